@@ -23,6 +23,10 @@ except:
 import traceback
 import sys
 from AutoGen.DataPipe import MemoryDataPipe
+from AutoGen.CacheIR import LocalCacheIR
+from AutoGen.BinaryCache import GetCacheCopyEngine
+from Common.FileHashCache import FileHashCache, FileIncludeCache, MetaFileRecordCache
+from Common.BuildToolError import FatalError, FILE_READ_FAILURE, UNKNOWN_ERROR
 import logging
 
 def clearQ(q):
@@ -95,13 +99,29 @@ class LogAgent(threading.Thread):
 
     def kill(self):
         self.log_q.put(None)
+## The failure of an AutoGen worker, reported to AutoGenManager through feedback_q
+#
+#   @param  ErrorCode   The error code of the failure, defined in BuildToolError
+#   @param  TaskName    The module, or the data pipe, the worker was working on
+#
+class AutoGenWorkerError(object):
+    def __init__(self, ErrorCode, TaskName):
+        self.ErrorCode = ErrorCode
+        self.TaskName = TaskName
+    def __str__(self):
+        return "AutoGen of %s failed with error code 0x%04X" % (self.TaskName, self.ErrorCode)
+
 class AutoGenManager(threading.Thread):
     def __init__(self,autogen_workers, feedback_q,error_event):
         super(AutoGenManager,self).__init__()
         self.autogen_workers = autogen_workers
         self.feedback_q = feedback_q
         self.Status = True
+        # the error code of the first failure reported by workers
+        self.ErrorCode = 0
         self.error_event = error_event
+        # (Kind, Files, Bytes, Time) of the binary cache copies done by workers
+        self.CacheCopyStat = []
     def run(self):
         try:
             fin_num = 0
@@ -111,7 +131,12 @@ class AutoGenManager(threading.Thread):
                     break
                 if badnews == "Done":
                     fin_num += 1
+                elif isinstance(badnews, tuple):
+                    self.CacheCopyStat.append(badnews)
                 else:
+                    if self.Status:
+                        self.ErrorCode = badnews.ErrorCode if isinstance(badnews, AutoGenWorkerError) else UNKNOWN_ERROR
+                        EdkLogger.debug(EdkLogger.DEBUG_5, str(badnews))
                     self.Status = False
                     self.TerminateWorkers()
                 if fin_num == len(self.autogen_workers):
@@ -132,17 +157,26 @@ class AutoGenManager(threading.Thread):
         self.error_event.set()
     def kill(self):
         self.feedback_q.put(None)
+## AutoGen worker process
+#
+#  Each item in module_queue is a (module info, data pipe file) pair, so that one
+#  pool of workers can serve the modules of all archs. The data pipe of an arch
+#  is loaded when the first module of that arch is met, and None in the queue
+#  tells the worker to exit.
+#
 class AutoGenWorkerInProcess(mp.Process):
-    def __init__(self,module_queue,data_pipe_file_path,feedback_q,file_lock,cache_lock,share_data,log_q,error_event):
+    def __init__(self,module_queue,feedback_q,file_lock,cache_lock,share_data,log_q,error_event):
         mp.Process.__init__(self)
         self.module_queue = module_queue
-        self.data_pipe_file_path =data_pipe_file_path
+        self.data_pipe_file_path = None
         self.data_pipe = None
+        self.data_pipe_dict = {}
         self.feedback_q = feedback_q
         self.PlatformMetaFileSet = {}
         self.file_lock = file_lock
         self.cache_lock = cache_lock
         self.share_data = share_data
+        self.cache_ir = None
         self.log_q = log_q
         self.error_event = error_event
     def GetPlatformMetaFile(self,filepath,root):
@@ -151,71 +185,102 @@ class AutoGenWorkerInProcess(mp.Process):
         except:
             self.PlatformMetaFileSet[(filepath,root)]  = filepath
             return self.PlatformMetaFileSet[(filepath,root)]
+    def SwitchDataPipe(self,data_pipe_file_path):
+        if data_pipe_file_path not in self.data_pipe_dict:
+            data_pipe = MemoryDataPipe()
+            try:
+                data_pipe.load(data_pipe_file_path)
+            except FatalError:
+                raise
+            except Exception as X:
+                EdkLogger.error("AutoGen", FILE_READ_FAILURE, "Failed to load data pipe: %s" % str(X), ExtraData=data_pipe_file_path)
+            self.data_pipe_dict[data_pipe_file_path] = data_pipe
+        self.data_pipe_file_path = data_pipe_file_path
+        self.data_pipe = self.data_pipe_dict[data_pipe_file_path]
+        loglevel = self.data_pipe.Get("LogLevel")
+        if not loglevel:
+            loglevel = EdkLogger.INFO
+        EdkLogger.SetLevel(loglevel)
+        target = self.data_pipe.Get("P_Info").get("Target")
+        toolchain = self.data_pipe.Get("P_Info").get("ToolChain")
+        archlist = self.data_pipe.Get("P_Info").get("ArchList")
+
+        active_p = self.data_pipe.Get("P_Info").get("ActivePlatform")
+        workspacedir = self.data_pipe.Get("P_Info").get("WorkspaceDir")
+        # os.getenv doesn't work after os.environ._data is replaced below
+        PackagesPath = self.data_pipe.Get("Env_Var").get("PACKAGES_PATH")
+        mws.setWs(workspacedir, PackagesPath)
+        self.Wa = WorkSpaceInfo(
+            workspacedir,active_p,target,toolchain,archlist
+            )
+        self.Wa._SrcTimeStamp = self.data_pipe.Get("Workspace_timestamp")
+        GlobalData.gGlobalDefines = self.data_pipe.Get("G_defines")
+        GlobalData.gCommandLineDefines = self.data_pipe.Get("CL_defines")
+        os.environ._data = self.data_pipe.Get("Env_Var")
+        GlobalData.gWorkspace = workspacedir
+        GlobalData.gDisableIncludePathCheck = False
+        GlobalData.gFdfParser = self.data_pipe.Get("FdfParser")
+        GlobalData.gDatabasePath = self.data_pipe.Get("DatabasePath")
+        GlobalData.gBinCacheSource = self.data_pipe.Get("BinCacheSource")
+        GlobalData.gBinCacheDest = self.data_pipe.Get("BinCacheDest")
+        GlobalData.gBinCacheLink = self.data_pipe.Get("BinCacheLink")
+        FileHashDb = self.data_pipe.Get("FileHashDb")
+        if not FileHashDb:
+            GlobalData.gFileHashCache = None
+        elif not GlobalData.gFileHashCache or GlobalData.gFileHashCache.DbPath != FileHashDb:
+            GlobalData.gFileHashCache = FileHashCache(FileHashDb)
+        GlobalData.gUseCompilerDeps = self.data_pipe.Get("UseCompilerDeps")
+        IncludeDepDb = self.data_pipe.Get("IncludeDepDb")
+        if not IncludeDepDb:
+            GlobalData.gFileIncludeCache = None
+        elif not GlobalData.gFileIncludeCache or GlobalData.gFileIncludeCache.DbPath != IncludeDepDb:
+            GlobalData.gFileIncludeCache = FileIncludeCache(IncludeDepDb)
+        MetaFileDb = self.data_pipe.Get("MetaFileDb")
+        if not MetaFileDb:
+            GlobalData.gMetaFileCache = None
+        elif not GlobalData.gMetaFileCache or GlobalData.gMetaFileCache.DbPath != MetaFileDb:
+            GlobalData.gMetaFileCache = MetaFileRecordCache(MetaFileDb)
+        GlobalData.gCacheIR = self.cache_ir
+        GlobalData.gEnableGenfdsMultiThread = self.data_pipe.Get("EnableGenfdsMultiThread")
+        GlobalData.gBuildBackend = self.data_pipe.Get("BuildBackend")
+        GlobalData.file_lock = self.file_lock
+        # gCacheIR is local to this process, only its Flush() needs the shared lock
+        GlobalData.cache_lock = threading.Lock()
+        self.CommandTarget = self.data_pipe.Get("CommandTarget")
+        pcd_from_build_option = []
+        for pcd_tuple in self.data_pipe.Get("BuildOptPcd"):
+            pcd_id = ".".join((pcd_tuple[0],pcd_tuple[1]))
+            if pcd_tuple[2].strip():
+                pcd_id = ".".join((pcd_id,pcd_tuple[2]))
+            pcd_from_build_option.append("=".join((pcd_id,pcd_tuple[3])))
+        GlobalData.BuildOptionPcd = pcd_from_build_option
+        FfsCmd = self.data_pipe.Get("FfsCommand")
+        if FfsCmd is None:
+            FfsCmd = {}
+        GlobalData.FfsCmd = FfsCmd
+        self.PlatformMetaFile = self.GetPlatformMetaFile(self.data_pipe.Get("P_Info").get("ActivePlatform"),
+                                         self.data_pipe.Get("P_Info").get("WorkspaceDir"))
+        GlobalData.libConstPcd = self.data_pipe.Get("LibConstPcd")
+        GlobalData.Refes = self.data_pipe.Get("REFS")
     def run(self):
         try:
             taskname = "Init"
-            with self.file_lock:
-                try:
-                    self.data_pipe = MemoryDataPipe()
-                    self.data_pipe.load(self.data_pipe_file_path)
-                except:
-                    self.feedback_q.put(taskname + ":" + "load data pipe %s failed." % self.data_pipe_file_path)
             EdkLogger.LogClientInitialize(self.log_q)
-            loglevel = self.data_pipe.Get("LogLevel")
-            if not loglevel:
-                loglevel = EdkLogger.INFO
-            EdkLogger.SetLevel(loglevel)
-            target = self.data_pipe.Get("P_Info").get("Target")
-            toolchain = self.data_pipe.Get("P_Info").get("ToolChain")
-            archlist = self.data_pipe.Get("P_Info").get("ArchList")
-
-            active_p = self.data_pipe.Get("P_Info").get("ActivePlatform")
-            workspacedir = self.data_pipe.Get("P_Info").get("WorkspaceDir")
-            PackagesPath = os.getenv("PACKAGES_PATH")
-            mws.setWs(workspacedir, PackagesPath)
-            self.Wa = WorkSpaceInfo(
-                workspacedir,active_p,target,toolchain,archlist
-                )
-            self.Wa._SrcTimeStamp = self.data_pipe.Get("Workspace_timestamp")
-            GlobalData.gGlobalDefines = self.data_pipe.Get("G_defines")
-            GlobalData.gCommandLineDefines = self.data_pipe.Get("CL_defines")
-            os.environ._data = self.data_pipe.Get("Env_Var")
-            GlobalData.gWorkspace = workspacedir
-            GlobalData.gDisableIncludePathCheck = False
-            GlobalData.gFdfParser = self.data_pipe.Get("FdfParser")
-            GlobalData.gDatabasePath = self.data_pipe.Get("DatabasePath")
-            GlobalData.gBinCacheSource = self.data_pipe.Get("BinCacheSource")
-            GlobalData.gBinCacheDest = self.data_pipe.Get("BinCacheDest")
-            GlobalData.gCacheIR = self.share_data
-            GlobalData.gEnableGenfdsMultiThread = self.data_pipe.Get("EnableGenfdsMultiThread")
-            GlobalData.file_lock = self.file_lock
-            GlobalData.cache_lock = self.cache_lock
-            CommandTarget = self.data_pipe.Get("CommandTarget")
-            pcd_from_build_option = []
-            for pcd_tuple in self.data_pipe.Get("BuildOptPcd"):
-                pcd_id = ".".join((pcd_tuple[0],pcd_tuple[1]))
-                if pcd_tuple[2].strip():
-                    pcd_id = ".".join((pcd_id,pcd_tuple[2]))
-                pcd_from_build_option.append("=".join((pcd_id,pcd_tuple[3])))
-            GlobalData.BuildOptionPcd = pcd_from_build_option
+            self.cache_ir = LocalCacheIR(self.share_data, self.cache_lock)
             module_count = 0
-            FfsCmd = self.data_pipe.Get("FfsCommand")
-            if FfsCmd is None:
-                FfsCmd = {}
-            GlobalData.FfsCmd = FfsCmd
-            PlatformMetaFile = self.GetPlatformMetaFile(self.data_pipe.Get("P_Info").get("ActivePlatform"),
-                                             self.data_pipe.Get("P_Info").get("WorkspaceDir"))
-            libConstPcd = self.data_pipe.Get("LibConstPcd")
-            Refes = self.data_pipe.Get("REFS")
-            GlobalData.libConstPcd = libConstPcd
-            GlobalData.Refes = Refes
             while True:
-                if self.module_queue.empty():
-                    break
                 if self.error_event.is_set():
                     break
+                # publish the cache state of last module before waiting for next one
+                self.cache_ir.Flush()
+                task = self.module_queue.get()
+                if task is None:
+                    break
+                (module_file,module_root,module_path,module_basename,module_originalpath,module_arch,IsLib),data_pipe_file_path = task
+                if data_pipe_file_path != self.data_pipe_file_path:
+                    taskname = data_pipe_file_path
+                    self.SwitchDataPipe(data_pipe_file_path)
                 module_count += 1
-                module_file,module_root,module_path,module_basename,module_originalpath,module_arch,IsLib = self.module_queue.get_nowait()
                 modulefullpath = os.path.join(module_root,module_file)
                 taskname = " : ".join((modulefullpath,module_arch))
                 module_metafile = PathClass(module_file,module_root)
@@ -228,34 +293,44 @@ class AutoGenWorkerInProcess(mp.Process):
                 arch = module_arch
                 target = self.data_pipe.Get("P_Info").get("Target")
                 toolchain = self.data_pipe.Get("P_Info").get("ToolChain")
-                Ma = ModuleAutoGen(self.Wa,module_metafile,target,toolchain,arch,PlatformMetaFile,self.data_pipe)
+                Ma = ModuleAutoGen(self.Wa,module_metafile,target,toolchain,arch,self.PlatformMetaFile,self.data_pipe)
                 Ma.IsLibrary = IsLib
                 if IsLib:
-                    if (Ma.MetaFile.File,Ma.MetaFile.Root,Ma.Arch,Ma.MetaFile.Path) in libConstPcd:
-                        Ma.ConstPcd = libConstPcd[(Ma.MetaFile.File,Ma.MetaFile.Root,Ma.Arch,Ma.MetaFile.Path)]
-                    if (Ma.MetaFile.File,Ma.MetaFile.Root,Ma.Arch,Ma.MetaFile.Path) in Refes:
-                        Ma.ReferenceModules = Refes[(Ma.MetaFile.File,Ma.MetaFile.Root,Ma.Arch,Ma.MetaFile.Path)]
-                if GlobalData.gBinCacheSource and CommandTarget in [None, "", "all"]:
+                    if (Ma.MetaFile.File,Ma.MetaFile.Root,Ma.Arch,Ma.MetaFile.Path) in GlobalData.libConstPcd:
+                        Ma.ConstPcd = GlobalData.libConstPcd[(Ma.MetaFile.File,Ma.MetaFile.Root,Ma.Arch,Ma.MetaFile.Path)]
+                    if (Ma.MetaFile.File,Ma.MetaFile.Root,Ma.Arch,Ma.MetaFile.Path) in GlobalData.Refes:
+                        Ma.ReferenceModules = GlobalData.Refes[(Ma.MetaFile.File,Ma.MetaFile.Root,Ma.Arch,Ma.MetaFile.Path)]
+                if GlobalData.gBinCacheSource and self.CommandTarget in [None, "", "all"]:
                     Ma.GenModuleFilesHash(GlobalData.gCacheIR)
                     Ma.GenPreMakefileHash(GlobalData.gCacheIR)
                     if Ma.CanSkipbyPreMakefileCache(GlobalData.gCacheIR):
                         continue
 
                 Ma.CreateCodeFile(False)
-                Ma.CreateMakeFile(False,GenFfsList=FfsCmd.get((Ma.MetaFile.Path, Ma.Arch),[]))
+                Ma.CreateMakeFile(False,GenFfsList=GlobalData.FfsCmd.get((Ma.MetaFile.Path, Ma.Arch),[]))
 
-                if GlobalData.gBinCacheSource and CommandTarget in [None, "", "all"]:
+                if GlobalData.gBinCacheSource and self.CommandTarget in [None, "", "all"]:
                     Ma.GenMakeHeaderFilesHash(GlobalData.gCacheIR)
                     Ma.GenMakeHash(GlobalData.gCacheIR)
                     if Ma.CanSkipbyMakeCache(GlobalData.gCacheIR):
                         continue
                     else:
                         Ma.PrintFirstMakeCacheMissFile(GlobalData.gCacheIR)
-        except Empty:
-            pass
+            self.cache_ir.Flush()
+            if GlobalData.gFileHashCache:
+                GlobalData.gFileHashCache.Flush()
+            if GlobalData.gFileIncludeCache:
+                GlobalData.gFileIncludeCache.Flush()
+            if GlobalData.gMetaFileCache:
+                GlobalData.gMetaFileCache.Flush()
+            for Kind, (Files, Bytes, Time) in GetCacheCopyEngine().Stat.items():
+                self.feedback_q.put((Kind, Files, Bytes, Time))
+        except FatalError as X:
+            # the error has been logged by EdkLogger.error()
+            self.feedback_q.put(AutoGenWorkerError(X.args[0], taskname))
         except:
             traceback.print_exc(file=sys.stdout)
-            self.feedback_q.put(taskname)
+            self.feedback_q.put(AutoGenWorkerError(UNKNOWN_ERROR, taskname))
         finally:
             self.feedback_q.put("Done")
     def printStatus(self):
@@ -0,0 +1,548 @@
+## @file
+# Content addressable store of the binary cache
+#
+# The files of a module are stored once per content, as blobs named by their
+# md5 digest under the .blobs directory of the binary cache. The cache directory
+# of each MakeHash of a module only has a small manifest listing the files to
+# restore and their digests, so identical outputs of different modules, hashes
+# and platforms share one blob.
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import os
+import json
+import shutil
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+import Common.EdkLogger as EdkLogger
+from Common.FileHashCache import GetFileDigest
+from Common.LongFilePathSupport import OpenLongFilePath as open
+from Common.Misc import CreateDirectory, RemoveDirectory
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+## Directory of the blobs, under the root directory of the binary cache
+BLOB_DIRECTORY = ".blobs"
+
+## Suffix of the manifest file in the cache directory of a module
+MANIFEST_SUFFIX = ".Manifest"
+
+## Version of the manifest format
+MANIFEST_VERSION = 1
+
+## Reference index of the cache entries and the blobs they use, under the root
+#  directory of the binary cache. Each line is a JSON list of the manifest path
+#  relative to the root, the size of the cache entry and the blob digests.
+INDEX_FILE = ".index"
+INDEX_LOCK_FILE = ".index.lock"
+
+## Kinds of the files in a manifest, relative to module OutputDir or FfsOutputDir
+CACHE_FILE_OUTPUT = "Output"
+CACHE_FILE_FFS = "Ffs"
+
+## List of the files hardlinked to blobs, in module OutputDir. Each line is a
+#  path relative to OutputDir.
+CACHE_LINK_FILE = "CacheLinks.lst"
+
+## Unreferenced blobs younger than this many seconds may belong to a module
+#  being saved by a running build, so they are kept by the garbage collector
+BLOB_GRACE_PERIOD = 3600
+
+## ioctl request cloning a file on Linux file systems supporting reflink
+FICLONE = 0x40049409
+
+## Number of threads copying files between build directory and binary cache
+CACHE_COPY_THREADS = 8
+
+## Kinds of cache copy counted by CacheCopyEngine
+CACHE_COPY_RESTORE = "restored from"
+CACHE_COPY_SAVE = "saved to"
+
+## Parse the size of the binary cache
+#
+#   @param  Size        Size string, a number with optional K, M, G or T suffix
+#
+#   @retval int         The size in bytes
+#
+def ParseCacheSize(Size):
+    Size = Size.strip().upper()
+    if Size.endswith('B'):
+        Size = Size[:-1]
+    Unit = 1
+    if Size and Size[-1] in 'KMGT':
+        Unit = 1024 ** ('KMGT'.index(Size[-1]) + 1)
+        Size = Size[:-1]
+    Value = int(float(Size) * Unit)
+    if Value <= 0:
+        raise ValueError("Invalid cache size: %s" % Size)
+    return Value
+
+## Copy a file, sharing its data blocks with the source file if possible
+#
+#   @param  SrcFile     The path of source file
+#   @param  DstFile     The path of destination file, it must not exist
+#
+def _CloneFile(SrcFile, DstFile):
+    with open(SrcFile, 'rb') as Src, open(DstFile, 'wb') as Dst:
+        if fcntl and sys.platform.startswith('linux'):
+            try:
+                fcntl.ioctl(Dst.fileno(), FICLONE, Src.fileno())
+                return
+            except (IOError, OSError):
+                pass
+        shutil.copyfileobj(Src, Dst, 1024 * 1024)
+
+def _TempPath(FilePath):
+    return "%s.%d.%d.tmp" % (FilePath, os.getpid(), threading.current_thread().ident)
+
+## Give a file hardlinked to a blob its own copy of the data
+#
+#   A file restored with --binary-cache-link shares its data with the blob, so
+#   it must be unlinked from the blob before any tool writes into it in place.
+#
+#   @param  File        The path of the file
+#
+def BreakLink(File):
+    if not os.path.isfile(File) or os.stat(File).st_nlink < 2:
+        return
+    TempFile = _TempPath(File)
+    _CloneFile(File, TempFile)
+    os.replace(TempFile, File)
+
+## Record the files of a module which are going to be hardlinked to blobs
+#
+#   The list is kept until BreakCacheLinks() is called, so that the links are
+#   broken before the module is built again, even by a build without
+#   --binary-cache-link. The files recorded by an earlier restore are kept in
+#   the list.
+#
+#   @param  OutputDir   The output directory of the module
+#   @param  FileList    The paths of the files relative to OutputDir
+#
+def SaveCacheLinks(OutputDir, FileList):
+    if not FileList:
+        return
+    LinkFile = os.path.join(OutputDir, CACHE_LINK_FILE)
+    FileSet = set(FileList)
+    if os.path.exists(LinkFile):
+        with open(LinkFile, 'r') as Fd:
+            FileSet.update(Fd.read().splitlines())
+    CreateDirectory(OutputDir)
+    with open(LinkFile, 'w') as Fd:
+        Fd.write('\n'.join(sorted(FileSet)))
+
+## Give the files of a module recorded by SaveCacheLinks() their own copies of data
+#
+#   It must be called before any tool may write into OutputDir of the module,
+#   since the tools rewrite their outputs in place, which fails on the read-only
+#   blobs, or changes them if run by root.
+#
+#   @param  OutputDir   The output directory of the module
+#
+def BreakCacheLinks(OutputDir):
+    LinkFile = os.path.join(OutputDir, CACHE_LINK_FILE)
+    if not os.path.exists(LinkFile):
+        return
+    with open(LinkFile, 'r') as Fd:
+        FileList = Fd.read().splitlines()
+    for File in FileList:
+        BreakLink(os.path.join(OutputDir, File))
+    os.remove(LinkFile)
+
+## Content addressable binary cache store
+#
+class BinaryCacheStore(object):
+    ## Constructor
+    #
+    #   @param  Root        The root directory of the binary cache
+    #
+    def __init__(self, Root):
+        self.Root = Root
+        self.BlobDir = os.path.join(Root, BLOB_DIRECTORY)
+
+    def BlobPath(self, Digest):
+        return os.path.join(self.BlobDir, Digest[:2], Digest)
+
+    ## Hold the lock of the reference index, across the builds sharing the cache
+    #
+    #   Without fcntl, e.g. on Windows, the index is not locked.
+    #
+    @contextmanager
+    def IndexLock(self):
+        with open(os.path.join(self.Root, INDEX_LOCK_FILE), 'a') as LockFile:
+            if fcntl:
+                fcntl.flock(LockFile.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(LockFile.fileno(), fcntl.LOCK_UN)
+
+    ## Load the reference index
+    #
+    #   @retval dict        {manifest path: (entry size, digest list)}, the
+    #                       last line of a manifest saved more than once wins
+    #   @retval None        The cache has no index
+    #
+    def LoadIndex(self):
+        IndexFile = os.path.join(self.Root, INDEX_FILE)
+        if not os.path.exists(IndexFile):
+            return None
+        Index = {}
+        with open(IndexFile, 'r') as f:
+            for Line in f:
+                try:
+                    RelPath, EntrySize, DigestList = json.loads(Line)
+                except ValueError:
+                    # partial line of an interrupted save
+                    continue
+                Index[RelPath] = (EntrySize, DigestList)
+        return Index
+
+    ## Replace the reference index
+    #
+    #   @param  Index       {manifest path: (entry size, digest list)}
+    #
+    def SaveIndex(self, Index):
+        IndexFile = os.path.join(self.Root, INDEX_FILE)
+        TempFile = _TempPath(IndexFile)
+        with open(TempFile, 'w') as f:
+            for RelPath in sorted(Index):
+                f.write(json.dumps([RelPath, Index[RelPath][0], Index[RelPath][1]]) + "\n")
+        os.replace(TempFile, IndexFile)
+
+    ## Index all the cache entries by reading their manifests
+    #
+    #   This is only for a cache saved without the reference index.
+    #
+    #   @retval dict        {manifest path: (entry size, digest list)}
+    #
+    def ScanEntries(self):
+        Index = {}
+        for Root, Dirs, Files in os.walk(self.Root):
+            if Root == self.Root and BLOB_DIRECTORY in Dirs:
+                Dirs.remove(BLOB_DIRECTORY)
+            for File in Files:
+                if not File.endswith(MANIFEST_SUFFIX):
+                    continue
+                ManifestFile = os.path.join(Root, File)
+                try:
+                    with open(ManifestFile, 'r') as f:
+                        DigestList = sorted(set(Entry[2] for Entry in json.load(f)["Files"]))
+                except (OSError, IOError, ValueError, KeyError, IndexError, TypeError):
+                    EdkLogger.quiet("[cache warning]: ignore broken manifest: %s" % ManifestFile)
+                    continue
+                Index[os.path.relpath(ManifestFile, self.Root)] = (self.GetEntrySize(Root), DigestList)
+        return Index
+
+    ## Get the size of the files in the cache directory of a MakeHash
+    #
+    #   @param  EntryDir    The cache directory
+    #
+    def GetEntrySize(self, EntryDir):
+        return sum(Entry.stat().st_size for Entry in os.scandir(EntryDir) if Entry.is_file())
+
+    ## Add a file to the store
+    #
+    #   Blobs are read-only, so that a restored file hardlinked to its blob
+    #   can't be changed in place by accident.
+    #
+    #   @param  File        The path of the file
+    #
+    #   @retval tuple       The hex digest and the size of the file
+    #
+    def AddFile(self, File):
+        Digest = GetFileDigest(File).hex()
+        Size = os.path.getsize(File)
+        Blob = self.BlobPath(Digest)
+        if os.path.exists(Blob):
+            return Digest, Size
+        CreateDirectory(os.path.dirname(Blob))
+        TempFile = _TempPath(Blob)
+        _CloneFile(File, TempFile)
+        os.chmod(TempFile, 0o444)
+        os.replace(TempFile, Blob)
+        return Digest, Size
+
+    ## Save the manifest of a module
+    #
+    #   @param  ManifestFile    The path of the manifest
+    #   @param  EntryList       List of (Kind, RelativePath, Digest, Size)
+    #
+    #   The entry is added to the reference index before the manifest is in
+    #   place, so that the garbage collector never finds a manifest whose blobs
+    #   are not referenced by the index.
+    #
+    def SaveManifest(self, ManifestFile, EntryList):
+        TempFile = _TempPath(ManifestFile)
+        with open(TempFile, 'w') as f:
+            json.dump({"Version": MANIFEST_VERSION, "Files": EntryList}, f, indent=2)
+        # the size of the entry once the manifest is replaced
+        EntrySize = self.GetEntrySize(os.path.dirname(ManifestFile))
+        if os.path.exists(ManifestFile):
+            EntrySize -= os.path.getsize(ManifestFile)
+        Line = json.dumps([os.path.relpath(ManifestFile, self.Root), EntrySize, sorted(set(Entry[2] for Entry in EntryList))])
+        with self.IndexLock():
+            with open(os.path.join(self.Root, INDEX_FILE), 'a') as f:
+                f.write(Line + "\n")
+        os.replace(TempFile, ManifestFile)
+
+    ## Load the manifest of a module
+    #
+    #   The modification time of the manifest is updated, it's the last use
+    #   time of the cache entry for the garbage collector.
+    #
+    #   @param  ManifestFile    The path of the manifest
+    #
+    #   @retval list            List of (Kind, RelativePath, Digest, Size)
+    #
+    def LoadManifest(self, ManifestFile):
+        with open(ManifestFile, 'r') as f:
+            Manifest = json.load(f)
+        if Manifest.get("Version") != MANIFEST_VERSION:
+            raise ValueError("Unsupported manifest version: %s" % ManifestFile)
+        try:
+            os.utime(ManifestFile, None)
+        except OSError:
+            # read-only cache
+            pass
+        return Manifest["Files"]
+
+    ## Restore a file from its blob
+    #
+    #   @param  Digest      The hex digest of the file
+    #   @param  Size        The size of the file
+    #   @param  DstFile     The path of the file to restore, its directory must exist
+    #   @param  Link        Hardlink the file to the blob instead of copying it
+    #
+    def RestoreFile(self, Digest, Size, DstFile, Link=False):
+        Blob = self.BlobPath(Digest)
+        if os.path.getsize(Blob) != Size:
+            raise ValueError("Broken cache file: %s" % Blob)
+        TempFile = _TempPath(DstFile)
+        if Link:
+            try:
+                os.link(Blob, TempFile)
+            except OSError:
+                # different file system, or links not supported
+                Link = False
+        if not Link:
+            _CloneFile(Blob, TempFile)
+        os.replace(TempFile, DstFile)
+
+    ## Remove unreferenced blobs and least recently used module entries
+    #
+    #   The cache directory of a MakeHash is removed as a whole with its
+    #   manifest, then the blobs not referenced by any manifest are removed.
+    #   The entries and their blobs are got from the reference index, so only
+    #   the manifests are stat'ed. The index is compacted under its lock, which
+    #   also holds back the builds saving to the cache meanwhile.
+    #
+    #   @param  MaxSize     The size limit of the cache in bytes, or None
+    #
+    #   @retval tuple       Number of removed entries, number of removed blobs
+    #                       and the size of the cache after collection
+    #
+    def Gc(self, MaxSize=None):
+        with self.IndexLock():
+            return self._Gc(MaxSize)
+
+    def _Gc(self, MaxSize):
+        Index = self.LoadIndex()
+        if Index is None:
+            Index = self.ScanEntries()
+        EntryList = []
+        RefCount = defaultdict(int)
+        for RelPath in list(Index):
+            EntrySize, DigestList = Index[RelPath]
+            try:
+                LastUse = os.stat(os.path.join(self.Root, RelPath)).st_mtime
+            except OSError:
+                # removed, or never saved by an interrupted build
+                del Index[RelPath]
+                continue
+            for Digest in DigestList:
+                RefCount[Digest] += 1
+            EntryList.append((LastUse, RelPath, EntrySize, DigestList))
+
+        BlobSize = {}
+        RemovedBlob = 0
+        Now = time.time()
+        for Root, Dirs, Files in os.walk(self.BlobDir):
+            for File in Files:
+                Blob = os.path.join(Root, File)
+                Stat = os.stat(Blob)
+                if File not in RefCount and Now - Stat.st_ctime > BLOB_GRACE_PERIOD:
+                    os.remove(Blob)
+                    RemovedBlob += 1
+                else:
+                    BlobSize[File] = Stat.st_size
+
+        TotalSize = sum(BlobSize.values()) + sum(Entry[2] for Entry in EntryList)
+        RemovedEntry = 0
+        ParentDirSet = set()
+        if MaxSize:
+            for LastUse, RelPath, EntrySize, DigestList in sorted(EntryList, key=lambda Entry: Entry[0]):
+                if TotalSize <= MaxSize:
+                    break
+                EntryDir = os.path.dirname(os.path.join(self.Root, RelPath))
+                RemoveDirectory(EntryDir, True)
+                ParentDirSet.add(os.path.dirname(EntryDir))
+                del Index[RelPath]
+                RemovedEntry += 1
+                TotalSize -= EntrySize
+                for Digest in DigestList:
+                    RefCount[Digest] -= 1
+                    if RefCount[Digest] == 0 and Digest in BlobSize:
+                        os.remove(self.BlobPath(Digest))
+                        RemovedBlob += 1
+                        TotalSize -= BlobSize.pop(Digest)
+
+        # drop the removed MakeHash from the ModuleHashPair files of the modules
+        for ParentDir in ParentDirSet:
+            for File in os.listdir(ParentDir):
+                if not File.endswith(".ModuleHashPair"):
+                    continue
+                ModuleHashPair = os.path.join(ParentDir, File)
+                try:
+                    with open(ModuleHashPair, 'r') as f:
+                        ModuleHashPairList = json.load(f)
+                    ModuleHashPairList = [Pair for Pair in ModuleHashPairList if os.path.isdir(os.path.join(ParentDir, str(Pair[1])))]
+                    with open(ModuleHashPair, 'w') as f:
+                        json.dump(ModuleHashPairList, f, indent=2)
+                except (OSError, IOError, ValueError):
+                    EdkLogger.quiet("[cache warning]: fail to update ModuleHashPair file: %s" % ModuleHashPair)
+
+        self.SaveIndex(Index)
+        return RemovedEntry, RemovedBlob, TotalSize
+
+## Thread pool copying files between build directory and binary cache
+#
+#  A cache restore or upload is mostly the latency of creating many small
+#  files, which is long on network file systems, so the files are copied by
+#  several threads. The files, bytes and time of the copies are counted for
+#  the summary printed at the end of build.
+#
+class CacheCopyEngine(object):
+    ## Constructor
+    #
+    #   @param  ThreadNumber    The number of copy threads
+    #
+    def __init__(self, ThreadNumber=CACHE_COPY_THREADS):
+        self.ThreadNumber = ThreadNumber
+        self._Pool = None
+        self._Pending = []
+        self._PendingStart = None
+        self._Lock = threading.Lock()
+        self.Stat = {}
+
+    @property
+    def Pool(self):
+        if self._Pool is None:
+            self._Pool = ThreadPoolExecutor(max_workers=self.ThreadNumber)
+        return self._Pool
+
+    ## Count the files copied
+    #
+    #   @param  Kind        CACHE_COPY_RESTORE or CACHE_COPY_SAVE
+    #   @param  Files       Number of files
+    #   @param  Bytes       Number of bytes
+    #   @param  Time        Time spent in seconds
+    #
+    def Count(self, Kind, Files, Bytes, Time):
+        with self._Lock:
+            Stat = self.Stat.setdefault(Kind, [0, 0, 0.0])
+            Stat[0] += Files
+            Stat[1] += Bytes
+            Stat[2] += Time
+
+    ## Restore files from their blobs, return when all of them are restored
+    #
+    #   @param  Store       The BinaryCacheStore of the files
+    #   @param  EntryList   List of (Digest, Size, DstFile, Link), the file is
+    #                       hardlinked to its blob instead of copied if Link
+    #
+    def RestoreFiles(self, Store, EntryList):
+        Start = time.time()
+        for DirName in sorted(set(os.path.dirname(Entry[2]) for Entry in EntryList)):
+            CreateDirectory(DirName)
+        Futures = [self.Pool.submit(Store.RestoreFile, Digest, Size, DstFile, Link) for Digest, Size, DstFile, Link in EntryList]
+        wait(Futures)
+        self.Count(CACHE_COPY_RESTORE, len(EntryList), sum(Entry[1] for Entry in EntryList), time.time() - Start)
+        for Future in Futures:
+            Future.result()
+
+    ## Start saving the files of a module, the manifest is saved by Wait()
+    #
+    #   @param  Store           The BinaryCacheStore to save the files in
+    #   @param  ManifestFile    The path of the manifest of the module
+    #   @param  FileList        List of (Kind, RelativePath, File)
+    #   @param  Name            The name of the module for warnings
+    #
+    def SaveFiles(self, Store, ManifestFile, FileList, Name):
+        if self._PendingStart is None:
+            self._PendingStart = time.time()
+        Futures = [(Kind, RelPath, self.Pool.submit(Store.AddFile, File)) for Kind, RelPath, File in FileList]
+        self._Pending.append((Store, ManifestFile, Futures, Name))
+
+    ## Wait for the files started by SaveFiles() and save the manifests
+    #
+    #   @retval bool        True if all the modules are saved
+    #
+    def Wait(self):
+        Status = True
+        Files = 0
+        Bytes = 0
+        for Store, ManifestFile, Futures, Name in self._Pending:
+            try:
+                EntryList = []
+                for Kind, RelPath, Future in Futures:
+                    Digest, Size = Future.result()
+                    EntryList.append((Kind, RelPath, Digest, Size))
+                Store.SaveManifest(ManifestFile, EntryList)
+                Files += len(EntryList)
+                Bytes += sum(Entry[3] for Entry in EntryList)
+            except (OSError, IOError) as X:
+                EdkLogger.quiet("[cache warning]: fail to save module %s in cache: %s" % (Name, X))
+                Status = False
+        if self._PendingStart is not None:
+            self.Count(CACHE_COPY_SAVE, Files, Bytes, time.time() - self._PendingStart)
+        self._Pending = []
+        self._PendingStart = None
+        return Status
+
+    ## Get the summary of the copies
+    #
+    #   @retval list        One line for each kind of copy
+    #
+    def Summary(self):
+        LineList = []
+        for Kind in (CACHE_COPY_RESTORE, CACHE_COPY_SAVE):
+            if Kind not in self.Stat or not self.Stat[Kind][0]:
+                continue
+            Files, Bytes, Time = self.Stat[Kind]
+            MegaBytes = Bytes / (1024.0 * 1024.0)
+            LineList.append("[cache]: %d files (%.1f MB) %s cache in %.2f s, %.1f MB/s" %
+                            (Files, MegaBytes, Kind, Time, MegaBytes / Time if Time else 0))
+        return LineList
+
+## Copy engine of current process
+_CacheCopyEngine = None
+
+## Get the CacheCopyEngine of current process
+#
+def GetCacheCopyEngine():
+    global _CacheCopyEngine
+    if _CacheCopyEngine is None:
+        _CacheCopyEngine = CacheCopyEngine()
+    return _CacheCopyEngine
@@ -27,3 +27,102 @@ class ModuleBuildCacheIR():
         self.CacheCrash = False
         self.PreMakeCacheHit = False
         self.MakeCacheHit = False
+
+## Merge the build cache state of a module found in another process
+#
+#   The merge is done field by field: a field of IR which has been changed since
+#   it was read keeps the value of current process, and any other field takes the
+#   value in OtherIR. A field may be changed in either direction, like MakeCacheHit
+#   which is cleared again for a module with .inc files. The fields are always
+#   assigned, never updated in place, so a change is found by comparing values.
+#
+#   @param  IR          The ModuleBuildCacheIR object to be updated
+#   @param  BaseFields  The fields of IR when it was read from the shared dict,
+#                       None if IR was created in current process
+#   @param  OtherIR     The ModuleBuildCacheIR object of the same module
+#
+def MergeCacheIR(IR, BaseFields, OtherIR):
+    if BaseFields is None:
+        BaseFields = vars(ModuleBuildCacheIR(IR.ModulePath, IR.ModuleArch))
+    for Name, Value in vars(OtherIR).items():
+        if getattr(IR, Name, None) == BaseFields.get(Name):
+            setattr(IR, Name, Value)
+
+## Process local view of the build cache state shared by AutoGen workers
+#
+#  Reading and updating an entry of a multiprocessing.Manager dict is a round
+#  trip to the manager process, and pickles the whole ModuleBuildCacheIR object.
+#  This class keeps the entries read, created or updated in current process in a
+#  plain dict, so that each entry is fetched from the shared dict at most once.
+#  The entries changed locally are written back to the shared dict in one batch
+#  by Flush(), which also drops the entries read, so that the results of other
+#  processes are visible again after it.
+#
+class LocalCacheIR():
+    ## Constructor
+    #
+    #   @param  SharedDict  The dict shared by all processes
+    #   @param  Lock        The lock protecting SharedDict
+    #
+    def __init__(self, SharedDict, Lock):
+        self.SharedDict = SharedDict
+        self.Lock = Lock
+        self.LocalDict = {}
+        self.DirtyKeySet = set()
+        # {key: fields of ModuleBuildCacheIR when it was read from SharedDict}
+        self.BaseFieldsDict = {}
+
+    ## Get an entry with one round trip to the shared dict at most
+    #
+    #   None is never stored as a value, so it means the key is not found.
+    #   Missing keys are not remembered, since other processes may add them.
+    #
+    def _Lookup(self, Key):
+        if Key in self.LocalDict:
+            return self.LocalDict[Key]
+        Value = self.SharedDict.get(Key)
+        if Value is not None:
+            self.LocalDict[Key] = Value
+            if isinstance(Value, ModuleBuildCacheIR):
+                self.BaseFieldsDict[Key] = dict(vars(Value))
+        return Value
+
+    def __contains__(self, Key):
+        return self._Lookup(Key) is not None
+
+    def __getitem__(self, Key):
+        Value = self._Lookup(Key)
+        if Value is None:
+            raise KeyError(Key)
+        return Value
+
+    def __setitem__(self, Key, Value):
+        self.LocalDict[Key] = Value
+        self.DirtyKeySet.add(Key)
+
+    def get(self, Key, Default=None):
+        try:
+            return self[Key]
+        except KeyError:
+            return Default
+
+    ## Write the entries changed locally back to the shared dict
+    #
+    #   Other processes may have updated the same entries since they were read,
+    #   so they are merged with the ones in the shared dict first.
+    #
+    def Flush(self):
+        if self.DirtyKeySet:
+            with self.Lock:
+                UpdateDict = {}
+                for Key in self.DirtyKeySet:
+                    Value = self.LocalDict[Key]
+                    if isinstance(Value, ModuleBuildCacheIR):
+                        SharedValue = self.SharedDict.get(Key)
+                        if SharedValue is not None:
+                            MergeCacheIR(Value, self.BaseFieldsDict.get(Key), SharedValue)
+                    UpdateDict[Key] = Value
+                self.SharedDict.update(UpdateDict)
+        self.LocalDict = {}
+        self.DirtyKeySet = set()
+        self.BaseFieldsDict = {}
@@ -9,9 +9,24 @@ from Workspace.WorkspaceDatabase import BuildDB
 from Workspace.WorkspaceCommon import GetModuleLibInstances
 import Common.GlobalData as GlobalData
 import os
+import mmap
+import struct
 import pickle
 from pickle import HIGHEST_PROTOCOL
 from Common import EdkLogger
+from Common.BuildToolError import FORMAT_NOT_SUPPORTED
+
+## Layout of data pipe file
+#
+#   header      magic, format version and size of data
+#   data        pickled data container
+#
+# The whole container is pickled at once, so that the objects shared by the
+# values, like the PCDs, are still shared after it is loaded.
+#
+DATA_PIPE_MAGIC = b"EDK2PIPE"
+DATA_PIPE_VERSION = 2
+DATA_PIPE_HEADER = struct.Struct("<8sIQ")
 
 class PCD_DATA():
     def __init__(self,TokenCName,TokenSpaceGuidCName,Type,DatumType,SkuInfoList,DefaultValue,
@@ -44,12 +59,18 @@ class MemoryDataPipe(DataPipe):
 
     def dump(self,file_path):
         self.dump_file = file_path
+        data = pickle.dumps(self.data_container,pickle.HIGHEST_PROTOCOL)
         with open(file_path,'wb') as fd:
-            pickle.dump(self.data_container,fd,pickle.HIGHEST_PROTOCOL)
+            fd.write(DATA_PIPE_HEADER.pack(DATA_PIPE_MAGIC, DATA_PIPE_VERSION, len(data)))
+            fd.write(data)
 
     def load(self,file_path):
-        with open(file_path,'rb') as fd:
-            self.data_container = pickle.load(fd)
+        with open(file_path,'rb') as fd, mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as snapshot:
+            magic, version, data_size = DATA_PIPE_HEADER.unpack_from(snapshot, 0)
+            if magic != DATA_PIPE_MAGIC or version != DATA_PIPE_VERSION:
+                EdkLogger.error("AutoGen", FORMAT_NOT_SUPPORTED, "Unknown data pipe format", ExtraData=file_path)
+            self.data_container = pickle.loads(snapshot[DATA_PIPE_HEADER.size:DATA_PIPE_HEADER.size + data_size])
+        self.dump_file = file_path
 
     @property
     def DataContainer(self):
@@ -163,4 +184,16 @@ class MemoryDataPipe(DataPipe):
 
         self.DataContainer = {"BinCacheDest":GlobalData.gBinCacheDest}
 
+        self.DataContainer = {"BinCacheLink":GlobalData.gBinCacheLink}
+
+        self.DataContainer = {"FileHashDb":GlobalData.gFileHashCache.DbPath if GlobalData.gFileHashCache else None}
+
+        self.DataContainer = {"UseCompilerDeps":GlobalData.gUseCompilerDeps}
+
+        self.DataContainer = {"IncludeDepDb":GlobalData.gFileIncludeCache.DbPath if GlobalData.gFileIncludeCache else None}
+
+        self.DataContainer = {"MetaFileDb":GlobalData.gMetaFileCache.DbPath if GlobalData.gMetaFileCache else None}
+
+        self.DataContainer = {"BuildBackend":GlobalData.gBuildBackend}
+
         self.DataContainer = {"EnableGenfdsMultiThread":GlobalData.gEnableGenfdsMultiThread}
\ No newline at end of file
@@ -20,7 +20,7 @@ from Common.Misc import *
 from Common.StringUtils import *
 from .BuildEngine import *
 import Common.GlobalData as GlobalData
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from Common.DataType import TAB_COMPILER_MSFT
 
 ## Regular expression for finding header file inclusions
@@ -29,7 +29,24 @@ gIncludePattern = re.compile(r"^[ \t]*[#%]?[ \t]*include(?:[ \t]*(?:\\(?:\r\n|\r
 ## Regular expression for matching macro used in header file inclusion
 gMacroPattern = re.compile("([_A-Z][_A-Z0-9]*)[ \t]*\((.+)\)", re.UNICODE)
 
-gIsFileMap = {}
+## Compiler flags saving the header files included by a source file, per tool chain family
+#
+#  GCC compatible compilers write a dependency file next to the object file. The
+#  notes printed by MSFT compiler are saved to a dependency file by build.
+#
+gDepsFlags = {
+  "GCC"                 :   "-MMD -MF $@.deps",
+  TAB_COMPILER_MSFT     :   "/showIncludes",
+}
+
+## Extension of the dependency files saved by compiler
+gDepsFileExt = ".deps"
+
+## Name of the makefile fragment containing the header dependencies got from compiler
+gDepsMakefileName = "deps.mk"
+
+## Regular expression for the items in the rule of a dependency file, the spaces in paths are escaped
+gDepsItemPattern = re.compile(r"(?:\\ |\S)+")
 
 ## pattern for include style in Edk.x code
 gProtocolDefinition = "Protocol/%(HeaderKey)s/%(HeaderKey)s.h"
@@ -161,6 +178,12 @@ class BuildFile(object):
         "gmake" :   "include"
     }
 
+    ## include a file only if it exists
+    _OPTIONAL_INCLUDE_TEMPLATE_ = {
+        "nmake" :   '!IF EXIST(%(file)s)\n!INCLUDE %(file)s\n!ENDIF',
+        "gmake" :   "-include %(file)s"
+    }
+
     _INC_FLAG_ = {TAB_COMPILER_MSFT : "/I", "GCC" : "-I", "INTEL" : "-I", "RVCT" : "-I", "NASM" : "-I"}
 
     ## Constructor of BuildFile
@@ -297,7 +320,8 @@ ${END}
 ${BEGIN}${module_tool_definitions}
 ${END}
 MAKE_FILE = ${makefile_path}
-
+${BEGIN}DEPS_FLAGS = ${deps_flags}
+${END}
 #
 # Build Macro
 #
@@ -387,7 +411,8 @@ gen_fds:
 #
 ${BEGIN}${file_build_target}
 ${END}
-
+${BEGIN}${deps_makefile_include}
+${END}
 #
 # clean all intermediate files
 #
@@ -450,6 +475,7 @@ cleanlib:
         self.MacroList = ['FFS_OUTPUT_DIR', 'MODULE_GUID', 'OUTPUT_DIR']
         self.FfsOutputFileList = []
         self.DependencyHeaderFileSet = set()
+        self.DepsTargetList = []
 
     # Compose a dict object containing information used to do replacement in template
     @property
@@ -564,6 +590,17 @@ cleanlib:
         self.ProcessBuildTargetList()
         self.ParserGenerateFfsCmd()
 
+        # the header dependencies got from compiler are kept out of makefile, so
+        # that makefile won't change after the sources are compiled
+        DepsFlags = []
+        DepsMakefileInclude = []
+        if GlobalData.gUseCompilerDeps:
+            if MyAgo.ToolChainFamily in gDepsFlags:
+                DepsFlags.append(gDepsFlags[MyAgo.ToolChainFamily])
+            DepsMakefile = os.path.join(MyAgo.MakeFileDir, gDepsMakefileName)
+            SaveFileOnChange(DepsMakefile, "\n".join(self.DepsTargetList), False)
+            DepsMakefileInclude.append(self._OPTIONAL_INCLUDE_TEMPLATE_[self._FileType] % {"file" : self.PlaceMacro(DepsMakefile, self.Macros)})
+
         # Generate macros used to represent input files
         FileMacroList = [] # macro name = file list
         for FileListMacro in self.FileListMacros:
@@ -698,6 +735,8 @@ cleanlib:
             "file_macro"                : FileMacroList,
             "file_build_target"         : self.BuildTargetList,
             "backward_compatible_target": BcTargetList,
+            "deps_flags"                : DepsFlags,
+            "deps_makefile_include"     : DepsMakefileInclude,
         }
 
         return MakefileTemplateDict
@@ -974,6 +1013,13 @@ cleanlib:
                         ExtraData = "Local Header: " + aFile + " not found in " + self._AutoGenObject.MetaFile.Path
                         )
 
+        if GlobalData.gUseCompilerDeps:
+            # the header dependencies are put in a makefile fragment instead
+            for Dependency in FileDependencyDict.values():
+                self._AutoGenObject.AutoGenDepSet |= set(Dependency)
+            self.DepsTargetList = self.GetDepsTargetList(FileDependencyDict)
+            FileDependencyDict = {}
+
         DepSet = None
         for File,Dependency in FileDependencyDict.items():
             if not Dependency:
@@ -1134,10 +1180,66 @@ cleanlib:
     #
     def GetFileDependency(self, FileList, ForceInculeList, SearchPathList):
         Dependency = {}
+        DepsFileDict = {}
+        if GlobalData.gUseCompilerDeps:
+            DepsFileDict = self.GetDepsFileDict()
         for F in FileList:
+            if F in DepsFileDict:
+                DependencyList = GetCompilerDependencyList(DepsFileDict[F], self._AutoGenObject.MakeFileDir)
+                # the file has been compiled in previous build
+                if DependencyList is not None:
+                    DependencySet = set(ForceInculeList)
+                    for FilePath in DependencyList:
+                        if FilePath != F.Path and os.path.isfile(FilePath):
+                            DependencySet.add(PathClass(FilePath))
+                    Dependency[F] = list(DependencySet)
+                    continue
             Dependency[F] = GetDependencyList(self._AutoGenObject, self.FileCache, F, ForceInculeList, SearchPathList)
         return Dependency
 
+    ## Return the dependency files saved by compiler for the source files
+    #
+    #   @retval     dict            The mapping between source file and its dependency file
+    #
+    def GetDepsFileDict(self):
+        MyAgo = self._AutoGenObject
+        DepsFileDict = {}
+        if MyAgo.ToolChainFamily not in gDepsFlags:
+            return DepsFileDict
+        NameCount = defaultdict(int)
+        for T in MyAgo.IntroTargetList:
+            if len(T.Inputs) == 1:
+                NameCount[T.Inputs[0].Name] += 1
+        for T in MyAgo.IntroTargetList:
+            if len(T.Inputs) != 1:
+                continue
+            Source = T.Inputs[0]
+            if MyAgo.ToolChainFamily == TAB_COMPILER_MSFT:
+                # MSFT compiler prints only the name of the source file with its
+                # included files, the files of same name can't be told apart
+                if NameCount[Source.Name] == 1:
+                    DepsFileDict[Source] = os.path.join(MyAgo.OutputDir, Source.Name + gDepsFileExt)
+            else:
+                DepsFileDict[Source] = T.Target.Path + gDepsFileExt
+        return DepsFileDict
+
+    ## Return the makefile rules adding the header dependencies to the targets
+    #
+    #   @param      FileDependencyDict  The mapping between source file and its dependencies
+    #
+    #   @retval     list                The list of makefile rules
+    #
+    def GetDepsTargetList(self, FileDependencyDict):
+        DepsTargetList = []
+        for Type in self._AutoGenObject.Targets:
+            for T in self._AutoGenObject.Targets[Type]:
+                if len(T.Inputs) != 1 or not FileDependencyDict.get(T.Inputs[0]):
+                    continue
+                Target = self.PlaceMacro(T.Target.Path, self.Macros)
+                for F in sorted(FileDependencyDict[T.Inputs[0]], key=lambda x: str(x)):
+                    DepsTargetList.append("%s : %s" % (Target, self.PlaceMacro(str(F), self.Macros)))
+        return DepsTargetList
+
 
 ## CustomMakefile class
 #
@@ -1662,6 +1764,459 @@ class TopLevelMakefile(BuildFile):
                 DirList.append(os.path.join(self._AutoGenObject.BuildDir, LibraryAutoGen.BuildDir))
         return DirList
 
+## ModuleNinjaFile class
+#
+#  This class generates the ninja build file of a module in addition to its makefile.
+#  The build statements are derived from the same target data (IntroTargetList,
+#  CodaTargetList, BuildRules) used for the makefile, with all make macros
+#  expanded, so that one build.ninja including the files of all modules describes
+#  the whole platform build.
+#
+class ModuleNinjaFile(ModuleMakefile):
+    ## Name of ninja build file
+    _NINJA_FILE_NAME_ = "build.ninja"
+
+    ## Header string for ninja build file
+    _NINJA_HEADER_ = '''#
+# DO NOT EDIT
+# This file is auto-generated by build utility
+#
+# Module Name:
+#
+#   %s
+#
+# Abstract:
+#
+#   Auto-generated ninja file for building modules, libraries or platform
+#
+''' % _NINJA_FILE_NAME_
+
+    ## The rules in module ninja file. The command of each build statement is
+    #  given by its "cmd" variable. The C files are compiled by the rule of the
+    #  tool chain family, so that ninja records the headers reported by compiler.
+    _NINJA_RULE_ = '''rule run
+  command = $cmd
+  description = $desc
+  restat = 1
+
+rule cc_gcc
+  command = $cmd
+  description = $desc
+  depfile = ${out}.deps
+  deps = gcc
+
+rule cc_msvc
+  command = $cmd
+  description = $desc
+  deps = msvc
+'''
+
+    ## Compile rule and $(DEPS_FLAGS) of each tool chain family, $@ is the output
+    _NINJA_DEPS_RULE_ = {
+        "GCC"               :   ("cc_gcc", "-MMD -MF $@.deps"),
+        TAB_COMPILER_MSFT   :   ("cc_msvc", "/showIncludes"),
+    }
+
+    ## shell related templates used to compose the command of a build statement
+    _CD_COMMAND_ = {
+        "nmake" :   'cd /d %s',
+        "gmake" :   'cd %s'
+    }
+    _IGNORE_ERROR_TEMPLATE_ = {
+        "nmake" :   '(%s || ver > nul)',
+        "gmake" :   '(%s || true)'
+    }
+    _SHELL_TEMPLATE_ = {
+        "nmake" :   'cmd /c %s',
+        "gmake" :   '%s'
+    }
+
+    ## Ninja target forcing the rebuild of the files depending on it
+    FORCE_REBUILD_TARGET = "force_build"
+
+    ## Regular expression for macro definition in makefile
+    _MACRO_DEFINITION_PATTERN_ = re.compile(r"^([A-Za-z_][\w]*)[ \t]*=[ \t]*(.*)$")
+    ## Regular expression for macro reference, automatic variable $@ and $<, or escaped "$" in makefile
+    _MACRO_REFERENCE_PATTERN_ = re.compile(r"\$\((\w+)\)|\$([@<])|\$\$")
+
+    ## Placeholders of automatic variables in expanded command, replaced when the build statement is composed
+    _OUTPUT_PLACEHOLDER_ = "\0out\0"
+    _INPUT_PLACEHOLDER_ = "\0in\0"
+
+    ## Constructor of ModuleNinjaFile
+    #
+    #   @param  ModuleAutoGen   Object of ModuleAutoGen class
+    #
+    def __init__(self, ModuleAutoGen):
+        ModuleMakefile.__init__(self, ModuleAutoGen)
+        self.CommandDict = {}
+        self.FileDependencyDict = {}
+        self.FfsTargetList = []     # [(target, dependency list, command list)]
+        self.MakefileMacros = {}
+
+    ## Return the path of the ninja build file of a module
+    #
+    #   @param  ModuleAutoGen   Object of ModuleAutoGen class
+    #
+    @staticmethod
+    def GetNinjaFilePath(ModuleAutoGen):
+        return os.path.join(ModuleAutoGen.MakeFileDir, ModuleNinjaFile._NINJA_FILE_NAME_)
+
+    ## Return the name of the phony target building all outputs of a module
+    #
+    #   @param  ModuleAutoGen   Object of ModuleAutoGen class
+    #
+    @staticmethod
+    def GetModuleTarget(ModuleAutoGen):
+        return os.path.join(ModuleAutoGen.MakeFileDir, "tbuild")
+
+    ## Escape a path used in ninja build statement
+    @staticmethod
+    def EscapePath(Path):
+        return Path.replace("$", "$$").replace(" ", "$ ").replace(":", "$:")
+
+    ## Escape a string used as value of ninja variable
+    @staticmethod
+    def EscapeValue(Value):
+        return Value.replace("$", "$$")
+
+    ## Create makefile and ninja build file
+    #
+    #   @param  FileType    Type of build file. Only nmake and gmake are supported now.
+    #
+    #   @retval TRUE        The ninja file is created or re-created successfully
+    #   @retval FALSE       The ninja file exists and is the same as the one to be generated
+    #
+    def Generate(self, FileType=gMakeType):
+        if FileType not in self._FILE_NAME_:
+            EdkLogger.error("build", PARAMETER_INVALID, "Invalid build type [%s]" % FileType,
+                            ExtraData="[%s]" % str(self._AutoGenObject))
+        self._FileType = FileType
+        FileContent = self._TEMPLATE_.Replace(self._TemplateDict)
+        SaveFileOnChange(os.path.join(self._AutoGenObject.MakeFileDir, self._FILE_NAME_[FileType]), FileContent, False)
+
+        self.MakefileMacros = self.GetMakefileMacros(FileContent)
+        if self._AutoGenObject.ToolChainFamily in self._NINJA_DEPS_RULE_:
+            self.MakefileMacros["DEPS_FLAGS"] = self._NINJA_DEPS_RULE_[self._AutoGenObject.ToolChainFamily][1]
+        return SaveFileOnChange(self.GetNinjaFilePath(self._AutoGenObject), self.GetNinjaContent(), False)
+
+    ## Keep the commands of C file targets before they are merged for nmake
+    def ParserCCodeFile(self, T, Type, CmdSumDict, CmdTargetDict, CmdCppDict, DependencyDict):
+        self.CommandDict[T.Target.Path] = T.Commands[:]
+        return ModuleMakefile.ParserCCodeFile(self, T, Type, CmdSumDict, CmdTargetDict, CmdCppDict, DependencyDict)
+
+    ## Keep the source file dependencies found for makefile
+    def GetFileDependency(self, FileList, ForceInculeList, SearchPathList):
+        self.FileDependencyDict = ModuleMakefile.GetFileDependency(self, FileList, ForceInculeList, SearchPathList)
+        return self.FileDependencyDict
+
+    ## Keep the targets generating FFS files in structured form
+    def ParserGenerateFfsCmd(self):
+        Start = len(self.BuildTargetList)
+        ModuleMakefile.ParserGenerateFfsCmd(self)
+        for Item in self.BuildTargetList[Start:]:
+            if Item.startswith('\t'):
+                if self.FfsTargetList:
+                    self.FfsTargetList[-1][2].append(Item[1:])
+                continue
+            Target, Deps = Item.split(' :', 1)
+            self.FfsTargetList.append((Target.strip(), Deps.split(), []))
+
+    ## Collect macro definitions in the generated makefile
+    #
+    #   @param  FileContent The content of makefile
+    #
+    #   @retval dict        The mapping between macro name and its (unexpanded) value
+    #
+    def GetMakefileMacros(self, FileContent):
+        Macros = {}
+        Line = ''
+        for Text in FileContent.splitlines():
+            if Text.endswith('\\'):
+                Line += Text[:-1] + ' '
+                continue
+            Line += Text
+            Match = self._MACRO_DEFINITION_PATTERN_.match(Line)
+            if Match:
+                Macros[Match.group(1)] = Match.group(2).strip()
+            Line = ''
+        return Macros
+
+    ## Expand all make macros in given string
+    #
+    #   Macros not defined in makefile are taken from environment, like make does.
+    #
+    def ExpandMacro(self, String, Depth=0):
+        if Depth > 32:
+            EdkLogger.error("build", AUTOGEN_ERROR, "Recursive macro reference in [%s]" % String,
+                            ExtraData="[%s]" % str(self._AutoGenObject))
+        def _Replace(Match):
+            Name = Match.group(1)
+            if Match.group(2) == '@':
+                return self._OUTPUT_PLACEHOLDER_
+            if Match.group(2) == '<':
+                return self._INPUT_PLACEHOLDER_
+            if Name is None:
+                return '$'
+            if Name in self.MakefileMacros:
+                return self.ExpandMacro(self.MakefileMacros[Name], Depth + 1)
+            return os.environ.get(Name, '')
+        return self._MACRO_REFERENCE_PATTERN_.sub(_Replace, String)
+
+    ## Convert makefile style path or path list to list of full paths
+    def ExpandPathList(self, PathList):
+        RetVal = []
+        for P in PathList:
+            if P == '$(FORCE_REBUILD)':
+                RetVal.append(self.FORCE_REBUILD_TARGET)
+            else:
+                RetVal.extend(self.ExpandMacro(str(P)).split())
+        return RetVal
+
+    ## Convert the makefile commands of a target to one shell command line
+    def GetShellCommand(self, CommandList):
+        WorkingDir = self._AutoGenObject.MakeFileDir
+        if ' ' in WorkingDir:
+            WorkingDir = '"%s"' % WorkingDir
+        ShellCommandList = [self._CD_COMMAND_[self._FileType] % WorkingDir]
+        for Command in CommandList:
+            for Line in self.ExpandMacro(Command).splitlines():
+                Line = Line.strip()
+                IgnoreError = False
+                while Line[:1] in ['@', '-', '+']:
+                    if Line[0] == '-':
+                        IgnoreError = True
+                    Line = Line[1:].lstrip()
+                if not Line:
+                    continue
+                if IgnoreError:
+                    Line = self._IGNORE_ERROR_TEMPLATE_[self._FileType] % Line
+                ShellCommandList.append(Line)
+        return self._SHELL_TEMPLATE_[self._FileType] % ' && '.join(ShellCommandList)
+
+    ## Compose one ninja build statement
+    #
+    #   The $@ and $< in the command are replaced with the output and the first
+    #   input. With a compile rule, ninja gets the headers from compiler and the
+    #   dependencies found by searching #include only order the build.
+    #
+    def GetBuildStatement(self, Target, Inputs, ImplicitDeps, CommandList, Rule="run"):
+        Escape = self.EscapePath
+        Output = Escape(Target)
+        FirstInput = Escape(Inputs[0]) if Inputs else ''
+        Inputs = [Escape(I) for I in Inputs]
+        ImplicitDeps = [Escape(D) for D in ImplicitDeps if D not in Inputs]
+        Statement = "build %s: %s %s" % (Output, Rule if CommandList else "phony", " ".join(Inputs))
+        if ImplicitDeps:
+            Statement = "%s %s %s" % (Statement.rstrip(), "|" if Rule == "run" else "||", " ".join(ImplicitDeps))
+        Statement = Statement.rstrip() + "\n"
+        if CommandList:
+            Command = self.EscapeValue(self.GetShellCommand(CommandList))
+            Command = Command.replace(self._OUTPUT_PLACEHOLDER_, Output).replace(self._INPUT_PLACEHOLDER_, FirstInput)
+            Statement += "  cmd = %s\n" % Command
+            Statement += "  desc = %s [%s] %s\n" % (self._AutoGenObject.Name, self._AutoGenObject.Arch,
+                                                    self.EscapeValue(os.path.basename(Target)))
+        return Statement
+
+    ## Compose the content of module ninja file
+    def GetNinjaContent(self):
+        MyAgo = self._AutoGenObject
+        StatementList = []
+        TargetSet = set()
+        CompileRule = "run"
+        if MyAgo.ToolChainFamily in self._NINJA_DEPS_RULE_:
+            CompileRule = self._NINJA_DEPS_RULE_[MyAgo.ToolChainFamily][0]
+        for Type in MyAgo.Targets:
+            for T in MyAgo.Targets[Type]:
+                Target = T.Target.Path
+                if Target in TargetSet:
+                    continue
+                TargetSet.add(Target)
+                ImplicitDeps = [str(Dep) for Dep in T.Dependencies]
+                if len(T.Inputs) == 1 and T.Inputs[0] in self.FileDependencyDict:
+                    for Dep in self.FileDependencyDict[T.Inputs[0]]:
+                        if Dep == '$(COMMON_DEPS)':
+                            ImplicitDeps.extend(self.CommonFileDependency)
+                        else:
+                            ImplicitDeps.append(str(Dep))
+                CommandList = self.CommandDict.get(Target, T.Commands)
+                Rule = "run"
+                if Type == TAB_C_CODE_FILE and any("$(DEPS_FLAGS)" in Command for Command in CommandList):
+                    Rule = CompileRule
+                StatementList.append(self.GetBuildStatement(
+                                        Target,
+                                        [str(F) for F in T.Inputs],
+                                        self.ExpandPathList(ImplicitDeps),
+                                        CommandList,
+                                        Rule
+                                        ))
+
+        for Target, Deps, CommandList in self.FfsTargetList:
+            Target = self.ExpandMacro(Target)
+            if Target in TargetSet:
+                continue
+            TargetSet.add(Target)
+            StatementList.append(self.GetBuildStatement(Target, self.ExpandPathList(Deps), [], CommandList))
+
+        ResultList = self.ExpandPathList(self.ResultFileList)
+        StatementList.append(self.GetBuildStatement(self.GetModuleTarget(MyAgo), ResultList, [], []))
+        return "%s\n%s\n%s" % (self._NINJA_HEADER_, self._NINJA_RULE_, "\n".join(StatementList))
+
+## CustomNinjaFile class
+#
+#  The ninja build file of a module with custom makefile just runs its makefile.
+#  Make decides what to rebuild, and restat lets ninja skip the modules depending
+#  on it if its outputs are not changed.
+#
+class CustomNinjaFile(CustomMakefile):
+    ## Create makefile and ninja build file
+    #
+    #   @param  FileType    Type of build file. Only nmake and gmake are supported now.
+    #
+    #   @retval TRUE        The ninja file is created or re-created successfully
+    #   @retval FALSE       The ninja file exists and is the same as the one to be generated
+    #
+    def Generate(self, FileType=gMakeType):
+        CustomMakefile.Generate(self, FileType)
+        MyAgo = self._AutoGenObject
+        Escape = ModuleNinjaFile.EscapePath
+        MakeFileDir = MyAgo.MakeFileDir
+        if ' ' in MakeFileDir:
+            MakeFileDir = '"%s"' % MakeFileDir
+        Command = ' && '.join([
+                    ModuleNinjaFile._CD_COMMAND_[FileType] % MakeFileDir,
+                    ' '.join(MyAgo.BuildCommand + ['-f', self._FILE_NAME_[FileType], 'tbuild'])
+                    ])
+        Outputs = [Escape(str(T.Target)) for T in MyAgo.CodaTargetList]
+        if not Outputs:
+            Outputs = [Escape(os.path.join(MyAgo.MakeFileDir, "custom_build"))]
+        FileContent = "%s\n%s\n" % (ModuleNinjaFile._NINJA_HEADER_, ModuleNinjaFile._NINJA_RULE_)
+        FileContent += "build %s: run | %s\n" % (" ".join(Outputs), ModuleNinjaFile.FORCE_REBUILD_TARGET)
+        FileContent += "  cmd = %s\n" % ModuleNinjaFile.EscapeValue(ModuleNinjaFile._SHELL_TEMPLATE_[FileType] % Command)
+        FileContent += "  desc = %s [%s]\n" % (MyAgo.Name, MyAgo.Arch)
+        FileContent += "\nbuild %s: phony %s\n" % (Escape(ModuleNinjaFile.GetModuleTarget(MyAgo)), " ".join(Outputs))
+        return SaveFileOnChange(ModuleNinjaFile.GetNinjaFilePath(MyAgo), FileContent, False)
+
+## PlatformNinjaFile class
+#
+#  This class generates the top level ninja file, which includes the ninja files
+#  of all modules and libraries to be built, so that ninja sees one dependency
+#  graph of the whole platform.
+#
+class PlatformNinjaFile(BuildFile):
+    ## Constructor of PlatformNinjaFile
+    #
+    #   @param  Workspace   Object of WorkspaceAutoGen class
+    #   @param  ModuleList  List of ModuleAutoGen objects to be built
+    #
+    def __init__(self, Workspace, ModuleList):
+        BuildFile.__init__(self, Workspace)
+        self.ModuleList = ModuleList
+
+    ## Return the path of platform ninja file
+    @property
+    def FilePath(self):
+        return os.path.join(self._AutoGenObject.MakeFileDir, ModuleNinjaFile._NINJA_FILE_NAME_)
+
+    ## Create the platform ninja file
+    #
+    #   @retval TRUE        The ninja file is created or re-created successfully
+    #   @retval FALSE       The ninja file exists and is the same as the one to be generated
+    #
+    def Generate(self, FileType=gMakeType):
+        Escape = ModuleNinjaFile.EscapePath
+        FileContent = ModuleNinjaFile._NINJA_HEADER_
+        FileContent += "\nninja_required_version = 1.3\n"
+        FileContent += "\nbuild %s: phony\n\n" % ModuleNinjaFile.FORCE_REBUILD_TARGET
+        ModuleTargetList = []
+        for Ma in self.ModuleList:
+            FileContent += "subninja %s\n" % Escape(ModuleNinjaFile.GetNinjaFilePath(Ma))
+            ModuleTargetList.append(Escape(ModuleNinjaFile.GetModuleTarget(Ma)))
+        FileContent += "\nbuild all: phony %s\n" % " ".join(ModuleTargetList)
+        FileContent += "\ndefault all\n"
+        return SaveFileOnChange(self.FilePath, FileContent, False)
+
+## Get the files included by one source file
+#
+#  The macros of known header types used in #include are expanded.
+#
+#   @param      FilePath        The path of the source file
+#
+#   @retval     list            The normalized names in the #include directives
+#   @retval     None            A not known macro is used in #include
+#
+def GetIncludeList(FilePath):
+    try:
+        Fd = open(FilePath, 'rb')
+        FileContent = Fd.read()
+        Fd.close()
+    except BaseException as X:
+        EdkLogger.error("build", FILE_OPEN_FAILURE, ExtraData=FilePath + "\n\t" + str(X))
+    if len(FileContent) == 0:
+        return []
+    try:
+        if FileContent[0] == 0xff or FileContent[0] == 0xfe:
+            FileContent = FileContent.decode('utf-16')
+        else:
+            FileContent = FileContent.decode()
+    except:
+        # The file is not txt file. for example .mcb file
+        return []
+
+    IncludeList = []
+    for Inc in gIncludePattern.findall(FileContent):
+        Inc = Inc.strip()
+        # if there's macro used to reference header file, expand it
+        HeaderList = gMacroPattern.findall(Inc)
+        if len(HeaderList) == 1 and len(HeaderList[0]) == 2:
+            HeaderType = HeaderList[0][0]
+            HeaderKey = HeaderList[0][1]
+            if HeaderType in gIncludeMacroConversion:
+                Inc = gIncludeMacroConversion[HeaderType] % {"HeaderKey" : HeaderKey}
+            else:
+                return None
+        IncludeList.append(os.path.normpath(Inc))
+    return IncludeList
+
+## Get the files a source file depends on from the dependency file saved by compiler
+#
+#  The dependency file contains one makefile rule, whose prerequisites are the
+#  source file and the files included by it.
+#
+#   @param      DepsFile        The path of the dependency file
+#   @param      WorkingDir      The directory the relative paths in the file are based on
+#
+#   @retval     list            The paths of the prerequisites
+#   @retval     None            The dependency file doesn't exist or has no rule
+#
+def GetCompilerDependencyList(DepsFile, WorkingDir):
+    try:
+        with open(DepsFile, 'r') as Fd:
+            FileContent = Fd.read()
+    except (IOError, OSError):
+        return None
+    # join the lines of the rule
+    Rule = FileContent.replace('\\\n', ' ').split('\n')[0]
+    # the target may contain a drive letter, it ends at a colon followed by space
+    Rule = re.split(r":\s", Rule + " ", 1)
+    if len(Rule) != 2:
+        return None
+    DependencyList = []
+    for Item in gDepsItemPattern.findall(Rule[1]):
+        Item = Item.replace('\\ ', ' ').replace('$$', '$')
+        DependencyList.append(os.path.normpath(os.path.join(WorkingDir, Item)))
+    return DependencyList
+
+## Save the files a source file depends on as a dependency file
+#
+#   @param      DepsFile        The path of the dependency file
+#   @param      Target          The target of the rule in the file
+#   @param      DependencyList  The paths of the prerequisites
+#
+def SaveCompilerDependencyList(DepsFile, Target, DependencyList):
+    Rule = [Item.replace(' ', '\\ ') for Item in [Target + ":"] + DependencyList]
+    SaveFileOnChange(DepsFile, " \\\n  ".join(Rule) + "\n", False)
+
 ## Find dependencies for one source file
 #
 #  By searching recursively "#include" directive in file, find out all the
@@ -1682,6 +2237,8 @@ def GetDependencyList(AutoGenObject, FileCache, File, ForceList, SearchPathList)
     if AutoGenObject.Arch not in gDependencyDatabase:
         gDependencyDatabase[AutoGenObject.Arch] = {}
     DepDb = gDependencyDatabase[AutoGenObject.Arch]
+    # OutputDir and DebugDir in SearchPathList get new files during the build
+    gDirListCache.AddUncachedRoot(AutoGenObject.PlatformInfo.BuildDir)
 
     while len(FileStack) > 0:
         F = FileStack.pop()
@@ -1695,65 +2252,31 @@ def GetDependencyList(AutoGenObject, FileCache, File, ForceList, SearchPathList)
             DependencySet.update(FullPathDependList)
             continue
 
-        CurrentFileDependencyList = []
         if F in DepDb:
             CurrentFileDependencyList = DepDb[F]
         else:
-            try:
-                Fd = open(F.Path, 'rb')
-                FileContent = Fd.read()
-                Fd.close()
-            except BaseException as X:
-                EdkLogger.error("build", FILE_OPEN_FAILURE, ExtraData=F.Path + "\n\t" + str(X))
-            if len(FileContent) == 0:
-                continue
-            try:
-                if FileContent[0] == 0xff or FileContent[0] == 0xfe:
-                    FileContent = FileContent.decode('utf-16')
-                else:
-                    FileContent = FileContent.decode()
-            except:
-                # The file is not txt file. for example .mcb file
-                continue
-            IncludedFileList = gIncludePattern.findall(FileContent)
-
-            for Inc in IncludedFileList:
-                Inc = Inc.strip()
-                # if there's macro used to reference header file, expand it
-                HeaderList = gMacroPattern.findall(Inc)
-                if len(HeaderList) == 1 and len(HeaderList[0]) == 2:
-                    HeaderType = HeaderList[0][0]
-                    HeaderKey = HeaderList[0][1]
-                    if HeaderType in gIncludeMacroConversion:
-                        Inc = gIncludeMacroConversion[HeaderType] % {"HeaderKey" : HeaderKey}
-                    else:
-                        # not known macro used in #include, always build the file by
-                        # returning a empty dependency
-                        FileCache[File] = []
-                        return []
-                Inc = os.path.normpath(Inc)
-                CurrentFileDependencyList.append(Inc)
+            # the include list of a file is kept across builds if the cache is enabled
+            if GlobalData.gFileIncludeCache:
+                CurrentFileDependencyList = GlobalData.gFileIncludeCache.Get(F.Path, GetIncludeList)
+            else:
+                CurrentFileDependencyList = GetIncludeList(F.Path)
+            if CurrentFileDependencyList is None:
+                # not known macro used in #include, always build the file by
+                # returning a empty dependency
+                FileCache[File] = []
+                return []
             DepDb[F] = CurrentFileDependencyList
 
         CurrentFilePath = F.Dir
         PathList = [CurrentFilePath] + SearchPathList
         for Inc in CurrentFileDependencyList:
-            for SearchPath in PathList:
-                FilePath = os.path.join(SearchPath, Inc)
-                if FilePath in gIsFileMap:
-                    if not gIsFileMap[FilePath]:
-                        continue
-                # If isfile is called too many times, the performance is slow down.
-                elif not os.path.isfile(FilePath):
-                    gIsFileMap[FilePath] = False
-                    continue
-                else:
-                    gIsFileMap[FilePath] = True
-                FilePath = PathClass(FilePath)
+            # If isfile is called too many times, the performance is slow down.
+            SearchPath = gDirListCache.FindFile(Inc, PathList)
+            if SearchPath is not None:
+                FilePath = PathClass(os.path.join(SearchPath, Inc))
                 FullPathDependList.append(FilePath)
                 if FilePath not in DependencySet:
                     FileStack.append(FilePath)
-                break
             else:
                 EdkLogger.debug(EdkLogger.DEBUG_9, "%s included by %s was not found "\
                                 "in any given path:\n\t%s" % (Inc, F, "\n\t".join(SearchPathList)))
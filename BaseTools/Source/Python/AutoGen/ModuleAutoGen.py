@@ -25,6 +25,8 @@ from GenPatchPcdTable.GenPatchPcdTable import parsePcdInfoFromMapFile
 from Workspace.MetaFileCommentParser import UsageList
 from .GenPcdDb import CreatePcdDatabaseCode
 from Common.caching import cached_class_function
+from Common.FileHashCache import GetFileDigest
+from AutoGen.BinaryCache import BinaryCacheStore, GetCacheCopyEngine, SaveCacheLinks, MANIFEST_SUFFIX, CACHE_FILE_OUTPUT, CACHE_FILE_FFS
 from AutoGen.ModuleAutoGenHelper import PlatformInfo,WorkSpaceInfo
 from AutoGen.CacheIR import ModuleBuildCacheIR
 import json
@@ -1622,16 +1624,37 @@ class ModuleAutoGen(AutoGen):
 
         self.IsAsBuiltInfCreated = True
 
-    def CacheCopyFile(self, OriginDir, CopyDir, File):
-        sub_dir = os.path.relpath(File, CopyDir)
-        destination_file = os.path.join(OriginDir, sub_dir)
-        destination_dir = os.path.dirname(destination_file)
-        CreateDirectory(destination_dir)
+    ## Restore the files of the module from the binary cache
+    #
+    #   With --binary-cache-link, only the files under OutputDir are hardlinked
+    #   to the cache. GenFds writes the FFS files again in FfsOutputDir, and the
+    #   as-built INF may be saved again, so they are always copied. The linked
+    #   files are recorded, and copied by BreakCacheLinks() before the module is
+    #   built again.
+    #
+    #   @param  TargetHashDir   The cache directory of the module for current MakeHash
+    #
+    #   @retval True            All the files are restored
+    #   @retval False           The cache entry is missing or broken
+    #
+    def RestoreModuleFromCache(self, TargetHashDir):
+        Store = BinaryCacheStore(GlobalData.gBinCacheSource)
+        ManifestFile = path.join(TargetHashDir, self.Name + MANIFEST_SUFFIX)
         try:
-            CopyFileOnChange(File, destination_dir)
-        except:
-            EdkLogger.quiet("[cache warning]: fail to copy file:%s to folder:%s" % (File, destination_dir))
-            return
+            EntryList = []
+            LinkList = []
+            for Kind, RelPath, Digest, Size in Store.LoadManifest(ManifestFile):
+                DestDir = self.FfsOutputDir if Kind == CACHE_FILE_FFS else self.OutputDir
+                Link = GlobalData.gBinCacheLink and Kind == CACHE_FILE_OUTPUT and not RelPath.endswith('.inf')
+                EntryList.append((Digest, Size, path.join(DestDir, RelPath), Link))
+                if Link:
+                    LinkList.append(RelPath)
+            SaveCacheLinks(self.OutputDir, LinkList)
+            GetCacheCopyEngine().RestoreFiles(Store, EntryList)
+        except (OSError, IOError, ValueError) as X:
+            EdkLogger.quiet("[cache warning]: fail to restore module %s[%s] from cache: %s" % (self.MetaFile.Path, self.Arch, X))
+            return False
+        return True
 
     def CopyModuleToCache(self):
         self.GenPreMakefileHash(GlobalData.gCacheIR)
@@ -1649,22 +1672,30 @@ class ModuleAutoGen(AutoGen):
 
         MakeHashStr = str(GlobalData.gCacheIR[(self.MetaFile.Path, self.Arch)].MakeHashHexDigest)
         FileDir = path.join(GlobalData.gBinCacheDest, self.PlatformInfo.OutputDir, self.BuildTarget + "_" + self.ToolChain, self.Arch, self.SourceDir, self.MetaFile.BaseName, MakeHashStr)
-        FfsDir = path.join(GlobalData.gBinCacheDest, self.PlatformInfo.OutputDir, self.BuildTarget + "_" + self.ToolChain, TAB_FV_DIRECTORY, "Ffs", self.Guid + self.Name, MakeHashStr)
 
         CreateDirectory (FileDir)
         self.SaveHashChainFileToCache(GlobalData.gCacheIR)
+        FileList = []
         ModuleFile = path.join(self.OutputDir, self.Name + '.inf')
         if os.path.exists(ModuleFile):
-            CopyFileOnChange(ModuleFile, FileDir)
+            FileList.append((CACHE_FILE_OUTPUT, self.OutputDir, ModuleFile))
         if not self.OutputFile:
             Ma = self.BuildDatabase[self.MetaFile, self.Arch, self.BuildTarget, self.ToolChain]
             self.OutputFile = Ma.Binaries
         for File in self.OutputFile:
             if os.path.exists(File):
-                if File.startswith(os.path.abspath(self.FfsOutputDir)+os.sep):
-                    self.CacheCopyFile(FfsDir, self.FfsOutputDir, File)
+                if self.FfsOutputDir and File.startswith(os.path.abspath(self.FfsOutputDir)+os.sep):
+                    FileList.append((CACHE_FILE_FFS, self.FfsOutputDir, File))
                 else:
-                    self.CacheCopyFile(FileDir, self.OutputDir, File)
+                    FileList.append((CACHE_FILE_OUTPUT, self.OutputDir, File))
+
+        # save the files as blobs, and the list of them as the manifest of the module,
+        # the copies run in background until GetCacheCopyEngine().Wait() is called
+        GetCacheCopyEngine().SaveFiles(BinaryCacheStore(GlobalData.gBinCacheDest),
+                                       path.join(FileDir, self.Name + MANIFEST_SUFFIX),
+                                       [(Kind, os.path.relpath(File, BaseDir), File) for Kind, BaseDir, File in FileList],
+                                       "%s[%s]" % (self.MetaFile.Path, self.Arch))
+        return True
 
     def SaveHashChainFileToCache(self, gDict):
         if not GlobalData.gBinCacheDest:
@@ -1777,7 +1808,12 @@ class ModuleAutoGen(AutoGen):
         if self.CanSkip():
             return
 
-        if len(self.CustomMakefile) == 0:
+        if GlobalData.gBuildBackend == 'ninja':
+            if len(self.CustomMakefile) == 0:
+                Makefile = GenMake.ModuleNinjaFile(self)
+            else:
+                Makefile = GenMake.CustomNinjaFile(self)
+        elif len(self.CustomMakefile) == 0:
             Makefile = GenMake.ModuleMakefile(self)
         else:
             Makefile = GenMake.CustomMakefile(self)
@@ -1943,17 +1979,12 @@ class ModuleAutoGen(AutoGen):
                 m.update(GlobalData.gModuleHash[self.Arch][Lib.Name].encode('utf-8'))
 
         # Add Module self
-        with open(str(self.MetaFile), 'rb') as f:
-            Content = f.read()
-        m.update(Content)
+        m.update(GetFileDigest(str(self.MetaFile)))
 
         # Add Module's source files
         if self.SourceFileList:
             for File in sorted(self.SourceFileList, key=lambda x: str(x)):
-                f = open(str(File), 'rb')
-                Content = f.read()
-                f.close()
-                m.update(Content)
+                m.update(GetFileDigest(str(File)))
 
         GlobalData.gModuleHash[self.Arch][self.Name] = m.hexdigest()
 
@@ -2017,10 +2048,9 @@ class ModuleAutoGen(AutoGen):
             if not os.path.exists(str(File)):
                 EdkLogger.quiet("[cache warning]: header file %s is missing for module: %s[%s]" % (File, self.MetaFile.Path, self.Arch))
                 continue
-            with open(str(File), 'rb') as f:
-                Content = f.read()
-            m.update(Content)
-            FileList.append((str(File), hashlib.md5(Content).hexdigest()))
+            Digest = GetFileDigest(str(File))
+            m.update(Digest)
+            FileList.append((str(File), Digest.hex()))
 
 
         MewIR = ModuleBuildCacheIR(self.MetaFile.Path, self.Arch)
@@ -2158,11 +2188,9 @@ class ModuleAutoGen(AutoGen):
             if not os.path.exists(str(File)):
                 EdkLogger.quiet("[cache warning]: header file: %s doesn't exist for module: %s[%s]" % (File, self.MetaFile.Path, self.Arch))
                 continue
-            f = open(str(File), 'rb')
-            Content = f.read()
-            f.close()
-            m.update(Content)
-            FileList.append((str(File), hashlib.md5(Content).hexdigest()))
+            Digest = GetFileDigest(str(File))
+            m.update(Digest)
+            FileList.append((str(File), Digest.hex()))
 
         with GlobalData.cache_lock:
             IR = gDict[(self.MetaFile.Path, self.Arch)]
@@ -2265,7 +2293,6 @@ class ModuleAutoGen(AutoGen):
         # then check whether cache hit based on the hash values
         # if cache hit, restore all the files from cache
         FileDir = path.join(GlobalData.gBinCacheSource, self.PlatformInfo.OutputDir, self.BuildTarget + "_" + self.ToolChain, self.Arch, self.SourceDir, self.MetaFile.BaseName)
-        FfsDir = path.join(GlobalData.gBinCacheSource, self.PlatformInfo.OutputDir, self.BuildTarget + "_" + self.ToolChain, TAB_FV_DIRECTORY, "Ffs", self.Guid + self.Name)
 
         ModuleHashPairList = [] # tuple list: [tuple(PreMakefileHash, MakeHash)]
         ModuleHashPair = path.join(FileDir, self.Name + ".ModuleHashPair")
@@ -2300,21 +2327,13 @@ class ModuleAutoGen(AutoGen):
             return False
 
         TargetHashDir = path.join(FileDir, MakeHashStr)
-        TargetFfsHashDir = path.join(FfsDir, MakeHashStr)
 
         if not os.path.exists(TargetHashDir):
             EdkLogger.quiet("[cache warning]: Cache folder is missing: %s" % TargetHashDir)
             return False
 
-        for root, dir, files in os.walk(TargetHashDir):
-            for f in files:
-                File = path.join(root, f)
-                self.CacheCopyFile(self.OutputDir, TargetHashDir, File)
-        if os.path.exists(TargetFfsHashDir):
-            for root, dir, files in os.walk(TargetFfsHashDir):
-                for f in files:
-                    File = path.join(root, f)
-                    self.CacheCopyFile(self.FfsOutputDir, TargetFfsHashDir, File)
+        if not self.RestoreModuleFromCache(TargetHashDir):
+            return False
 
         if self.Name == "PcdPeim" or self.Name == "PcdDxe":
             CreatePcdDatabaseCode(self, TemplateString(), TemplateString())
@@ -2357,7 +2376,6 @@ class ModuleAutoGen(AutoGen):
         # then check whether cache hit based on the hash values
         # if cache hit, restore all the files from cache
         FileDir = path.join(GlobalData.gBinCacheSource, self.PlatformInfo.OutputDir, self.BuildTarget + "_" + self.ToolChain, self.Arch, self.SourceDir, self.MetaFile.BaseName)
-        FfsDir = path.join(GlobalData.gBinCacheSource, self.PlatformInfo.OutputDir, self.BuildTarget + "_" + self.ToolChain, TAB_FV_DIRECTORY, "Ffs", self.Guid + self.Name)
 
         ModuleHashPairList = [] # tuple list: [tuple(PreMakefileHash, MakeHash)]
         ModuleHashPair = path.join(FileDir, self.Name + ".ModuleHashPair")
@@ -2393,21 +2411,12 @@ class ModuleAutoGen(AutoGen):
             return False
 
         TargetHashDir = path.join(FileDir, MakeHashStr)
-        TargetFfsHashDir = path.join(FfsDir, MakeHashStr)
         if not os.path.exists(TargetHashDir):
             EdkLogger.quiet("[cache warning]: Cache folder is missing: %s" % TargetHashDir)
             return False
 
-        for root, dir, files in os.walk(TargetHashDir):
-            for f in files:
-                File = path.join(root, f)
-                self.CacheCopyFile(self.OutputDir, TargetHashDir, File)
-
-        if os.path.exists(TargetFfsHashDir):
-            for root, dir, files in os.walk(TargetFfsHashDir):
-                for f in files:
-                    File = path.join(root, f)
-                    self.CacheCopyFile(self.FfsOutputDir, TargetFfsHashDir, File)
+        if not self.RestoreModuleFromCache(TargetHashDir):
+            return False
 
         if self.Name == "PcdPeim" or self.Name == "PcdDxe":
             CreatePcdDatabaseCode(self, TemplateString(), TemplateString())
@@ -2541,6 +2550,9 @@ class ModuleAutoGen(AutoGen):
             return True
         if not os.path.exists(self.TimeStampPath):
             return False
+        # ninja file is missing if the module was built with make before
+        if GlobalData.gBuildBackend == 'ninja' and not os.path.exists(GenMake.ModuleNinjaFile.GetNinjaFilePath(self)):
+            return False
         #last creation time of the module
         DstTimeStamp = os.stat(self.TimeStampPath)[8]
 
@@ -23,6 +23,7 @@ from Common.StringUtils import NormPath
 from Common.BuildToolError import *
 from Common.DataType import *
 from Common.Misc import *
+from Common.FileHashCache import GetFileDigest
 
 ## Regular expression for splitting Dependency Expression string into tokens
 gDepexTokenPattern = re.compile("(\(|\)|\w+| \S+\.inf)")
@@ -108,6 +109,7 @@ class WorkspaceAutoGen(AutoGen):
         # Mark now build in AutoGen Phase
         #
         GlobalData.gAutoGenPhase = True
+        self.PreParseMetaFiles()
         self.ProcessModuleFromPdf()
         self.ProcessPcdType()
         self.ProcessMixedPcd()
@@ -161,6 +163,8 @@ class WorkspaceAutoGen(AutoGen):
         if self.FdfFile:
             Fdf = FdfParser(self.FdfFile.Path)
             Fdf.ParseFile()
+            # save the profile for GenFds
+            Fdf.SaveProfile()
             GlobalData.gFdfParser = Fdf
             if Fdf.CurrentFdName and Fdf.CurrentFdName in Fdf.Profile.FdDict:
                 FdDict = Fdf.Profile.FdDict[Fdf.CurrentFdName]
@@ -182,6 +186,30 @@ class WorkspaceAutoGen(AutoGen):
 
         return FdfProfile
 
+    ## Parse the INF files referenced by DSC and FDF files, and their DEC files, in parallel
+    #
+    #  The modules and library instances are got from the platform objects of
+    #  each arch, which are used by AutoGen later anyway. Getting them parses no
+    #  INF file, except the ones in the [Libraries] section. The library instances
+    #  of the platform include the ones given to modules in <LibraryClasses>.
+    #
+    def PreParseMetaFiles(self):
+        if GlobalData.gParserProcessNumber < 2:
+            return
+        ModuleDict = OrderedDict()
+        for Arch in self.ArchList:
+            Platform = self.BuildDatabase[self.MetaFile, Arch, self.BuildTarget, self.ToolChain]
+            for ModuleFile in Platform.Modules:
+                ModuleDict.setdefault(ModuleFile.Path, ModuleFile)
+            for LibraryFile in Platform.LibraryInstances:
+                ModuleDict.setdefault(LibraryFile.Path, LibraryFile)
+        if self.FdfProfile:
+            for Inf in self.FdfProfile.InfList:
+                ModuleFile = PathClass(NormPath(Inf), GlobalData.gWorkspace)
+                if ModuleFile.Path not in ModuleDict and ModuleFile.Validate('.inf')[0] == 0:
+                    ModuleDict[ModuleFile.Path] = ModuleFile
+        self.BuildDatabase.WorkspaceDb.PreParse(list(ModuleDict.values()), GlobalData.gParserProcessNumber)
+
     def ProcessModuleFromPdf(self):
 
         if self.FdfProfile:
@@ -547,12 +575,15 @@ class WorkspaceAutoGen(AutoGen):
             for files in AllWorkSpaceMetaFiles:
                 if files.endswith('.dec'):
                     continue
-                f = open(files, 'rb')
-                Content = f.read()
-                f.close()
-                m.update(Content)
+                m.update(GetFileDigest(files))
             SaveFileOnChange(os.path.join(self.BuildDir, 'AutoGen.hash'), m.hexdigest(), False)
             GlobalData.gPlatformHash = m.hexdigest()
+            # save the digests of package and platform files before AutoGen workers start
+            if GlobalData.gFileHashCache:
+                GlobalData.gFileHashCache.Flush()
+        # save the records of the meta files parsed so far for AutoGen workers
+        if GlobalData.gMetaFileCache:
+            GlobalData.gMetaFileCache.Flush()
 
         #
         # Write metafile list to build directory
@@ -576,20 +607,14 @@ class WorkspaceAutoGen(AutoGen):
         HashFile = os.path.join(PkgDir, Pkg.PackageName + '.hash')
         m = hashlib.md5()
         # Get .dec file's hash value
-        f = open(Pkg.MetaFile.Path, 'rb')
-        Content = f.read()
-        f.close()
-        m.update(Content)
+        m.update(GetFileDigest(Pkg.MetaFile.Path))
         # Get include files hash value
         if Pkg.Includes:
             for inc in sorted(Pkg.Includes, key=lambda x: str(x)):
                 for Root, Dirs, Files in os.walk(str(inc)):
                     for File in sorted(Files):
                         File_Path = os.path.join(Root, File)
-                        f = open(File_Path, 'rb')
-                        Content = f.read()
-                        f.close()
-                        m.update(Content)
+                        m.update(GetFileDigest(File_Path))
         SaveFileOnChange(HashFile, m.hexdigest(), False)
         GlobalData.gPackageHash[Pkg.PackageName] = m.hexdigest()
 
@@ -834,6 +859,7 @@ class WorkspaceAutoGen(AutoGen):
             FdsCommandDict["quiet"] = True
 
         FdsCommandDict["GenfdsMultiThread"] = GlobalData.gEnableGenfdsMultiThread
+        FdsCommandDict["ThreadNumber"] = GlobalData.gGenFdsThreadNumber
         if GlobalData.gIgnoreSource:
             FdsCommandDict["IgnoreSources"] = True
 
@@ -44,6 +44,39 @@ __ValidString = re.compile(r'[_a-zA-Z][_0-9a-zA-Z]*$')
 _ReLabel = re.compile('LABEL\((\w+)\)')
 _ReOffset = re.compile('OFFSET_OF\((\w+)\)')
 PcdPattern = re.compile(r'[_a-zA-Z][0-9A-Za-z_]*\.[_a-zA-Z][0-9A-Za-z_]*$')
+## The names an expression may get from the symbol table: PCD, macro and GUID names
+_ReSymbolName = re.compile(r'(?<![0-9A-Za-z_.])[_a-zA-Z][0-9A-Za-z_]*(?:\.[_a-zA-Z][0-9A-Za-z_]*)?')
+
+## The values of the expressions evaluated, by the keys got by ValueExpression._GetCacheKey()
+_ExpressionValueCache = {}
+
+## Get the symbols the value of an expression depends on
+#
+#  Besides the expression string, the value only depends on the symbols used
+#  by it, and on the symbols used by the values of them, e.g. the macros in the
+#  value of a PCD. All the names in them are looked up, so the symbols got may
+#  be more than the ones really used, but never less.
+#
+#   @param  Expression      The expression string
+#   @param  SymbolTable     The symbol table the expression is evaluated with
+#
+#   @retval frozenset       The names and values of the symbols
+#
+def GetExpressionSymbols(Expression, SymbolTable):
+    NameSet = set()
+    SymbolList = []
+    PendingList = [Expression]
+    while PendingList:
+        for Name in _ReSymbolName.findall(PendingList.pop()):
+            if Name in NameSet:
+                continue
+            NameSet.add(Name)
+            if Name in SymbolTable:
+                Value = SymbolTable[Name]
+                SymbolList.append((Name, Value))
+                if isinstance(Value, str):
+                    PendingList.append(Value)
+    return frozenset(SymbolList)
 
 ## SplitString
 #  Split string to list according double quote
@@ -334,6 +367,7 @@ class ValueExpression(BaseExpression):
     def __init__(self, Expression, SymbolTable={}):
         super(ValueExpression, self).__init__(self, Expression, SymbolTable)
         self._NoProcess = False
+        self._Evaluated = False
         if not isinstance(Expression, type('')):
             self._Expr = Expression
             self._NoProcess = True
@@ -347,10 +381,12 @@ class ValueExpression(BaseExpression):
             raise BadExpression(ERR_EMPTY_EXPR)
 
         #
-        # The symbol table including PCD and macro mapping
+        # The symbol table including PCD and macro mapping, which is copied
+        # only if the expression is not found in the cache
         #
-        self._Symb = CopyDict(SymbolTable)
-        self._Symb.update(self.LogicalOperators)
+        self._Expression = Expression
+        self._SymbolTable = SymbolTable
+        self._SymbolCopy = None
         self._Idx = 0
         self._Len = len(self._Expr)
         self._Token = ''
@@ -359,6 +395,27 @@ class ValueExpression(BaseExpression):
         # Literal token without any conversion
         self._LiteralToken = ''
 
+    @property
+    def _Symb(self):
+        if self._SymbolCopy is None:
+            self._SymbolCopy = CopyDict(self._SymbolTable)
+            self._SymbolCopy.update(self.LogicalOperators)
+        return self._SymbolCopy
+
+    ## Get the key of the value of the expression in the cache
+    #
+    #   @retval tuple   The key
+    #   @retval None    The value can't be cached, i.e. a symbol value is not hashable
+    #
+    def _GetCacheKey(self, RealValue, Depth):
+        try:
+            Key = (type(self), getattr(self, 'PcdType', None), self._Expression, RealValue, Depth == 0,
+                   GetExpressionSymbols(self._Expression, self._SymbolTable))
+            hash(Key)
+        except TypeError:
+            return None
+        return Key
+
     # Public entry for this class
     #   @param RealValue: False: only evaluate if the expression is true or false, used for conditional expression
     #                     True : return the evaluated str(value), used for PCD value
@@ -366,7 +423,23 @@ class ValueExpression(BaseExpression):
     #   @return: True or False if RealValue is False
     #            Evaluated value of string format if RealValue is True
     #
+    #   The value of the same expression with the same symbols is evaluated once,
+    #   and got from the cache later.
+    #
     def __call__(self, RealValue=False, Depth=0):
+        if self._NoProcess or self._Evaluated:
+            return self._Evaluate(RealValue, Depth)
+        self._Evaluated = True
+        Key = self._GetCacheKey(RealValue, Depth)
+        if Key is None:
+            return self._Evaluate(RealValue, Depth)
+        if Key in _ExpressionValueCache:
+            return _ExpressionValueCache[Key]
+        Value = self._Evaluate(RealValue, Depth)
+        _ExpressionValueCache[Key] = Value
+        return Value
+
+    def _Evaluate(self, RealValue, Depth):
         if self._NoProcess:
             return self._Expr
 
@@ -819,11 +892,11 @@ class ValueExpressionEx(ValueExpression):
         self.PcdValue = PcdValue
         self.PcdType = PcdType
 
-    def __call__(self, RealValue=False, Depth=0):
+    def _Evaluate(self, RealValue, Depth):
         PcdValue = self.PcdValue
         if "{CODE(" not in PcdValue:
             try:
-                PcdValue = ValueExpression.__call__(self, RealValue, Depth)
+                PcdValue = ValueExpression._Evaluate(self, RealValue, Depth)
                 if self.PcdType == TAB_VOID and (PcdValue.startswith("'") or PcdValue.startswith("L'")):
                     PcdValue, Size = ParseFieldValue(PcdValue)
                     PcdValueList = []
@@ -0,0 +1,341 @@
+## @file
+# Persistent caches of the information got from the content of files
+#
+# The information, e.g. the md5 digest used by the hash based build cache, is
+# saved in a database together with the size, the modification time and the
+# inode of the file when it was read. A file is read again only if one of them
+# changes, so that a no-op build mostly costs a stat() of each file.
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import Common.LongFilePathOs as os
+import hashlib
+import json
+import pickle
+import threading
+import time
+import Common.EdkLogger as EdkLogger
+import Common.GlobalData as GlobalData
+from Common.LongFilePathSupport import OpenLongFilePath as open
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+## Version of the database layout, a database of other version is discarded
+FILE_CACHE_DB_VERSION = 2
+
+## Files modified less than this many seconds before the cache is opened are
+#  not saved, because another change in the same time stamp tick can't be seen
+FILE_HASH_RACY_WINDOW = 2
+
+## Compute the md5 digest of the content of a file
+#
+#   @param  FilePath    The path of the file
+#
+#   @retval bytes       The md5 digest of the file
+#
+def ComputeFileDigest(FilePath):
+    m = hashlib.md5()
+    with open(FilePath, 'rb') as f:
+        m.update(f.read())
+    return m.digest()
+
+## Get the md5 digest of a file from the file digest cache, if it's enabled
+#
+#   @param  FilePath    The path of the file
+#
+#   @retval bytes       The md5 digest of the file
+#
+def GetFileDigest(FilePath):
+    if GlobalData.gFileHashCache:
+        return GlobalData.gFileHashCache.GetDigest(FilePath)
+    return ComputeFileDigest(FilePath)
+
+## Get the md5 digest of a file just written, and update the file digest cache
+#
+#   The cache can't tell a file rewritten in the same time stamp tick with the
+#   same size, so the writer of a file which may be read again through the
+#   cache gets its digest here.
+#
+#   @param  FilePath    The path of the file
+#   @param  Data        The content written to the file, None to read the file
+#
+#   @retval bytes       The md5 digest of the file
+#
+def UpdateFileDigest(FilePath, Data=None):
+    if Data is None:
+        Digest = ComputeFileDigest(FilePath)
+    else:
+        Digest = hashlib.md5(Data).digest()
+    if GlobalData.gFileHashCache:
+        GlobalData.gFileHashCache.Set(FilePath, Digest)
+    return Digest
+
+## Persistent cache of the information got from files
+#
+#  The database is read once, when the first file is requested, and the new
+#  entries are written back by Flush(). The database is only opened during the
+#  load and the flush, so that a cache object can be inherited by the processes
+#  forked from current one. Several processes may flush to the same database,
+#  the entry written last wins.
+#
+#  The sub-class sets the name of the database table, and converts the value to
+#  and from the type saved in the database if needed.
+#
+class FileStatCache(object):
+    _TABLE_ = None
+
+    ## Constructor
+    #
+    #   @param  DbPath      The path of the database file
+    #
+    def __init__(self, DbPath):
+        self.DbPath = DbPath
+        self._FileValue = None
+        self._NewEntry = {}
+        self._RacyTime = 0
+        self._LoadLock = threading.Lock()
+
+    ## Get the information of a file
+    #
+    #   @param  FilePath    The path of the file
+    #   @param  Compute     The function getting the information from the file path
+    #
+    #   @retval object      The value returned by Compute
+    #
+    def Get(self, FilePath, Compute):
+        self._LoadOnce()
+        FilePath = os.path.normpath(FilePath)
+        try:
+            Stat = os.stat(FilePath)
+        except OSError:
+            # let Compute report the error in its own way
+            return Compute(FilePath)
+        Key = (Stat.st_size, Stat.st_mtime_ns, Stat.st_ino)
+        Entry = self._FileValue.get(FilePath)
+        if Entry is not None and Entry[0] == Key:
+            return Entry[1]
+        Value = Compute(FilePath)
+        self._FileValue[FilePath] = (Key, Value)
+        if Stat.st_mtime_ns < self._RacyTime:
+            self._NewEntry[FilePath] = (Key, Value)
+        return Value
+
+    ## Set the information of a file got by the caller, e.g. after writing it
+    #
+    #   @param  FilePath    The path of the file
+    #   @param  Value       The value Compute of Get() returns for the file
+    #
+    def Set(self, FilePath, Value):
+        self._LoadOnce()
+        FilePath = os.path.normpath(FilePath)
+        try:
+            Stat = os.stat(FilePath)
+        except OSError:
+            return
+        Key = (Stat.st_size, Stat.st_mtime_ns, Stat.st_ino)
+        self._FileValue[FilePath] = (Key, Value)
+        if Stat.st_mtime_ns < self._RacyTime:
+            self._NewEntry[FilePath] = (Key, Value)
+
+    def _LoadOnce(self):
+        if self._FileValue is None:
+            with self._LoadLock:
+                if self._FileValue is None:
+                    self._Load()
+
+    def _Encode(self, Value):
+        return Value
+
+    def _Decode(self, Value):
+        return Value
+
+    def _Connect(self):
+        Db = sqlite3.connect(self.DbPath, timeout=60, isolation_level=None)
+        Db.execute("PRAGMA synchronous = OFF")
+        return Db
+
+    def _Load(self):
+        FileValue = {}
+        self._RacyTime = int((time.time() - FILE_HASH_RACY_WINDOW) * 1e9)
+        if sqlite3 is not None and os.path.exists(self.DbPath):
+            try:
+                Db = self._Connect()
+                try:
+                    if Db.execute("PRAGMA user_version").fetchone()[0] == FILE_CACHE_DB_VERSION:
+                        for FilePath, Size, MTime, Inode, Value in Db.execute("SELECT Path, Size, MTime, Inode, Value FROM %s" % self._TABLE_):
+                            FileValue[FilePath] = ((Size, MTime, Inode), self._Decode(Value))
+                finally:
+                    Db.close()
+            except (sqlite3.Error, ValueError) as X:
+                EdkLogger.verbose("Ignore file cache %s: %s" % (self.DbPath, X))
+                FileValue = {}
+        self._FileValue = FileValue
+
+    ## Write the entries got since last flush to the database
+    #
+    def Flush(self):
+        if not self._NewEntry or sqlite3 is None:
+            return
+        try:
+            DbDir = os.path.dirname(self.DbPath)
+            if not os.path.exists(DbDir):
+                os.makedirs(DbDir)
+            Db = self._Connect()
+            try:
+                # take the write lock first, other processes may create the table too
+                Db.execute("BEGIN IMMEDIATE")
+                if Db.execute("PRAGMA user_version").fetchone()[0] != FILE_CACHE_DB_VERSION:
+                    Db.execute("DROP TABLE IF EXISTS %s" % self._TABLE_)
+                    Db.execute("CREATE TABLE %s (Path TEXT PRIMARY KEY, Size INTEGER, MTime INTEGER, Inode INTEGER, Value)" % self._TABLE_)
+                    Db.execute("PRAGMA user_version = %d" % FILE_CACHE_DB_VERSION)
+                Db.executemany("INSERT OR REPLACE INTO %s VALUES (?, ?, ?, ?, ?)" % self._TABLE_,
+                               [(FilePath, Key[0], Key[1], Key[2], self._Encode(Value)) for FilePath, (Key, Value) in self._NewEntry.items()])
+                Db.execute("COMMIT")
+            finally:
+                Db.close()
+        except (sqlite3.Error, OSError) as X:
+            EdkLogger.verbose("Failed to update file cache %s: %s" % (self.DbPath, X))
+        self._NewEntry = {}
+
+## Persistent cache of file digests
+#
+class FileHashCache(FileStatCache):
+    _TABLE_ = "FileHash"
+
+    ## Get the md5 digest of a file
+    #
+    #   @param  FilePath    The path of the file
+    #
+    #   @retval bytes       The md5 digest of the file
+    #
+    def GetDigest(self, FilePath):
+        return self.Get(FilePath, ComputeFileDigest)
+
+    def _Decode(self, Value):
+        return bytes(Value)
+
+## Persistent cache of the files included by source files
+#
+#  The value of a file is a list of the names in its #include directives, or
+#  None, so it's saved as JSON.
+#
+class FileIncludeCache(FileStatCache):
+    _TABLE_ = "FileInclude"
+
+    def _Encode(self, Value):
+        return json.dumps(Value)
+
+    def _Decode(self, Value):
+        return json.loads(Value)
+
+## Persistent cache of the records parsed from meta files
+#
+#  The records of a file are saved together with a key, which is made of the
+#  digest of the file content and the version of the parser. They are used
+#  only if the key is the same when the file is parsed next time. The records
+#  are pickled when they're saved and unpickled only when they're requested.
+#
+#  Like FileStatCache, the database is only opened to load and flush it.
+#
+class MetaFileRecordCache(object):
+    _TABLE_ = "MetaFileRecord"
+
+    ## Constructor
+    #
+    #   @param  DbPath      The path of the database file
+    #
+    def __init__(self, DbPath):
+        self.DbPath = DbPath
+        self._FileRecord = None
+        self._NewEntry = {}
+        self._LoadLock = threading.Lock()
+
+    ## Get the records of a file
+    #
+    #   @param  FilePath    The path of the file
+    #   @param  Key         The key the records must be saved with
+    #
+    #   @retval list        The records saved by Set()
+    #   @retval None        No records of the file are saved with the key
+    #
+    def Get(self, FilePath, Key):
+        if self._FileRecord is None:
+            with self._LoadLock:
+                if self._FileRecord is None:
+                    self._Load()
+        Entry = self._FileRecord.get(os.path.normpath(FilePath))
+        if Entry is None or Entry[0] != Key:
+            return None
+        try:
+            return pickle.loads(Entry[1])
+        except Exception as X:
+            EdkLogger.verbose("Ignore cached records of %s: %s" % (FilePath, X))
+            return None
+
+    ## Save the records of a file
+    #
+    #   @param  FilePath    The path of the file
+    #   @param  Key         The key of the records
+    #   @param  RecordList  The records of the file
+    #
+    def Set(self, FilePath, Key, RecordList):
+        if self._FileRecord is None:
+            with self._LoadLock:
+                if self._FileRecord is None:
+                    self._Load()
+        FilePath = os.path.normpath(FilePath)
+        Entry = (Key, pickle.dumps(RecordList, pickle.HIGHEST_PROTOCOL))
+        self._FileRecord[FilePath] = Entry
+        self._NewEntry[FilePath] = Entry
+
+    def _Connect(self):
+        Db = sqlite3.connect(self.DbPath, timeout=60, isolation_level=None)
+        Db.execute("PRAGMA synchronous = OFF")
+        return Db
+
+    def _Load(self):
+        FileRecord = {}
+        if sqlite3 is not None and os.path.exists(self.DbPath):
+            try:
+                Db = self._Connect()
+                try:
+                    if Db.execute("PRAGMA user_version").fetchone()[0] == FILE_CACHE_DB_VERSION:
+                        for FilePath, Key, Value in Db.execute("SELECT Path, Key, Value FROM %s" % self._TABLE_):
+                            FileRecord[FilePath] = (Key, bytes(Value))
+                finally:
+                    Db.close()
+            except sqlite3.Error as X:
+                EdkLogger.verbose("Ignore meta file cache %s: %s" % (self.DbPath, X))
+                FileRecord = {}
+        self._FileRecord = FileRecord
+
+    ## Write the records saved since last flush to the database
+    #
+    def Flush(self):
+        if not self._NewEntry or sqlite3 is None:
+            return
+        try:
+            DbDir = os.path.dirname(self.DbPath)
+            if not os.path.exists(DbDir):
+                os.makedirs(DbDir)
+            Db = self._Connect()
+            try:
+                Db.execute("BEGIN IMMEDIATE")
+                if Db.execute("PRAGMA user_version").fetchone()[0] != FILE_CACHE_DB_VERSION:
+                    Db.execute("DROP TABLE IF EXISTS %s" % self._TABLE_)
+                    Db.execute("CREATE TABLE %s (Path TEXT PRIMARY KEY, Key TEXT, Value BLOB)" % self._TABLE_)
+                    Db.execute("PRAGMA user_version = %d" % FILE_CACHE_DB_VERSION)
+                Db.executemany("INSERT OR REPLACE INTO %s VALUES (?, ?, ?)" % self._TABLE_,
+                               [(FilePath, Key, Value) for FilePath, (Key, Value) in self._NewEntry.items()])
+                Db.execute("COMMIT")
+            finally:
+                Db.close()
+        except (sqlite3.Error, OSError) as X:
+            EdkLogger.verbose("Failed to update meta file cache %s: %s" % (self.DbPath, X))
+        self._NewEntry = {}
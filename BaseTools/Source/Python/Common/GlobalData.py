@@ -103,11 +103,31 @@ gConditionalPcds = []
 gUseHashCache = None
 gBinCacheDest = None
 gBinCacheSource = None
+# Maximum size of binary cache in bytes, None for no limit
+gBinCacheMaxSize = None
+# Hardlink the files restored from binary cache
+gBinCacheLink = False
 gPlatformHash = None
 gPackageHash = {}
 gModuleHash = {}
+# Persistent cache of the file digests used by the hash based build cache
+gFileHashCache = None
+# Persistent cache of the files included by source files, used to find the dependencies
+gFileIncludeCache = None
+# Persistent cache of the records parsed from INF and DEC files
+gMetaFileCache = None
+# Directory of the cache of the applications evaluating structure PCD values
+gPcdValueInitCache = None
+# Number of processes to parse INF and DEC files before AutoGen
+gParserProcessNumber = 1
+# Number of threads to generate the independent FV images in GenFds
+gGenFdsThreadNumber = 1
+# Get the header dependencies of source files from the dependency files saved by compiler
+gUseCompilerDeps = False
 gEnableGenfdsMultiThread = True
 gSikpAutoGenCache = set()
+# Build system used to build modules: 'make' or 'ninja'
+gBuildBackend = 'make'
 
 # Dictionary for tracking Module build status as success or failure
 # Top Dict:     Key: Arch Type              Value: Dictionary
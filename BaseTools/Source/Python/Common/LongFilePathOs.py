@@ -60,12 +60,16 @@ def listdir(path):
         List.append(Item)
     return List
 
+def scandir(path):
+    return os.scandir(LongFilePath(path))
+
 if hasattr(os, 'replace'):
     def replace(src, dst):
         return os.replace(LongFilePath(src), LongFilePath(dst))
 
 environ = os.environ
 getcwd = os.getcwd
+getpid = os.getpid
 chdir = os.chdir
 walk = os.walk
 W_OK = os.W_OK
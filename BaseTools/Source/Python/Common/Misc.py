@@ -576,6 +576,137 @@ def CopyFileOnChange(SrcFile, Dst, FileLock=None):
 
     return True
 
+## Lazily populated index of the entries in directories
+#
+#  A directory is listed once, when a path in it is looked up for the first time.
+#  Then checking if a file exists costs dict lookups instead of a stat() call,
+#  e.g. when a header file is searched in dozens of include paths. A directory
+#  is known not to exist without listing it if its parent has been listed.
+#
+#  The files created in a directory after it's listed are not seen, so the
+#  directories under the roots given by AddUncachedRoot(), like the build output
+#  directory, are never listed, and their files are checked by stat() each time.
+#
+class DirListCache(object):
+    def __init__(self):
+        # normalized directory path : {normcase(name) : (name, is dir, is file)}, or None
+        self._DirEntries = {}
+        # normalized directory path : {upper case name : name}
+        self._UpperNames = {}
+        # normalized root paths ending with separator
+        self._UncachedRoots = set()
+        # normalized directory path : if it is under any uncached root
+        self._IsUncached = {}
+
+    ## Don't cache the entries of a directory and the directories under it
+    #
+    #   @param      Root    The path of the directory whose files may be created
+    #                       after they are looked up, like the build output directory
+    #
+    def AddUncachedRoot(self, Root):
+        Root = os.path.join(os.path.normcase(os.path.normpath(Root)), '')
+        if Root in self._UncachedRoots:
+            return
+        self._UncachedRoots.add(Root)
+        self._IsUncached = {}
+        for Key in list(self._DirEntries):
+            if self._Uncached(Key):
+                del self._DirEntries[Key]
+
+    def _Uncached(self, Key):
+        if Key not in self._IsUncached:
+            self._IsUncached[Key] = any(os.path.join(Key, '').startswith(Root) for Root in self._UncachedRoots)
+        return self._IsUncached[Key]
+
+    ## Return the entries in a directory
+    #
+    #   @param      Dir     The path of the directory
+    #
+    #   @retval     dict    The entries in the directory, keyed by the normcase name
+    #   @retval     None    The directory doesn't exist
+    #
+    def GetEntries(self, Dir):
+        Key = os.path.normcase(os.path.normpath(Dir))
+        if Key in self._DirEntries:
+            return self._DirEntries[Key]
+        Uncached = self._Uncached(Key)
+        Parent, Name = os.path.split(Key)
+        if not Uncached and Name and Parent in self._DirEntries:
+            ParentEntries = self._DirEntries[Parent]
+            if ParentEntries is None or Name not in ParentEntries or not ParentEntries[Name][1]:
+                self._DirEntries[Key] = None
+                return None
+        Entries = {}
+        UpperNames = {}
+        try:
+            for Entry in os.scandir(Dir):
+                Entries[os.path.normcase(Entry.name)] = (Entry.name, Entry.is_dir(), Entry.is_file())
+                UpperNames[Entry.name.upper()] = Entry.name
+        except OSError:
+            Entries = None
+        self._UpperNames[Key] = UpperNames
+        if not Uncached:
+            self._DirEntries[Key] = Entries
+        return Entries
+
+    ## Forget the entries of a directory, it will be listed again when needed
+    #
+    #   @param      Dir     The path of the directory
+    #
+    def Refresh(self, Dir):
+        self._DirEntries.pop(os.path.normcase(os.path.normpath(Dir)), None)
+
+    ## Check if a path is an existing regular file, like os.path.isfile()
+    #
+    #   @param      Path    The path of the file
+    #
+    #   @retval     True    The file exists
+    #   @retval     False   The file doesn't exist
+    #
+    def IsFile(self, Path):
+        Dir, Name = os.path.split(os.path.normpath(Path))
+        if self._Uncached(os.path.normcase(Dir)):
+            return os.path.isfile(Path)
+        Entries = self.GetEntries(Dir)
+        if not Entries:
+            return False
+        Entry = Entries.get(os.path.normcase(Name))
+        return Entry is not None and Entry[2]
+
+    ## Find the first directory containing a file
+    #
+    #   @param      File        The relative path of the file
+    #   @param      DirList     The directories to search the file in
+    #
+    #   @retval     str         The directory containing the file
+    #   @retval     None        The file is not found in any directory
+    #
+    def FindFile(self, File, DirList):
+        for Dir in DirList:
+            if self.IsFile(os.path.join(Dir, File)):
+                return Dir
+        return None
+
+    ## Return the name of a path entry in the case of file system
+    #
+    #   @param      Dir     The directory the entry is in
+    #   @param      Name    The name of the entry in any case
+    #
+    #   @retval     str     The name in file system
+    #   @retval     None    The entry doesn't exist
+    #
+    def GetRealName(self, Dir, Name):
+        Entries = self.GetEntries(Dir)
+        if not Entries:
+            return None
+        Entry = Entries.get(os.path.normcase(Name))
+        if Entry is not None:
+            return Entry[0]
+        return self._UpperNames[os.path.normcase(os.path.normpath(Dir))].get(Name.upper())
+
+## The index of directory entries shared by all users in current process
+gDirListCache = DirListCache()
+
 ## Retrieve and cache the real path name in file system
 #
 #   @param      Root    The root directory of path relative to
@@ -584,14 +715,9 @@ def CopyFileOnChange(SrcFile, Dst, FileLock=None):
 #   @retval     None    If path doesn't exist
 #
 class DirCache:
-    _CACHE_ = set()
-    _UPPER_CACHE_ = {}
-
     def __init__(self, Root):
         self._Root = Root
-        for F in os.listdir(Root):
-            self._CACHE_.add(F)
-            self._UPPER_CACHE_[F.upper()] = F
+        gDirListCache.GetEntries(Root)
 
     # =[] operator
     def __getitem__(self, Path):
@@ -600,52 +726,19 @@ class DirCache:
             return self._Root
         if Path and Path[0] == os.path.sep:
             Path = Path[1:]
-        if Path in self._CACHE_:
-            return os.path.join(self._Root, Path)
-        UpperPath = Path.upper()
-        if UpperPath in self._UPPER_CACHE_:
-            return os.path.join(self._Root, self._UPPER_CACHE_[UpperPath])
-
-        IndexList = []
-        LastSepIndex = -1
-        SepIndex = Path.find(os.path.sep)
-        while SepIndex > -1:
-            Parent = UpperPath[:SepIndex]
-            if Parent not in self._UPPER_CACHE_:
-                break
-            LastSepIndex = SepIndex
-            SepIndex = Path.find(os.path.sep, LastSepIndex + 1)
-
-        if LastSepIndex == -1:
-            return None
-
-        Cwd = os.getcwd()
-        os.chdir(self._Root)
-        SepIndex = LastSepIndex
-        while SepIndex > -1:
-            Parent = Path[:SepIndex]
-            ParentKey = UpperPath[:SepIndex]
-            if ParentKey not in self._UPPER_CACHE_:
-                os.chdir(Cwd)
-                return None
-
-            if Parent in self._CACHE_:
-                ParentDir = Parent
-            else:
-                ParentDir = self._UPPER_CACHE_[ParentKey]
-            for F in os.listdir(ParentDir):
-                Dir = os.path.join(ParentDir, F)
-                self._CACHE_.add(Dir)
-                self._UPPER_CACHE_[Dir.upper()] = Dir
-
-            SepIndex = Path.find(os.path.sep, SepIndex + 1)
-
-        os.chdir(Cwd)
-        if Path in self._CACHE_:
-            return os.path.join(self._Root, Path)
-        elif UpperPath in self._UPPER_CACHE_:
-            return os.path.join(self._Root, self._UPPER_CACHE_[UpperPath])
-        return None
+        RealPath = self._Root
+        for Name in Path.split(os.path.sep):
+            if not Name:
+                continue
+            RealName = gDirListCache.GetRealName(RealPath, Name)
+            if RealName is None:
+                # the entry may be created after the directory is listed
+                gDirListCache.Refresh(RealPath)
+                RealName = gDirListCache.GetRealName(RealPath, Name)
+                if RealName is None:
+                    return None
+            RealPath = os.path.join(RealPath, RealName)
+        return RealPath
 
 def RealPath(File, Dir='', OverrideDir=''):
     NewFile = os.path.normpath(os.path.join(Dir, File))
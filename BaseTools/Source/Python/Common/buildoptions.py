@@ -84,9 +84,25 @@ def MyOptionParser():
     Parser.add_option("--hash", action="store_true", dest="UseHashCache", default=False, help="Enable hash-based caching during build process.")
     Parser.add_option("--binary-destination", action="store", type="string", dest="BinCacheDest", help="Generate a cache of binary files in the specified directory.")
     Parser.add_option("--binary-source", action="store", type="string", dest="BinCacheSource", help="Consume a cache of binary files from the specified directory.")
+    Parser.add_option("--binary-cache-size", action="store", type="string", dest="BinCacheSize",
+        help="Maximum size of the cache of binary files, e.g. 512M or 20G. Used with --binary-destination, "\
+             "the least recently used cache entries are removed when the cache grows over it.")
+    Parser.add_option("--binary-cache-link", action="store_true", dest="BinCacheLink", default=False,
+        help="Hardlink the module output files restored by --binary-source to the cache instead of copying them. "\
+             "The restored files are read-only and must not be modified in place.")
+    Parser.add_option("--cache-gc", action="store_true", dest="CacheGc", default=False,
+        help="Remove the unreferenced files and, with --binary-cache-size, the least recently used entries "\
+             "from the cache of binary files given by --binary-destination, then exit without building.")
+    Parser.add_option("--compiler-deps", action="store_true", dest="UseCompilerDeps", default=False,
+        help="Get the header files a source file depends on from the dependency file saved by compiler when it was "\
+             "compiled, and search #include in the source file only if it has not been compiled. The C compile "\
+             "commands in build_rule.txt must use $(DEPS_FLAGS). Not supported with --backend=ninja.")
     Parser.add_option("--genfds-multi-thread", action="store_true", dest="GenfdsMultiThread", default=True, help="Enable GenFds multi thread to generate ffs file.")
     Parser.add_option("--no-genfds-multi-thread", action="store_true", dest="NoGenfdsMultiThread", default=False, help="Disable GenFds multi thread to generate ffs file.")
     Parser.add_option("--disable-include-path-check", action="store_true", dest="DisableIncludePathCheck", default=False, help="Disable the include path check for outside of package.")
+    Parser.add_option("--backend", action="store", type="choice", choices=['make', 'ninja'], dest="Backend", default="make",
+        help="Build system used to build modules. Must be one of: [make, ninja]. make (default) runs one (n)make per module, "\
+             "ninja builds the whole platform from one build.ninja file, and only supports the all, genc and genmake targets.")
     (Opt, Args) = Parser.parse_args()
     return (Opt, Args)
 
@@ -12,8 +12,9 @@
 #
 from __future__ import print_function
 from __future__ import absolute_import
-from re import compile, DOTALL
+from re import compile, DOTALL, MULTILINE
 from string import hexdigits
+from hashlib import md5
 from uuid import UUID
 
 from Common.BuildToolError import *
@@ -27,6 +28,7 @@ from Common.MultipleWorkspace import MultipleWorkspace as mws
 import Common.LongFilePathOs as os
 from Common.LongFilePathSupport import OpenLongFilePath as open
 from Common.RangeExpression import RangeExpression
+from Common.FileHashCache import GetFileDigest
 from collections import OrderedDict
 
 from .Fd import FD
@@ -71,8 +73,24 @@ ShortcutPcdPattern = compile("\s*\w+\s*=\s*(?P<value>(?:0x|0X)?[a-fA-F0-9]+)\s*\
 BaseAddrValuePattern = compile('^0[xX][0-9a-fA-F]+')
 FileExtensionPattern = compile(r'([a-zA-Z][a-zA-Z0-9]*)')
 TokenFindPattern = compile(r'([a-zA-Z0-9\-]+|\$\(TARGET\)|\*)_([a-zA-Z0-9\-]+|\$\(TOOL_CHAIN_TAG\)|\*)_([a-zA-Z0-9\-]+|\$\(ARCH\)|\*)')
+# patterns used by the scanner, which works on the lines of the file buffer
+CommentStartPattern = compile(r'"|#|//|/\*')
+NonLineBreakPattern = compile(r'[^\n]')
+LineBreakPattern = compile(r'[\r\n]')
+WhiteSpacePattern = compile(r'[\0\r\n \t]*')
+TokenPattern = compile(r'[^\s=|,{}]*')
+WordPattern = compile(r'[a-zA-Z_][a-zA-Z0-9_\-]*')
+PcdWordPattern = compile(r'[a-zA-Z_\[\]][a-zA-Z0-9_\-\[\]]*')
+# patterns of the macros an FDF file may reference: $(NAME), and the names in conditional directives
+MacroReferencePattern = compile(r'\$\(([^)\s]+)\)')
+ConditionalDirectivePattern = compile(r'^\s*!(?:if|ifdef|ifndef|elseif|else\s+if)\b(.*)$', MULTILINE)
+MacroNamePattern = compile(r'[a-zA-Z_][a-zA-Z0-9_]*')
 AllIncludeFileList = []
 
+## Version of the profiles saved in the meta file cache, the profiles saved by
+#  other version are discarded. Increase it when the profile objects change.
+PROFILE_VERSION = 3
+
 # Get the closest parent
 def GetParentAtLine (Line):
     for Profile in AllIncludeFileList:
@@ -274,11 +292,19 @@ class FdfParser:
     #
     def _SkipWhiteSpace(self):
         while not self._EndOfFile():
-            if self._CurrentChar() in {TAB_PRINTCHAR_NUL, T_CHAR_CR, TAB_LINE_BREAK, TAB_SPACE_SPLIT, T_CHAR_TAB}:
-                self._SkippedChars += str(self._CurrentChar())
-                self._GetOneChar()
-            else:
+            Line = self._CurrentLine()
+            End = WhiteSpacePattern.match(Line, self.CurrentOffsetWithinLine).end()
+            if End == self.CurrentOffsetWithinLine:
                 return
+            # the last char of the file is never skipped
+            if self.CurrentLineNumber == len(self.Profile.FileLinesList):
+                End = min(End, len(Line) - 1)
+            self._SkippedChars += Line[self.CurrentOffsetWithinLine:End]
+            if End == len(Line):
+                self.CurrentLineNumber += 1
+                self.CurrentOffsetWithinLine = 0
+            else:
+                self.CurrentOffsetWithinLine = End
         return
 
     ## _EndOfFile() method
@@ -291,12 +317,11 @@ class FdfParser:
     #
     def _EndOfFile(self):
         NumberOfLines = len(self.Profile.FileLinesList)
-        SizeOfLastLine = len(self.Profile.FileLinesList[-1])
-        if self.CurrentLineNumber == NumberOfLines and self.CurrentOffsetWithinLine >= SizeOfLastLine - 1:
-            return True
+        if self.CurrentLineNumber < NumberOfLines:
+            return False
         if self.CurrentLineNumber > NumberOfLines:
             return True
-        return False
+        return self.CurrentOffsetWithinLine >= len(self.Profile.FileLinesList[-1]) - 1
 
     ## _EndOfLine() method
     #
@@ -379,16 +404,6 @@ class FdfParser:
             return self.Profile.FileLinesList[self.CurrentLineNumber][0]
         return self.Profile.FileLinesList[self.CurrentLineNumber - 1][self.CurrentOffsetWithinLine + 1]
 
-    ## _SetCurrentCharValue() method
-    #
-    #   Modify the value of current char
-    #
-    #   @param  self        The object pointer
-    #   @param  Value       The new value of current char
-    #
-    def _SetCurrentCharValue(self, Value):
-        self.Profile.FileLinesList[self.CurrentLineNumber - 1][self.CurrentOffsetWithinLine] = Value
-
     ## _CurrentLine() method
     #
     #   Get the list that contains current line contents
@@ -399,37 +414,44 @@ class FdfParser:
     def _CurrentLine(self):
         return self.Profile.FileLinesList[self.CurrentLineNumber - 1]
 
-    def _StringToList(self):
-        self.Profile.FileLinesList = [list(s) for s in self.Profile.FileLinesList]
+    ## _PadLastLine() method
+    #
+    #   Append a space to the last line. The last char of the file is never
+    #   scanned, so that the real last char can be handled like the others.
+    #
+    #   @param  self        The object pointer
+    #
+    def _PadLastLine(self):
         if not self.Profile.FileLinesList:
             EdkLogger.error('FdfParser', FILE_READ_FAILURE, 'The file is empty!', File=self.FileName)
-        self.Profile.FileLinesList[-1].append(' ')
+        self.Profile.FileLinesList[-1] += TAB_SPACE_SPLIT
 
+    ## _ReplaceFragment() method
+    #
+    #   Replace the chars between two positions, both included, except the line breaks
+    #
+    #   @param  self        The object pointer
+    #   @param  StartPos    The line index and offset of the first char
+    #   @param  EndPos      The line index and offset of the last char
+    #   @param  Value       The char to replace with
+    #
     def _ReplaceFragment(self, StartPos, EndPos, Value = ' '):
+        Lines = self.Profile.FileLinesList
         if StartPos[0] == EndPos[0]:
-            Offset = StartPos[1]
-            while Offset <= EndPos[1]:
-                self.Profile.FileLinesList[StartPos[0]][Offset] = Value
-                Offset += 1
+            if EndPos[1] >= StartPos[1]:
+                Line = Lines[StartPos[0]]
+                Lines[StartPos[0]] = Line[:StartPos[1]] + Value * (EndPos[1] - StartPos[1] + 1) + Line[EndPos[1] + 1:]
             return
 
-        Offset = StartPos[1]
-        while self.Profile.FileLinesList[StartPos[0]][Offset] not in CR_LB_SET:
-            self.Profile.FileLinesList[StartPos[0]][Offset] = Value
-            Offset += 1
+        # the first line is replaced from its beginning too
+        for Index in range(StartPos[0], EndPos[0]):
+            Line = Lines[Index]
+            Match = LineBreakPattern.search(Line)
+            End = Match.start() if Match else len(Line)
+            Lines[Index] = Value * End + Line[End:]
 
-        Line = StartPos[0]
-        while Line < EndPos[0]:
-            Offset = 0
-            while self.Profile.FileLinesList[Line][Offset] not in CR_LB_SET:
-                self.Profile.FileLinesList[Line][Offset] = Value
-                Offset += 1
-            Line += 1
-
-        Offset = 0
-        while Offset <= EndPos[1]:
-            self.Profile.FileLinesList[EndPos[0]][Offset] = Value
-            Offset += 1
+        Line = Lines[EndPos[0]]
+        Lines[EndPos[0]] = Value * (EndPos[1] + 1) + Line[EndPos[1] + 1:]
 
     def _SetMacroValue(self, Macro, Value):
         if not self._CurSection:
@@ -494,59 +516,58 @@ class FdfParser:
     #   @param  self        The object pointer
     #
     def PreprocessFile(self):
+        # The file is scanned as a whole, since the lines are not changed but the chars in comments
+        FileLinesList = self.Profile.FileLinesList
+        Text = self._ReplaceComments("".join(FileLinesList))
+        Offset = 0
+        for Index, Line in enumerate(FileLinesList):
+            FileLinesList[Index] = Text[Offset:Offset + len(Line)]
+            Offset += len(Line)
         self.Rewind()
-        InComment = False
-        DoubleSlashComment = False
-        HashComment = False
-        # HashComment in quoted string " " is ignored.
-        InString = False
 
-        while not self._EndOfFile():
-
-            if self._CurrentChar() == T_CHAR_DOUBLE_QUOTE and not InComment:
+    ## _ReplaceComments() method
+    #
+    #   Replace the chars of comments with spaces, except the line breaks
+    #
+    #   A '#' in quoted string " " is not a comment, while '//' and '/*' are.
+    #   The last char of the text is not scanned, see _PadLastLine().
+    #
+    #   @param  Text        The content of the file
+    #   @retval string      The content with the comments replaced
+    #
+    @staticmethod
+    def _ReplaceComments(Text):
+        End = len(Text) - 1
+        PieceList = []
+        CopiedPos = 0
+        Pos = 0
+        InString = False
+        while True:
+            Match = CommentStartPattern.search(Text, Pos, End)
+            if not Match:
+                break
+            Start = Match.start()
+            if Match.group() == T_CHAR_DOUBLE_QUOTE:
                 InString = not InString
-            # meet new line, then no longer in a comment for // and '#'
-            if self._CurrentChar() == TAB_LINE_BREAK:
-                self.CurrentLineNumber += 1
-                self.CurrentOffsetWithinLine = 0
-                if InComment and DoubleSlashComment:
-                    InComment = False
-                    DoubleSlashComment = False
-                if InComment and HashComment:
-                    InComment = False
-                    HashComment = False
-            # check for */ comment end
-            elif InComment and not DoubleSlashComment and not HashComment and self._CurrentChar() == TAB_STAR and self._NextChar() == TAB_BACK_SLASH:
-                self._SetCurrentCharValue(TAB_SPACE_SPLIT)
-                self._GetOneChar()
-                self._SetCurrentCharValue(TAB_SPACE_SPLIT)
-                self._GetOneChar()
-                InComment = False
-            # set comments to spaces
-            elif InComment:
-                self._SetCurrentCharValue(TAB_SPACE_SPLIT)
-                self._GetOneChar()
-            # check for // comment
-            elif self._CurrentChar() == TAB_BACK_SLASH and self._NextChar() == TAB_BACK_SLASH and not self._EndOfLine():
-                InComment = True
-                DoubleSlashComment = True
-            # check for '#' comment
-            elif self._CurrentChar() == TAB_COMMENT_SPLIT and not self._EndOfLine() and not InString:
-                InComment = True
-                HashComment = True
-            # check for /* comment start
-            elif self._CurrentChar() == TAB_BACK_SLASH and self._NextChar() == TAB_STAR:
-                self._SetCurrentCharValue(TAB_SPACE_SPLIT)
-                self._GetOneChar()
-                self._SetCurrentCharValue(TAB_SPACE_SPLIT)
-                self._GetOneChar()
-                InComment = True
+                Pos = Start + 1
+                continue
+            if Match.group() == TAB_COMMENT_SPLIT and InString:
+                Pos = Start + 1
+                continue
+            if Match.group() == '/*':
+                CommentEnd = Text.find('*/', Start + 2, End + 1)
+                CommentEnd = End if CommentEnd == -1 else CommentEnd + 2
+                Comment = NonLineBreakPattern.sub(TAB_SPACE_SPLIT, Text[Start:CommentEnd])
             else:
-                self._GetOneChar()
-
-        # restore from ListOfList to ListOfString
-        self.Profile.FileLinesList = ["".join(list) for list in self.Profile.FileLinesList]
-        self.Rewind()
+                CommentEnd = Text.find(TAB_LINE_BREAK, Start, End)
+                if CommentEnd == -1:
+                    CommentEnd = End
+                Comment = TAB_SPACE_SPLIT * (CommentEnd - Start)
+            PieceList.append(Text[CopiedPos:Start])
+            PieceList.append(Comment)
+            CopiedPos = Pos = CommentEnd
+        PieceList.append(Text[CopiedPos:])
+        return "".join(PieceList)
 
     ## PreprocessIncludeFile() method
     #
@@ -647,18 +668,15 @@ class FdfParser:
                         self.CurrentLineNumber += 1
                         self.CurrentOffsetWithinLine = 0
 
-                for Line in IncFileProfile.FileLinesList:
-                    self.Profile.FileLinesList.insert(InsertAtLine, Line)
-                    self.CurrentLineNumber += 1
-                    InsertAtLine += 1
+                self.Profile.FileLinesList[InsertAtLine:InsertAtLine] = IncFileProfile.FileLinesList
+                self.CurrentLineNumber += len(IncFileProfile.FileLinesList)
 
                 # reversely sorted to better determine error in file
                 AllIncludeFileList.insert(0, IncFileProfile)
 
                 # comment out the processed include file statement
-                TempList = list(self.Profile.FileLinesList[IncludeLine - 1])
-                TempList.insert(IncludeOffset, TAB_COMMENT_SPLIT)
-                self.Profile.FileLinesList[IncludeLine - 1] = ''.join(TempList)
+                IncludeLineString = self.Profile.FileLinesList[IncludeLine - 1]
+                self.Profile.FileLinesList[IncludeLine - 1] = IncludeLineString[:IncludeOffset] + TAB_COMMENT_SPLIT + IncludeLineString[IncludeOffset:]
             if Processed: # Nested and back-to-back support
                 self.Rewind(DestLine = IncFileProfile.InsertStartLineNumber - 1)
                 Processed = False
@@ -923,17 +941,28 @@ class FdfParser:
 
         # Only consider the same line, no multi-line token allowed
         StartPos = self.CurrentOffsetWithinLine
-        index = -1
-        if IgnoreCase:
-            index = self._CurrentLine()[self.CurrentOffsetWithinLine: ].upper().find(String.upper())
-        else:
-            index = self._CurrentLine()[self.CurrentOffsetWithinLine: ].find(String)
-        if index == 0:
+        if self._StartsWith(String, IgnoreCase):
             self.CurrentOffsetWithinLine += len(String)
             self._Token = self._CurrentLine()[StartPos: self.CurrentOffsetWithinLine]
             return True
         return False
 
+    ## _StartsWith() method
+    #
+    #   Check whether the string is at the current position of the current line
+    #
+    #   @param  self        The object pointer
+    #   @param  String      The string to check
+    #   @param  IgnoreCase  Indicate case sensitive/non-sensitive check
+    #   @retval True        The string is at the current position
+    #   @retval False       The string is not at the current position
+    #
+    def _StartsWith(self, String, IgnoreCase):
+        Line = self._CurrentLine()
+        if IgnoreCase:
+            return Line[self.CurrentOffsetWithinLine:self.CurrentOffsetWithinLine + len(String)].upper() == String.upper()
+        return Line.startswith(String, self.CurrentOffsetWithinLine)
+
     ## _IsKeyword() method
     #
     #   Check whether input keyword is found from current char position along, whole word only!
@@ -950,12 +979,7 @@ class FdfParser:
 
         # Only consider the same line, no multi-line token allowed
         StartPos = self.CurrentOffsetWithinLine
-        index = -1
-        if IgnoreCase:
-            index = self._CurrentLine()[self.CurrentOffsetWithinLine: ].upper().find(KeyWord.upper())
-        else:
-            index = self._CurrentLine()[self.CurrentOffsetWithinLine: ].find(KeyWord)
-        if index == 0:
+        if self._StartsWith(KeyWord, IgnoreCase):
             followingChar = self._CurrentLine()[self.CurrentOffsetWithinLine + len(KeyWord)]
             if not str(followingChar).isspace() and followingChar not in SEPARATORS:
                 return False
@@ -984,50 +1008,32 @@ class FdfParser:
     #   @retval False       Not able to find a C name string, file buffer pointer not changed
     #
     def _GetNextWord(self):
-        self._SkipWhiteSpace()
-        if self._EndOfFile():
-            return False
-
-        TempChar = self._CurrentChar()
-        StartPos = self.CurrentOffsetWithinLine
-        if (TempChar >= 'a' and TempChar <= 'z') or (TempChar >= 'A' and TempChar <= 'Z') or TempChar == '_':
-            self._GetOneChar()
-            while not self._EndOfLine():
-                TempChar = self._CurrentChar()
-                if (TempChar >= 'a' and TempChar <= 'z') or (TempChar >= 'A' and TempChar <= 'Z') \
-                or (TempChar >= '0' and TempChar <= '9') or TempChar == '_' or TempChar == '-':
-                    self._GetOneChar()
-
-                else:
-                    break
-
-            self._Token = self._CurrentLine()[StartPos: self.CurrentOffsetWithinLine]
-            return True
-
-        return False
+        return self._GetNextPatternWord(WordPattern)
 
     def _GetNextPcdWord(self):
+        return self._GetNextPatternWord(PcdWordPattern)
+
+    ## _GetNextPatternWord() method
+    #
+    #   Get next word matching a pattern from file lines
+    #   If found, the string value is put into self._Token
+    #
+    #   @param  self        The object pointer
+    #   @param  Pattern     The pattern of the word, which never matches a line break
+    #   @retval True        Successfully find a word, file buffer pointer moved forward
+    #   @retval False       Not able to find a word, file buffer pointer not changed
+    #
+    def _GetNextPatternWord(self, Pattern):
         self._SkipWhiteSpace()
         if self._EndOfFile():
             return False
 
-        TempChar = self._CurrentChar()
-        StartPos = self.CurrentOffsetWithinLine
-        if (TempChar >= 'a' and TempChar <= 'z') or (TempChar >= 'A' and TempChar <= 'Z') or TempChar == '_' or TempChar == TAB_SECTION_START or TempChar == TAB_SECTION_END:
-            self._GetOneChar()
-            while not self._EndOfLine():
-                TempChar = self._CurrentChar()
-                if (TempChar >= 'a' and TempChar <= 'z') or (TempChar >= 'A' and TempChar <= 'Z') \
-                or (TempChar >= '0' and TempChar <= '9') or TempChar == '_' or TempChar == '-' or TempChar == TAB_SECTION_START or TempChar == TAB_SECTION_END:
-                    self._GetOneChar()
-
-                else:
-                    break
-
-            self._Token = self._CurrentLine()[StartPos: self.CurrentOffsetWithinLine]
-            return True
-
-        return False
+        Match = Pattern.match(self._CurrentLine(), self.CurrentOffsetWithinLine)
+        if not Match:
+            return False
+        self.CurrentOffsetWithinLine = Match.end()
+        self._Token = Match.group()
+        return True
 
     ## _GetNextToken() method
     #
@@ -1045,27 +1051,19 @@ class FdfParser:
             return False
         # Record the token start position, the position of the first non-space char.
         StartPos = self.CurrentOffsetWithinLine
-        StartLine = self.CurrentLineNumber
-        while StartLine == self.CurrentLineNumber:
-            TempChar = self._CurrentChar()
-            # Try to find the end char that is not a space and not in separator tuple.
-            # That is, when we got a space or any char in the tuple, we got the end of token.
-            if not str(TempChar).isspace() and TempChar not in SEPARATORS:
-                self._GetOneChar()
-            # if we happen to meet a separator as the first char, we must proceed to get it.
-            # That is, we get a token that is a separator char. normally it is the boundary of other tokens.
-            elif StartPos == self.CurrentOffsetWithinLine and TempChar in SEPARATORS:
-                self._GetOneChar()
-                break
-            else:
-                break
-#        else:
-#            return False
-
-        EndPos = self.CurrentOffsetWithinLine
-        if self.CurrentLineNumber != StartLine:
-            EndPos = len(self.Profile.FileLinesList[StartLine-1])
-        self._Token = self.Profile.FileLinesList[StartLine-1][StartPos: EndPos]
+        Line = self._CurrentLine()
+        # Try to find the end char that is a space or in separator tuple.
+        EndPos = TokenPattern.match(Line, StartPos).end()
+        # if we happen to meet a separator as the first char, we must proceed to get it.
+        # That is, we get a token that is a separator char. normally it is the boundary of other tokens.
+        if EndPos == StartPos and Line[StartPos] in SEPARATORS:
+            EndPos += 1
+        if EndPos == len(Line):
+            self.CurrentLineNumber += 1
+            self.CurrentOffsetWithinLine = 0
+        else:
+            self.CurrentOffsetWithinLine = EndPos
+        self._Token = Line[StartPos: EndPos]
         if self._Token.lower() in {TAB_IF, TAB_END_IF, TAB_ELSE_IF, TAB_ELSE, TAB_IF_DEF, TAB_IF_N_DEF, TAB_ERROR, TAB_INCLUDE}:
             self._Token = self._Token.lower()
         if StartPos != self.CurrentOffsetWithinLine:
@@ -1240,19 +1238,29 @@ class FdfParser:
     def _SkipToToken(self, String, IgnoreCase = False):
         StartPos = self.GetFileBufferPos()
 
-        self._SkippedChars = ""
+        SkippedList = []
         while not self._EndOfFile():
-            index = -1
+            Line = self._CurrentLine()
+            # the last char of the file is never skipped
+            if self.CurrentLineNumber == len(self.Profile.FileLinesList):
+                LineEnd = len(Line) - 1
+            else:
+                LineEnd = len(Line)
             if IgnoreCase:
-                index = self._CurrentLine()[self.CurrentOffsetWithinLine: ].upper().find(String.upper())
+                Index = Line.upper().find(String.upper(), self.CurrentOffsetWithinLine)
             else:
-                index = self._CurrentLine()[self.CurrentOffsetWithinLine: ].find(String)
-            if index == 0:
-                self.CurrentOffsetWithinLine += len(String)
-                self._SkippedChars += String
+                Index = Line.find(String, self.CurrentOffsetWithinLine)
+            if Index != -1 and Index < LineEnd:
+                SkippedList.append(Line[self.CurrentOffsetWithinLine:Index])
+                SkippedList.append(String)
+                self.CurrentOffsetWithinLine = Index + len(String)
+                self._SkippedChars = "".join(SkippedList)
                 return True
-            self._SkippedChars += str(self._CurrentChar())
-            self._GetOneChar()
+            SkippedList.append(Line[self.CurrentOffsetWithinLine:LineEnd])
+            if LineEnd != len(Line):
+                break
+            self.CurrentLineNumber += 1
+            self.CurrentOffsetWithinLine = 0
 
         self.SetFileBufferPos(StartPos)
         self._SkippedChars = ""
@@ -1286,16 +1294,15 @@ class FdfParser:
     #   @param  self        The object pointer
     #
     def Preprocess(self):
-        self._StringToList()
+        self._PadLastLine()
         self.PreprocessFile()
         self.PreprocessIncludeFile()
-        self._StringToList()
+        self._PadLastLine()
         self.PreprocessFile()
         self.PreprocessConditionalStatement()
-        self._StringToList()
+        self._PadLastLine()
         for Pos in self._WipeOffArea:
             self._ReplaceFragment(Pos[0], Pos[1])
-        self.Profile.FileLinesList = ["".join(list) for list in self.Profile.FileLinesList]
 
         while self._GetDefines():
             pass
@@ -1331,6 +1338,139 @@ class FdfParser:
                 % (FileLineTuple[1], self.CurrentOffsetWithinLine + 1, self.Profile.FileLinesList[self.CurrentLineNumber - 1][self.CurrentOffsetWithinLine:].rstrip(TAB_LINE_BREAK).rstrip(T_CHAR_CR))
             raise
 
+    ## LoadProfile() method
+    #
+    #   Load the profile of the file from the meta file cache instead of parsing
+    #   the file. The profile is saved by SaveProfile() when build parses the file.
+    #   The profiles of the include files are restored in AllIncludeFileList, so
+    #   the lines reported in errors are mapped to the include files as usual.
+    #
+    #   @param  self        The object pointer
+    #   @retval True        The profile is loaded
+    #   @retval False       No valid profile in the cache, the file must be parsed
+    #
+    def LoadProfile(self):
+        CacheKey = self._GetCacheKey()
+        if not CacheKey:
+            return False
+        Entry = GlobalData.gMetaFileCache.Get(self.FileName, CacheKey)
+        if Entry is None:
+            return False
+        IncludeFileDigestList, MacroValueList, Profile, CurrentFdName, IncludeProfileList = Entry
+        try:
+            for FileName, Digest in IncludeFileDigestList:
+                if GetFileDigest(FileName) != Digest:
+                    return False
+        except (IOError, OSError):
+            return False
+        for Macro, Value in MacroValueList:
+            if self._GetGlobalMacroValue(Macro) != Value:
+                return False
+        self.Profile = Profile
+        self.CurrentFdName = CurrentFdName
+        AllIncludeFileList[:] = IncludeProfileList
+        return True
+
+    ## SaveProfile() method
+    #
+    #   Save the profile of the parsed file in the meta file cache, together
+    #   with the profiles and the digests of the include files and the values
+    #   of the macros of the platform and the command line referenced by the files
+    #
+    #   @param  self        The object pointer
+    #
+    def SaveProfile(self):
+        CacheKey = self._GetCacheKey()
+        if not CacheKey:
+            return
+        IncludeFileList = sorted({IncFileProfile.FileName for IncFileProfile in AllIncludeFileList})
+        try:
+            IncludeFileDigestList = [(FileName, GetFileDigest(FileName)) for FileName in IncludeFileList]
+            MacroList = self._GetReferencedMacros([self.FileName] + IncludeFileList)
+        except (IOError, OSError):
+            return
+        MacroValueList = [(Macro, self._GetGlobalMacroValue(Macro)) for Macro in MacroList]
+        GlobalData.gMetaFileCache.Set(self.FileName, CacheKey, (IncludeFileDigestList, MacroValueList, self.Profile, self.CurrentFdName,
+                                                                AllIncludeFileList))
+
+    ## _GetGlobalMacroValue() method
+    #
+    #   Get the value of a macro of the command line, build or the platform, like
+    #   _GetMacroValue() does out of any section
+    #
+    #   @param  self        The object pointer
+    #   @param  Macro       The name of the macro
+    #   @retval str         The value of the macro
+    #   @retval None        The macro is not defined
+    #
+    def _GetGlobalMacroValue(self, Macro):
+        for MacroDict in (GlobalData.gCommandLineDefines, GlobalData.gGlobalDefines, GlobalData.gPlatformDefines):
+            if Macro in MacroDict:
+                return MacroDict[Macro]
+        return None
+
+    ## _GetReferencedMacros() method
+    #
+    #   Get the macros the files may reference, i.e. the ones used as $(NAME),
+    #   the names in the conditional directives, and the macros used by the
+    #   values of them. The macros got may be more than the ones really used,
+    #   but never less.
+    #
+    #   @param  self        The object pointer
+    #   @param  FileList    The FDF file and the files included by it
+    #   @retval list        The names of the macros
+    #
+    def _GetReferencedMacros(self, FileList):
+        PendingList = []
+        for FileName in FileList:
+            with open(FileName, "r") as File:
+                Content = File.read()
+            PendingList.extend(MacroReferencePattern.findall(Content))
+            for Directive in ConditionalDirectivePattern.findall(Content):
+                PendingList.extend(MacroNamePattern.findall(Directive))
+        MacroSet = set()
+        while PendingList:
+            Macro = PendingList.pop()
+            if Macro in MacroSet:
+                continue
+            MacroSet.add(Macro)
+            Value = self._GetGlobalMacroValue(Macro)
+            if isinstance(Value, str):
+                PendingList.extend(MacroReferencePattern.findall(Value))
+        return sorted(MacroSet)
+
+    ## _GetCacheKey() method
+    #
+    #   Get the key of the profile in the meta file cache. The profile depends
+    #   on the content of the file, the macros and PCDs of the platform and the
+    #   command line, and the directories the included files are searched in.
+    #   The included files and the macros are checked by LoadProfile() separately,
+    #   because only the macros referenced by the files are compared. build
+    #   defines more macros than GenFds run alone, e.g. ARCH and FAMILY.
+    #
+    #   @param  self        The object pointer
+    #   @retval str         The key of the profile
+    #   @retval None        The profile can't be cached
+    #
+    def _GetCacheKey(self):
+        if not GlobalData.gMetaFileCache:
+            return None
+        try:
+            Digest = GetFileDigest(self.FileName)
+        except (IOError, OSError):
+            return None
+        PlatformDir = ''
+        if GenFdsGlobalVariable.ActivePlatform:
+            PlatformDir = GenFdsGlobalVariable.ActivePlatform.Dir
+        elif GlobalData.gActivePlatform:
+            PlatformDir = GlobalData.gActivePlatform.MetaFile.Dir
+        # the PCDs got from build options are only used in their string form
+        OptionPcdList = [Item for Item in GlobalData.BuildOptionPcd if not isinstance(Item, tuple)]
+        m = md5(Digest)
+        m.update(repr((self.__class__.__name__, PROFILE_VERSION, sorted(GlobalData.gPlatformPcds.items()),
+                       OptionPcdList, PlatformDir, GlobalData.gWorkspace, mws.WORKSPACE, mws.PACKAGES_PATH)).encode())
+        return m.hexdigest()
+
     ## SectionParser() method
     #
     #   Parse the file section info
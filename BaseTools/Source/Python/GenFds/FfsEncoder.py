@@ -0,0 +1,505 @@
+## @file
+# Generate sections and FFS files in process
+#
+# The functions here produce the same bytes as the GenSec and GenFfs tools do
+# for the same command line. Anything they do not handle, e.g. the standard
+# compression or an alignment got from a PE image, makes them return None and
+# the caller falls back to the tools.
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+from __future__ import absolute_import
+import re
+from struct import pack, unpack_from
+from uuid import UUID
+from zlib import crc32
+
+from Common.LongFilePathSupport import OpenLongFilePath as open
+
+## Version of the encoder, saved in the manifests of the outputs generated in
+#  process. Increase it when the output of any function here changes.
+FFS_ENCODER_VERSION = 1
+
+MAX_SECTION_SIZE = 0x1000000
+MAX_FFS_SIZE = 0x1000000
+
+EFI_SECTION_COMPRESSION = 0x01
+EFI_SECTION_GUID_DEFINED = 0x02
+EFI_SECTION_PE32 = 0x10
+EFI_SECTION_TE = 0x12
+EFI_SECTION_VERSION = 0x14
+EFI_SECTION_USER_INTERFACE = 0x15
+EFI_SECTION_FIRMWARE_VOLUME_IMAGE = 0x17
+EFI_SECTION_FREEFORM_SUBTYPE_GUID = 0x18
+EFI_SECTION_RAW = 0x19
+
+# section types accepted by the -s option of GenSec
+SectionTypeValue = {
+    'EFI_SECTION_COMPRESSION'               : EFI_SECTION_COMPRESSION,
+    'EFI_SECTION_GUID_DEFINED'              : EFI_SECTION_GUID_DEFINED,
+    'EFI_SECTION_PE32'                      : EFI_SECTION_PE32,
+    'EFI_SECTION_PIC'                       : 0x11,
+    'EFI_SECTION_TE'                        : EFI_SECTION_TE,
+    'EFI_SECTION_DXE_DEPEX'                 : 0x13,
+    'EFI_SECTION_VERSION'                   : EFI_SECTION_VERSION,
+    'EFI_SECTION_USER_INTERFACE'            : EFI_SECTION_USER_INTERFACE,
+    'EFI_SECTION_COMPATIBILITY16'           : 0x16,
+    'EFI_SECTION_FIRMWARE_VOLUME_IMAGE'     : EFI_SECTION_FIRMWARE_VOLUME_IMAGE,
+    'EFI_SECTION_FREEFORM_SUBTYPE_GUID'     : EFI_SECTION_FREEFORM_SUBTYPE_GUID,
+    'EFI_SECTION_RAW'                       : EFI_SECTION_RAW,
+    'EFI_SECTION_PEI_DEPEX'                 : 0x1B,
+    'EFI_SECTION_SMM_DEPEX'                 : 0x1C
+}
+
+EFI_FV_FILETYPE_SECURITY_CORE = 0x03
+EFI_FV_FILETYPE_PEI_CORE = 0x04
+EFI_FV_FILETYPE_DXE_CORE = 0x05
+EFI_FV_FILETYPE_PEIM = 0x06
+EFI_FV_FILETYPE_DRIVER = 0x07
+EFI_FV_FILETYPE_COMBINED_PEIM_DRIVER = 0x08
+EFI_FV_FILETYPE_APPLICATION = 0x09
+
+# file types accepted by the -t option of GenFfs
+FfsFileTypeValue = {
+    'EFI_FV_FILETYPE_RAW'                   : 0x01,
+    'EFI_FV_FILETYPE_FREEFORM'              : 0x02,
+    'EFI_FV_FILETYPE_SECURITY_CORE'         : EFI_FV_FILETYPE_SECURITY_CORE,
+    'EFI_FV_FILETYPE_PEI_CORE'              : EFI_FV_FILETYPE_PEI_CORE,
+    'EFI_FV_FILETYPE_DXE_CORE'              : EFI_FV_FILETYPE_DXE_CORE,
+    'EFI_FV_FILETYPE_PEIM'                  : EFI_FV_FILETYPE_PEIM,
+    'EFI_FV_FILETYPE_DRIVER'                : EFI_FV_FILETYPE_DRIVER,
+    'EFI_FV_FILETYPE_COMBINED_PEIM_DRIVER'  : EFI_FV_FILETYPE_COMBINED_PEIM_DRIVER,
+    'EFI_FV_FILETYPE_APPLICATION'           : EFI_FV_FILETYPE_APPLICATION,
+    'EFI_FV_FILETYPE_SMM'                   : 0x0A,
+    'EFI_FV_FILETYPE_FIRMWARE_VOLUME_IMAGE' : 0x0B,
+    'EFI_FV_FILETYPE_COMBINED_SMM_DXE'      : 0x0C,
+    'EFI_FV_FILETYPE_SMM_CORE'              : 0x0D,
+    'EFI_FV_FILETYPE_MM_STANDALONE'         : 0x0E,
+    'EFI_FV_FILETYPE_MM_CORE_STANDALONE'    : 0x0F
+}
+
+EFI_GUIDED_SECTION_PROCESSING_REQUIRED = 0x01
+EFI_GUIDED_SECTION_AUTH_STATUS_VALID = 0x02
+EFI_GUIDED_SECTION_NONE = 0x80
+
+GuidedSectionAttributeValue = {
+    'NONE'                  : EFI_GUIDED_SECTION_NONE,
+    'PROCESSING_REQUIRED'   : EFI_GUIDED_SECTION_PROCESSING_REQUIRED,
+    'AUTH_STATUS_VALID'     : EFI_GUIDED_SECTION_AUTH_STATUS_VALID
+}
+
+FFS_ATTRIB_LARGE_FILE = 0x01
+FFS_ATTRIB_DATA_ALIGNMENT2 = 0x02
+FFS_ATTRIB_FIXED = 0x04
+FFS_ATTRIB_CHECKSUM = 0x40
+FFS_FIXED_CHECKSUM = 0xAA
+EFI_FILE_STATE = 0x07
+
+EFI_TE_IMAGE_HEADER_SIGNATURE = 0x5A56
+EFI_TE_IMAGE_HEADER_SIZE = 40
+
+EFI_CRC32_GUIDED_SECTION_GUID = UUID('FC1BCDB0-7D31-49AA-936A-A4600D9DD083').bytes_le
+EFI_FFS_SECTION_ALIGNMENT_PADDING_GUID = UUID('04132C8D-0A22-4FA8-826E-8BBFEFDB836C').bytes_le
+ZERO_GUID = bytes(16)
+
+# alignments accepted for the input sections, their value is 1 << index
+AlignNameList = ["1", "2", "4", "8", "16", "32", "64", "128", "256", "512",
+                 "1K", "2K", "4K", "8K", "16K", "32K", "64K", "128K", "256K",
+                 "512K", "1M", "2M", "4M", "8M", "16M"]
+FfsValidAlignNameList = ["8", "16", "128", "512", "1K", "4K", "32K", "64K", "128K", "256K",
+                         "512K", "1M", "2M", "4M", "8M", "16M"]
+FfsValidAlignList = [0, 8, 16, 128, 512, 1024, 4096, 32768, 65536, 131072, 262144,
+                     524288, 1048576, 2097152, 4194304, 8388608, 16777216]
+
+GuidPattern = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+# an argument which reaches the tool unchanged through the shell, apart from
+# the enclosing double quotes
+ShellArgumentPattern = re.compile(r'^(?:[A-Za-z0-9_.+\-]+|"[ #&-~]*")$')
+ShellUnsafeCharacters = set('"\\$`%!^')
+
+## Get the string a tool gets from the shell for an argument of the command line
+#
+#   @param  Argument    The argument in the command line
+#
+#   @retval string      The argument the tool gets
+#   @retval None        The argument is not simple enough to be sure about it
+#
+def GetShellArgument(Argument):
+    if not ShellArgumentPattern.match(Argument):
+        return None
+    if Argument.startswith('"'):
+        Argument = Argument[1:-1]
+        if ShellUnsafeCharacters.intersection(Argument):
+            return None
+    return Argument
+
+## Read the whole content of an input file
+#
+#   @param  FileName    The file to read
+#
+#   @retval bytes       The content of the file
+#   @retval None        The file cannot be read
+#
+def ReadInputFile(FileName):
+    try:
+        with open(FileName, 'rb') as File:
+            return File.read()
+    except (IOError, OSError):
+        return None
+
+## Convert a section alignment string to its value
+#
+#   @param  AlignString     The alignment string, e.g. "4K"
+#
+#   @retval int             The alignment value
+#   @retval None            The string is not a valid alignment
+#
+def StringToAlignment(AlignString):
+    AlignString = AlignString.upper()
+    for Index, AlignName in enumerate(AlignNameList):
+        if AlignString == AlignName:
+            return 1 << Index
+    return None
+
+## Convert a registry format GUID string to the bytes of EFI_GUID
+#
+#   @param  GuidString      The GUID string
+#
+#   @retval bytes           The 16 bytes of the GUID
+#   @retval None            The string is not in registry format
+#
+def StringToGuid(GuidString):
+    if not GuidPattern.match(GuidString):
+        return None
+    return UUID(GuidString).bytes_le
+
+## Convert a decimal, or hexadecimal with 0x prefix, string to integer
+#
+#   @param  String      The string to convert
+#
+#   @retval int         The value of the string
+#   @retval None        The string is not a number
+#
+def StringToInteger(String):
+    String = String.strip(' ')
+    if re.match(r'^0[xX][0-9a-fA-F]+$', String):
+        return int(String, 16)
+    if re.match(r'^[0-9]+$', String):
+        return int(String)
+    return None
+
+## Get the 8-bit checksum of the data
+#
+#   @param  Data        The data to sum
+#
+#   @retval int         The value making the 8-bit sum of the data zero
+#
+def CalculateChecksum8(Data):
+    return -sum(Data) & 0xFF
+
+## Create the common header of a section
+#
+# EFI_COMMON_SECTION_HEADER2 is used when the size of the section doesn't fit
+# in 24 bits.
+#
+#   @param  Type        The section type
+#   @param  Length      The size of the section after the common header
+#
+#   @retval bytes       The common section header
+#
+def CreateSectionHeader(Type, Length):
+    if Length + 4 >= MAX_SECTION_SIZE:
+        return pack('<3BBI', 0xFF, 0xFF, 0xFF, Type, Length + 8)
+    Size = Length + 4
+    return pack('<4B', Size & 0xFF, (Size >> 8) & 0xFF, (Size >> 16) & 0xFF, Type)
+
+## Get the type, data offset and TE stripped size of a section file
+#
+#   @param  Data        The content of the section file
+#
+#   @retval tuple       (Type, HeaderSize, TeOffset)
+#   @retval None        The file is too small to hold the headers
+#
+def GetSectionDataOffset(Data):
+    HeaderSize = 8 if len(Data) >= MAX_SECTION_SIZE else 4
+    if len(Data) < HeaderSize:
+        return None
+    Type = Data[3]
+    TeOffset = 0
+    if Type == EFI_SECTION_TE:
+        if len(Data) < HeaderSize + EFI_TE_IMAGE_HEADER_SIZE:
+            return None
+        Signature, StrippedSize = unpack_from('<H4xH', Data, HeaderSize)
+        if Signature == EFI_TE_IMAGE_HEADER_SIGNATURE:
+            if StrippedSize < EFI_TE_IMAGE_HEADER_SIZE:
+                return None
+            TeOffset = StrippedSize - EFI_TE_IMAGE_HEADER_SIZE
+    elif Type == EFI_SECTION_GUID_DEFINED:
+        GuidHeaderSize = HeaderSize + 20
+        if len(Data) < GuidHeaderSize:
+            return None
+        DataOffset, Attributes = unpack_from('<HH', Data, GuidHeaderSize - 4)
+        if not Attributes & EFI_GUIDED_SECTION_PROCESSING_REQUIRED:
+            HeaderSize = DataOffset
+    return Type, HeaderSize, TeOffset
+
+## Concatenate section files, the way GetSectionContents() of GenSec and GenFfs does
+#
+# Each section starts on a 4-byte boundary. If an alignment is given for the
+# sections, a pad section is inserted before each section whose data would not
+# be aligned.
+#
+#   @param  InputList       The section files
+#   @param  AlignList       The alignment value of each section, or None
+#   @param  FfsAttrib       The attributes of the FFS file the sections are for
+#   @param  TypeList        The list to append the type of each section to
+#
+#   @retval tuple           (Data, MaxAlignment)
+#   @retval None            The data cannot be generated in process
+#
+def GetSectionContents(InputList, AlignList=None, FfsAttrib=None, TypeList=None):
+    Buffer = bytearray()
+    MaxAlignment = 1
+    for Index, FileName in enumerate(InputList):
+        Buffer += bytes(-len(Buffer) & 3)
+        Data = ReadInputFile(FileName)
+        if Data is None:
+            return None
+        if AlignList is not None or TypeList is not None:
+            DataOffset = GetSectionDataOffset(Data)
+            if DataOffset is None:
+                return None
+            Type, HeaderSize, TeOffset = DataOffset
+            if TypeList is not None:
+                TypeList.append(Type)
+        if AlignList is not None:
+            Align = AlignList[Index]
+            if TeOffset:
+                TeOffset = (Align - TeOffset % Align) % Align
+            Size = len(Buffer)
+            if (Size + HeaderSize + TeOffset) % Align:
+                #
+                # The tools leave the pad section header out when nothing follows it
+                #
+                if not Data:
+                    return None
+                Offset = ((Size + 4 + HeaderSize + TeOffset + Align - 1) & ~(Align - 1)) - Size - HeaderSize - TeOffset
+                if FfsAttrib is not None and FfsAttrib & FFS_ATTRIB_FIXED and MaxAlignment <= 1 and Offset >= 20:
+                    Buffer += pack('<4B', Offset & 0xFF, (Offset >> 8) & 0xFF, (Offset >> 16) & 0xFF, EFI_SECTION_FREEFORM_SUBTYPE_GUID)
+                    Buffer += EFI_FFS_SECTION_ALIGNMENT_PADDING_GUID + bytes(Offset - 20)
+                else:
+                    Buffer += pack('<4B', Offset & 0xFF, (Offset >> 8) & 0xFF, (Offset >> 16) & 0xFF, EFI_SECTION_RAW)
+                    Buffer += bytes(Offset - 4)
+            MaxAlignment = max(MaxAlignment, Align)
+        Buffer += Data
+    return bytes(Buffer), MaxAlignment
+
+## Generate a section the same way as GenSec
+#
+#   @param  Input           The input files
+#   @param  Type            The section type, None for the concatenation of the input sections
+#   @param  CompressionType The compression type of a compression section
+#   @param  Guid            The GUID of a GUID defined section
+#   @param  GuidHdrLen      The size of the GUID specific header
+#   @param  GuidAttr        The attributes of a GUID defined section
+#   @param  Ver             The version string, as it is in the command line
+#   @param  InputAlign      The alignment of each input section
+#   @param  BuildNumber     The build number of a version section
+#   @param  DummyFile       The dummy file of a GUID defined section
+#
+#   @retval bytes           The content of the section file
+#   @retval None            The section cannot be generated in process
+#
+def EncodeSection(Input, Type=None, CompressionType=None, Guid=None, GuidHdrLen=None,
+                  GuidAttr=[], Ver=None, InputAlign=[], BuildNumber=None, DummyFile=None):
+    Input = list(Input or [])
+    if DummyFile:
+        return None
+
+    SectionType = None
+    if Type:
+        SectionType = SectionTypeValue.get(Type.upper())
+        if SectionType is None:
+            return None
+
+    VendorGuid = ZERO_GUID
+    if Guid:
+        VendorGuid = StringToGuid(Guid)
+        if VendorGuid is None or (VendorGuid != ZERO_GUID and SectionType != EFI_SECTION_GUID_DEFINED):
+            return None
+
+    Attributes = EFI_GUIDED_SECTION_NONE
+    for Attr in GuidAttr:
+        if Attr.upper() not in GuidedSectionAttributeValue:
+            return None
+        Attributes |= GuidedSectionAttributeValue[Attr.upper()]
+
+    DataHeaderSize = 0
+    if GuidHdrLen:
+        DataHeaderSize = StringToInteger(str(GuidHdrLen))
+        if DataHeaderSize is None:
+            return None
+
+    VersionNumber = 0
+    if BuildNumber:
+        if not re.match(r'^[0-9]+$', str(BuildNumber)):
+            return None
+        VersionNumber = int(BuildNumber)
+
+    AlignList = None
+    if InputAlign:
+        if len(InputAlign) != len(Input):
+            return None
+        AlignList = []
+        for Align in InputAlign:
+            # "0" asks for the section alignment of the PE image
+            Align = StringToAlignment(Align) if Align != "0" else None
+            if Align is None:
+                return None
+            AlignList.append(Align)
+
+    if SectionType == EFI_SECTION_VERSION:
+        VersionString = GetShellArgument(Ver) if Ver else ''
+        if VersionString is None:
+            return None
+        if VersionNumber > 0xFFFF:
+            return None
+        Data = pack('<H', VersionNumber) + VersionString.encode('utf_16_le') + b'\0\0'
+        return CreateSectionHeader(SectionType, len(Data)) + Data
+
+    if SectionType == EFI_SECTION_USER_INTERFACE or not Input:
+        return None
+
+    if SectionType is None:
+        Contents = GetSectionContents(Input, AlignList)
+        return Contents and Contents[0]
+
+    if SectionType == EFI_SECTION_COMPRESSION:
+        if not CompressionType or CompressionType.upper() != 'PI_NONE':
+            return None
+        Contents = GetSectionContents(Input)
+        if not Contents or not Contents[0]:
+            return None
+        Data = Contents[0]
+        return CreateSectionHeader(SectionType, len(Data) + 5) + pack('<IB', len(Data), 0) + Data
+
+    if SectionType == EFI_SECTION_GUID_DEFINED:
+        Attributes &= ~EFI_GUIDED_SECTION_NONE
+        #
+        # The alignment is only processed for the default CRC32 guided section
+        #
+        if VendorGuid == ZERO_GUID:
+            Contents = GetSectionContents(Input, AlignList)
+        else:
+            Contents = GetSectionContents(Input)
+        if not Contents or not Contents[0]:
+            return None
+        Data = Contents[0]
+        if VendorGuid == ZERO_GUID:
+            Header = CreateSectionHeader(SectionType, len(Data) + 24) + EFI_CRC32_GUIDED_SECTION_GUID
+            Header += pack('<HHI', len(Header) + 8, EFI_GUIDED_SECTION_AUTH_STATUS_VALID, crc32(Data) & 0xFFFFFFFF)
+        else:
+            Header = CreateSectionHeader(SectionType, len(Data) + 20) + VendorGuid
+            Header += pack('<HH', (len(Header) + 4 + DataHeaderSize) & 0xFFFF, Attributes)
+        return Header + Data
+
+    if len(Input) != 1:
+        return None
+    Data = ReadInputFile(Input[0])
+    if Data is None:
+        return None
+    return CreateSectionHeader(SectionType, len(Data)) + Data
+
+## Generate an FFS file the same way as GenFfs
+#
+#   @param  Input           The section files
+#   @param  Type            The file type
+#   @param  Guid            The file name GUID
+#   @param  Fixed           Whether the file has the fixed attribute
+#   @param  CheckSum        Whether the checksum covers the file data
+#   @param  Align           The file alignment, one of the GenFfs alignment names
+#   @param  SectionAlign    The alignment of each section file
+#
+#   @retval bytes           The content of the FFS file
+#   @retval None            The file cannot be generated in process
+#
+def EncodeFfs(Input, Type, Guid, Fixed=False, CheckSum=False, Align=None, SectionAlign=None):
+    FileType = FfsFileTypeValue.get(Type.upper())
+    FileGuid = StringToGuid(Guid)
+    if FileType is None or FileGuid is None or FileGuid == ZERO_GUID or not Input:
+        return None
+
+    FfsAttrib = 0
+    if Fixed:
+        FfsAttrib |= FFS_ATTRIB_FIXED
+    if CheckSum:
+        FfsAttrib |= FFS_ATTRIB_CHECKSUM
+
+    FfsAlign = 0
+    if Align:
+        if Align.upper() in FfsValidAlignNameList:
+            FfsAlign = FfsValidAlignNameList.index(Align.upper())
+        elif Align not in ("1", "2", "4"):
+            return None
+
+    AlignList = []
+    for Index in range(len(Input)):
+        SecAlign = 1
+        if SectionAlign and SectionAlign[Index]:
+            # "0" asks for the section alignment of the PE image
+            SecAlign = StringToAlignment(SectionAlign[Index]) if SectionAlign[Index] != "0" else None
+            if SecAlign is None:
+                return None
+        AlignList.append(SecAlign)
+
+    TypeList = []
+    Contents = GetSectionContents(Input, AlignList, FfsAttrib, TypeList)
+    if not Contents:
+        return None
+    Data, MaxAlignment = Contents
+
+    #
+    # Leave the check of the PE/TE sections of the modules to the tool, which
+    # reports the error
+    #
+    PeSectionNum = len([SecType for SecType in TypeList if SecType in (EFI_SECTION_TE, EFI_SECTION_PE32,
+                        EFI_SECTION_GUID_DEFINED, EFI_SECTION_COMPRESSION, EFI_SECTION_FIRMWARE_VOLUME_IMAGE)])
+    if FileType in (EFI_FV_FILETYPE_SECURITY_CORE, EFI_FV_FILETYPE_PEI_CORE, EFI_FV_FILETYPE_DXE_CORE) and PeSectionNum != 1:
+        return None
+    if FileType in (EFI_FV_FILETYPE_PEIM, EFI_FV_FILETYPE_DRIVER, EFI_FV_FILETYPE_COMBINED_PEIM_DRIVER,
+                    EFI_FV_FILETYPE_APPLICATION) and PeSectionNum < 1:
+        return None
+
+    for Index in range(len(FfsValidAlignList) - 1):
+        if FfsValidAlignList[Index] < MaxAlignment <= FfsValidAlignList[Index + 1]:
+            break
+    else:
+        Index = len(FfsValidAlignList) - 1
+    FfsAlign = max(FfsAlign, Index)
+
+    if len(Data) + 24 >= MAX_FFS_SIZE:
+        FfsAttrib |= FFS_ATTRIB_LARGE_FILE
+        Size = bytes(3)
+        ExtendedSize = pack('<Q', len(Data) + 32)
+    else:
+        FileSize = len(Data) + 24
+        Size = pack('<3B', FileSize & 0xFF, (FileSize >> 8) & 0xFF, (FileSize >> 16) & 0xFF)
+        ExtendedSize = b''
+    if FfsAlign < 8:
+        Attributes = FfsAttrib | (FfsAlign << 3)
+    else:
+        Attributes = FfsAttrib | ((FfsAlign & 0x7) << 3) | FFS_ATTRIB_DATA_ALIGNMENT2
+    Attributes &= 0xFF
+
+    Header = bytearray(FileGuid + pack('<4B', 0, 0, FileType, Attributes) + Size + b'\0' + ExtendedSize)
+    Header[16] = CalculateChecksum8(Header)
+    if Attributes & FFS_ATTRIB_CHECKSUM:
+        Header[17] = CalculateChecksum8(Data)
+    else:
+        Header[17] = FFS_FIXED_CHECKSUM
+    Header[23] = EFI_FILE_STATE
+    return bytes(Header) + Data
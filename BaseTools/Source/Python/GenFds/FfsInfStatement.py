@@ -15,6 +15,7 @@ from . import Rule
 import Common.LongFilePathOs as os
 from io import BytesIO
 from struct import *
+from copy import deepcopy
 from .GenFdsGlobalVariable import GenFdsGlobalVariable
 from .Ffs import SectionSuffix,FdfFvFileTypeToFileType
 import subprocess
@@ -483,6 +484,12 @@ class FfsInfStatement(FfsInfStatementClassObject):
         # Get the rule of how to generate Ffs file
         #
         Rule = self.__GetRule__()
+        #
+        # The section objects of a rule keep the state of the module being generated,
+        # so the modules generated in parallel use their own copies of the rule
+        #
+        if GenFdsGlobalVariable.ParallelLock is not None:
+            Rule = deepcopy(Rule)
         GenFdsGlobalVariable.VerboseLogger( "Packing binaries from inf file : %s" %self.InfFileName)
         #
         # Convert Fv File Type for PI1.1 SMM driver.
@@ -18,6 +18,8 @@ from glob import glob
 from struct import unpack
 from linecache import getlines
 from io import BytesIO
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import Common.LongFilePathOs as os
 from Common.TargetTxtClassObject import TargetTxt
@@ -30,11 +32,16 @@ from Common.Misc import SaveFileOnChange, ClearDuplicatedInf
 from Common.BuildVersion import gBUILD_VERSION
 from Common.MultipleWorkspace import MultipleWorkspace as mws
 from Common.BuildToolError import FatalError, GENFDS_ERROR, CODE_ERROR, FORMAT_INVALID, RESOURCE_NOT_AVAILABLE, FILE_NOT_FOUND, OPTION_MISSING, FORMAT_NOT_SUPPORTED, OPTION_VALUE_INVALID, PARAMETER_INVALID
+from Common.FileHashCache import FileHashCache, MetaFileRecordCache
 from Workspace.WorkspaceDatabase import WorkspaceDatabase
 
 from .FdfParser import FdfParser, Warning
-from .GenFdsGlobalVariable import GenFdsGlobalVariable
+from .GenFdsGlobalVariable import GenFdsGlobalVariable, LargeFileFlagStack
 from .FfsFileStatement import FileStatement
+from .FfsInfStatement import FfsInfStatement
+from .FvImageSection import FvImageSection
+from .CompressSection import CompressSection
+from .GuidSection import GuidSection
 import Common.DataType as DataType
 from struct import Struct
 
@@ -81,7 +88,6 @@ def resetFdsGlobalVariable():
     GenFdsGlobalVariable.SharpCounter = 0
     GenFdsGlobalVariable.SharpNumberPerLine = 40
     GenFdsGlobalVariable.FdfFile = ''
-    GenFdsGlobalVariable.FdfFileTimeStamp = 0
     GenFdsGlobalVariable.FixedLoadAddress = False
     GenFdsGlobalVariable.PlatformName = ''
 
@@ -95,7 +101,7 @@ def resetFdsGlobalVariable():
     GenFdsGlobalVariable.ModuleFile = ''
     GenFdsGlobalVariable.EnableGenfdsMultiThread = True
 
-    GenFdsGlobalVariable.LargeFileInFvFlags = []
+    GenFdsGlobalVariable.LargeFileInFvFlags = LargeFileFlagStack()
     GenFdsGlobalVariable.EFI_FIRMWARE_FILE_SYSTEM3_GUID = '5473C07A-3DCB-4dca-BD6F-1E9689E7349A'
     GenFdsGlobalVariable.LARGE_FILE_SIZE = 0x1000000
 
@@ -104,6 +110,11 @@ def resetFdsGlobalVariable():
     # FvName, FdName, CapName in FDF, Image file name
     GenFdsGlobalVariable.ImageBinDict = {}
 
+    GenFdsGlobalVariable.ThreadNumber = 1
+    GenFdsGlobalVariable.ParallelLock = None
+    GenFdsGlobalVariable.ManifestDict = {}
+    GenFdsGlobalVariable.ToolDigestDict = {}
+
 def GenFdsApi(FdsCommandDict, WorkSpaceDataBase=None):
     global Workspace
     Workspace = ""
@@ -119,6 +130,9 @@ def GenFdsApi(FdsCommandDict, WorkSpaceDataBase=None):
         if FdsCommandDict.get("FixedAddress"):
             GenFdsGlobalVariable.FixedLoadAddress = True
 
+        if FdsCommandDict.get("ThreadNumber"):
+            GenFdsGlobalVariable.ThreadNumber = FdsCommandDict.get("ThreadNumber")
+
         if FdsCommandDict.get("quiet"):
             EdkLogger.SetLevel(EdkLogger.QUIET)
         if FdsCommandDict.get("debug"):
@@ -160,7 +174,6 @@ def GenFdsApi(FdsCommandDict, WorkSpaceDataBase=None):
                 EdkLogger.error("GenFds", FILE_NOT_FOUND, ExtraData=FdfFilename)
 
             GenFdsGlobalVariable.FdfFile = FdfFilename
-            GenFdsGlobalVariable.FdfFileTimeStamp = os.path.getmtime(FdfFilename)
         else:
             EdkLogger.error("GenFds", OPTION_MISSING, "Missing FDF filename")
 
@@ -262,6 +275,11 @@ def GenFdsApi(FdsCommandDict, WorkSpaceDataBase=None):
         if WorkSpaceDataBase:
             BuildWorkSpace = WorkSpaceDataBase
         else:
+            # use the meta files parsed by build, including the profile of FDF file
+            GlobalData.gMetaFileCache = MetaFileRecordCache(os.path.join(Workspace, 'Build', '.cache', 'metafile.db'))
+            # the digests of the files in the manifests of the outputs
+            if not GlobalData.gFileHashCache:
+                GlobalData.gFileHashCache = FileHashCache(os.path.join(Workspace, 'Build', '.cache', 'filehash.db'))
             BuildWorkSpace = WorkspaceDatabase()
         #
         # Get files real name in workspace dir
@@ -311,7 +329,8 @@ def GenFdsApi(FdsCommandDict, WorkSpaceDataBase=None):
             FdfParserObj = GlobalData.gFdfParser
         else:
             FdfParserObj = FdfParser(FdfFilename)
-            FdfParserObj.ParseFile()
+            if not FdfParserObj.LoadProfile():
+                FdfParserObj.ParseFile()
 
         if FdfParserObj.CycleReferenceCheck():
             EdkLogger.error("GenFds", FORMAT_NOT_SUPPORTED, "Cycle Reference Detected in FDF file")
@@ -374,6 +393,9 @@ def GenFdsApi(FdsCommandDict, WorkSpaceDataBase=None):
         """Display FV space info."""
         GenFds.DisplayFvSpaceInfo(FdfParserObj)
 
+        if not WorkSpaceDataBase:
+            GlobalData.gFileHashCache.Flush()
+
     except Warning as X:
         EdkLogger.error(X.ToolName, FORMAT_INVALID, File=X.FileName, Line=X.LineNumber, ExtraData=X.Message, RaiseError=False)
         ReturnCode = FORMAT_INVALID
@@ -405,6 +427,7 @@ def OptionsToCommandDict(Options):
     FdsCommandDict["debug"] = Options.debug
     FdsCommandDict["Workspace"] = Options.Workspace
     FdsCommandDict["GenfdsMultiThread"] = not Options.NoGenfdsMultiThread
+    FdsCommandDict["ThreadNumber"] = Options.ThreadNumber
     FdsCommandDict["fdf_file"] = [PathClass(Options.filename)] if Options.filename else []
     FdsCommandDict["build_target"] = Options.BuildTarget
     FdsCommandDict["toolchain_tag"] = Options.ToolChain
@@ -463,6 +486,7 @@ def myOptionParser():
     Parser.add_option("--pcd", action="append", dest="OptionPcd", help="Set PCD value by command line. Format: \"PcdName=Value\" ")
     Parser.add_option("--genfds-multi-thread", action="store_true", dest="GenfdsMultiThread", default=True, help="Enable GenFds multi thread to generate ffs file.")
     Parser.add_option("--no-genfds-multi-thread", action="store_true", dest="NoGenfdsMultiThread", default=False, help="Disable GenFds multi thread to generate ffs file.")
+    Parser.add_option("-n", "--thread-number", action="store", type="int", dest="ThreadNumber", help="Build the independent FV images with specified number of threads.")
 
     Options, _ = Parser.parse_args()
     return Options
@@ -504,6 +528,7 @@ class GenFds(object):
                 FdObj.GenFd()
                 return
         elif GenFds.OnlyGenerateThisFd is None and GenFds.OnlyGenerateThisFv is None:
+            GenFds.GenFvInParallel()
             for FdObj in GenFdsGlobalVariable.FdfParser.Profile.FdDict.values():
                 FdObj.GenFd()
 
@@ -532,6 +557,140 @@ class GenFds(object):
                 for OptRomObj in GenFdsGlobalVariable.FdfParser.Profile.OptRomDict.values():
                     OptRomObj.AddToBuffer(None)
 
+    ## GetFvReference()
+    #
+    #   Collect the FVs and INF files an FV is made of
+    #
+    #   @param  FvObj       FV to be searched
+    #   @param  RefFvSet    Set receiving the names of the FVs nested without base address
+    #   @param  InfSet      Set receiving the INF files of the modules in the FV
+    #   @retval bool        False if the FV contains an FD, True otherwise
+    #
+    @staticmethod
+    def GetFvReference(FvObj, RefFvSet, InfSet):
+        for FfsObj in FvObj.FfsList:
+            if isinstance(FfsObj, FfsInfStatement):
+                InfSet.add(FfsObj.InfFileName)
+                continue
+            if not isinstance(FfsObj, FileStatement):
+                continue
+            if FfsObj.FvName is not None:
+                RefFvSet.add(FfsObj.FvName.upper())
+                continue
+            if FfsObj.FdName is not None:
+                return False
+            SectionStack = list(FfsObj.SectionList)
+            while SectionStack:
+                SectionObj = SectionStack.pop()
+                if isinstance(SectionObj, FvImageSection):
+                    if SectionObj.FvName is not None:
+                        RefFvSet.add(SectionObj.FvName.upper())
+                    elif SectionObj.Fv is not None and not GenFds.GetFvReference(SectionObj.Fv, RefFvSet, InfSet):
+                        return False
+                elif isinstance(SectionObj, (CompressSection, GuidSection)):
+                    SectionStack.extend(SectionObj.SectionList)
+        return True
+
+    ## GetFvDependency()
+    #
+    #   Get the FVs which are neither in an FD region nor nested at a base address,
+    #   so that they are generated the same way whether before or after the FDs.
+    #   An FV depends on the FVs nested in it and, as the FFS files of a module
+    #   are shared, on the earlier FVs containing one of its modules.
+    #
+    #   @retval dict        FV name -> set of FV names to be generated before it,
+    #                       in an order where every FV follows its dependencies
+    #
+    @staticmethod
+    def GetFvDependency():
+        FdfParserObj = GenFdsGlobalVariable.FdfParser
+        FvDict = FdfParserObj.Profile.FvDict
+        FixedFvSet = set()
+        for FdName in FdfParserObj.Profile.FdDict:
+            FixedFvSet.update(FdfParserObj._GetFvInFd(FdName))
+
+        RefFvDict = {}
+        InfDict = {}
+        for FvName, FvObj in FvDict.items():
+            if FvName in FixedFvSet or FvObj.BaseAddress or FvName + 'fv' in GenFdsGlobalVariable.ImageBinDict:
+                continue
+            RefFvSet = set()
+            InfSet = set()
+            if GenFds.GetFvReference(FvObj, RefFvSet, InfSet):
+                RefFvDict[FvName] = set(Name for Name in RefFvSet if Name in FvDict and Name + 'fv' not in GenFdsGlobalVariable.ImageBinDict)
+                InfDict[FvName] = InfSet
+
+        #
+        # An FV nesting an FV generated at a base address has to wait for the FDs
+        #
+        Removed = True
+        while Removed:
+            Removed = False
+            for FvName in list(RefFvDict):
+                if not RefFvDict[FvName].issubset(RefFvDict):
+                    del RefFvDict[FvName]
+                    Removed = True
+
+        FvOrder = []
+        while len(FvOrder) < len(RefFvDict):
+            ReadyList = [FvName for FvName in RefFvDict if FvName not in FvOrder and RefFvDict[FvName].issubset(FvOrder)]
+            if not ReadyList:
+                break
+            FvOrder.extend(ReadyList)
+
+        DependencyDict = {}
+        for Index, FvName in enumerate(FvOrder):
+            DependencyDict[FvName] = set(RefFvDict[FvName])
+            for PrevFvName in FvOrder[:Index]:
+                if InfDict[FvName] & InfDict[PrevFvName]:
+                    DependencyDict[FvName].add(PrevFvName)
+        return DependencyDict
+
+    ## GenFvInParallel()
+    #
+    #   Generate the independent FVs with a pool of threads before the FDs. The
+    #   FDs, capsules and other FVs then reuse them through ImageBinDict.
+    #
+    @staticmethod
+    def GenFvInParallel():
+        if GenFdsGlobalVariable.ThreadNumber < 2:
+            return
+        DependencyDict = GenFds.GetFvDependency()
+        if len(DependencyDict) < 2:
+            return
+
+        GenFdsGlobalVariable.VerboseLogger("\n Generate independent FV images with %d threads!" % GenFdsGlobalVariable.ThreadNumber)
+        FvDict = GenFdsGlobalVariable.FdfParser.Profile.FvDict
+        GenFdsGlobalVariable.ParallelLock = Lock()
+        try:
+            with ThreadPoolExecutor(max_workers=GenFdsGlobalVariable.ThreadNumber) as Executor:
+                GeneratedSet = set()
+                RunningDict = {}
+                while DependencyDict or RunningDict:
+                    for FvName in [Name for Name in DependencyDict if DependencyDict[Name].issubset(GeneratedSet)]:
+                        del DependencyDict[FvName]
+                        RunningDict[Executor.submit(GenFds.GenFvJob, FvDict[FvName])] = FvName
+                    DoneSet, _ = wait(RunningDict, return_when=FIRST_COMPLETED)
+                    for Future in DoneSet:
+                        Future.result()
+                        GeneratedSet.add(RunningDict.pop(Future))
+        finally:
+            GenFdsGlobalVariable.ParallelLock = None
+
+    ## GenFvJob()
+    #
+    #   Generate an FV on a thread of GenFvInParallel(). The thread holds
+    #   ParallelLock, CallExternalTool() releases it while a tool is running.
+    #
+    #   @param  FvObj       FV to be generated
+    #
+    @staticmethod
+    def GenFvJob(FvObj):
+        with GenFdsGlobalVariable.ParallelLock:
+            Buffer = BytesIO()
+            FvObj.AddToBuffer(Buffer)
+            Buffer.close()
+
     @staticmethod
     def GenFfsMakefile(OutputDir, FdfParserObject, WorkSpace, ArchList, GlobalData):
         GenFdsGlobalVariable.SetEnv(FdfParserObject, WorkSpace, ArchList, GlobalData)
@@ -13,12 +13,15 @@ from __future__ import print_function
 from __future__ import absolute_import
 
 import Common.LongFilePathOs as os
+import json
 from sys import stdout
+from threading import local
 from subprocess import PIPE,Popen
 from struct import Struct
-from array import array
+from shutil import which
+from binascii import hexlify
 
-from Common.BuildToolError import COMMAND_FAILURE,GENFDS_ERROR
+from Common.BuildToolError import COMMAND_FAILURE,GENFDS_ERROR,FILE_WRITE_FAILURE
 from Common import EdkLogger
 from Common.Misc import SaveFileOnChange
 
@@ -29,7 +32,33 @@ import Common.DataType as DataType
 from Common.Misc import PathClass
 from Common.LongFilePathSupport import OpenLongFilePath as open
 from Common.MultipleWorkspace import MultipleWorkspace as mws
+from Common.FileHashCache import GetFileDigest, UpdateFileDigest
 import Common.GlobalData as GlobalData
+from .FfsEncoder import EncodeSection, EncodeFfs, FFS_ENCODER_VERSION
+
+## Stack of the large file flags of the FVs being generated
+#
+#   Each thread has its own stack, so that the FVs generated in parallel by
+#   GenFds.GenFvInParallel() do not see the flags of each other.
+#
+class LargeFileFlagStack(local):
+    def __init__(self):
+        self.FlagList = []
+
+    def append(self, Flag):
+        self.FlagList.append(Flag)
+
+    def pop(self):
+        return self.FlagList.pop()
+
+    def __getitem__(self, Index):
+        return self.FlagList[Index]
+
+    def __setitem__(self, Index, Flag):
+        self.FlagList[Index] = Flag
+
+    def __len__(self):
+        return len(self.FlagList)
 
 ## Global variables
 #
@@ -57,7 +86,6 @@ class GenFdsGlobalVariable:
     SharpCounter = 0
     SharpNumberPerLine = 40
     FdfFile = ''
-    FdfFileTimeStamp = 0
     FixedLoadAddress = False
     PlatformName = ''
 
@@ -80,7 +108,7 @@ class GenFdsGlobalVariable:
     # At the end of generation of FV, pop the flag.
     # List is used as a stack to handle nested FV generation.
     #
-    LargeFileInFvFlags = []
+    LargeFileInFvFlags = LargeFileFlagStack()
     EFI_FIRMWARE_FILE_SYSTEM3_GUID = '5473C07A-3DCB-4dca-BD6F-1E9689E7349A'
     LARGE_FILE_SIZE = 0x1000000
 
@@ -89,6 +117,20 @@ class GenFdsGlobalVariable:
     # FvName, FdName, CapName in FDF, Image file name
     ImageBinDict = {}
 
+    # Number of threads to generate the independent FVs
+    ThreadNumber = 1
+    #
+    # Lock held by the threads generating FVs in parallel, except while they
+    # run an external tool. It guards the global state shared by the threads,
+    # like ImageBinDict, ManifestDict and FfsCmdDict.
+    #
+    ParallelLock = None
+
+    # Output file -> manifest of its inputs got by NeedsUpdate, saved by SaveManifest
+    ManifestDict = {}
+    # Tool name -> md5 digest of the tool found in PATH
+    ToolDigestDict = {}
+
     ## LoadBuildRule
     #
     @staticmethod
@@ -396,35 +438,113 @@ class GenFdsGlobalVariable:
             Str = mws.join(GenFdsGlobalVariable.WorkSpaceDir, String)
         return os.path.normpath(Str)
 
-    ## Check if the input files are newer than output files
+    ## Get the md5 digest of a tool found in PATH
+    #
+    #   @param  Tool            Name or path of the tool
+    #
+    #   @retval string          The md5 digest, None if the tool is not found
+    #
+    @staticmethod
+    def GetToolDigest(Tool):
+        if Tool not in GenFdsGlobalVariable.ToolDigestDict:
+            ToolPath = which(Tool)
+            if ToolPath:
+                GenFdsGlobalVariable.ToolDigestDict[Tool] = hexlify(GetFileDigest(ToolPath)).decode()
+            else:
+                GenFdsGlobalVariable.ToolDigestDict[Tool] = None
+        return GenFdsGlobalVariable.ToolDigestDict[Tool]
+
+    ## Get the manifest of the generation of an output file
+    #
+    #   The output which may be generated in process gets the version of the
+    #   encoder instead of the digest of the tool, which is added by
+    #   SaveOutputFile() only if the tool is called.
+    #
+    #   @param  Input           Path list of input files
+    #   @param  Cmd             The command generating the output file
+    #   @param  InProcess       Whether the output may be generated in process
+    #
+    #   @retval dict            The digests of the inputs and of the tool, and the command
+    #   @retval None            if any Input doesn't exist
+    #
+    @staticmethod
+    def GetManifest(Input, Cmd, InProcess=False):
+        InputDigestList = []
+        for F in Input:
+            if not os.path.isfile(F):
+                return None
+            InputDigestList.append([F, hexlify(GetFileDigest(F)).decode()])
+        Manifest = {"Command": ' '.join(Cmd),
+                    "Input": InputDigestList}
+        if InProcess:
+            Manifest["Encoder"] = FFS_ENCODER_VERSION
+        else:
+            Manifest["Tool"] = GenFdsGlobalVariable.GetToolDigest(Cmd[0])
+        return Manifest
+
+    ## Check if the output file needs to be generated again
+    #
+    #   The manifest saved by SaveManifest() when the output was generated last
+    #   time is compared with the current one, so that the output is generated
+    #   again only if the content of an input, the tool or the command changes.
+    #   The modification time of the files is not used. The output itself is
+    #   only read if everything else is the same.
     #
     #   @param  Output          Path of output file
     #   @param  Input           Path list of input files
+    #   @param  Cmd             The command generating the output file
+    #   @param  InProcess       Whether the output may be generated in process
     #
-    #   @retval True            if Output doesn't exist, or any Input is newer
-    #   @retval False           if all Input is older than Output
+    #   @retval True            if Output or its manifest doesn't exist, or the manifest changes
+    #   @retval False           if Output was generated from the same inputs by the same command
     #
     @staticmethod
-    def NeedsUpdate(Output, Input):
-        if not os.path.exists(Output):
-            return True
+    def NeedsUpdate(Output, Input, Cmd, InProcess=False):
+        GenFdsGlobalVariable.ManifestDict.pop(Output, None)
         # always update "Output" if no "Input" given
         if not Input:
             return True
+        # always update "Output" if any "Input" doesn't exist
+        Manifest = GenFdsGlobalVariable.GetManifest(Input, Cmd, InProcess)
+        if Manifest is None:
+            return True
+        GenFdsGlobalVariable.ManifestDict[Output] = Manifest
 
-        # if fdf file is changed after the 'Output" is generated, update the 'Output'
-        OutputTime = os.path.getmtime(Output)
-        if GenFdsGlobalVariable.FdfFileTimeStamp > OutputTime:
+        ManifestFile = Output + '.manifest'
+        if not os.path.isfile(Output) or not os.path.isfile(ManifestFile):
             return True
+        try:
+            with open(ManifestFile, 'r') as File:
+                SavedManifest = json.load(File)
+        except ValueError:
+            return True
+        if not isinstance(SavedManifest, dict):
+            return True
+        OutputDigest = SavedManifest.pop("Output", None)
+        if InProcess:
+            #
+            # The same inputs and command are generated in the same way, so the
+            # tool matters only if it generated the output last time
+            #
+            Manifest = dict(Manifest, Tool=None)
+            if SavedManifest.get("Tool") is not None:
+                Manifest["Tool"] = GenFdsGlobalVariable.GetToolDigest(Cmd[0])
+        if SavedManifest != Manifest:
+            return True
+        return OutputDigest != hexlify(GetFileDigest(Output)).decode()
 
-        for F in Input:
-            # always update "Output" if any "Input" doesn't exist
-            if not os.path.exists(F):
-                return True
-            # always update "Output" if any "Input" is newer than "Output"
-            if os.path.getmtime(F) > OutputTime:
-                return True
-        return False
+    ## Save the manifest got by NeedsUpdate() after the output file is generated
+    #
+    #   @param  Output          Path of output file
+    #
+    @staticmethod
+    def SaveManifest(Output):
+        Manifest = GenFdsGlobalVariable.ManifestDict.pop(Output, None)
+        if Manifest is None or not os.path.isfile(Output):
+            return
+        if "Output" not in Manifest:
+            Manifest["Output"] = hexlify(UpdateFileDigest(Output)).decode()
+        SaveFileOnChange(Output + '.manifest', json.dumps(Manifest, sort_keys=True), False)
 
     @staticmethod
     def GenerateSection(Output, Input, Type=None, CompressionType=None, Guid=None,
@@ -458,13 +578,10 @@ class GenFdsGlobalVariable:
                 if ' '.join(Cmd).strip() not in GenFdsGlobalVariable.SecCmdList:
                     GenFdsGlobalVariable.SecCmdList.append(' '.join(Cmd).strip())
             else:
-                SectionData = array('B', [0, 0, 0, 0])
-                SectionData.fromstring(Ui.encode("utf_16_le"))
-                SectionData.append(0)
-                SectionData.append(0)
+                SectionData = bytearray(4) + Ui.encode("utf_16_le") + b'\0\0'
                 Len = len(SectionData)
                 GenFdsGlobalVariable.SectionHeader.pack_into(SectionData, 0, Len & 0xff, (Len >> 8) & 0xff, (Len >> 16) & 0xff, 0x15)
-                SaveFileOnChange(Output, SectionData.tostring())
+                SaveFileOnChange(Output, bytes(SectionData))
 
         elif Ver:
             Cmd += ("-n", Ver)
@@ -477,9 +594,12 @@ class GenFdsGlobalVariable:
                 if ' '.join(Cmd).strip() not in GenFdsGlobalVariable.SecCmdList:
                     GenFdsGlobalVariable.SecCmdList.append(' '.join(Cmd).strip())
             else:
-                if not GenFdsGlobalVariable.NeedsUpdate(Output, list(Input) + [CommandFile]):
+                if not GenFdsGlobalVariable.NeedsUpdate(Output, list(Input) + [CommandFile], Cmd, True):
                     return
-                GenFdsGlobalVariable.CallExternalTool(Cmd, "Failed to generate section")
+                SectionData = EncodeSection(Input, Type, CompressionType, Guid, GuidHdrLen, GuidAttr, Ver,
+                                            InputAlign, BuildNumber, DummyFile)
+                GenFdsGlobalVariable.SaveOutputFile(Output, SectionData, Cmd, "Failed to generate section")
+                GenFdsGlobalVariable.SaveManifest(Output)
         else:
             Cmd += ("-o", Output)
             Cmd += Input
@@ -492,9 +612,12 @@ class GenFdsGlobalVariable:
                     Cmd = ['-test', '-e', Input[0], "&&"] + Cmd
                 if ' '.join(Cmd).strip() not in GenFdsGlobalVariable.SecCmdList:
                     GenFdsGlobalVariable.SecCmdList.append(' '.join(Cmd).strip())
-            elif GenFdsGlobalVariable.NeedsUpdate(Output, list(Input) + [CommandFile]):
-                GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of newer %s" % (Output, Input))
-                GenFdsGlobalVariable.CallExternalTool(Cmd, "Failed to generate section")
+            elif GenFdsGlobalVariable.NeedsUpdate(Output, list(Input) + [CommandFile], Cmd, True):
+                GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of changed %s" % (Output, Input))
+                SectionData = EncodeSection(Input, Type, CompressionType, Guid, GuidHdrLen, GuidAttr, Ver,
+                                            InputAlign, BuildNumber, DummyFile)
+                GenFdsGlobalVariable.SaveOutputFile(Output, SectionData, Cmd, "Failed to generate section")
+                GenFdsGlobalVariable.SaveManifest(Output)
                 if (os.path.getsize(Output) >= GenFdsGlobalVariable.LARGE_FILE_SIZE and
                     GenFdsGlobalVariable.LargeFileInFvFlags):
                     GenFdsGlobalVariable.LargeFileInFvFlags[-1] = True
@@ -541,24 +664,22 @@ class GenFdsGlobalVariable:
         CommandFile = Output + '.txt'
         SaveFileOnChange(CommandFile, ' '.join(Cmd), False)
 
-        GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of newer %s" % (Output, Input))
+        GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of changed %s" % (Output, Input))
         if MakefilePath:
             if (tuple(Cmd), tuple(GenFdsGlobalVariable.SecCmdList), tuple(GenFdsGlobalVariable.CopyList)) not in GenFdsGlobalVariable.FfsCmdDict:
                 GenFdsGlobalVariable.FfsCmdDict[tuple(Cmd), tuple(GenFdsGlobalVariable.SecCmdList), tuple(GenFdsGlobalVariable.CopyList)] = MakefilePath
             GenFdsGlobalVariable.SecCmdList = []
             GenFdsGlobalVariable.CopyList = []
         else:
-            if not GenFdsGlobalVariable.NeedsUpdate(Output, list(Input) + [CommandFile]):
+            if not GenFdsGlobalVariable.NeedsUpdate(Output, list(Input) + [CommandFile], Cmd, True):
                 return
-            GenFdsGlobalVariable.CallExternalTool(Cmd, "Failed to generate FFS")
+            FfsData = EncodeFfs(Input, Type, Guid, Fixed, CheckSum, Align, SectionAlign)
+            GenFdsGlobalVariable.SaveOutputFile(Output, FfsData, Cmd, "Failed to generate FFS")
+            GenFdsGlobalVariable.SaveManifest(Output)
 
     @staticmethod
     def GenerateFirmwareVolume(Output, Input, BaseAddress=None, ForceRebase=None, Capsule=False, Dump=False,
                                AddressFile=None, MapFile=None, FfsList=[], FileSystemGuid=None):
-        if not GenFdsGlobalVariable.NeedsUpdate(Output, Input+FfsList):
-            return
-        GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of newer %s" % (Output, Input))
-
         Cmd = ["GenFv"]
         if BaseAddress:
             Cmd += ("-r", BaseAddress)
@@ -582,16 +703,16 @@ class GenFdsGlobalVariable:
         for I in Input:
             Cmd += ("-i", I)
 
+        if not GenFdsGlobalVariable.NeedsUpdate(Output, Input+FfsList, Cmd):
+            return
+        GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of changed %s" % (Output, Input))
         GenFdsGlobalVariable.CallExternalTool(Cmd, "Failed to generate FV")
+        GenFdsGlobalVariable.SaveManifest(Output)
 
     @staticmethod
     def GenerateFirmwareImage(Output, Input, Type="efi", SubType=None, Zero=False,
                               Strip=False, Replace=False, TimeStamp=None, Join=False,
                               Align=None, Padding=None, Convert=False, IsMakefile=False):
-        if not GenFdsGlobalVariable.NeedsUpdate(Output, Input) and not IsMakefile:
-            return
-        GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of newer %s" % (Output, Input))
-
         Cmd = ["GenFw"]
         if Type.lower() == "te":
             Cmd.append("-t")
@@ -618,8 +739,10 @@ class GenFdsGlobalVariable:
         if IsMakefile:
             if " ".join(Cmd).strip() not in GenFdsGlobalVariable.SecCmdList:
                 GenFdsGlobalVariable.SecCmdList.append(" ".join(Cmd).strip())
-        else:
+        elif GenFdsGlobalVariable.NeedsUpdate(Output, Input, Cmd):
+            GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of changed %s" % (Output, Input))
             GenFdsGlobalVariable.CallExternalTool(Cmd, "Failed to generate firmware image")
+            GenFdsGlobalVariable.SaveManifest(Output)
 
     @staticmethod
     def GenerateOptionRom(Output, EfiInput, BinaryInput, Compress=False, ClassCode=None,
@@ -643,11 +766,6 @@ class GenFdsGlobalVariable:
                 Cmd.append(BinFile)
                 InputList.append (BinFile)
 
-        # Check List
-        if not GenFdsGlobalVariable.NeedsUpdate(Output, InputList) and not IsMakefile:
-            return
-        GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of newer %s" % (Output, InputList))
-
         if ClassCode:
             Cmd += ("-l", ClassCode)
         if Revision:
@@ -661,15 +779,13 @@ class GenFdsGlobalVariable:
         if IsMakefile:
             if " ".join(Cmd).strip() not in GenFdsGlobalVariable.SecCmdList:
                 GenFdsGlobalVariable.SecCmdList.append(" ".join(Cmd).strip())
-        else:
+        elif GenFdsGlobalVariable.NeedsUpdate(Output, InputList, Cmd):
+            GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of changed %s" % (Output, InputList))
             GenFdsGlobalVariable.CallExternalTool(Cmd, "Failed to generate option rom")
+            GenFdsGlobalVariable.SaveManifest(Output)
 
     @staticmethod
     def GuidTool(Output, Input, ToolPath, Options='', returnValue=[], IsMakefile=False):
-        if not GenFdsGlobalVariable.NeedsUpdate(Output, Input) and not IsMakefile:
-            return
-        GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of newer %s" % (Output, Input))
-
         Cmd = [ToolPath, ]
         Cmd += Options.split(' ')
         Cmd += ("-o", Output)
@@ -677,9 +793,50 @@ class GenFdsGlobalVariable:
         if IsMakefile:
             if " ".join(Cmd).strip() not in GenFdsGlobalVariable.SecCmdList:
                 GenFdsGlobalVariable.SecCmdList.append(" ".join(Cmd).strip())
-        else:
+        elif GenFdsGlobalVariable.NeedsUpdate(Output, Input, Cmd):
+            GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s needs update because of changed %s" % (Output, Input))
             GenFdsGlobalVariable.CallExternalTool(Cmd, "Failed to call " + ToolPath, returnValue)
+            if returnValue == [] or returnValue[0] == 0:
+                GenFdsGlobalVariable.SaveManifest(Output)
 
+    ## Save the data generated in process, or run the tool if there is no data
+    #
+    #   The manifest got by NeedsUpdate() records which of them generated the
+    #   output, and the digest of the data generated in process.
+    #
+    #   @param  Output      The output file
+    #   @param  Data        The data generated in process, None if it cannot be
+    #   @param  Cmd         The tool command generating the same output file
+    #   @param  ErrorMess   The message of the error if the tool fails
+    #
+    @staticmethod
+    def SaveOutputFile(Output, Data, Cmd, ErrorMess):
+        Manifest = GenFdsGlobalVariable.ManifestDict.get(Output)
+        if Data is None:
+            GenFdsGlobalVariable.CallExternalTool(Cmd, ErrorMess)
+            if Manifest is not None:
+                Manifest["Tool"] = GenFdsGlobalVariable.GetToolDigest(Cmd[0])
+            return
+        GenFdsGlobalVariable.DebugLogger(EdkLogger.DEBUG_5, "%s is generated in process" % Output)
+        try:
+            with open(Output, 'wb') as File:
+                File.write(Data)
+        except (IOError, OSError):
+            EdkLogger.error("GenFds", FILE_WRITE_FAILURE, ExtraData=Output)
+        Digest = hexlify(UpdateFileDigest(Output, Data)).decode()
+        if Manifest is not None:
+            Manifest["Tool"] = None
+            Manifest["Output"] = Digest
+
+    ## Call an external tool
+    #
+    #   @param  cmd         The command line of the tool
+    #   @param  errorMess   The message of the error if the tool fails
+    #   @param  returnValue Receive the return value of the tool instead of reporting error
+    #
+    #   ParallelLock is released while the tool is running, so that the tools of
+    #   the FVs generated in parallel run at the same time.
+    #
     @staticmethod
     def CallExternalTool (cmd, errorMess, returnValue=[]):
 
@@ -700,11 +857,18 @@ class GenFdsGlobalVariable:
             if GenFdsGlobalVariable.SharpCounter % GenFdsGlobalVariable.SharpNumberPerLine == 0:
                 stdout.write('\n')
 
+        Lock = GenFdsGlobalVariable.ParallelLock
+        if Lock is not None:
+            Lock.release()
         try:
-            PopenObject = Popen(' '.join(cmd), stdout=PIPE, stderr=PIPE, shell=True)
-        except Exception as X:
-            EdkLogger.error("GenFds", COMMAND_FAILURE, ExtraData="%s: %s" % (str(X), cmd[0]))
-        (out, error) = PopenObject.communicate()
+            try:
+                PopenObject = Popen(' '.join(cmd), stdout=PIPE, stderr=PIPE, shell=True)
+            except Exception as X:
+                EdkLogger.error("GenFds", COMMAND_FAILURE, ExtraData="%s: %s" % (str(X), cmd[0]))
+            (out, error) = PopenObject.communicate()
+        finally:
+            if Lock is not None:
+                Lock.acquire()
 
         while PopenObject.returncode is None:
             PopenObject.wait()
@@ -33,10 +33,19 @@ from Common.Parsing import IsValidWord
 from Common.VariableAttributes import VariableAttributes
 import Common.GlobalData as GlobalData
 import subprocess
+import hashlib
+import glob
+import shutil
 from functools import reduce
 from Common.Misc import SaveFileOnChange
+from Common.FileHashCache import GetFileDigest
 from Workspace.BuildClassObject import PlatformBuildClassObject, StructurePcd, PcdClassObject, ModuleBuildClassObject
+from Workspace.StructurePcdLayout import StructureLayout, StructureLayoutError, GetHostArchInclude
 from collections import OrderedDict, defaultdict
+try:
+    import ctypes
+except ImportError:
+    ctypes = None
 
 def _IsFieldValueAnArray (Value):
     Value = Value.strip()
@@ -113,6 +122,12 @@ SkuIdPattern = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
 ## regular expressions for finding decimal and hex numbers
 Pattern = re.compile('^[1-9]\d*|0$')
 HexPattern = re.compile(r'0[xX][0-9a-fA-F]+$')
+## regular expression for the numbers read by strtoul() in base 16
+gStrtoulPattern = re.compile(r'\s*([+-]?)(?:0[xX](?=[0-9a-fA-F]))?([0-9a-fA-F]+)')
+## ctypes codes of the integer types, which a number can be assigned to
+gIntegerTypeCodes = ('b', 'B', 'h', 'H', 'i', 'I', 'l', 'L', 'q', 'Q')
+## regular expression for the negative numbers, which are written to the C code as they are
+gNegativeNumberPattern = re.compile(r'-\s*(0[xX][0-9a-fA-F]+|[1-9][0-9]*|0)$')
 ## Regular expression for finding header file inclusions
 from AutoGen.GenMake import gIncludePattern
 
@@ -220,6 +235,8 @@ class DscBuildData(PlatformBuildClassObject):
 
     # used to compose dummy library class name for those forced library instances
     _NullLibraryNumber = 0
+    # path and version of the host compiler building the PcdValueInit application
+    _PcdValueInitCompiler = None
 
     ## Constructor of DscBuildData
     #
@@ -2556,13 +2573,16 @@ class DscBuildData(PlatformBuildClassObject):
 
         InitByteValue = ""
         CApp = PcdMainCHeader
+        PcdSizeFields = {PcdName: self.GetStructurePcdSizeFields(Pcd) for PcdName, Pcd in StructuredPcds.items()}
 
         IncludeFiles = set()
+        IncludeFileList = []
         for PcdName in StructuredPcds:
             Pcd = StructuredPcds[PcdName]
             for IncludeFile in Pcd.StructuredPcdIncludeFile:
                 if IncludeFile not in IncludeFiles:
                     IncludeFiles.add(IncludeFile)
+                    IncludeFileList.append(IncludeFile)
                     CApp = CApp + '#include <%s>\n' % (IncludeFile)
         CApp = CApp + '\n'
         for Pcd in StructuredPcds.values():
@@ -2678,6 +2698,7 @@ class DscBuildData(PlatformBuildClassObject):
                             BuildOptions[Arch] = set()
                         BuildOptions[Arch] |= self.ParseCCFlags(self.BuildOptions[Options])
 
+        MacroFlagList = []
         if BuildOptions:
             ArchBuildOptions = {arch:flags for arch,flags in BuildOptions.items() if arch != 'COMMON'}
             if len(ArchBuildOptions.keys()) == 1:
@@ -2688,6 +2709,7 @@ class DscBuildData(PlatformBuildClassObject):
             ValueList = [item for item in BuildOptions['COMMON'] if item.startswith((r"/U","-U"))]
             ValueList.extend([item for item in BuildOptions['COMMON'] if item.startswith((r"/D", "-D"))])
             CC_FLAGS += " ".join(ValueList)
+            MacroFlagList = ValueList
         MakeApp += CC_FLAGS
 
         if sys.platform == "win32":
@@ -2718,11 +2740,83 @@ class DscBuildData(PlatformBuildClassObject):
         OutputValueFile = os.path.join(self.OutputPath, 'Output.txt')
         SaveFileOnChange(InputValueFile, InitByteValue, False)
 
+        #
+        # The values are evaluated in Python if the layout of the structures can
+        # be got from the header files. Otherwise the application is built and run.
+        #
+        try:
+            return self.EvaluateStructurePcds(StructuredPcds, InitByteValue, IncludeFileList, IncSearchList, MacroFlagList, PcdSizeFields)
+        except StructureLayoutError as X:
+            EdkLogger.verbose("Evaluate structure PCDs by %s: %s" % (PcdValueInitName, X))
+
         Dest_PcdValueInitExe = PcdValueInitName
         if not sys.platform == "win32":
             Dest_PcdValueInitExe = os.path.join(self.OutputPath, PcdValueInitName)
         else:
             Dest_PcdValueInitExe = os.path.join(self.OutputPath, PcdValueInitName) +".exe"
+        #
+        # The application is kept in the cache of PcdValueInit applications, keyed by
+        # the digest of the C code, the compiler flags and the header files. It's not
+        # built again if it's found in the cache.
+        #
+        AppDigest = None
+        CachedApp = None
+        if GlobalData.gPcdValueInitCache:
+            AppDigest = self.GetPcdValueInitDigest(CApp, CC_FLAGS, IncSearchList, IncFileList)
+            CachedApp = os.path.join(GlobalData.gPcdValueInitCache, AppDigest, os.path.basename(Dest_PcdValueInitExe))
+        if CachedApp and os.path.exists(CachedApp):
+            Dest_PcdValueInitExe = CachedApp
+        else:
+            self.BuildPcdValueInitApp(MakeFileName)
+            if CachedApp:
+                # copy to a temporary file first, so that other builds never run a partial one
+                TempApp = '%s.%d.tmp' % (CachedApp, os.getpid())
+                try:
+                    CreateDirectory(os.path.dirname(CachedApp))
+                    shutil.copy2(Dest_PcdValueInitExe, TempApp)
+                    os.replace(TempApp, CachedApp)
+                except (IOError, OSError) as X:
+                    EdkLogger.verbose("Failed to cache %s: %s" % (Dest_PcdValueInitExe, X))
+
+        #
+        # The output is got from the same application and the same input before if
+        # the digest of them is the one saved with the output
+        #
+        OutputDigestFile = os.path.join(self.OutputPath, 'Output.digest')
+        if AppDigest:
+            m = hashlib.md5(AppDigest.encode())
+            m.update(InitByteValue.encode())
+            OutputDigest = m.hexdigest()
+            NeedUpdate = True
+            if os.path.exists(OutputValueFile) and os.path.exists(OutputDigestFile):
+                with open(OutputDigestFile, 'r') as File:
+                    NeedUpdate = File.read() != OutputDigest
+        else:
+            NeedUpdate = DscBuildData.NeedUpdateOutput(OutputValueFile, Dest_PcdValueInitExe, InputValueFile)
+        if NeedUpdate:
+            Command = Dest_PcdValueInitExe + ' -i %s -o %s' % (InputValueFile, OutputValueFile)
+            returncode, StdOut, StdErr = DscBuildData.ExecuteCommand (Command)
+            if returncode != 0:
+                EdkLogger.warn('Build', COMMAND_FAILURE, 'Can not collect output from command: %s' % Command)
+            elif AppDigest:
+                SaveFileOnChange(OutputDigestFile, OutputDigest, False)
+
+        File = open (OutputValueFile, 'r')
+        FileBuffer = File.readlines()
+        File.close()
+
+        StructurePcdSet = []
+        for Pcd in FileBuffer:
+            PcdValue = Pcd.split ('|')
+            PcdInfo = PcdValue[0].split ('.')
+            StructurePcdSet.append((PcdInfo[0], PcdInfo[1], PcdInfo[2], PcdInfo[3], PcdValue[2].strip()))
+        return StructurePcdSet
+
+    ## Build the application evaluating the values of structure PCDs
+    #
+    #   @param  MakeFileName    The path of the makefile of the application
+    #
+    def BuildPcdValueInitApp(self, MakeFileName):
         Messages = ''
         if sys.platform == "win32":
             MakeCommand = 'nmake -f %s' % (MakeFileName)
@@ -2779,22 +2873,432 @@ class DscBuildData(PlatformBuildClassObject):
             else:
                 EdkLogger.error('Build', COMMAND_FAILURE, 'Can not execute command: %s' % MakeCommand)
 
-        if DscBuildData.NeedUpdateOutput(OutputValueFile, Dest_PcdValueInitExe, InputValueFile):
-            Command = Dest_PcdValueInitExe + ' -i %s -o %s' % (InputValueFile, OutputValueFile)
-            returncode, StdOut, StdErr = DscBuildData.ExecuteCommand (Command)
-            if returncode != 0:
-                EdkLogger.warn('Build', COMMAND_FAILURE, 'Can not collect output from command: %s' % Command)
+    ## Get the digest of the application evaluating the values of structure PCDs
+    #
+    #   @param  CApp            The C code of the application
+    #   @param  CcFlags         The compiler flags
+    #   @param  IncSearchList   The include paths
+    #   @param  IncFileList     The header files included by the C code
+    #
+    #   @retval str             The md5 digest of them and of the host compiler in hex string
+    #
+    @staticmethod
+    def GetPcdValueInitDigest(CApp, CcFlags, IncSearchList, IncFileList):
+        m = hashlib.md5()
+        m.update(('%s\n%s\n%s\n' % (sys.platform, CcFlags, '\n'.join(str(Inc) for Inc in IncSearchList))).encode())
+        m.update(DscBuildData.GetPcdValueInitCompiler().encode())
+        m.update(CApp.encode())
+        for File in sorted(set(IncFileList)):
+            m.update(File.encode())
+            m.update(GetFileDigest(File))
+        # the application is linked with the common library of BaseTools
+        if sys.platform == "win32":
+            LibList = glob.glob(os.path.join(os.getenv('BASE_TOOLS_PATH', ''), 'Lib', '*', 'Common.lib'))
+        else:
+            LibList = [os.path.join(os.getenv('EDK_TOOLS_PATH', ''), 'Source', 'C', 'libs', 'libCommon.a')]
+        for Lib in LibList:
+            if os.path.exists(Lib):
+                m.update(GetFileDigest(Lib))
+        return m.hexdigest()
 
-        File = open (OutputValueFile, 'r')
-        FileBuffer = File.readlines()
-        File.close()
+    ## Get the host compiler the application evaluating structure PCDs is built with
+    #
+    #   It's the compiler of the BaseTools makefiles, BUILD_CC on POSIX hosts and
+    #   cl.exe on Windows. The path and the version banner of the compiler are
+    #   got once in a process.
+    #
+    #   @retval str             The compiler, its path and its version banner
+    #
+    @staticmethod
+    def GetPcdValueInitCompiler():
+        if DscBuildData._PcdValueInitCompiler is None:
+            if sys.platform == "win32":
+                Compiler = 'cl.exe'
+                # cl prints its version banner when it's run without argument
+                VersionCommand = Compiler
+            else:
+                Compiler = os.getenv('BUILD_CC') or 'gcc'
+                VersionCommand = Compiler + ' --version'
+            CompilerPath = shutil.which(Compiler.split()[0])
+            returncode, StdOut, StdErr = DscBuildData.ExecuteCommand(VersionCommand)
+            DscBuildData._PcdValueInitCompiler = '%s\n%s\n%s\n%s' % (Compiler, CompilerPath, StdOut, StdErr)
+        return DscBuildData._PcdValueInitCompiler
+
+    ## Get the include paths the application evaluating structure PCDs is built with
+    #
+    #   @param  IncSearchList   The include paths of the packages the PCDs depend on
+    #
+    #   @retval list            The include paths, in the order the compiler searches them
+    #
+    @staticmethod
+    def GetPcdValueInitSearchPath(IncSearchList):
+        Arch = GetHostArchInclude()
+        if sys.platform == "win32":
+            SourcePath = os.path.join(os.getenv('BASE_TOOLS_PATH', ''), 'Source', 'C')
+        else:
+            SourcePath = os.path.join(os.getenv('EDK_TOOLS_PATH', ''), 'Source', 'C')
+        ArchInclude = os.path.join(SourcePath, 'Include', Arch or '')
+        if not Arch or not os.path.isfile(os.path.join(ArchInclude, 'ProcessorBind.h')):
+            raise StructureLayoutError("ProcessorBind.h of the host processor is not found in %s" % SourcePath)
+        # the include paths in ms.common and header.makefile
+        if sys.platform == "win32":
+            SearchPathList = ['.', os.path.join(SourcePath, 'Include'), ArchInclude, os.path.join(SourcePath, 'Common')]
+        else:
+            SearchPathList = [SourcePath, os.path.join(SourcePath, 'Include', 'Common'), os.path.join(SourcePath, 'Include'),
+                              os.path.join(SourcePath, 'Include', 'IndustryStandard'), os.path.join(SourcePath, 'Common'),
+                              '..', '.', ArchInclude]
+        SearchPathList.extend(str(Inc) for Inc in IncSearchList)
+        return SearchPathList
 
-        StructurePcdSet = []
-        for Pcd in FileBuffer:
-            PcdValue = Pcd.split ('|')
-            PcdInfo = PcdValue[0].split ('.')
-            StructurePcdSet.append((PcdInfo[0], PcdInfo[1], PcdInfo[2], PcdInfo[3], PcdValue[2].strip()))
-        return StructurePcdSet
+    ## Get the macros defined by the -D and -U compiler flags
+    #
+    #   @param  MacroFlagList   The -D and -U flags, in the order they're passed to the compiler
+    #
+    #   @retval dict            The macro values, None for the macros undefined
+    #
+    @staticmethod
+    def GetPcdValueInitMacros(MacroFlagList):
+        MacroDict = {}
+        for Flag in MacroFlagList:
+            Name, Equal, Value = Flag[2:].strip().partition('=')
+            if Flag[1] == 'U':
+                MacroDict[Name.strip()] = None
+            else:
+                MacroDict[Name.strip()] = Value if Equal else '1'
+        return MacroDict
+
+    ## Convert a PCD value in the input of the application to bytes
+    #
+    #  The items are read like PcdGetPtr() of the application does, i.e. each by
+    #  strtoul() in base 16 until one can't be converted.
+    #
+    #   @param  Value   The value, e.g. {0x01,0x02}
+    #
+    #   @retval bytearray   The bytes of the value
+    #
+    @staticmethod
+    def PcdValueToBytes(Value):
+        Buffer = bytearray()
+        Index = 1
+        while True:
+            Match = gStrtoulPattern.match(Value, Index)
+            if not Match:
+                return Buffer
+            Item = int(Match.group(2), 16)
+            if Item > 0xFFFFFFFFFFFFFFFF:
+                Item = 0xFFFFFFFFFFFFFFFF
+            if Match.group(1) == '-':
+                Item = -Item
+            Buffer.append(Item & 0xff)
+            Index = Match.end() + 1
+
+    @staticmethod
+    def IntToBytes(Value, ValueSize):
+        return bytes((Value >> (Index * 8)) & 0xff for Index in range(ValueSize))
+
+    ## Get a value of a structure PCD, or of a field of it, as bytes
+    #
+    #   @param  Value       The value from DEC, DSC, FDF or command line
+    #   @param  GuidDict    The GUIDs used by the value, None for a value of the whole PCD
+    #   @param  ToArray     If the value is converted by StringToArray(), like the value in DEC is
+    #
+    #   @retval tuple       (If the value is an array, the value, the size of the value)
+    #
+    #   StructureLayoutError is raised for the value which can't be parsed, so that
+    #   the application built from the C code evaluates it.
+    #
+    @staticmethod
+    def ParseStructurePcdValue(Value, GuidDict=None, ToArray=False):
+        IsArray = _IsFieldValueAnArray(Value)
+        if IsArray and "{CODE(" in Value:
+            raise StructureLayoutError("CODE() value %s is not supported" % Value)
+        try:
+            if IsArray:
+                if GuidDict is None:
+                    Value = ValueExpressionEx(Value, TAB_VOID)(True)
+                else:
+                    Value = ValueExpressionEx(Value, TAB_VOID, GuidDict)(True)
+            if ToArray:
+                Value = StringToArray(Value)
+            Value, ValueSize = ParseFieldValue(Value)
+        except (BadExpression, ValueError) as X:
+            raise StructureLayoutError("Value %s can't be parsed: %s" % (Value, X))
+        if isinstance(Value, str) and gNegativeNumberPattern.match(Value.strip()):
+            Value = -int(gNegativeNumberPattern.match(Value.strip()).group(1), 0)
+        if isinstance(Value, str):
+            raise StructureLayoutError("C expression %s is not supported" % Value)
+        return IsArray, Value, ValueSize
+
+    ## Copy a value to the buffer of a structure PCD
+    #
+    #   @param  Buffer      The buffer of the PCD
+    #   @param  Offset      The offset the value is copied to
+    #   @param  Data        The bytes of the value
+    #
+    @staticmethod
+    def CopyStructurePcdData(Buffer, Offset, Data):
+        if Offset + len(Data) > len(Buffer):
+            raise StructureLayoutError("The value exceeds the buffer of %d bytes" % len(Buffer))
+        Buffer[Offset:Offset + len(Data)] = Data
+
+    ## Assign a value to the whole structure PCD, like the application does
+    #
+    #  Only a value of an array is copied to the PCD.
+    #
+    #   @param  Buffer      The buffer of the PCD
+    #   @param  Value       The value
+    #   @param  ToArray     If the value is converted by StringToArray()
+    #
+    def AssignStructurePcdValue(self, Buffer, Value, ToArray=False):
+        IsArray, Value, ValueSize = self.ParseStructurePcdValue(Value, None, ToArray)
+        if IsArray:
+            self.CopyStructurePcdData(Buffer, 0, self.IntToBytes(Value, ValueSize))
+
+    ## Assign a value to a field of a structure PCD, like the application does
+    #
+    #   @param  Layout      The layout of the structures
+    #   @param  Pcd         The PCD
+    #   @param  Buffer      The buffer of the PCD
+    #   @param  FieldName   The name of the field, e.g. A.B[1]
+    #   @param  Value       The value
+    #
+    def AssignStructurePcdField(self, Layout, Pcd, Buffer, FieldName, Value):
+        IsArray, Value, ValueSize = self.ParseStructurePcdValue(Value, self._GuidDict)
+        Offset, FieldType = Layout.GetField(Pcd.DatumType, FieldName)
+        FieldSize = ctypes.sizeof(FieldType)
+        if IsArray:
+            # the application doesn't compile if the value doesn't fit in the field
+            if FieldSize and FieldSize < ValueSize:
+                raise StructureLayoutError("Value of %s exceeds the field of %d bytes" % (FieldName, FieldSize))
+            Data = self.IntToBytes(Value, ValueSize)
+        else:
+            if getattr(FieldType, '_type_', None) not in gIntegerTypeCodes:
+                raise StructureLayoutError("Field %s is not an integer" % FieldName)
+            # the application doesn't compile if the value is changed by the conversion
+            if Value < -(1 << (FieldSize * 8 - 1)) or Value >= (1 << (FieldSize * 8)):
+                raise StructureLayoutError("Value of %s overflows the field" % FieldName)
+            Data = (Value & ((1 << (FieldSize * 8)) - 1)).to_bytes(FieldSize, sys.byteorder)
+        self.CopyStructurePcdData(Buffer, Offset, Data)
+
+    ## Assign the values of fields of a structure PCD, like the application does
+    #
+    #   @param  Layout      The layout of the structures
+    #   @param  Pcd         The PCD
+    #   @param  Buffer      The buffer of the PCD
+    #   @param  FieldValues The field values by the array indexes, or the field values
+    #   @param  Indexed     If the field values are by the array indexes
+    #
+    def AssignStructurePcdFields(self, Layout, Pcd, Buffer, FieldValues, Indexed=True):
+        for Index, FieldList in (FieldValues.items() if Indexed else [('', FieldValues)]):
+            if not FieldList:
+                continue
+            if Index:
+                raise StructureLayoutError("Field values of PCD array are not supported")
+            for FieldName in FieldList:
+                self.AssignStructurePcdField(Layout, Pcd, Buffer, FieldName, FieldList[FieldName][0])
+
+    ## Get the field values the size of a structure PCD depends on
+    #
+    #  They're got before the field values are replaced by the functions generating
+    #  the C code, because GenerateSizeFunction() uses the values not replaced.
+    #
+    #   @param  Pcd         The PCD
+    #
+    #   @retval tuple       (The array indexes, [(FieldName, Value), ...])
+    #
+    @staticmethod
+    def GetStructurePcdSizeFields(Pcd):
+        ActualCap = []
+        FieldValueList = []
+        for Index, FieldList in Pcd.DefaultValues.items():
+            if Index:
+                ActualCap.append(Index)
+            FieldValueList.append(FieldList)
+        for SkuName in Pcd.SkuOverrideValues:
+            if SkuName == TAB_COMMON:
+                continue
+            for DefaultStoreName in Pcd.SkuOverrideValues[SkuName]:
+                for Index, FieldList in Pcd.SkuOverrideValues[SkuName][DefaultStoreName].items():
+                    if Index:
+                        ActualCap.append(Index)
+                    FieldValueList.append(FieldList)
+        FieldValueList.append(Pcd.PcdFieldValueFromFdf)
+        FieldValueList.append(Pcd.PcdFieldValueFromComm)
+        return ActualCap, [(FieldName, FieldList[FieldName][0]) for FieldList in FieldValueList if FieldList for FieldName in FieldList]
+
+    ## Get the size of the buffer of a structure PCD, like Cal_*_Size() of the application does
+    #
+    #   @param  Layout      The layout of the structures
+    #   @param  Pcd         The PCD
+    #   @param  SizeFields  The value got by GetStructurePcdSizeFields()
+    #
+    #   @retval int         The size of the buffer
+    #
+    def GetStructurePcdSize(self, Layout, Pcd, SizeFields):
+        Size = Layout.SizeOf(Pcd.DatumType)
+        if "{CODE(" in Pcd.DefaultValueFromDec:
+            raise StructureLayoutError("CODE() value in DEC is not supported")
+        if Pcd.Type in PCD_DYNAMIC_TYPE_SET | PCD_DYNAMIC_EX_TYPE_SET:
+            DscValueList = []
+            for SkuName, SkuObj in Pcd.SkuInfoList.items():
+                for DefaultStore in (SkuObj.DefaultStoreDict if SkuObj.VariableName else [TAB_DEFAULT_STORES_DEFAULT]):
+                    DscValueList.append(self.GetPcdDscRawDefaultValue(Pcd, SkuName, DefaultStore))
+        else:
+            DscValueList = [self.GetPcdDscRawDefaultValue(Pcd, TAB_DEFAULT, TAB_DEFAULT_STORES_DEFAULT)]
+        for DscValue in DscValueList:
+            if DscValue:
+                if "{CODE(" in DscValue:
+                    raise StructureLayoutError("CODE() value in DSC is not supported")
+                Size = max(Size, int(self.GetStructurePcdMaxSize(Pcd)))
+
+        ActualCap, FieldValueList = SizeFields
+        for FieldName, Value in FieldValueList:
+            if _IsFieldValueAnArray(Value) and not (Value.startswith('{GUID') and Value.endswith('}')):
+                IsArray, Value, ValueSize = self.ParseStructurePcdValue(Value, self._GuidDict)
+                Size = self.GetFlexibleSize(Layout, Pcd, Size, FieldName, None, ValueSize)
+            elif '[' in FieldName:
+                # the size for the highest index, all the indexes are taken as 0 but the last one
+                NewFieldName = ''
+                while '[' in FieldName:
+                    NewFieldName = NewFieldName + FieldName.split('[', 1)[0] + '[0]'
+                    LastIndex = int(FieldName.split('[', 1)[1].split(']', 1)[0])
+                    FieldName = FieldName.split(']', 1)[1]
+                FieldName = NewFieldName + FieldName
+                while '[' in FieldName:
+                    FieldName = FieldName.rsplit('[', 1)[0]
+                    Size = self.GetFlexibleSize(Layout, Pcd, Size, FieldName, LastIndex + 1)
+        if Pcd.GetPcdMaxSize():
+            Size = max(Size, Pcd.GetPcdMaxSize())
+        ArraySizeByAssign = self.CalculateActualCap(ActualCap)
+        if ArraySizeByAssign > 1:
+            Size = max(Size, ArraySizeByAssign)
+        return Size
+
+    ## Get the size of a structure PCD with a flexible array member, like __FLEXIBLE_SIZE() does
+    #
+    #   @param  Layout      The layout of the structures
+    #   @param  Pcd         The PCD
+    #   @param  Size        The current size
+    #   @param  FieldName   The name of the array field
+    #   @param  MaxIndex    The number of the elements used
+    #   @param  ValueSize   The size of the value assigned to the array, if MaxIndex is None
+    #
+    #   @retval int         The new size
+    #
+    @staticmethod
+    def GetFlexibleSize(Layout, Pcd, Size, FieldName, MaxIndex, ValueSize=0):
+        Offset, FieldType = Layout.GetField(Pcd.DatumType, FieldName)
+        if not issubclass(FieldType, ctypes.Array):
+            raise StructureLayoutError("Field %s is not an array" % FieldName)
+        ElementSize = ctypes.sizeof(FieldType._type_)
+        if MaxIndex is None:
+            MaxIndex = ValueSize // ElementSize + (1 if ValueSize % ElementSize else 0)
+        if ctypes.sizeof(FieldType) == 0:
+            Size = max(Offset + ElementSize * MaxIndex, Size)
+        return Size
+
+    ## Assign the values of a structure PCD in DSC for a SKU and a default store,
+    #  like Assign_*_Value() of the application does
+    #
+    #   @param  Layout      The layout of the structures
+    #   @param  Pcd         The PCD
+    #   @param  Buffer      The buffer of the PCD
+    #   @param  SkuName     The name of the SKU
+    #   @param  DefaultStoreName    The name of the default store
+    #
+    def AssignStructurePcdDscValue(self, Layout, Pcd, Buffer, SkuName, DefaultStoreName):
+        PcdDefaultValue = self.GetPcdDscRawDefaultValue(Pcd, SkuName, DefaultStoreName)
+        if PcdDefaultValue:
+            self.AssignStructurePcdValue(Buffer, PcdDefaultValue)
+        if (SkuName, DefaultStoreName) == (TAB_DEFAULT, TAB_DEFAULT_STORES_DEFAULT) or ((SkuName, '') not in Pcd.ValueChain and (SkuName, DefaultStoreName) not in Pcd.ValueChain):
+            self.AssignStructurePcdFields(Layout, Pcd, Buffer, Pcd.SkuOverrideValues[SkuName].get(DefaultStoreName) or {})
+
+    ## Evaluate the values of structure PCDs in Python
+    #
+    #  The values are got like the application built from the C code generated by
+    #  GenerateByteArrayValue() does, with the layout of the structures got from
+    #  the header files by StructureLayout. StructureLayoutError is raised for
+    #  the PCDs which can't be evaluated this way, e.g. the array
+    #  PCDs, the CODE() values, the fields assigned with C expressions, and the
+    #  structures with bit fields.
+    #
+    #   @param  StructuredPcds  The structure PCDs
+    #   @param  InitByteValue   The input of the application
+    #   @param  IncludeFileList The header files included by the application
+    #   @param  IncSearchList   The include paths of the packages the PCDs depend on
+    #   @param  MacroFlagList   The -D and -U compiler flags of the application
+    #   @param  PcdSizeFields   The values got by GetStructurePcdSizeFields() by the PCD names
+    #
+    #   @retval list            (SkuName, DefaultStoreName, TokenSpaceGuidCName, TokenCName, Value) of each PCD value
+    #
+    def EvaluateStructurePcds(self, StructuredPcds, InitByteValue, IncludeFileList, IncSearchList, MacroFlagList, PcdSizeFields):
+        for Pcd in StructuredPcds.values():
+            if Pcd.IsArray():
+                raise StructureLayoutError("PCD array %s.%s is not supported" % (Pcd.TokenSpaceGuidCName, Pcd.TokenCName))
+        Layout = StructureLayout(['PcdValueCommon.h'] + IncludeFileList, self.GetPcdValueInitSearchPath(IncSearchList),
+                                 self.GetPcdValueInitMacros(MacroFlagList))
+
+        # the values of the PCDs like PcdGet/SetPtr() of the application access them
+        PcdValueList = []
+        PcdIndex = {}
+        for Line in InitByteValue.splitlines():
+            Name, DatumType, Value = Line.split('|')
+            Key = tuple(Name.split('.'))
+            if len(Key) != 4 or '.' in Value:
+                raise StructureLayoutError("Invalid value %s" % Line)
+            if Key not in PcdIndex:
+                PcdIndex[Key] = len(PcdValueList)
+            PcdValueList.append(Key + (Value.strip(),))
+
+        SystemPcdType = [self._PCD_TYPE_STRING_[MODEL_PCD_FIXED_AT_BUILD], self._PCD_TYPE_STRING_[MODEL_PCD_PATCHABLE_IN_MODULE]]
+        for PcdName, Pcd in StructuredPcds.items():
+            # the Assign_*_Value() and Initialize_*() functions in the application
+            if self.SkuOverrideValuesEmpty(Pcd.SkuOverrideValues) or Pcd.Type in SystemPcdType:
+                AssignList = [(self.SkuIdMgr.SystemSkuId, TAB_DEFAULT_STORES_DEFAULT)]
+                OverrideValues = Pcd.SkuOverrideValues[self.SkuIdMgr.SystemSkuId] if Pcd.SkuOverrideValues else {TAB_DEFAULT_STORES_DEFAULT: {}}
+                InitializeList = [(self.SkuIdMgr.SystemSkuId, DefaultStoreName) for DefaultStoreName in (OverrideValues or [TAB_DEFAULT_STORES_DEFAULT])]
+                CallList = [(self.SkuIdMgr.SystemSkuId, TAB_DEFAULT_STORES_DEFAULT)]
+            else:
+                AssignList = [(SkuName, DefaultStoreName) for SkuName in self.SkuIdMgr.SkuOverrideOrder() if SkuName in Pcd.SkuOverrideValues
+                              for DefaultStoreName in Pcd.SkuOverrideValues[SkuName]]
+                InitializeList = [(SkuName, DefaultStoreName) for SkuName in self.SkuIdMgr.SkuOverrideOrder() if SkuName in Pcd.SkuOverrideValues
+                                  for DefaultStoreName in (Pcd.SkuOverrideValues[SkuName] or [TAB_DEFAULT_STORES_DEFAULT])]
+                CallList = [(SkuName, DefaultStoreName) for SkuName in self.SkuIdMgr.SkuOverrideOrder() if SkuName in self.SkuIdMgr.AvailableSkuIdSet
+                            for DefaultStoreName in Pcd.SkuOverrideValues[SkuName]]
+
+            Size = self.GetStructurePcdSize(Layout, Pcd, PcdSizeFields[PcdName])
+            for SkuName, DefaultStoreName in CallList:
+                if (SkuName, DefaultStoreName) not in InitializeList:
+                    raise StructureLayoutError("Initialize_%s_%s_%s_%s() is not defined" % (SkuName, DefaultStoreName, Pcd.TokenSpaceGuidCName, Pcd.TokenCName))
+                Key = (SkuName, DefaultStoreName, Pcd.TokenSpaceGuidCName, Pcd.TokenCName)
+                if Key not in PcdIndex:
+                    raise StructureLayoutError("PCD %s is not in database" % ".".join(Key))
+                OriginalPcd = self.PcdValueToBytes(PcdValueList[PcdIndex[Key]][4])
+                Buffer = bytearray(max(len(OriginalPcd), Size))
+                Buffer[:len(OriginalPcd)] = OriginalPcd
+
+                # the value and the field values in DEC
+                self.AssignStructurePcdValue(Buffer, Pcd.DefaultValueFromDec, True)
+                self.AssignStructurePcdFields(Layout, Pcd, Buffer, Pcd.DefaultValues)
+                # the values in DSC
+                if Pcd.Type not in SystemPcdType:
+                    for SkuItem in self.SkuIdMgr.GetSkuChain(SkuName):
+                        for DefaultStoreItem in ([DefaultStoreName] if DefaultStoreName == TAB_DEFAULT_STORES_DEFAULT else [TAB_DEFAULT_STORES_DEFAULT, DefaultStoreName]):
+                            if (SkuItem, DefaultStoreItem) not in AssignList:
+                                raise StructureLayoutError("Assign_%s_%s_%s_%s_Value() is not defined" % (Pcd.TokenSpaceGuidCName, Pcd.TokenCName, SkuItem, DefaultStoreItem))
+                            self.AssignStructurePcdDscValue(Layout, Pcd, Buffer, SkuItem, DefaultStoreItem)
+                        if SkuItem == SkuName:
+                            break
+                else:
+                    self.AssignStructurePcdDscValue(Layout, Pcd, Buffer, self.SkuIdMgr.SystemSkuId, TAB_DEFAULT_STORES_DEFAULT)
+                # the values in FDF and command line
+                for WholeValue, FieldValues in ((Pcd.PcdValueFromFdf, Pcd.PcdFieldValueFromFdf), (Pcd.PcdValueFromComm, Pcd.PcdFieldValueFromComm)):
+                    if WholeValue:
+                        self.AssignStructurePcdValue(Buffer, WholeValue)
+                    self.AssignStructurePcdFields(Layout, Pcd, Buffer, FieldValues, False)
+                PcdValueList[PcdIndex[Key]] = Key + ('{%s}' % ','.join('0x%02x' % Byte for Byte in Buffer),)
+
+        return PcdValueList
 
     @staticmethod
     def NeedUpdateOutput(OutputFile, ValueCFile, StructureInput):
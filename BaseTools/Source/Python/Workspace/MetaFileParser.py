@@ -31,6 +31,11 @@ from collections import defaultdict
 from .MetaFileTable import MetaFileStorage
 from .MetaFileCommentParser import CheckInfComment
 from Common.DataType import TAB_COMMENT_EDK_START, TAB_COMMENT_EDK_END
+from Common.FileHashCache import GetFileDigest
+
+## Version of the records got by parsers, the records saved in the meta file
+#  cache by other version are discarded. Increase it when the records change.
+PARSER_VERSION = 1
 
 ## RegEx for finding file versions
 hexVersionPattern = re.compile(r'0[xX][\da-f-A-F]{5,8}')
@@ -122,6 +127,9 @@ class MetaFileParser(object):
     # Parser objects used to implement singleton
     MetaFiles = {}
 
+    # the raw records of the file can be saved in the meta file cache
+    _CACHEABLE_ = False
+
     ## Factory method
     #
     # One file, one parser object. This factory method makes sure that there's
@@ -257,7 +265,43 @@ class MetaFileParser(object):
             else:
                 self._Table = self._RawTable
                 self._PostProcessed = False
+                CacheKey = self.GetCacheKey(str(self.MetaFile))
+                if CacheKey:
+                    RecordList = GlobalData.gMetaFileCache.Get(str(self.MetaFile), CacheKey)
+                    if RecordList is not None:
+                        self._Table.InsertRecordList(RecordList)
+                        self._Done()
+                        return
                 self.Start()
+                if CacheKey:
+                    GlobalData.gMetaFileCache.Set(str(self.MetaFile), CacheKey, self._Table.GetRecordList())
+
+    ## Get the key of the raw records of the file in the meta file cache
+    #
+    #  The records depend on the content of the file and the parser. The names
+    #  of global macros are also in the key because they're checked in parsing.
+    #
+    #   @param  FilePath    The path of the file
+    #
+    #   @retval str         The key of the records
+    #   @retval None        The records can't be cached
+    #
+    @classmethod
+    def GetCacheKey(Class, FilePath):
+        if not Class._CACHEABLE_ or not GlobalData.gMetaFileCache:
+            return None
+        # the usage comments are checked in parsing only
+        if GlobalData.gOptions and GlobalData.gOptions.CheckUsage:
+            return None
+        try:
+            Digest = GetFileDigest(FilePath)
+        except (IOError, OSError):
+            # let the parser report the error
+            return None
+        m = md5(Digest)
+        m.update(("%s %d %s" % (Class.__name__, PARSER_VERSION, " ".join(sorted(GlobalData.gGlobalDefines)))).encode())
+        return m.hexdigest()
+
     ## Data parser for the common format in different type of file
     #
     #   The common format in the meatfile is like
@@ -524,6 +568,8 @@ class MetaFileParser(object):
 #   @param      Macros          Macros used for replacement in file
 #
 class InfParser(MetaFileParser):
+    _CACHEABLE_ = True
+
     # INF file supported data types (one type per section)
     DataType = {
         TAB_UNKNOWN.upper() : MODEL_UNKNOWN,
@@ -1733,6 +1779,8 @@ class DscParser(MetaFileParser):
 #   @param      Macros          Macros used for replacement in file
 #
 class DecParser(MetaFileParser):
+    _CACHEABLE_ = True
+
     # DEC file supported data types (one type per section)
     DataType = {
         TAB_DEC_DEFINES.upper()                     :   MODEL_META_DATA_HEADER,
@@ -10,6 +10,7 @@
 #
 from __future__ import absolute_import
 import uuid
+from itertools import chain
 
 import Common.EdkLogger as EdkLogger
 from Common.BuildToolError import FORMAT_INVALID
@@ -23,6 +24,9 @@ class MetaFileTable():
     _ID_STEP_ = 1
     _ID_MAX_ = 99999999
 
+    # columns of Model, Scope1, Scope2 and BelongsToItem, which the records are indexed by
+    _INDEX_COLUMN_ = (1, 5, 6, 7)
+
     ## Constructor
     def __init__(self, DB, MetaFile, FileType, Temporary, FromItem=None):
         self.MetaFile = MetaFile
@@ -31,6 +35,7 @@ class MetaFileTable():
         self._NumpyTab = None
 
         self.CurrentContent = []
+        self._Index = None
         DB.TblFile.append([MetaFile.Name,
                         MetaFile.Ext,
                         MetaFile.Dir,
@@ -68,10 +73,90 @@ class MetaFileTable():
 
     def SetEndFlag(self):
         self.CurrentContent.append(self._DUMMY_)
+        self._BuildIndex()
+
+    ## Index the records by Model, Scope1, Scope2 and BelongsToItem
+    #
+    #  The index keeps the positions of records in CurrentContent, so that the
+    #  records found are returned in the order they're inserted.
+    #
+    def _BuildIndex(self):
+        ModelColumn, Scope1Column, Scope2Column, BelongsColumn = self._INDEX_COLUMN_
+        # (Model, Scope1, Scope2, BelongsToItem) : [position]
+        self._Index = {}
+        # (Model, BelongsToItem) : [(Scope1, Scope2)]
+        self._ScopeIndex = {}
+        # Model : [BelongsToItem]
+        self._BelongsIndex = {}
+        for Position, Record in enumerate(self.CurrentContent):
+            Model = Record[ModelColumn]
+            BelongsToItem = Record[BelongsColumn]
+            Key = (Model, Record[Scope1Column], Record[Scope2Column], BelongsToItem)
+            if Key not in self._Index:
+                self._Index[Key] = []
+                if (Model, BelongsToItem) not in self._ScopeIndex:
+                    self._ScopeIndex[Model, BelongsToItem] = []
+                    self._BelongsIndex.setdefault(Model, []).append(BelongsToItem)
+                self._ScopeIndex[Model, BelongsToItem].append(Key[1:3])
+            self._Index[Key].append(Position)
+
+    ## Find records in the index
+    #
+    # @param    Model:          The Model of Record
+    # @param    Scope1Set:      The Scope1 values to match, None for any value
+    # @param    Scope2Set:      The Scope2 values to match, None for any value
+    # @param    BelongsToItem:  The BelongsToItem to match, None for any value
+    # @param    TopLevel:       Match the records belonging to no item only, if BelongsToItem is None
+    #
+    # @retval:  The records found, in the order of CurrentContent
+    #
+    def _QueryIndex(self, Model, Scope1Set=None, Scope2Set=None, BelongsToItem=None, TopLevel=False):
+        if self._Index is None:
+            self._BuildIndex()
+        if BelongsToItem is not None:
+            BelongsList = [BelongsToItem]
+        elif TopLevel:
+            BelongsList = [Item for Item in self._BelongsIndex.get(Model, []) if Item < 0]
+        else:
+            BelongsList = self._BelongsIndex.get(Model, [])
+        PositionLists = []
+        for Item in BelongsList:
+            for Scope1, Scope2 in self._ScopeIndex.get((Model, Item), []):
+                if (Scope1Set is None or Scope1 in Scope1Set) and (Scope2Set is None or Scope2 in Scope2Set):
+                    PositionLists.append(self._Index[Model, Scope1, Scope2, Item])
+        if len(PositionLists) == 1:
+            PositionList = PositionLists[0]
+        else:
+            PositionList = sorted(chain.from_iterable(PositionLists))
+        Content = self.CurrentContent
+        return [Content[Position] for Position in PositionList]
 
     def GetAll(self):
         return [item for item in self.CurrentContent if item[0] >= 0 and item[-1]>=0]
 
+    ## Get all records of the table, which can be added to another table by InsertRecordList()
+    #
+    # @retval:  The list of records, the end flag excluded
+    #
+    def GetRecordList(self):
+        return [list(item) for item in self.CurrentContent if item[0] >= 0]
+
+    ## Insert the records got from another table by GetRecordList()
+    #
+    #  The records get the IDs of this table, and the items they belong to are
+    #  changed to the new IDs accordingly.
+    #
+    # @param    RecordList:     The list of records
+    #
+    def InsertRecordList(self, RecordList):
+        BelongsColumn = self._INDEX_COLUMN_[3]
+        IdMap = {}
+        for Record in RecordList:
+            Args = Record[1:]
+            BelongsToItem = Record[BelongsColumn]
+            Args[BelongsColumn - 1] = IdMap.get(BelongsToItem, BelongsToItem)
+            IdMap[Record[0]] = self.Insert(*Args)
+
 ## Python class representation of table storing module data
 class ModuleTable(MetaFileTable):
     _COLUMN_ = '''
@@ -134,6 +219,7 @@ class ModuleTable(MetaFileTable):
                 Enabled
             ]
         self.CurrentContent.append(row)
+        self._Index = None
         return self.ID
 
     ## Query table
@@ -145,22 +231,17 @@ class ModuleTable(MetaFileTable):
     # @retval:       A recordSet of all found records
     #
     def Query(self, Model, Arch=None, Platform=None, BelongsToItem=None):
-
-        QueryTab = self.CurrentContent
-        result = [item for item in QueryTab if item[1] == Model and item[-1]>=0 ]
-
+        ArchList = None
         if Arch is not None and Arch != TAB_ARCH_COMMON:
             ArchList = set(['COMMON'])
             ArchList.add(Arch)
-            result = [item for item in result if item[5] in ArchList]
 
+        Platformlist = None
         if Platform is not None and Platform != TAB_COMMON:
             Platformlist = set( ['COMMON','DEFAULT'])
             Platformlist.add(Platform)
-            result = [item for item in result if item[6] in Platformlist]
 
-        if BelongsToItem is not None:
-            result = [item for item in result if item[7] == BelongsToItem]
+        result = [item for item in self._QueryIndex(Model, ArchList, Platformlist, BelongsToItem) if item[-1]>=0]
 
         result = [ [r[2],r[3],r[4],r[5],r[6],r[0],r[9]] for r in result ]
         return result
@@ -226,6 +307,7 @@ class PackageTable(MetaFileTable):
                 Enabled
             ]
         self.CurrentContent.append(row)
+        self._Index = None
         return self.ID
 
     ## Query table
@@ -236,14 +318,12 @@ class PackageTable(MetaFileTable):
     # @retval:       A recordSet of all found records
     #
     def Query(self, Model, Arch=None):
-
-        QueryTab = self.CurrentContent
-        result = [item for item in QueryTab if item[1] == Model and item[-1]>=0 ]
-
+        ArchList = None
         if Arch is not None and Arch != TAB_ARCH_COMMON:
             ArchList = set(['COMMON'])
             ArchList.add(Arch)
-            result = [item for item in result if item[5] in ArchList]
+
+        result = [item for item in self._QueryIndex(Model, ArchList) if item[-1]>=0]
 
         return [[r[2], r[3], r[4], r[5], r[6], r[0], r[8]] for r in result]
 
@@ -306,6 +386,8 @@ class PlatformTable(MetaFileTable):
     # used as table end flag, in case the changes to database is not committed to db file
     _DUMMY_ = [-1, -1, '====', '====', '====', '====', '====','====', -1, -1, -1, -1, -1, -1, -1]
 
+    _INDEX_COLUMN_ = (1, 5, 6, 8)
+
     ## Constructor
     def __init__(self, Cursor, MetaFile, Temporary, FromItem=0):
         MetaFileTable.__init__(self, Cursor, MetaFile, MODEL_FILE_DSC, Temporary, FromItem)
@@ -350,6 +432,7 @@ class PlatformTable(MetaFileTable):
                 Enabled
             ]
         self.CurrentContent.append(row)
+        self._Index = None
         return self.ID
 
 
@@ -364,26 +447,21 @@ class PlatformTable(MetaFileTable):
     # @retval:       A recordSet of all found records
     #
     def Query(self, Model, Scope1=None, Scope2=None, BelongsToItem=None, FromItem=None):
-
-        QueryTab = self.CurrentContent
-        result = [item for item in QueryTab if item[1] == Model and item[-1]>0 ]
+        Sc1 = None
         if Scope1 is not None and Scope1 != TAB_ARCH_COMMON:
             Sc1 = set(['COMMON'])
             Sc1.add(Scope1)
-            result = [item for item in result if item[5] in Sc1]
-        Sc2 = set( ['COMMON','DEFAULT'])
+        Sc2 = None
         if Scope2 and Scope2 != TAB_COMMON:
+            Sc2 = set( ['COMMON','DEFAULT'])
             if '.' in Scope2:
                 Index = Scope2.index('.')
                 NewScope = TAB_COMMON + Scope2[Index:]
                 Sc2.add(NewScope)
             Sc2.add(Scope2)
-            result = [item for item in result if item[6] in Sc2]
 
-        if BelongsToItem is not None:
-            result = [item for item in result if item[8] == BelongsToItem]
-        else:
-            result = [item for item in result if item[8] < 0]
+        # the records belonging to no item are returned if BelongsToItem is not given
+        result = [item for item in self._QueryIndex(Model, Sc1, Sc2, BelongsToItem, True) if item[-1]>0]
         if FromItem is not None:
             result = [item for item in result if item[9] == FromItem]
 
@@ -0,0 +1,832 @@
+## @file
+# Get the layout of the structures of structure PCDs from C header files
+#
+# The header files are read by a small C preprocessor, and the structures are
+# declared with ctypes, so that the offset and the size of each field are the
+# ones the host C compiler gives them in the application built by
+# DscBuildData.GenerateByteArrayValue(). A declaration the scanner can't be
+# sure of, e.g. one depending on the compiler, raises StructureLayoutError.
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import re
+import sys
+import platform
+import Common.LongFilePathOs as os
+from Common.LongFilePathSupport import OpenLongFilePath as open
+try:
+    import ctypes
+except ImportError:
+    ctypes = None
+
+## Regular expressions for reading C header files
+gCommentPattern = re.compile(r'("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')|//[^\n]*|/\*.*?\*/', re.S)
+gTokenPattern = re.compile(r'[A-Za-z_]\w*|0[xX][0-9a-fA-F]+[uUlL]*|\d+[uUlL]*|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|<<|>>|<=|>=|==|!=|&&|\|\||->|##|\S')
+gDirectivePattern = re.compile(r'(\w+)\s*(.*)')
+gIncludeFilePattern = re.compile(r'[<"]([^>"]+)[>"]')
+gFieldPattern = re.compile(r'\s*(?:\.?\s*([A-Za-z_]\w*)|\[\s*([^\]]*?)\s*\])')
+
+## The standard C headers, which declare nothing used by the structures
+gStandardHeaders = {'stdarg.h', 'stdint.h', 'stddef.h', 'stdbool.h', 'stdio.h', 'stdlib.h', 'string.h', 'limits.h', 'wchar.h', 'ctype.h', 'assert.h'}
+
+## The words qualifying a type, which don't change its layout
+gQualifiers = {'const', 'CONST', 'volatile', 'VOLATILE', 'static', 'STATIC', 'extern', 'register', 'inline', 'IN', 'OUT', 'OPTIONAL', 'EFIAPI'}
+
+## The words of C basic types
+gBasicTypeWords = {'unsigned', 'signed', 'char', 'short', 'int', 'long', 'float', 'double', 'void', '_Bool'}
+
+## The token put in place of the code skipped for an unknown condition, and of
+#  the values which aren't known
+TAB_UNKNOWN = '#?'
+
+## Values of the macros, besides the list of tokens of an object-like macro.
+#  The value of an opaque macro, e.g. a function-like one, is not used.
+MACRO_UNKNOWN = None
+MACRO_UNDEFINED = False
+MACRO_OPAQUE = True
+
+## The macros predefined by the compilers for the host processors
+gArchMacros = {
+    'X64': ('__x86_64__', '_M_X64'),
+    'Ia32': ('__i386__', '_M_IX86'),
+    'AArch64': ('__aarch64__', '_M_ARM64'),
+    'Arm': ('__arm__', '_M_ARM'),
+}
+
+## The binary operators of preprocessor expressions, and their precedences
+gBinaryOperators = {
+    '*': 10, '/': 10, '%': 10,
+    '+': 9, '-': 9,
+    '<<': 8, '>>': 8,
+    '<': 7, '>': 7, '<=': 7, '>=': 7,
+    '==': 6, '!=': 6,
+    '&': 5, '^': 4, '|': 3, '&&': 2, '||': 1
+}
+
+## Raised when the layout of a type can't be got for sure
+class StructureLayoutError(Exception):
+    pass
+
+## Get the ctypes types of the types of the fixed size
+#
+#   @retval dict    The ctypes types by the type names
+#
+def _GetBasicTypes():
+    UINTN = ctypes.c_size_t
+    return {
+        'BOOLEAN': ctypes.c_uint8, 'UINT8': ctypes.c_uint8, 'INT8': ctypes.c_uint8, 'CHAR8': ctypes.c_uint8,
+        'UINT16': ctypes.c_uint16, 'INT16': ctypes.c_uint16, 'CHAR16': ctypes.c_uint16,
+        'UINT32': ctypes.c_uint32, 'INT32': ctypes.c_uint32,
+        'UINT64': ctypes.c_uint64, 'INT64': ctypes.c_uint64,
+        'UINTN': UINTN, 'INTN': UINTN,
+        'char': ctypes.c_uint8, 'short': ctypes.c_ushort, 'int': ctypes.c_uint, 'long': ctypes.c_ulong,
+        'long long': ctypes.c_ulonglong, '_Bool': ctypes.c_bool,
+        'size_t': ctypes.c_size_t, 'uint8_t': ctypes.c_uint8, 'int8_t': ctypes.c_uint8,
+        'uint16_t': ctypes.c_uint16, 'int16_t': ctypes.c_uint16, 'uint32_t': ctypes.c_uint32,
+        'int32_t': ctypes.c_uint32, 'uint64_t': ctypes.c_uint64, 'int64_t': ctypes.c_uint64,
+    }
+
+## Get the include directory of BaseTools C headers for the host processor
+#
+#   @retval str     The name of the directory
+#
+def GetHostArchInclude():
+    Machine = platform.machine().lower()
+    if Machine in ('x86_64', 'amd64'):
+        return 'X64'
+    if Machine in ('i386', 'i486', 'i586', 'i686', 'x86'):
+        return 'Ia32'
+    if Machine in ('aarch64', 'arm64'):
+        return 'AArch64'
+    if Machine.startswith('arm'):
+        return 'Arm'
+    return None
+
+## Layout of the structures declared in C header files
+#
+#  The header files are read when the object is created. The ctypes type of a
+#  structure is created when its layout is requested the first time.
+#
+class StructureLayout(object):
+    ## Constructor
+    #
+    #   @param  IncludeFileList     The header files included by the C application, in order
+    #   @param  SearchPathList      The include paths of the C application, in order
+    #   @param  MacroDict           The macros defined by compiler flags
+    #
+    def __init__(self, IncludeFileList, SearchPathList, MacroDict=None):
+        if ctypes is None:
+            raise StructureLayoutError("ctypes is not available")
+        self.SearchPathList = SearchPathList
+        # the application is built by Visual C++ on Windows, and by GCC or a
+        # compatible compiler on other systems
+        self._Macro = {'__cplusplus': MACRO_UNDEFINED}
+        Arch = GetHostArchInclude()
+        if sys.platform == "win32":
+            self._Macro.update({'_MSC_EXTENSIONS': ['1'], '_MSC_VER': MACRO_OPAQUE, '_WIN32': ['1']})
+            if Arch in gArchMacros:
+                self._Macro[gArchMacros[Arch][1]] = ['1']
+        else:
+            self._Macro['__GNUC__'] = MACRO_OPAQUE
+            if Arch in gArchMacros:
+                self._Macro[gArchMacros[Arch][0]] = ['1']
+        for Name, Value in (MacroDict or {}).items():
+            self._Macro[Name] = gTokenPattern.findall(Value) if Value is not None else MACRO_UNDEFINED
+        self._MacroIncomplete = False
+        self._Pack = None
+        self._PackStack = []
+        self._ScannedFile = set()
+        self._TokenList = []
+        self._PackList = []
+        self._Typedef = {}
+        self._Tag = {}
+        self._Type = {}
+        self._Field = {}
+        self._Resolving = set()
+        self._ExprToken = []
+        self._ExprIndex = 0
+        self._BasicType = _GetBasicTypes()
+        for IncludeFile in IncludeFileList:
+            FilePath = self._FindFile(IncludeFile, None)
+            if FilePath is None:
+                raise StructureLayoutError("Header file %s is not found" % IncludeFile)
+            if FilePath not in self._ScannedFile:
+                self._ScanFile(FilePath)
+        self._ParseDeclarations()
+
+    ## Get the ctypes type of a type
+    #
+    #   @param  TypeName    The name of the type
+    #
+    #   @retval type        The ctypes type
+    #
+    def GetType(self, TypeName):
+        return self._GetNamedType(TypeName.strip())
+
+    ## Get the size of a type
+    #
+    #   @param  TypeName    The name of the type
+    #
+    #   @retval int         The size of the type
+    #
+    def SizeOf(self, TypeName):
+        return ctypes.sizeof(self.GetType(TypeName))
+
+    ## Get the offset and the type of a field
+    #
+    #   @param  TypeName    The name of the structure
+    #   @param  FieldName   The field, e.g. A.B[2].C
+    #
+    #   @retval tuple       The offset and the ctypes type of the field
+    #
+    def GetField(self, TypeName, FieldName):
+        Type = self.GetType(TypeName)
+        Offset = 0
+        Index = 0
+        FieldName = FieldName.strip()
+        while Index < len(FieldName):
+            Match = gFieldPattern.match(FieldName, Index)
+            if not Match or Match.end() == Index:
+                raise StructureLayoutError("Invalid field %s" % FieldName)
+            Index = Match.end()
+            if Match.group(1):
+                if Type not in self._Field or Match.group(1) not in self._Field[Type]:
+                    raise StructureLayoutError("%s has no field %s" % (TypeName, FieldName))
+                FieldOffset, Type = self._Field[Type][Match.group(1)]
+                Offset += FieldOffset
+            else:
+                if not issubclass(Type, ctypes.Array):
+                    raise StructureLayoutError("%s.%s is not an array" % (TypeName, FieldName))
+                try:
+                    ElementIndex = int(Match.group(2), 0)
+                except ValueError:
+                    raise StructureLayoutError("Invalid index in %s.%s" % (TypeName, FieldName))
+                if ElementIndex < 0 or (Type._length_ and ElementIndex >= Type._length_):
+                    raise StructureLayoutError("Index exceeds the array %s.%s" % (TypeName, FieldName))
+                Type = Type._type_
+                Offset += ElementIndex * ctypes.sizeof(Type)
+        return Offset, Type
+
+    def _FindFile(self, IncludeFile, CurrentDir):
+        PathList = self.SearchPathList if CurrentDir is None else [CurrentDir] + self.SearchPathList
+        for SearchPath in PathList:
+            FilePath = os.path.normpath(os.path.join(str(SearchPath), IncludeFile))
+            if os.path.isfile(FilePath):
+                return FilePath
+        return None
+
+    ## Read a header file, and the files it includes
+    #
+    #  The tokens of the code compiled are appended to the token list. The code
+    #  skipped for a condition which isn't known is replaced by TAB_UNKNOWN.
+    #
+    def _ScanFile(self, FilePath):
+        self._ScannedFile.add(FilePath)
+        try:
+            with open(FilePath, 'rb') as File:
+                Content = File.read().decode('utf-8', 'ignore')
+        except IOError as X:
+            raise StructureLayoutError("Can't read %s: %s" % (FilePath, X))
+        Content = Content.replace('\r\n', '\n').replace('\\\n', '')
+        Content = gCommentPattern.sub(lambda Match: Match.group(1) or ' ', Content)
+        LineList = [Line.strip() for Line in Content.split('\n')]
+        DirectiveList = [Line for Line in LineList if Line.startswith('#')]
+        Guard = None
+        if len(DirectiveList) > 1:
+            First = DirectiveList[0][1:].split()
+            Second = DirectiveList[1][1:].split()
+            if len(First) == 2 and First[0] == 'ifndef' and len(Second) >= 2 and Second[0] == 'define' and Second[1] == First[1]:
+                Guard = First[1]
+
+        # Each item is [State of the current branch, if a branch has been taken]
+        CondStack = []
+        for Line in LineList:
+            if not Line:
+                continue
+            Skip = False
+            Unknown = False
+            for State, Taken in CondStack:
+                if State is False:
+                    Skip = True
+                elif State is None:
+                    Unknown = True
+            if Line[0] != '#':
+                if Skip:
+                    continue
+                if Unknown:
+                    if not self._TokenList or self._TokenList[-1] != TAB_UNKNOWN:
+                        self._TokenList.append(TAB_UNKNOWN)
+                        self._PackList.append(None)
+                    continue
+                for Token in gTokenPattern.findall(Line):
+                    self._TokenList.append(Token)
+                    self._PackList.append(self._Pack)
+                continue
+
+            Match = gDirectivePattern.match(Line[1:].strip())
+            if not Match:
+                continue
+            Directive, Argument = Match.groups()
+            if Directive in ('if', 'ifdef', 'ifndef'):
+                if Skip:
+                    CondStack.append([False, True])
+                elif Unknown:
+                    CondStack.append([None, None])
+                elif Directive == 'ifndef' and Argument.strip() == Guard:
+                    # another header may use the same guard, otherwise the file is new
+                    Guard = None
+                    Value = self._IsDefined(Argument.strip()) is not True
+                    CondStack.append([Value, Value])
+                else:
+                    if Directive == 'if':
+                        Value = self._EvaluateCondition(Argument)
+                    else:
+                        Value = self._IsDefined(Argument.strip())
+                        if Value is not None and Directive == 'ifndef':
+                            Value = not Value
+                    CondStack.append([Value, Value])
+            elif Directive in ('elif', 'else'):
+                if not CondStack:
+                    raise StructureLayoutError("Unmatched #%s in %s" % (Directive, FilePath))
+                Cond = CondStack[-1]
+                ParentState = [State for State, Taken in CondStack[:-1]]
+                if False in ParentState or Cond[1] is True:
+                    Cond[0] = False
+                elif None in ParentState or Cond[1] is None:
+                    Cond[0] = None
+                elif Directive == 'else':
+                    Cond[0] = Cond[1] = True
+                else:
+                    Cond[0] = Cond[1] = self._EvaluateCondition(Argument)
+            elif Directive == 'endif':
+                if not CondStack:
+                    raise StructureLayoutError("Unmatched #endif in %s" % FilePath)
+                CondStack.pop()
+            elif Skip:
+                continue
+            elif Directive == 'define':
+                Match = re.match(r'([A-Za-z_]\w*)(\()?\s*(.*)', Argument)
+                if not Match:
+                    continue
+                if Unknown:
+                    self._Macro[Match.group(1)] = MACRO_UNKNOWN
+                elif Match.group(2):
+                    self._Macro[Match.group(1)] = MACRO_OPAQUE
+                else:
+                    self._Macro[Match.group(1)] = gTokenPattern.findall(Match.group(3))
+            elif Directive == 'undef':
+                self._Macro[Argument.strip()] = MACRO_UNKNOWN if Unknown else MACRO_UNDEFINED
+            elif Directive == 'pragma':
+                TokenList = gTokenPattern.findall(Argument)
+                if TokenList[:1] == ['pack'] and self._Pack != TAB_UNKNOWN:
+                    Pack = self._GetPack(TokenList[1:])
+                    if not Unknown:
+                        self._Pack, self._PackStack = Pack
+                    elif Pack != (self._Pack, self._PackStack):
+                        self._Pack = TAB_UNKNOWN
+            elif Directive == 'include':
+                Match = gIncludeFilePattern.match(Argument.strip())
+                if Match and os.path.basename(Match.group(1)) in gStandardHeaders:
+                    continue
+                IncludeFile = None
+                if Match and not Unknown:
+                    IncludeFile = self._FindFile(Match.group(1), os.path.dirname(FilePath) if Argument.strip()[0] == '"' else None)
+                if IncludeFile is None:
+                    # the macros defined in the file are not known
+                    self._MacroIncomplete = True
+                elif IncludeFile not in self._ScannedFile:
+                    self._ScanFile(IncludeFile)
+        if CondStack:
+            raise StructureLayoutError("Unterminated #if in %s" % FilePath)
+
+    ## Get the pack of structures after #pragma pack
+    #
+    #   @param  TokenList   The tokens after pack
+    #
+    #   @retval tuple       The pack and the stack of packs pushed
+    #
+    def _GetPack(self, TokenList):
+        Pack = self._Pack
+        PackStack = list(self._PackStack)
+        ArgumentList = [Token for Token in TokenList if Token not in ('(', ')', ',')]
+        if not ArgumentList:
+            Pack = None
+        for Argument in ArgumentList:
+            if Argument == 'push':
+                PackStack.append(Pack)
+            elif Argument == 'pop':
+                Pack = PackStack.pop() if PackStack else None
+            elif Argument[0].isdigit():
+                Pack = int(Argument.rstrip('uUlL'), 0)
+        return Pack, PackStack
+
+    ## Check if a macro is defined
+    #
+    #   @retval True/False  The macro is defined or not
+    #   @retval None        It's unknown if the macro is defined
+    #
+    def _IsDefined(self, Name):
+        if Name in self._Macro:
+            Value = self._Macro[Name]
+            if Value is MACRO_UNKNOWN:
+                return None
+            return Value is not MACRO_UNDEFINED
+        # the names starting with '_' are reserved for the compiler
+        if Name.startswith('_') or self._MacroIncomplete:
+            return None
+        return False
+
+    ## Evaluate the condition of #if or #elif
+    #
+    #   @retval True/False  The condition is true or false
+    #   @retval None        It's unknown if the condition is true
+    #
+    def _EvaluateCondition(self, Expression):
+        try:
+            Value = self._Evaluate(self._Expand(gTokenPattern.findall(Expression), True))
+        except StructureLayoutError:
+            return None
+        return None if Value is None else bool(Value)
+
+    ## Replace the macros in a list of tokens with their values
+    #
+    #   @param  TokenList   The tokens
+    #   @param  InCondition The tokens are of the condition of #if, where the
+    #                       operator defined is valid and undefined names are 0
+    #
+    #   @retval list        The tokens expanded, a value which isn't known is
+    #                       replaced by TAB_UNKNOWN
+    #
+    def _Expand(self, TokenList, InCondition, Expanding=()):
+        Result = []
+        Index = 0
+        while Index < len(TokenList):
+            Token = TokenList[Index]
+            Index += 1
+            if InCondition and Token == 'defined':
+                if TokenList[Index:Index + 1] == ['(']:
+                    Name = TokenList[Index + 1] if Index + 1 < len(TokenList) else ''
+                    Index += 3
+                else:
+                    Name = TokenList[Index] if Index < len(TokenList) else ''
+                    Index += 1
+                Defined = self._IsDefined(Name)
+                Result.append(TAB_UNKNOWN if Defined is None else '1' if Defined else '0')
+            elif Token == 'sizeof' and not InCondition:
+                # keep the type name
+                End = Index
+                Depth = 0
+                while End < len(TokenList):
+                    Depth += {'(': 1, ')': -1}.get(TokenList[End], 0)
+                    End += 1
+                    if Depth == 0:
+                        break
+                Result.extend(TokenList[Index - 1:End])
+                Index = End
+            elif Token[0].isalpha() or Token[0] == '_':
+                Value = self._Macro.get(Token, MACRO_UNDEFINED)
+                if Token in Expanding:
+                    Result.append(Token)
+                elif isinstance(Value, list):
+                    Result.extend(self._Expand(Value, InCondition, Expanding + (Token,)))
+                elif InCondition and Value is MACRO_UNDEFINED and self._IsDefined(Token) is False:
+                    Result.append('0')
+                else:
+                    Result.append(TAB_UNKNOWN)
+            else:
+                Result.append(Token)
+        return Result
+
+    ## Evaluate an integer constant expression of expanded tokens
+    #
+    #   @retval int     The value of the expression
+    #   @retval None    The value depends on a value which isn't known
+    #
+    def _Evaluate(self, TokenList):
+        # sizeof() may evaluate the array sizes of another type
+        Saved = self._ExprToken, self._ExprIndex
+        self._ExprToken = TokenList
+        self._ExprIndex = 0
+        try:
+            Value = self._EvaluateConditional()
+            if self._ExprIndex != len(TokenList):
+                raise StructureLayoutError("Invalid expression %s" % ' '.join(TokenList))
+        finally:
+            self._ExprToken, self._ExprIndex = Saved
+        return Value
+
+    def _PeekToken(self):
+        if self._ExprIndex < len(self._ExprToken):
+            return self._ExprToken[self._ExprIndex]
+        return None
+
+    def _GetToken(self):
+        Token = self._PeekToken()
+        if Token is None:
+            raise StructureLayoutError("Incomplete expression %s" % ' '.join(self._ExprToken))
+        self._ExprIndex += 1
+        return Token
+
+    def _EvaluateConditional(self):
+        Value = self._EvaluateBinary(1)
+        if self._PeekToken() == '?':
+            self._GetToken()
+            TrueValue = self._EvaluateConditional()
+            if self._GetToken() != ':':
+                raise StructureLayoutError("Invalid expression %s" % ' '.join(self._ExprToken))
+            FalseValue = self._EvaluateConditional()
+            if Value is None:
+                Value = TrueValue if TrueValue == FalseValue else None
+            else:
+                Value = TrueValue if Value else FalseValue
+        return Value
+
+    def _EvaluateBinary(self, Precedence):
+        Value = self._EvaluateUnary()
+        while True:
+            Operator = self._PeekToken()
+            if Operator not in gBinaryOperators or gBinaryOperators[Operator] < Precedence:
+                return Value
+            self._GetToken()
+            Right = self._EvaluateBinary(gBinaryOperators[Operator] + 1)
+            if Operator == '&&':
+                if Value == 0 or Right == 0:
+                    Value = 0
+                else:
+                    Value = None if Value is None or Right is None else 1
+            elif Operator == '||':
+                if Value or Right:
+                    Value = 1
+                else:
+                    Value = None if Value is None or Right is None else 0
+            elif Value is None or Right is None:
+                Value = None
+            elif Operator in ('/', '%'):
+                if Right == 0:
+                    raise StructureLayoutError("Division by zero in %s" % ' '.join(self._ExprToken))
+                Quotient = abs(Value) // abs(Right)
+                if (Value < 0) != (Right < 0):
+                    Quotient = -Quotient
+                Value = Quotient if Operator == '/' else Value - Quotient * Right
+            else:
+                Value = {
+                    '*': lambda: Value * Right, '+': lambda: Value + Right, '-': lambda: Value - Right,
+                    '<<': lambda: Value << Right, '>>': lambda: Value >> Right,
+                    '<': lambda: int(Value < Right), '>': lambda: int(Value > Right),
+                    '<=': lambda: int(Value <= Right), '>=': lambda: int(Value >= Right),
+                    '==': lambda: int(Value == Right), '!=': lambda: int(Value != Right),
+                    '&': lambda: Value & Right, '^': lambda: Value ^ Right, '|': lambda: Value | Right
+                }[Operator]()
+
+    def _EvaluateUnary(self):
+        Token = self._GetToken()
+        if Token == TAB_UNKNOWN:
+            return None
+        if Token in ('-', '+', '~', '!'):
+            Value = self._EvaluateUnary()
+            if Value is None:
+                return None
+            return {'-': -Value, '+': Value, '~': ~Value, '!': int(not Value)}[Token]
+        if Token == '(':
+            Value = self._EvaluateConditional()
+            if self._GetToken() != ')':
+                raise StructureLayoutError("Invalid expression %s" % ' '.join(self._ExprToken))
+            return Value
+        if Token == 'sizeof':
+            if self._GetToken() != '(':
+                raise StructureLayoutError("Invalid expression %s" % ' '.join(self._ExprToken))
+            TypeToken = []
+            while self._PeekToken() != ')':
+                TypeToken.append(self._GetToken())
+            self._GetToken()
+            Spec, Index = self._ParseSpecifier(TypeToken, 0)
+            Declarator, Index = self._ParseDeclarator(TypeToken, Index)
+            if Index != len(TypeToken) or Declarator[0]:
+                raise StructureLayoutError("Invalid type %s" % ' '.join(TypeToken))
+            return ctypes.sizeof(self._GetDeclaredType(Spec, Declarator))
+        if Token[0].isdigit():
+            try:
+                return int(Token.rstrip('uUlL'), 16 if Token[:2] in ('0x', '0X') else 8 if Token[0] == '0' and len(Token.rstrip('uUlL')) > 1 else 10)
+            except ValueError:
+                raise StructureLayoutError("Invalid number %s" % Token)
+        if Token[0] == "'" and len(Token) == 3:
+            return ord(Token[1])
+        raise StructureLayoutError("Invalid expression %s" % ' '.join(self._ExprToken))
+
+    ## Find the typedefs and the tags of structures in the tokens read
+    #
+    def _ParseDeclarations(self):
+        TokenList = self._TokenList
+        Start = 0
+        Depth = 0
+        for Index, Token in enumerate(TokenList):
+            if Token == '{':
+                Depth += 1
+            elif Token == '}':
+                Depth -= 1
+            elif Token == ';' and Depth == 0:
+                while Start < Index and TokenList[Start] == TAB_UNKNOWN:
+                    Start += 1
+                try:
+                    self._ParseStatement(Start, Index)
+                except (StructureLayoutError, IndexError, ValueError):
+                    # not a declaration of type
+                    pass
+                Start = Index + 1
+
+    def _ParseStatement(self, Start, End):
+        TokenList = self._TokenList[Start:End]
+        IsTypedef = TokenList[:1] == ['typedef']
+        Uncertain = TAB_UNKNOWN in TokenList
+        Spec, Index = self._ParseSpecifier(TokenList, 1 if IsTypedef else 0, Start)
+        if Spec[0] in ('struct', 'union') and Spec[1] and Spec[2] is not None:
+            Key = (Spec[0], Spec[1])
+            if Key not in self._Tag:
+                self._Tag[Key] = Spec if not Uncertain else None
+        if not IsTypedef:
+            return
+        while Index < len(TokenList):
+            Declarator, Index = self._ParseDeclarator(TokenList, Index)
+            if Declarator[0] and Declarator[0] not in self._Typedef:
+                self._Typedef[Declarator[0]] = (Spec, Declarator) if not Uncertain else None
+            if Index < len(TokenList) and TokenList[Index] != ',':
+                raise StructureLayoutError("Invalid declaration")
+            Index += 1
+
+    ## Parse the type specifier of a declaration
+    #
+    #   @param  TokenList   The tokens
+    #   @param  Index       The index of the first token of the specifier
+    #   @param  Start       The index of the token list in all tokens read
+    #   @param  Pack        The pack of the structure declaring the specifier
+    #
+    #   @retval tuple       The specifier, and the index of the token after it.
+    #                       The specifier is one of (struct|union, Tag, Body, Pack),
+    #                       (enum,), (name, TypeName).
+    #
+    def _ParseSpecifier(self, TokenList, Index, Start=None, Pack=None):
+        Words = []
+        while Index < len(TokenList):
+            Token = TokenList[Index]
+            if Token in gQualifiers:
+                Index += 1
+            elif Token in ('struct', 'union', 'enum'):
+                if Words:
+                    raise StructureLayoutError("Invalid type")
+                if Start is not None:
+                    Pack = self._PackList[Start + Index]
+                Index += 1
+                Tag = None
+                if Index < len(TokenList) and (TokenList[Index][0].isalpha() or TokenList[Index][0] == '_'):
+                    Tag = TokenList[Index]
+                    Index += 1
+                Body = None
+                if Index < len(TokenList) and TokenList[Index] == '{':
+                    BodyStart = Index + 1
+                    Depth = 0
+                    while Index < len(TokenList):
+                        if TokenList[Index] == '{':
+                            Depth += 1
+                        elif TokenList[Index] == '}':
+                            Depth -= 1
+                            if Depth == 0:
+                                break
+                        Index += 1
+                    Body = TokenList[BodyStart:Index]
+                    Index += 1
+                while Index < len(TokenList) and TokenList[Index] in gQualifiers:
+                    Index += 1
+                if Token == 'enum':
+                    return ('enum',), Index
+                return (Token, Tag, Body, Pack), Index
+            elif Token in gBasicTypeWords:
+                Words.append(Token)
+                Index += 1
+            elif (Token[0].isalpha() or Token[0] == '_') and not Words:
+                Index += 1
+                while Index < len(TokenList) and TokenList[Index] in gQualifiers:
+                    Index += 1
+                return ('name', Token), Index
+            else:
+                break
+        if not Words:
+            raise StructureLayoutError("No type is found")
+        Words = [Word for Word in Words if Word != 'signed'] or ['int']
+        if Words[0] == 'unsigned':
+            Words = Words[1:] or ['int']
+        if Words[-1] == 'int' and len(Words) > 1:
+            Words = Words[:-1]
+        return ('name', ' '.join(Words)), Index
+
+    ## Parse a declarator
+    #
+    #   @retval tuple   The declarator, and the index of the token after it.
+    #                   The declarator is (Name, IsPointer, DimensionList, IsFunction).
+    #
+    def _ParseDeclarator(self, TokenList, Index):
+        Name = None
+        IsPointer = False
+        IsFunction = False
+        Parenthesized = False
+        DimensionList = []
+        while Index < len(TokenList):
+            Token = TokenList[Index]
+            if Token == '*':
+                IsPointer = True
+                Index += 1
+            elif Token in gQualifiers:
+                Index += 1
+            elif Token == '(':
+                if Name is None:
+                    # (EFIAPI *Name)(...), a pointer to function
+                    Parenthesized = True
+                    Index += 1
+                    while Index < len(TokenList) and TokenList[Index] != ')':
+                        if TokenList[Index] == '*':
+                            IsPointer = True
+                        elif TokenList[Index][0].isalpha() or TokenList[Index][0] == '_':
+                            Name = TokenList[Index]
+                        Index += 1
+                else:
+                    IsFunction = True
+                Depth = 0
+                while Index < len(TokenList):
+                    if TokenList[Index] == '(':
+                        Depth += 1
+                    elif TokenList[Index] == ')':
+                        Depth -= 1
+                        if Depth <= 0:
+                            break
+                    Index += 1
+                Index += 1
+                if Index < len(TokenList) and TokenList[Index] == '(':
+                    continue
+            elif Token == '[':
+                # (*Name)[N] is a pointer to array, the dimensions are not of Name
+                if Parenthesized:
+                    raise StructureLayoutError("Pointer to array %s is not supported" % Name)
+                End = TokenList.index(']', Index)
+                DimensionList.append(TokenList[Index + 1:End])
+                Index = End + 1
+            elif Token == ':':
+                raise StructureLayoutError("Bit field %s is not supported" % Name)
+            elif Token[0].isalpha() or Token[0] == '_':
+                if Name is not None:
+                    raise StructureLayoutError("Invalid declarator %s" % Name)
+                Name = Token
+                Index += 1
+            else:
+                break
+        return (Name, IsPointer, DimensionList, IsFunction), Index
+
+    ## Get the ctypes type of a type name
+    #
+    def _GetNamedType(self, TypeName):
+        if TypeName in self._BasicType:
+            return self._BasicType[TypeName]
+        if TypeName in self._Type:
+            return self._Type[TypeName]
+        Value = self._Macro.get(TypeName)
+        if isinstance(Value, list) and len(Value) == 1:
+            return self._GetNamedType(Value[0])
+        if TypeName not in self._Typedef:
+            raise StructureLayoutError("Type %s is not found" % TypeName)
+        if self._Typedef[TypeName] is None:
+            raise StructureLayoutError("Type %s depends on the compiler" % TypeName)
+        if TypeName in self._Resolving:
+            raise StructureLayoutError("Type %s is recursive" % TypeName)
+        self._Resolving.add(TypeName)
+        try:
+            Spec, Declarator = self._Typedef[TypeName]
+            Type = self._GetDeclaredType(Spec, Declarator, TypeName)
+        finally:
+            self._Resolving.discard(TypeName)
+        self._Type[TypeName] = Type
+        return Type
+
+    ## Get the ctypes type of a declaration
+    #
+    def _GetDeclaredType(self, Spec, Declarator, Name=None):
+        DeclaredName, IsPointer, DimensionList, IsFunction = Declarator
+        if IsFunction and not IsPointer:
+            raise StructureLayoutError("Function %s has no layout" % DeclaredName)
+        if IsPointer:
+            Type = ctypes.c_void_p
+        else:
+            Type = self._GetSpecifiedType(Spec, Name)
+        for Dimension in reversed(DimensionList):
+            if Dimension:
+                Length = self._Evaluate(self._Expand(Dimension, False))
+                if Length is None or Length < 0:
+                    raise StructureLayoutError("Invalid array size of %s" % DeclaredName)
+            else:
+                Length = 0
+            Type = Type * Length
+        return Type
+
+    def _GetSpecifiedType(self, Spec, Name=None):
+        if Spec[0] == 'enum':
+            return ctypes.c_uint32
+        if Spec[0] == 'name':
+            if Spec[1] in ('void', 'float', 'double', 'long double'):
+                raise StructureLayoutError("Type %s is not supported" % Spec[1])
+            return self._GetNamedType(Spec[1])
+        Kind, Tag, Body, Pack = Spec
+        if Body is None:
+            if (Kind, Tag) not in self._Tag:
+                raise StructureLayoutError("%s %s is not found" % (Kind, Tag))
+            if self._Tag[(Kind, Tag)] is None:
+                raise StructureLayoutError("%s %s depends on the compiler" % (Kind, Tag))
+            Kind, Tag, Body, Pack = self._Tag[(Kind, Tag)]
+        Key = (Kind, Tag, id(Body))
+        if Key in self._Type:
+            return self._Type[Key]
+        if TAB_UNKNOWN in Body or Pack == TAB_UNKNOWN:
+            raise StructureLayoutError("%s %s depends on the compiler" % (Kind, Tag or Name))
+
+        FieldList = []
+        AnonymousList = []
+        Index = 0
+        while Index < len(Body):
+            FieldSpec, Index = self._ParseSpecifier(Body, Index, Pack=Pack)
+            if Body[Index] == ';' and FieldSpec[0] in ('struct', 'union'):
+                AnonymousList.append('_Anonymous%d' % len(AnonymousList))
+                FieldList.append((AnonymousList[-1], self._GetSpecifiedType(FieldSpec)))
+            while Body[Index] != ';':
+                Declarator, Index = self._ParseDeclarator(Body, Index)
+                if Declarator[0] is None:
+                    raise StructureLayoutError("Invalid field in %s %s" % (Kind, Tag or Name))
+                FieldList.append((Declarator[0], self._GetDeclaredType(FieldSpec, Declarator)))
+                if Body[Index] == ',':
+                    Index += 1
+                elif Body[Index] != ';':
+                    raise StructureLayoutError("Invalid field %s" % Declarator[0])
+            Index += 1
+        Attribute = {}
+        if Pack:
+            Attribute['_pack_'] = Pack
+            if sys.version_info >= (3, 14):
+                Attribute['_layout_'] = 'ms'
+        if AnonymousList:
+            Attribute['_anonymous_'] = AnonymousList
+        Attribute['_fields_'] = FieldList
+        try:
+            Type = type(str(Tag or Name or 'Anonymous'), (ctypes.Union if Kind == 'union' else ctypes.Structure,), Attribute)
+        except (TypeError, ValueError, AttributeError) as X:
+            raise StructureLayoutError("Can't create %s %s: %s" % (Kind, Tag or Name, X))
+
+        FieldDict = {}
+        for FieldName, FieldType in FieldList:
+            Offset = getattr(Type, FieldName).offset
+            if FieldName in AnonymousList:
+                for SubName, (SubOffset, SubType) in self._Field[FieldType].items():
+                    FieldDict[SubName] = (Offset + SubOffset, SubType)
+            else:
+                FieldDict[FieldName] = (Offset, FieldType)
+        self._Field[Type] = FieldDict
+        self._Type[Key] = Type
+        return Type
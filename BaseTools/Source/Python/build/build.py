@@ -22,9 +22,11 @@ import time
 import platform
 import traceback
 import multiprocessing
+import json
+import select
 from threading import Thread,Event,BoundedSemaphore
 import threading
-from subprocess import Popen,PIPE
+from subprocess import Popen,PIPE,STDOUT
 from collections import OrderedDict, defaultdict
 from Common.buildoptions import BuildOption,BuildTarget
 from AutoGen.PlatformAutoGen import PlatformAutoGen
@@ -38,6 +40,8 @@ from Common import Misc as Utils
 from Common.TargetTxtClassObject import TargetTxt
 from Common.ToolDefClassObject import ToolDef
 from Common.Misc import PathClass,SaveFileOnChange,RemoveDirectory
+from Common.FileHashCache import FileHashCache, FileIncludeCache, MetaFileRecordCache
+from AutoGen.BinaryCache import BinaryCacheStore, GetCacheCopyEngine, ParseCacheSize, BreakLink, BreakCacheLinks
 from Common.StringUtils import NormPath
 from Common.MultipleWorkspace import MultipleWorkspace as mws
 from Common.BuildToolError import *
@@ -66,6 +70,9 @@ gSupportedTarget = ['all', 'genc', 'genmake', 'modules', 'libraries', 'fds', 'cl
 gBuildConfiguration = "target.txt"
 gToolsDefinition = "tools_def.txt"
 
+## file under build directory keeping the measured build time of each module
+gBuildTimeHistory = "BuildTimeHistory.json"
+
 TemporaryTablePattern = re.compile(r'^_\d+_\d+_[a-fA-F0-9]+$')
 TmpTableDict = {}
 
@@ -187,6 +194,62 @@ def ReadMessage(From, To, ExitFlag):
         if ExitFlag.isSet():
             break
 
+## Collect the included files printed by MSFT compiler with /showIncludes
+#
+# The compiler prints the name of each source file on stdout, and the notes of
+# the files it includes on stderr, so both streams must be read as one. The notes
+# are removed from the output of the program, and saved as the dependency file of
+# each source file when the program ends.
+#
+class ShowIncludesFilter(object):
+    _NOTE_PATTERN_ = re.compile(r"^Note: including file:\s*(.+)$")
+    _SOURCE_PATTERN_ = re.compile(r"^[^\s\\/:]+\.(?:c|cc|cpp|cxx)$", re.IGNORECASE)
+
+    ## Constructor
+    #
+    #   @param  To      The stream other messages are put on
+    #
+    def __init__(self, To):
+        self.To = To
+        self.Source = None
+        self.IncludeDict = OrderedDict()
+
+    def __call__(self, Line):
+        Match = self._NOTE_PATTERN_.match(Line)
+        if Match is not None:
+            if self.Source is not None:
+                self.IncludeDict[self.Source].append(Match.group(1).strip())
+            return
+        if self._SOURCE_PATTERN_.match(Line.strip()):
+            self.Source = Line.strip()
+            self.IncludeDict[self.Source] = []
+        self.To(Line)
+
+    ## Save the included files of each source file
+    #
+    #   A source file without notes, like the one compiled without /showIncludes,
+    #   gets no dependency file, so that it is still scanned for #include.
+    #
+    #   @param  OutputDir   The directory the dependency files are saved in
+    #
+    def Save(self, OutputDir):
+        for Source, IncludeList in self.IncludeDict.items():
+            if not IncludeList:
+                continue
+            GenMake.SaveCompilerDependencyList(os.path.join(OutputDir, Source + GenMake.gDepsFileExt), Source, IncludeList)
+
+## Get the directory the included files printed by MSFT compiler are saved in
+#
+#   @param  AutoGenObject   The ModuleAutoGen object built by make
+#
+#   @retval str             The OutputDir of the module, if its make runs cl with /showIncludes
+#   @retval None            The module is built without /showIncludes
+#
+def GetShowIncludesDir(AutoGenObject):
+    if GlobalData.gUseCompilerDeps and AutoGenObject.ToolChainFamily == TAB_COMPILER_MSFT:
+        return AutoGenObject.OutputDir
+    return None
+
 ## Launch an external program
 #
 # This method will call subprocess.Popen to execute an external program with
@@ -196,8 +259,12 @@ def ReadMessage(From, To, ExitFlag):
 #
 # @param  Command               A list or string containing the call of the program
 # @param  WorkingDir            The directory in which the program will be running
+# @param  JobServer             The jobserver shared with the make to be launched
+# @param  DepsDir               The directory the included files printed by MSFT
+#                               compiler are saved in, None if it isn't run with
+#                               /showIncludes
 #
-def LaunchCommand(Command, WorkingDir):
+def LaunchCommand(Command, WorkingDir, JobServer=None, DepsDir=None):
     BeginTime = time.time()
     # if working directory doesn't exist, Popen() will raise an exception
     if not os.path.isdir(WorkingDir):
@@ -212,17 +279,35 @@ def LaunchCommand(Command, WorkingDir):
             Command = Command.split()
         Command = ' '.join(Command)
 
+    # make joins the jobserver through the pipe inherited from build, and finds
+    # it from MAKEFLAGS in its own environment
+    PopenArgs = {}
+    Environment = os.environ
+    if JobServer is not None:
+        PopenArgs['pass_fds'] = JobServer.Fds
+        Environment = dict(os.environ)
+        Environment["MAKEFLAGS"] = Environment.get("MAKEFLAGS", "") + JobServer.MakeFlags
+
     Proc = None
     EndOfProcedure = None
+    StdOut = EdkLogger.info
+    StdErr = PIPE
+    if DepsDir is not None:
+        # the notes are only matched in English, and stderr is merged into stdout
+        # to keep them after the name of the source file they belong to
+        StdOut = ShowIncludesFilter(StdOut)
+        StdErr = STDOUT
+        Environment = dict(Environment)
+        Environment["VSLANG"] = "1033"
     try:
         # launch the command
-        Proc = Popen(Command, stdout=PIPE, stderr=PIPE, env=os.environ, cwd=WorkingDir, bufsize=-1, shell=True)
+        Proc = Popen(Command, stdout=PIPE, stderr=StdErr, env=Environment, cwd=WorkingDir, bufsize=-1, shell=True, **PopenArgs)
 
         # launch two threads to read the STDOUT and STDERR
         EndOfProcedure = Event()
         EndOfProcedure.clear()
         if Proc.stdout:
-            StdOutThread = Thread(target=ReadMessage, args=(Proc.stdout, EdkLogger.info, EndOfProcedure))
+            StdOutThread = Thread(target=ReadMessage, args=(Proc.stdout, StdOut, EndOfProcedure))
             StdOutThread.setName("STDOUT-Redirector")
             StdOutThread.setDaemon(False)
             StdOutThread.start()
@@ -250,6 +335,10 @@ def LaunchCommand(Command, WorkingDir):
     if Proc.stderr:
         StdErrThread.join()
 
+    # the files compiled before a failure are not compiled again
+    if isinstance(StdOut, ShowIncludesFilter) and StdOut.IncludeDict:
+        StdOut.Save(DepsDir)
+
     # check the return code of the program
     if Proc.returncode != 0:
         if not isinstance(Command, type("")):
@@ -371,23 +460,113 @@ class PlatformMakeUnit(BuildUnit):
         Dependency.extend([ModuleMakeUnit(Mod, BuildCommand,Target) for Mod in self.BuildObject.ModuleAutoGenList])
         BuildUnit.__init__(self, Obj, BuildCommand, Target, Dependency, Obj.MakeFileDir)
 
+## GNU make jobserver shared by all make processes launched by build
+#
+# The jobserver is a pipe holding one token per job slot. GNU make finds it from
+# the --jobserver-auth option (--jobserver-fds before make 4.2) in MAKEFLAGS, and
+# takes a token from the pipe before running each job in parallel with its first
+# one, which runs without token.
+#
+# The build task scheduler takes a job slot for every module make too, so that
+# the files compiled by module makes and the module makes themselves share the
+# same -n budget. The first slot is kept by build instead of being put into the
+# pipe, so that a make launched out of the scheduler still gets its first job.
+#
+class MakeJobServer:
+    ## token byte used by GNU make
+    _TOKEN_ = b'+'
+
+    ## The constructor
+    #
+    #   @param  self        The object pointer
+    #   @param  JobNumber   The total number of job slots
+    #
+    def __init__(self, JobNumber):
+        self.ReadFd, self.WriteFd = os.pipe()
+        os.set_inheritable(self.ReadFd, True)
+        os.set_inheritable(self.WriteFd, True)
+        os.write(self.WriteFd, self._TOKEN_ * (JobNumber - 1))
+        self._Lock = threading.Lock()
+        self._FreeSlot = True
+        self._Waiting = False
+
+    ## The file descriptors to be inherited by make processes
+    @property
+    def Fds(self):
+        return (self.ReadFd, self.WriteFd)
+
+    ## The options telling make where the jobserver is
+    @property
+    def MakeFlags(self):
+        return " -j --jobserver-fds=%d,%d --jobserver-auth=%d,%d" % (self.Fds + self.Fds)
+
+    ## Take a job slot, blocking until one is available
+    #
+    #   @retval None        The slot kept by build is taken
+    #   @retval bytes       The token read from the pipe
+    #
+    def Acquire(self):
+        with self._Lock:
+            if self._FreeSlot:
+                self._FreeSlot = False
+                return None
+            self._Waiting = True
+        try:
+            # GNU make may set the pipe to non-blocking mode, so wait for it to
+            # be readable and retry if another make took the token first
+            while True:
+                select.select([self.ReadFd], [], [])
+                try:
+                    return os.read(self.ReadFd, 1)
+                except BlockingIOError:
+                    pass
+        finally:
+            with self._Lock:
+                self._Waiting = False
+
+    ## Give back a job slot got from Acquire()
+    #
+    #   If someone is blocked on the pipe, the slot kept by build is put into the
+    #   pipe for good, so that it can be used at once.
+    #
+    #   @param  Token       The value returned by Acquire()
+    #
+    def Release(self, Token):
+        if Token is None:
+            with self._Lock:
+                if not self._Waiting:
+                    self._FreeSlot = True
+                    return
+            Token = self._TOKEN_
+        os.write(self.WriteFd, Token)
+
 ## The class representing the task of a module build or platform build
 #
 # This class manages the build tasks in multi-thread build mode. Its jobs include
 # scheduling thread running, catching thread error, monitor the thread status, etc.
 #
+# Scheduling is event driven. Every task keeps the number of its unfinished
+# dependencies, and a finishing task decreases the counter of each task waiting
+# on it. A task whose counter drops to zero is moved into the ready queue and
+# the scheduler is woken up through the _Condition object, so no polling is
+# needed.
+#
+# Ready tasks are launched in the order of their remaining critical path, which
+# is estimated from the build time each module took in the previous build.
+#
 class BuildTask:
     # queue for tasks waiting for schedule
     _PendingQueue = OrderedDict()
-    _PendingQueueLock = threading.Lock()
 
     # queue for tasks ready for running
     _ReadyQueue = OrderedDict()
-    _ReadyQueueLock = threading.Lock()
 
     # queue for run tasks
     _RunningQueue = OrderedDict()
-    _RunningQueueLock = threading.Lock()
+
+    # condition protecting the three queues above and the dependency counters,
+    # notified whenever a task becomes ready, a task completes or an error occurs
+    _Condition = threading.Condition()
 
     # queue containing all build tasks, in case duplicate build
     _TaskQueue = OrderedDict()
@@ -400,10 +579,47 @@ class BuildTask:
     # BoundedSemaphore object used to control the number of running threads
     _Thread = None
 
+    # jobserver shared with the make processes, only for GNU make
+    _JobServer = None
+
     # flag indicating if the scheduler is started or not
     _SchedulerStopped = threading.Event()
     _SchedulerStopped.set()
 
+    # build time (in ms) of each build unit measured in previous builds
+    _BuildTimeHistory = {}
+    _BuildTimeHistoryFile = None
+    # cost assumed for build units without history
+    _DefaultBuildTime = 1
+
+    ## Load the build time history saved in given build directory
+    #
+    #   @param  BuildDir            The platform build directory
+    #
+    @staticmethod
+    def LoadBuildTimeHistory(BuildDir):
+        BuildTask._BuildTimeHistoryFile = os.path.join(BuildDir, gBuildTimeHistory)
+        BuildTask._BuildTimeHistory = {}
+        if os.path.exists(BuildTask._BuildTimeHistoryFile):
+            try:
+                with open(BuildTask._BuildTimeHistoryFile, 'r') as f:
+                    BuildTask._BuildTimeHistory = json.load(f)
+            except:
+                EdkLogger.verbose("Ignore broken build time history file %s" % BuildTask._BuildTimeHistoryFile)
+        if BuildTask._BuildTimeHistory:
+            BuildTask._DefaultBuildTime = sum(BuildTask._BuildTimeHistory.values()) // len(BuildTask._BuildTimeHistory)
+        else:
+            BuildTask._DefaultBuildTime = 1
+
+    ## Save the build time history for the next build
+    #
+    @staticmethod
+    def SaveBuildTimeHistory():
+        if BuildTask._BuildTimeHistoryFile:
+            with BuildTask._Condition:
+                Content = json.dumps(BuildTask._BuildTimeHistory, indent=2, sort_keys=True)
+            SaveFileOnChange(BuildTask._BuildTimeHistoryFile, Content, False)
+
     ## Start the task scheduler thread
     #
     #   @param  MaxThreadNumber     The maximum thread number
@@ -411,13 +627,52 @@ class BuildTask:
     #
     @staticmethod
     def StartScheduler(MaxThreadNumber, ExitFlag):
+        # mark the scheduler as started before the thread runs, so that callers
+        # checking IsOnGoing() don't start a second one
+        BuildTask._SchedulerStopped.clear()
+        BuildTask.StartJobServer(MaxThreadNumber)
         SchedulerThread = Thread(target=BuildTask.Scheduler, args=(MaxThreadNumber, ExitFlag))
         SchedulerThread.setName("Build-Task-Scheduler")
         SchedulerThread.setDaemon(False)
         SchedulerThread.start()
-        # wait for the scheduler to be started, especially useful in Linux
-        while not BuildTask.IsOnGoing():
-            time.sleep(0.01)
+
+    ## Create the jobserver shared with make processes, if not yet
+    #
+    #   nmake doesn't support jobserver, so this is only for GNU make. The
+    #   jobserver is passed to the module makes only, through MAKEFLAGS in the
+    #   environment given to each of them. Windows can neither pass the pipe to
+    #   child processes by pass_fds nor select() on it, so only the number of
+    #   build threads limits the jobs there.
+    #
+    #   @param  MaxThreadNumber     The maximum thread number
+    #
+    @staticmethod
+    def StartJobServer(MaxThreadNumber):
+        if BuildTask._JobServer is not None or MaxThreadNumber < 2 or GenMake.gMakeType != "gmake":
+            return
+        if platform.system() == 'Windows':
+            return
+        BuildTask._JobServer = MakeJobServer(MaxThreadNumber)
+
+    ## Check if the scheduler has nothing more to launch
+    #
+    #   Must be called with BuildTask._Condition held.
+    #
+    #   @param  ExitFlag            Flag used to end the scheduler
+    #
+    @staticmethod
+    def _NothingToSchedule(ExitFlag):
+        return ExitFlag.isSet() and len(BuildTask._PendingQueue) == 0 and len(BuildTask._ReadyQueue) == 0
+
+    ## Remove the ready task with the longest remaining critical path
+    #
+    #   Must be called with BuildTask._Condition held. Tasks with equal critical
+    #   path are taken in last-in first-out order.
+    #
+    @staticmethod
+    def _PopReadyTask():
+        Bo = max(reversed(BuildTask._ReadyQueue), key=lambda Item: BuildTask._ReadyQueue[Item].CriticalPath)
+        return Bo, BuildTask._ReadyQueue.pop(Bo)
 
     ## Scheduler method
     #
@@ -434,57 +689,49 @@ class BuildTask:
             # scheduling loop, which will exits when no pending/ready task and
             # indicated to do so, or there's error in running thread
             #
-            while (len(BuildTask._PendingQueue) > 0 or len(BuildTask._ReadyQueue) > 0 \
-                   or not ExitFlag.isSet()) and not BuildTask._ErrorFlag.isSet():
-                EdkLogger.debug(EdkLogger.DEBUG_8, "Pending Queue (%d), Ready Queue (%d)"
-                                % (len(BuildTask._PendingQueue), len(BuildTask._ReadyQueue)))
-
-                # get all pending tasks
-                BuildTask._PendingQueueLock.acquire()
-                BuildObjectList = list(BuildTask._PendingQueue.keys())
-                #
-                # check if their dependency is resolved, and if true, move them
-                # into ready queue
-                #
-                for BuildObject in BuildObjectList:
-                    Bt = BuildTask._PendingQueue[BuildObject]
-                    if Bt.IsReady():
-                        BuildTask._ReadyQueue[BuildObject] = BuildTask._PendingQueue.pop(BuildObject)
-                BuildTask._PendingQueueLock.release()
-
-                # launch build thread until the maximum number of threads is reached
-                while not BuildTask._ErrorFlag.isSet():
-                    # empty ready queue, do nothing further
-                    if len(BuildTask._ReadyQueue) == 0:
+            while True:
+                # wait for active thread(s) exit
+                BuildTask._Thread.acquire(True)
+
+                with BuildTask._Condition:
+                    # sleep until a task gets ready, the build is over or broken
+                    while len(BuildTask._ReadyQueue) == 0 \
+                          and not BuildTask._NothingToSchedule(ExitFlag) \
+                          and not BuildTask._ErrorFlag.isSet():
+                        BuildTask._Condition.wait()
+
+                    EdkLogger.debug(EdkLogger.DEBUG_8, "Pending Queue (%d), Ready Queue (%d)"
+                                    % (len(BuildTask._PendingQueue), len(BuildTask._ReadyQueue)))
+                    if BuildTask._ErrorFlag.isSet() or len(BuildTask._ReadyQueue) == 0:
+                        BuildTask._Thread.release()
                         break
 
-                    # wait for active thread(s) exit
-                    BuildTask._Thread.acquire(True)
-
-                    # start a new build thread
-                    Bo, Bt = BuildTask._ReadyQueue.popitem()
-
-                    # move into running queue
-                    BuildTask._RunningQueueLock.acquire()
+                    # move the next ready task into running queue
+                    Bo, Bt = BuildTask._PopReadyTask()
                     BuildTask._RunningQueue[Bo] = Bt
-                    BuildTask._RunningQueueLock.release()
 
-                    Bt.Start()
-                    # avoid tense loop
-                    time.sleep(0.01)
+                # wait for a free slot of the jobserver shared with make, only
+                # when there's a task to run, and without holding the condition
+                JobToken = BuildTask._AcquireJobToken()
+                if BuildTask._ErrorFlag.isSet():
+                    BuildTask._ReleaseJobToken(JobToken)
+                    with BuildTask._Condition:
+                        BuildTask._RunningQueue.pop(Bo)
+                        BuildTask._Thread.release()
+                        BuildTask._Condition.notify_all()
+                    break
 
-                # avoid tense loop
-                time.sleep(0.01)
+                # start a new build thread
+                Bt.Start(JobToken)
 
             # wait for all running threads exit
             if BuildTask._ErrorFlag.isSet():
                 EdkLogger.quiet("\nWaiting for all build threads exit...")
-            # while not BuildTask._ErrorFlag.isSet() and \
-            while len(BuildTask._RunningQueue) > 0:
-                EdkLogger.verbose("Waiting for thread ending...(%d)" % len(BuildTask._RunningQueue))
-                EdkLogger.debug(EdkLogger.DEBUG_8, "Threads [%s]" % ", ".join(Th.getName() for Th in threading.enumerate()))
-                # avoid tense loop
-                time.sleep(0.1)
+            with BuildTask._Condition:
+                while len(BuildTask._RunningQueue) > 0:
+                    EdkLogger.verbose("Waiting for thread ending...(%d)" % len(BuildTask._RunningQueue))
+                    EdkLogger.debug(EdkLogger.DEBUG_8, "Threads [%s]" % ", ".join(Th.getName() for Th in threading.enumerate()))
+                    BuildTask._Condition.wait()
         except BaseException as X:
             #
             # TRICK: hide the output of threads left running, so that the user can
@@ -494,16 +741,45 @@ class BuildTask:
             BuildTask._ErrorFlag.set()
             BuildTask._ErrorMessage = "build thread scheduler error\n\t%s" % str(X)
 
-        BuildTask._PendingQueue.clear()
-        BuildTask._ReadyQueue.clear()
-        BuildTask._RunningQueue.clear()
-        BuildTask._TaskQueue.clear()
+        with BuildTask._Condition:
+            BuildTask._PendingQueue.clear()
+            BuildTask._ReadyQueue.clear()
+            BuildTask._RunningQueue.clear()
+            BuildTask._TaskQueue.clear()
         BuildTask._SchedulerStopped.set()
 
+    ## Take a job slot of the jobserver, if there's one
+    #
+    @staticmethod
+    def _AcquireJobToken():
+        if BuildTask._JobServer is not None:
+            return BuildTask._JobServer.Acquire()
+        return None
+
+    ## Give back a job slot got from _AcquireJobToken()
+    #
+    #   @param  JobToken    The value returned by _AcquireJobToken()
+    #
+    @staticmethod
+    def _ReleaseJobToken(JobToken):
+        if BuildTask._JobServer is not None:
+            BuildTask._JobServer.Release(JobToken)
+
+    ## Wake up the scheduler
+    #
+    #   Used when ExitFlag or _ErrorFlag is set outside of a build thread, since
+    #   the scheduler only re-checks them when the condition is notified.
+    #
+    @staticmethod
+    def _Notify():
+        with BuildTask._Condition:
+            BuildTask._Condition.notify_all()
+
     ## Wait for all running method exit
     #
     @staticmethod
     def WaitForComplete():
+        BuildTask._Notify()
         BuildTask._SchedulerStopped.wait()
 
     ## Check if the scheduler is running or not
@@ -542,7 +818,8 @@ class BuildTask:
     #   This method will check if a module is building or has been built. And if
     #   true, just return the associated BuildTask object in the _TaskQueue. If
     #   not, create and return a new BuildTask object. The new BuildTask object
-    #   will be appended to the _PendingQueue for scheduling later.
+    #   will be appended to the _ReadyQueue if all its dependencies are completed,
+    #   or to the _PendingQueue for scheduling later.
     #
     #   @param  BuildItem       A BuildUnit object representing a build object
     #   @param  Dependency      The dependent build object of BuildItem
@@ -557,9 +834,12 @@ class BuildTask:
         Bt._Init(BuildItem, Dependency)
         BuildTask._TaskQueue[BuildItem] = Bt
 
-        BuildTask._PendingQueueLock.acquire()
-        BuildTask._PendingQueue[BuildItem] = Bt
-        BuildTask._PendingQueueLock.release()
+        with BuildTask._Condition:
+            if Bt.IsReady():
+                BuildTask._ReadyQueue[BuildItem] = Bt
+                BuildTask._Condition.notify_all()
+            else:
+                BuildTask._PendingQueue[BuildItem] = Bt
 
         return Bt
 
@@ -572,25 +852,26 @@ class BuildTask:
         self.BuildItem = BuildItem
 
         self.DependencyList = []
+        # number of tasks in DependencyList not completed yet
+        self.UnfinishedDependency = 0
+        # tasks waiting for this one to complete
+        self.DependentList = []
+        # flag indicating build completes, used to avoid unnecessary re-build
+        self.CompleteFlag = False
+        # estimated build time of this task, and of the longest chain of tasks
+        # starting from it
+        self.BuildTime = BuildTask._BuildTimeHistory.get(repr(BuildItem), BuildTask._DefaultBuildTime)
+        self.CriticalPath = self.BuildTime
         if Dependency is None:
             Dependency = BuildItem.Dependency
         else:
             Dependency.extend(BuildItem.Dependency)
         self.AddDependency(Dependency)
-        # flag indicating build completes, used to avoid unnecessary re-build
-        self.CompleteFlag = False
 
     ## Check if all dependent build tasks are completed or not
     #
     def IsReady(self):
-        ReadyFlag = True
-        for Dep in self.DependencyList:
-            if Dep.CompleteFlag == True:
-                continue
-            ReadyFlag = False
-            break
-
-        return ReadyFlag
+        return self.UnfinishedDependency == 0
 
     ## Add dependent build task
     #
@@ -599,7 +880,38 @@ class BuildTask:
     def AddDependency(self, Dependency):
         for Dep in Dependency:
             if not Dep.BuildObject.IsBinaryModule and not Dep.BuildObject.CanSkipbyCache(GlobalData.gCacheIR):
-                self.DependencyList.append(BuildTask.New(Dep))    # BuildTask list
+                DepTask = BuildTask.New(Dep)
+                self.DependencyList.append(DepTask)    # BuildTask list
+                with BuildTask._Condition:
+                    if not DepTask.CompleteFlag:
+                        DepTask.DependentList.append(self)
+                        self.UnfinishedDependency += 1
+                    DepTask._UpdateCriticalPath(self.CriticalPath)
+
+    ## Extend the critical path of this task and its dependencies
+    #
+    #   Must be called with BuildTask._Condition held.
+    #
+    #   @param  DependentPath   The critical path of a task depending on this one
+    #
+    def _UpdateCriticalPath(self, DependentPath):
+        Path = self.BuildTime + DependentPath
+        if Path > self.CriticalPath:
+            self.CriticalPath = Path
+            for Dep in self.DependencyList:
+                Dep._UpdateCriticalPath(Path)
+
+    ## Mark the task as completed and wake up the tasks depending on it
+    #
+    #   Must be called with BuildTask._Condition held.
+    #
+    def _Complete(self):
+        self.CompleteFlag = True
+        for Dependent in self.DependentList:
+            Dependent.UnfinishedDependency -= 1
+            if Dependent.IsReady() and Dependent.BuildItem in BuildTask._PendingQueue:
+                BuildTask._ReadyQueue[Dependent.BuildItem] = BuildTask._PendingQueue.pop(Dependent.BuildItem)
+        self.DependentList = []
 
     ## The thread wrapper of LaunchCommand function
     #
@@ -607,14 +919,21 @@ class BuildTask:
     # @param  WorkingDir            The directory in which the program will be running
     #
     def _CommandThread(self, Command, WorkingDir):
+        Succeeded = False
+        BeginTime = time.time()
         try:
-            self.BuildItem.BuildObject.BuildTime = LaunchCommand(Command, WorkingDir)
-            self.CompleteFlag = True
+            # make rewrites the outputs of the module in place
+            DepsDir = None
+            if isinstance(self.BuildItem, ModuleMakeUnit):
+                BreakCacheLinks(self.BuildItem.BuildObject.OutputDir)
+                DepsDir = GetShowIncludesDir(self.BuildItem.BuildObject)
+            self.BuildItem.BuildObject.BuildTime = LaunchCommand(Command, WorkingDir, BuildTask._JobServer, DepsDir)
 
             # Run hash operation post dependency, to account for libs
             if GlobalData.gUseHashCache and self.BuildItem.BuildObject.IsLibrary:
                 HashFile = path.join(self.BuildItem.BuildObject.BuildDir, self.BuildItem.BuildObject.Name + ".hash")
                 SaveFileOnChange(HashFile, self.BuildItem.BuildObject.GenModuleHash(), True)
+            Succeeded = True
         except:
             #
             # TRICK: hide the output of threads left running, so that the user can
@@ -640,15 +959,22 @@ class BuildTask:
             GlobalData.gModuleBuildTracking[self.BuildItem.BuildObject] = 'SUCCESS'
 
         # indicate there's a thread is available for another build task
-        BuildTask._RunningQueueLock.acquire()
-        BuildTask._RunningQueue.pop(self.BuildItem)
-        BuildTask._RunningQueueLock.release()
-        BuildTask._Thread.release()
+        BuildTask._ReleaseJobToken(self.JobToken)
+        with BuildTask._Condition:
+            if Succeeded:
+                BuildTask._BuildTimeHistory[repr(self.BuildItem)] = int(round((time.time() - BeginTime) * 1000))
+                self._Complete()
+            BuildTask._RunningQueue.pop(self.BuildItem)
+            BuildTask._Thread.release()
+            BuildTask._Condition.notify_all()
 
     ## Start build task thread
     #
-    def Start(self):
+    #   @param  JobToken    The jobserver slot taken for the task
+    #
+    def Start(self, JobToken=None):
         EdkLogger.quiet("Building ... %s" % repr(self.BuildItem))
+        self.JobToken = JobToken
         Command = self.BuildItem.BuildCommand + [self.BuildItem.Target]
         self.BuildTread = Thread(target=self._CommandThread, args=(Command, self.BuildItem.WorkingDir))
         self.BuildTread.setName("build thread")
@@ -733,6 +1059,17 @@ class Build():
         GlobalData.gBinCacheSource = BuildOptions.BinCacheSource
         GlobalData.gEnableGenfdsMultiThread = not BuildOptions.NoGenfdsMultiThread
         GlobalData.gDisableIncludePathCheck = BuildOptions.DisableIncludePathCheck
+        GlobalData.gBuildBackend = BuildOptions.Backend
+        GlobalData.gUseCompilerDeps = BuildOptions.UseCompilerDeps
+
+        if GlobalData.gUseCompilerDeps and GlobalData.gBuildBackend == 'ninja':
+            EdkLogger.error("build", OPTION_NOT_SUPPORTED, ExtraData="--compiler-deps can not be used together with --backend=ninja, "
+                            "which gets the header files from compiler by itself.")
+
+        # only the makefiles can run the other targets, but the modules get build.ninja instead of them
+        if GlobalData.gBuildBackend == 'ninja' and self.Target not in ["", "all", "genc", "genmake"]:
+            EdkLogger.error("build", OPTION_NOT_SUPPORTED, ExtraData="--backend=ninja can only be used with the all, genc and genmake "
+                            "targets, not %s." % self.Target)
 
         if GlobalData.gBinCacheDest and not GlobalData.gUseHashCache:
             EdkLogger.error("build", OPTION_NOT_SUPPORTED, ExtraData="--binary-destination must be used together with --hash.")
@@ -743,6 +1080,15 @@ class Build():
         if GlobalData.gBinCacheDest and GlobalData.gBinCacheSource:
             EdkLogger.error("build", OPTION_NOT_SUPPORTED, ExtraData="--binary-destination can not be used together with --binary-source.")
 
+        if BuildOptions.BinCacheSize:
+            if not GlobalData.gBinCacheDest:
+                EdkLogger.error("build", OPTION_NOT_SUPPORTED, ExtraData="--binary-cache-size must be used together with --binary-destination.")
+            GlobalData.gBinCacheMaxSize = GetBinCacheMaxSize(BuildOptions)
+
+        GlobalData.gBinCacheLink = BuildOptions.BinCacheLink
+        if GlobalData.gBinCacheLink and not GlobalData.gBinCacheSource:
+            EdkLogger.error("build", OPTION_NOT_SUPPORTED, ExtraData="--binary-cache-link must be used together with --binary-source.")
+
         if GlobalData.gBinCacheSource:
             BinCacheSource = os.path.normpath(GlobalData.gBinCacheSource)
             if not os.path.isabs(BinCacheSource):
@@ -761,6 +1107,14 @@ class Build():
             if GlobalData.gBinCacheDest is not None:
                 EdkLogger.error("build", OPTION_VALUE_INVALID, ExtraData="Invalid value of option --binary-destination.")
 
+        if GlobalData.gUseHashCache:
+            GlobalData.gFileHashCache = FileHashCache(os.path.join(self.WorkspaceDir, 'Build', '.cache', 'filehash.db'))
+        if not BuildOptions.DisableCache:
+            GlobalData.gFileIncludeCache = FileIncludeCache(os.path.join(self.WorkspaceDir, 'Build', '.cache', 'include.db'))
+            if not BuildOptions.Reparse:
+                GlobalData.gMetaFileCache = MetaFileRecordCache(os.path.join(self.WorkspaceDir, 'Build', '.cache', 'metafile.db'))
+            GlobalData.gPcdValueInitCache = os.path.join(self.WorkspaceDir, 'Build', '.cache', 'PcdValueInit')
+
         GlobalData.gDatabasePath = os.path.normpath(os.path.join(GlobalData.gConfDirectory, GlobalData.gDatabasePath))
         if not os.path.exists(os.path.join(GlobalData.gConfDirectory, '.cache')):
             os.makedirs(os.path.join(GlobalData.gConfDirectory, '.cache'))
@@ -817,23 +1171,68 @@ class Build():
         self.log_q = log_q
         GlobalData.file_lock =  mp.Lock()
         GlobalData.cache_lock = mp.Lock()
+    ## Run AutoGen of the modules in mqueue with the worker processes
+    #
+    #   Each item in mqueue is a (module info, data pipe file) pair.
+    #
     def StartAutoGen(self,mqueue, DataPipe,SkipAutoGen,PcdMaList,share_data):
+        if SkipAutoGen:
+            return True,0
+        self._StartAutoGenWorkers(mqueue, share_data)
+        try:
+            rt, errorcode = self._GenPcdDriverAutoGen(DataPipe, PcdMaList, share_data)
+        finally:
+            self._EndAutoGenQueue(mqueue)
+        return self._WaitAutoGenWorkers(rt, errorcode)
+
+    ## Start the AutoGen worker processes
+    #
+    #   The workers keep taking modules from mqueue until they get None from it,
+    #   so modules of more archs can be put into mqueue after the start.
+    #
+    def _StartAutoGenWorkers(self, mqueue, share_data):
+        feedback_q = mp.Queue()
+        error_event = mp.Event()
+        auto_workers = [AutoGenWorkerInProcess(mqueue,feedback_q,GlobalData.file_lock,GlobalData.cache_lock,share_data,self.log_q,error_event) for _ in range(self.ThreadNumber)]
+        self.AutoGenMgr = AutoGenManager(auto_workers,feedback_q,error_event)
+        self.AutoGenMgr.start()
+        for w in auto_workers:
+            w.start()
+
+    ## Tell the AutoGen workers there's no more module
+    #
+    def _EndAutoGenQueue(self, mqueue):
+        for _ in range(self.ThreadNumber):
+            mqueue.put(None)
+
+    ## Wait for the AutoGen workers to finish
+    #
+    #   @param  rt          The status of the AutoGen done out of the workers
+    #   @param  errorcode   The error code if rt is False
+    #
+    def _WaitAutoGenWorkers(self, rt, errorcode):
+        if not rt:
+            self.AutoGenMgr.TerminateWorkers()
+        self.AutoGenMgr.join()
+        for CacheCopyStat in self.AutoGenMgr.CacheCopyStat:
+            GetCacheCopyEngine().Count(*CacheCopyStat)
+        if rt and not self.AutoGenMgr.Status:
+            errorcode = self.AutoGenMgr.ErrorCode
+        return rt and self.AutoGenMgr.Status, errorcode
+
+    ## Run AutoGen of the PCD driver modules in the main process
+    #
+    #   @param  DataPipe    The data pipe of the platform the modules belong to
+    #   @param  PcdMaList   The ModuleAutoGen objects of PCD drivers
+    #
+    def _GenPcdDriverAutoGen(self, DataPipe, PcdMaList, share_data):
         try:
-            if SkipAutoGen:
-                return True,0
-            feedback_q = mp.Queue()
-            error_event = mp.Event()
             FfsCmd = DataPipe.Get("FfsCommand")
             if FfsCmd is None:
                 FfsCmd = {}
             GlobalData.FfsCmd = FfsCmd
             GlobalData.libConstPcd = DataPipe.Get("LibConstPcd")
             GlobalData.Refes = DataPipe.Get("REFS")
-            auto_workers = [AutoGenWorkerInProcess(mqueue,DataPipe.dump_file,feedback_q,GlobalData.file_lock,GlobalData.cache_lock,share_data,self.log_q,error_event) for _ in range(self.ThreadNumber)]
-            self.AutoGenMgr = AutoGenManager(auto_workers,feedback_q,error_event)
-            self.AutoGenMgr.start()
-            for w in auto_workers:
-                w.start()
             if PcdMaList is not None:
                 for PcdMa in PcdMaList:
                     if GlobalData.gBinCacheSource and self.Target in [None, "", "all"]:
@@ -850,10 +1249,7 @@ class Build():
                         PcdMa.GenMakeHash(share_data)
                         if PcdMa.CanSkipbyMakeCache(share_data):
                             continue
-
-            self.AutoGenMgr.join()
-            rt = self.AutoGenMgr.Status
-            return rt, 0
+            return True, 0
         except FatalError as e:
             return False, e.args[0]
         except:
@@ -923,6 +1319,8 @@ class Build():
 
             self.PlatformFile = PathClass(NormFile(PlatformFile, self.WorkspaceDir), self.WorkspaceDir)
         self.ThreadNumber   = ThreadNum()
+        GlobalData.gParserProcessNumber = self.ThreadNumber
+        GlobalData.gGenFdsThreadNumber = self.ThreadNumber
     ## Initialize build configuration
     #
     #   This method will parse DSC file and merge the configurations from
@@ -1216,10 +1614,6 @@ class Build():
         # skip file generation for cleanxxx targets, run and fds target
         if Target not in ['clean', 'cleanlib', 'cleanall', 'run', 'fds']:
             # for target which must generate AutoGen code and makefile
-            mqueue = mp.Queue()
-            for m in AutoGenObject.GetAllModuleInfo:
-                mqueue.put(m)
-
             AutoGenObject.DataPipe.DataContainer = {"CommandTarget": self.Target}
             AutoGenObject.DataPipe.DataContainer = {"Workspace_timestamp": AutoGenObject.Workspace._SrcTimeStamp}
             AutoGenObject.CreateLibModuelDirs()
@@ -1229,6 +1623,9 @@ class Build():
             self.Progress.Start("Generating makefile and code")
             data_pipe_file = os.path.join(AutoGenObject.BuildDir, "GlobalVar_%s_%s.bin" % (str(AutoGenObject.Guid),AutoGenObject.Arch))
             AutoGenObject.DataPipe.dump(data_pipe_file)
+            mqueue = mp.Queue()
+            for m in AutoGenObject.GetAllModuleInfo:
+                mqueue.put((m, data_pipe_file))
             autogen_rt,errorcode = self.StartAutoGen(mqueue, AutoGenObject.DataPipe, self.SkipAutoGen, PcdMaList, GlobalData.gCacheIR)
             AutoGenIdFile = os.path.join(GlobalData.gConfDirectory,".AutoGenIdFile.txt")
             with open(AutoGenIdFile,"w") as fw:
@@ -1267,7 +1664,7 @@ class Build():
         # build modules
         if BuildModule:
             BuildCommand = BuildCommand + [Target]
-            LaunchCommand(BuildCommand, AutoGenObject.MakeFileDir)
+            LaunchCommand(BuildCommand, AutoGenObject.MakeFileDir, DepsDir=GetShowIncludesDir(AutoGenObject))
             self.CreateAsBuiltInf()
             if GlobalData.gBinCacheDest:
                 self.UpdateBuildCache()
@@ -1384,7 +1781,7 @@ class Build():
         if BuildModule:
             if Target != 'fds':
                 BuildCommand = BuildCommand + [Target]
-            AutoGenObject.BuildTime = LaunchCommand(BuildCommand, AutoGenObject.MakeFileDir)
+            AutoGenObject.BuildTime = LaunchCommand(BuildCommand, AutoGenObject.MakeFileDir, DepsDir=GetShowIncludesDir(AutoGenObject))
             self.CreateAsBuiltInf()
             if GlobalData.gBinCacheDest:
                 self.UpdateBuildCache()
@@ -1429,6 +1826,8 @@ class Build():
             ModuleName = ModuleInfo.BaseName
             ModuleOutputImage = ModuleInfo.Image.FileName
             ModuleDebugImage  = os.path.join(ModuleInfo.DebugDir, ModuleInfo.BaseName + '.efi')
+            # GenFw changes the image in place, not the blob it may be linked to
+            BreakLink(ModuleOutputImage)
             ## for SMM module in SMRAM, the SMRAM will be allocated from base to top.
             if not ModeIsSmm:
                 BaseAddress = BaseAddress - ModuleInfo.Image.Size
@@ -1848,6 +2247,7 @@ class Build():
                 MaList = []
                 ExitFlag = threading.Event()
                 ExitFlag.clear()
+                BuildTask.LoadBuildTimeHistory(Wa.BuildDir)
                 self.AutoGenTime += int(round((time.time() - WorkspaceAutoGenTime)))
                 for Arch in Wa.ArchList:
                     AutoGenStart = time.time()
@@ -1909,20 +2309,22 @@ class Build():
                             GlobalData.gModuleBuildTracking[Ma] = 'FAIL'
                     self.AutoGenTime += int(round((time.time() - AutoGenStart)))
                     MakeStart = time.time()
-                    for Ma in self.BuildModules:
-                        if not Ma.IsBinaryModule:
-                            Bt = BuildTask.New(ModuleMakeUnit(Ma, Pa.BuildCommand,self.Target))
-                        # Break build if any build thread has error
-                        if BuildTask.HasError():
-                            # we need a full version of makefile for platform
-                            ExitFlag.set()
-                            BuildTask.WaitForComplete()
-                            self.invalidateHash()
-                            Pa.CreateMakeFile(False)
-                            EdkLogger.error("build", BUILD_ERROR, "Failed to build module", ExtraData=GlobalData.gBuildingModule)
-                        # Start task scheduler
-                        if not BuildTask.IsOnGoing():
-                            BuildTask.StartScheduler(self.ThreadNumber, ExitFlag)
+                    # ninja builds all modules at once after AutoGen
+                    if GlobalData.gBuildBackend != 'ninja':
+                        for Ma in self.BuildModules:
+                            if not Ma.IsBinaryModule:
+                                Bt = BuildTask.New(ModuleMakeUnit(Ma, Pa.BuildCommand,self.Target))
+                            # Break build if any build thread has error
+                            if BuildTask.HasError():
+                                # we need a full version of makefile for platform
+                                ExitFlag.set()
+                                BuildTask.WaitForComplete()
+                                self.invalidateHash()
+                                Pa.CreateMakeFile(False)
+                                EdkLogger.error("build", BUILD_ERROR, "Failed to build module", ExtraData=GlobalData.gBuildingModule)
+                            # Start task scheduler
+                            if not BuildTask.IsOnGoing():
+                                BuildTask.StartScheduler(self.ThreadNumber, ExitFlag)
 
                     # in case there's an interruption. we need a full version of makefile for platform
                     Pa.CreateMakeFile(False)
@@ -1934,6 +2336,9 @@ class Build():
                 MakeContiue = time.time()
                 ExitFlag.set()
                 BuildTask.WaitForComplete()
+                if GlobalData.gBuildBackend == 'ninja':
+                    self._NinjaBuild(Wa, set(self.BuildModules))
+                BuildTask.SaveBuildTimeHistory()
                 self.CreateAsBuiltInf()
                 if GlobalData.gBinCacheDest:
                     self.UpdateBuildCache()
@@ -2113,77 +2518,98 @@ class Build():
         self.AutoGenTime += int(round((time.time() - WorkspaceAutoGenTime)))
         BuildModules = []
         TotalModules = []
-        for Arch in Wa.ArchList:
-            PcdMaList    = []
-            AutoGenStart = time.time()
-            GlobalData.gGlobalDefines['ARCH'] = Arch
-            Pa = PlatformAutoGen(Wa, self.PlatformFile, BuildTarget, ToolChain, Arch)
-            if Pa is None:
-                continue
-            ModuleList = []
-            for Inf in Pa.Platform.Modules:
-                ModuleList.append(Inf)
-                    # Add the INF only list in FDF
-            if GlobalData.gFdfParser is not None:
-                for InfName in GlobalData.gFdfParser.Profile.InfList:
-                    Inf = PathClass(NormPath(InfName), self.WorkspaceDir, Arch)
-                    if Inf in Pa.Platform.Modules:
-                        continue
-                    ModuleList.append(Inf)
-            Pa.DataPipe.DataContainer = {"FfsCommand":CmdListDict}
-            Pa.DataPipe.DataContainer = {"Workspace_timestamp": Wa._SrcTimeStamp}
-            Pa.DataPipe.DataContainer = {"CommandTarget": self.Target}
-            Pa.CreateLibModuelDirs()
-            Pa.DataPipe.DataContainer = {"LibraryBuildDirectoryList":Pa.LibraryBuildDirectoryList}
-            Pa.DataPipe.DataContainer = {"ModuleBuildDirectoryList":Pa.ModuleBuildDirectoryList}
-            Pa.DataPipe.DataContainer = {"FdsCommandDict": Wa.GenFdsCommandDict}
-            ModuleCodaFile = {}
-            for ma in Pa.ModuleAutoGenList:
-                ModuleCodaFile[(ma.MetaFile.File,ma.MetaFile.Root,ma.Arch,ma.MetaFile.Path)] = [item.Target for item in ma.CodaTargetList]
-            Pa.DataPipe.DataContainer = {"ModuleCodaFile":ModuleCodaFile}
-            for Module in ModuleList:
-                        # Get ModuleAutoGen object to generate C code file and makefile
-                Ma = ModuleAutoGen(Wa, Module, BuildTarget, ToolChain, Arch, self.PlatformFile,Pa.DataPipe)
-
-                if Ma is None:
+        AutoGenStart = time.time()
+        #
+        # All archs share one pool of AutoGen workers. The modules of an arch are
+        # put into the queue as soon as its data pipe is ready, so the workers run
+        # AutoGen of them while the PlatformAutoGen of the next arch is created.
+        #
+        mqueue = mp.Queue()
+        autogen_rt, errorcode = True, 0
+        if not self.SkipAutoGen:
+            self._StartAutoGenWorkers(mqueue, GlobalData.gCacheIR)
+        try:
+            for Arch in Wa.ArchList:
+                # no need to go on if any module of previous arch failed
+                if not self.SkipAutoGen and not self.AutoGenMgr.Status:
+                    break
+                PcdMaList    = []
+                GlobalData.gGlobalDefines['ARCH'] = Arch
+                Pa = PlatformAutoGen(Wa, self.PlatformFile, BuildTarget, ToolChain, Arch)
+                if Pa is None:
                     continue
-                if Ma.PcdIsDriver:
-                    Ma.PlatformInfo = Pa
-                    Ma.Workspace = Wa
-                    PcdMaList.append(Ma)
-                TotalModules.append(Ma)
-                # Initialize all modules in tracking to 'FAIL'
-                GlobalData.gModuleBuildTracking[Ma] = 'FAIL'
+                ModuleList = []
+                for Inf in Pa.Platform.Modules:
+                    ModuleList.append(Inf)
+                        # Add the INF only list in FDF
+                if GlobalData.gFdfParser is not None:
+                    for InfName in GlobalData.gFdfParser.Profile.InfList:
+                        Inf = PathClass(NormPath(InfName), self.WorkspaceDir, Arch)
+                        if Inf in Pa.Platform.Modules:
+                            continue
+                        ModuleList.append(Inf)
+                Pa.DataPipe.DataContainer = {"FfsCommand":CmdListDict}
+                Pa.DataPipe.DataContainer = {"Workspace_timestamp": Wa._SrcTimeStamp}
+                Pa.DataPipe.DataContainer = {"CommandTarget": self.Target}
+                Pa.CreateLibModuelDirs()
+                Pa.DataPipe.DataContainer = {"LibraryBuildDirectoryList":Pa.LibraryBuildDirectoryList}
+                Pa.DataPipe.DataContainer = {"ModuleBuildDirectoryList":Pa.ModuleBuildDirectoryList}
+                Pa.DataPipe.DataContainer = {"FdsCommandDict": Wa.GenFdsCommandDict}
+                ModuleCodaFile = {}
+                for ma in Pa.ModuleAutoGenList:
+                    ModuleCodaFile[(ma.MetaFile.File,ma.MetaFile.Root,ma.Arch,ma.MetaFile.Path)] = [item.Target for item in ma.CodaTargetList]
+                Pa.DataPipe.DataContainer = {"ModuleCodaFile":ModuleCodaFile}
+                for Module in ModuleList:
+                            # Get ModuleAutoGen object to generate C code file and makefile
+                    Ma = ModuleAutoGen(Wa, Module, BuildTarget, ToolChain, Arch, self.PlatformFile,Pa.DataPipe)
+
+                    if Ma is None:
+                        continue
+                    if Ma.PcdIsDriver:
+                        Ma.PlatformInfo = Pa
+                        Ma.Workspace = Wa
+                        PcdMaList.append(Ma)
+                    TotalModules.append(Ma)
+                    # Initialize all modules in tracking to 'FAIL'
+                    GlobalData.gModuleBuildTracking[Ma] = 'FAIL'
 
 
-            mqueue = mp.Queue()
-            for m in Pa.GetAllModuleInfo:
-                mqueue.put(m)
-            data_pipe_file = os.path.join(Pa.BuildDir, "GlobalVar_%s_%s.bin" % (str(Pa.Guid),Pa.Arch))
-            Pa.DataPipe.dump(data_pipe_file)
-
-            autogen_rt, errorcode = self.StartAutoGen(mqueue, Pa.DataPipe, self.SkipAutoGen, PcdMaList,GlobalData.gCacheIR)
-
-            # Skip cache hit modules
-            if GlobalData.gBinCacheSource:
-                for Ma in TotalModules:
-                    if (Ma.MetaFile.Path, Ma.Arch) in GlobalData.gCacheIR and \
-                        GlobalData.gCacheIR[(Ma.MetaFile.Path, Ma.Arch)].PreMakeCacheHit:
-                            self.HashSkipModules.append(Ma)
-                            continue
-                    if (Ma.MetaFile.Path, Ma.Arch) in GlobalData.gCacheIR and \
-                        GlobalData.gCacheIR[(Ma.MetaFile.Path, Ma.Arch)].MakeCacheHit:
-                            self.HashSkipModules.append(Ma)
-                            continue
-                    BuildModules.append(Ma)
-            else:
-                BuildModules.extend(TotalModules)
+                data_pipe_file = os.path.join(Pa.BuildDir, "GlobalVar_%s_%s.bin" % (str(Pa.Guid),Pa.Arch))
+                Pa.DataPipe.dump(data_pipe_file)
+                if self.SkipAutoGen:
+                    continue
 
-            if not autogen_rt:
-                self.AutoGenMgr.TerminateWorkers()
-                self.AutoGenMgr.join(1)
-                raise FatalError(errorcode)
-            self.AutoGenTime += int(round((time.time() - AutoGenStart)))
+                for m in Pa.GetAllModuleInfo:
+                    mqueue.put((m, data_pipe_file))
+                autogen_rt, errorcode = self._GenPcdDriverAutoGen(Pa.DataPipe, PcdMaList, GlobalData.gCacheIR)
+                if not autogen_rt:
+                    break
+        finally:
+            if not self.SkipAutoGen:
+                self._EndAutoGenQueue(mqueue)
+
+        if not self.SkipAutoGen:
+            autogen_rt, errorcode = self._WaitAutoGenWorkers(autogen_rt, errorcode)
+        if not autogen_rt:
+            self.AutoGenMgr.TerminateWorkers()
+            self.AutoGenMgr.join(1)
+            raise FatalError(errorcode)
+
+        # Skip cache hit modules
+        if GlobalData.gBinCacheSource:
+            for Ma in TotalModules:
+                if (Ma.MetaFile.Path, Ma.Arch) in GlobalData.gCacheIR and \
+                    GlobalData.gCacheIR[(Ma.MetaFile.Path, Ma.Arch)].PreMakeCacheHit:
+                        self.HashSkipModules.append(Ma)
+                        continue
+                if (Ma.MetaFile.Path, Ma.Arch) in GlobalData.gCacheIR and \
+                    GlobalData.gCacheIR[(Ma.MetaFile.Path, Ma.Arch)].MakeCacheHit:
+                        self.HashSkipModules.append(Ma)
+                        continue
+                BuildModules.append(Ma)
+        else:
+            BuildModules.extend(TotalModules)
+        self.AutoGenTime += int(round((time.time() - AutoGenStart)))
         AutoGenIdFile = os.path.join(GlobalData.gConfDirectory,".AutoGenIdFile.txt")
         with open(AutoGenIdFile,"w") as fw:
             fw.write("Arch=%s\n" % "|".join((Wa.ArchList)))
@@ -2216,6 +2642,7 @@ class Build():
                     Wa, self.BuildModules = self.PerformAutoGen(BuildTarget,ToolChain)
                 Pa = Wa.AutoGenObjectList[0]
                 GlobalData.gAutoGenPhase = False
+                BuildTask.LoadBuildTimeHistory(Wa.BuildDir)
 
                 if GlobalData.gBinCacheSource:
                     EdkLogger.quiet("Total cache hit driver num: %s, cache miss driver num: %s" % (len(set(self.HashSkipModules)), len(set(self.BuildModules))))
@@ -2233,21 +2660,23 @@ class Build():
 
                 for Arch in Wa.ArchList:
                     MakeStart = time.time()
-                    for Ma in set(self.BuildModules):
-                        # Generate build task for the module
-                        if not Ma.IsBinaryModule:
-                            Bt = BuildTask.New(ModuleMakeUnit(Ma, Pa.BuildCommand,self.Target))
-                        # Break build if any build thread has error
-                        if BuildTask.HasError():
-                            # we need a full version of makefile for platform
-                            ExitFlag.set()
-                            BuildTask.WaitForComplete()
-                            self.invalidateHash()
-                            Pa.CreateMakeFile(False)
-                            EdkLogger.error("build", BUILD_ERROR, "Failed to build module", ExtraData=GlobalData.gBuildingModule)
-                        # Start task scheduler
-                        if not BuildTask.IsOnGoing():
-                            BuildTask.StartScheduler(self.ThreadNumber, ExitFlag)
+                    # ninja builds all modules at once
+                    if GlobalData.gBuildBackend != 'ninja':
+                        for Ma in set(self.BuildModules):
+                            # Generate build task for the module
+                            if not Ma.IsBinaryModule:
+                                Bt = BuildTask.New(ModuleMakeUnit(Ma, Pa.BuildCommand,self.Target))
+                            # Break build if any build thread has error
+                            if BuildTask.HasError():
+                                # we need a full version of makefile for platform
+                                ExitFlag.set()
+                                BuildTask.WaitForComplete()
+                                self.invalidateHash()
+                                Pa.CreateMakeFile(False)
+                                EdkLogger.error("build", BUILD_ERROR, "Failed to build module", ExtraData=GlobalData.gBuildingModule)
+                            # Start task scheduler
+                            if not BuildTask.IsOnGoing():
+                                BuildTask.StartScheduler(self.ThreadNumber, ExitFlag)
 
                     # in case there's an interruption. we need a full version of makefile for platform
 
@@ -2264,6 +2693,9 @@ class Build():
                 #
                 ExitFlag.set()
                 BuildTask.WaitForComplete()
+                if GlobalData.gBuildBackend == 'ninja':
+                    self._NinjaBuild(Wa, set(self.BuildModules))
+                BuildTask.SaveBuildTimeHistory()
                 self.CreateAsBuiltInf()
                 if GlobalData.gBinCacheDest:
                     self.UpdateBuildCache()
@@ -2316,6 +2748,52 @@ class Build():
                     self._SaveMapFile(MapBuffer, Wa)
                 self.CreateGuidedSectionToolsFile(Wa)
         self.invalidateHash()
+
+    ## Build modules through one ninja file of the whole platform
+    #
+    #   The ninja files of modules are generated in AutoGen. The platform ninja
+    #   file includes the ones of given modules and the libraries they depend on.
+    #
+    #   @param  Wa          The WorkspaceAutoGen object
+    #   @param  ModuleList  The ModuleAutoGen objects to be built
+    #
+    def _NinjaBuild(self, Wa, ModuleList):
+        if not IsToolInPath('ninja'):
+            EdkLogger.error("build", FILE_NOT_FOUND, "ninja is required by --backend=ninja but not found in PATH")
+
+        NinjaModuleList = []
+        ModuleSet = set()
+        ModuleStack = [Ma for Ma in ModuleList if not Ma.IsBinaryModule]
+        while ModuleStack:
+            Ma = ModuleStack.pop()
+            if Ma in ModuleSet:
+                continue
+            ModuleSet.add(Ma)
+            NinjaModuleList.append(Ma)
+            for La in Ma.LibraryAutoGenList:
+                if not La.IsBinaryModule and not La.CanSkipbyCache(GlobalData.gCacheIR):
+                    ModuleStack.append(La)
+        if not NinjaModuleList:
+            return
+
+        NinjaFile = GenMake.PlatformNinjaFile(Wa, NinjaModuleList)
+        NinjaFile.Generate()
+        for Ma in NinjaModuleList:
+            BreakCacheLinks(Ma.OutputDir)
+        try:
+            LaunchCommand(['ninja', '-f', NinjaFile.FilePath, '-j', str(self.ThreadNumber)], Wa.BuildDir)
+        except FatalError:
+            self.invalidateHash()
+            raise
+
+        for Ma in NinjaModuleList:
+            # Run hash operation post dependency, to account for libs
+            if GlobalData.gUseHashCache and Ma.IsLibrary:
+                HashFile = path.join(Ma.BuildDir, Ma.Name + ".hash")
+                SaveFileOnChange(HashFile, Ma.GenModuleHash(), True)
+            if Ma in GlobalData.gModuleBuildTracking and GlobalData.gModuleBuildTracking[Ma] != 'FAIL_METAFILE':
+                GlobalData.gModuleBuildTracking[Ma] = 'SUCCESS'
+
     ## Generate GuidedSectionTools.txt in the FV directories.
     #
     def CreateGuidedSectionToolsFile(self,Wa):
@@ -2371,15 +2849,25 @@ class Build():
     ## Launch the module or platform build
     #
     def Launch(self):
-        if not self.ModuleFile:
-            if not self.SpawnMode or self.Target not in ["", "all"]:
-                self.SpawnMode = False
-                self._BuildPlatform()
+        try:
+            if not self.ModuleFile:
+                if not self.SpawnMode or self.Target not in ["", "all"]:
+                    self.SpawnMode = False
+                    self._BuildPlatform()
+                else:
+                    self._MultiThreadBuildPlatform()
             else:
-                self._MultiThreadBuildPlatform()
-        else:
-            self.SpawnMode = False
-            self._BuildModule()
+                self.SpawnMode = False
+                self._BuildModule()
+        finally:
+            if GlobalData.gFileHashCache:
+                GlobalData.gFileHashCache.Flush()
+            if GlobalData.gFileIncludeCache:
+                GlobalData.gFileIncludeCache.Flush()
+            if GlobalData.gMetaFileCache:
+                GlobalData.gMetaFileCache.Flush()
+            for Line in GetCacheCopyEngine().Summary():
+                EdkLogger.quiet(Line)
 
         if self.Target == 'cleanall':
             RemoveDirectory(os.path.dirname(GlobalData.gDatabasePath), True)
@@ -2402,9 +2890,12 @@ class Build():
                 all_lib_set.add(lib)
         for lib in all_lib_set:
             lib.CopyModuleToCache()
+        GetCacheCopyEngine().Wait()
         all_lib_set.clear()
         all_mod_set.clear()
         self.HashSkipModules = []
+        if GlobalData.gBinCacheMaxSize:
+            BinCacheGc(GlobalData.gBinCacheDest, GlobalData.gBinCacheMaxSize)
     ## Do some clean-up works when error occurred
     def Relinquish(self):
         OldLogLevel = EdkLogger.GetLevel()
@@ -2430,7 +2921,28 @@ def ParseDefines(DefineList=[]):
                 DefineDict[DefineTokenList[0]] = DefineTokenList[1].strip()
     return DefineDict
 
+## Get the size limit of binary cache from --binary-cache-size option
+#
+#   @param  Option      The build options
+#
+#   @retval int         The size limit in bytes, or None if no limit
+#
+def GetBinCacheMaxSize(Option):
+    if not Option.BinCacheSize:
+        return None
+    try:
+        return ParseCacheSize(Option.BinCacheSize)
+    except ValueError:
+        EdkLogger.error("build", OPTION_VALUE_INVALID, ExtraData="Invalid value of option --binary-cache-size: %s" % Option.BinCacheSize)
 
+## Remove unreferenced files and least recently used entries from binary cache
+#
+#   @param  CacheDir    The directory of binary cache
+#   @param  MaxSize     The size limit of binary cache, or None if no limit
+#
+def BinCacheGc(CacheDir, MaxSize):
+    RemovedEntry, RemovedBlob, CacheSize = BinaryCacheStore(CacheDir).Gc(MaxSize)
+    EdkLogger.quiet("[cache gc]: removed %d cache entries and %d files, %d bytes used in %s" % (RemovedEntry, RemovedBlob, CacheSize, CacheDir))
 
 def LogBuildTime(Time):
     if Time:
@@ -2576,10 +3088,20 @@ def Main():
         if Option.Flag is not None and Option.Flag not in ['-c', '-s']:
             EdkLogger.error("build", OPTION_VALUE_INVALID, "UNI flag must be one of -c or -s")
 
-        MyBuild = Build(Target, Workspace, Option,LogQ)
-        GlobalData.gCommandLineDefines['ARCH'] = ' '.join(MyBuild.ArchList)
-        if not (MyBuild.LaunchPrebuildFlag and os.path.exists(MyBuild.PlatformBuildPath)):
-            MyBuild.Launch()
+        if Option.CacheGc:
+            if not Option.BinCacheDest:
+                EdkLogger.error("build", OPTION_MISSING, ExtraData="--cache-gc must be used together with --binary-destination.")
+            CacheDir = os.path.normpath(Option.BinCacheDest)
+            if not os.path.isabs(CacheDir):
+                CacheDir = mws.join(Workspace, CacheDir)
+            if not os.path.isdir(CacheDir):
+                EdkLogger.error("build", FILE_NOT_FOUND, ExtraData="Binary cache directory %s does not exist." % CacheDir)
+            BinCacheGc(CacheDir, GetBinCacheMaxSize(Option))
+        else:
+            MyBuild = Build(Target, Workspace, Option,LogQ)
+            GlobalData.gCommandLineDefines['ARCH'] = ' '.join(MyBuild.ArchList)
+            if not (MyBuild.LaunchPrebuildFlag and os.path.exists(MyBuild.PlatformBuildPath)):
+                MyBuild.Launch()
 
         #
         # All job done, no error found and no exception raised
@@ -2637,7 +3159,8 @@ def Main():
 
     if ReturnCode == 0:
         try:
-            MyBuild.LaunchPostbuild()
+            if MyBuild is not None:
+                MyBuild.LaunchPostbuild()
             Conclusion = "Done"
         except:
             Conclusion = "Failed"
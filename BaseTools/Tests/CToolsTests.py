@@ -14,8 +14,14 @@ import sys
 import unittest
 
 import TianoCompress
+import TestStructurePcdLayout
+import TestFfsEncoder
+import TestGenFdsParallel
 modules = (
     TianoCompress,
+    TestStructurePcdLayout,
+    TestFfsEncoder,
+    TestGenFdsParallel,
     )
 
 
@@ -20,6 +20,26 @@ def TheTestSuite():
     suites.append(CheckPythonSyntax.TheTestSuite())
     import CheckUnicodeSourceFiles
     suites.append(CheckUnicodeSourceFiles.TheTestSuite())
+    import TestDataPipe
+    suites.append(TestDataPipe.TheTestSuite())
+    import TestBinaryCache
+    suites.append(TestBinaryCache.TheTestSuite())
+    import TestCacheIR
+    suites.append(TestCacheIR.TheTestSuite())
+    import TestMetaFileTable
+    suites.append(TestMetaFileTable.TheTestSuite())
+    import TestDirListCache
+    suites.append(TestDirListCache.TheTestSuite())
+    import TestPreParse
+    suites.append(TestPreParse.TheTestSuite())
+    import TestExpression
+    suites.append(TestExpression.TheTestSuite())
+    import TestFdfProfile
+    suites.append(TestFdfProfile.TheTestSuite())
+    import TestNinjaFile
+    suites.append(TestNinjaFile.TheTestSuite())
+    import TestShowIncludes
+    suites.append(TestShowIncludes.TheTestSuite())
     return unittest.TestSuite(suites)
 
 if __name__ == '__main__':
@@ -0,0 +1,148 @@
+## @file
+# Unit tests for the content addressable store of the binary cache
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import os
+import stat
+import unittest
+
+import TestTools
+from Common import EdkLogger
+import AutoGen.BinaryCache as BinaryCache
+from AutoGen.BinaryCache import BinaryCacheStore, BreakLink, SaveCacheLinks, BreakCacheLinks, CACHE_FILE_OUTPUT, CACHE_LINK_FILE, INDEX_FILE, MANIFEST_SUFFIX
+
+class Tests(TestTools.BaseToolsTest):
+
+    def setUp(self):
+        TestTools.BaseToolsTest.setUp(self)
+        EdkLogger.InitializeForUnitTest()
+        self.Store = BinaryCacheStore(self.GetTmpFilePath('cache'))
+        os.mkdir(self.Store.Root)
+        self.SavedGracePeriod = BinaryCache.BLOB_GRACE_PERIOD
+
+    def tearDown(self):
+        BinaryCache.BLOB_GRACE_PERIOD = self.SavedGracePeriod
+        for Root, Dirs, Files in os.walk(self.testDir):
+            for Name in Files:
+                os.chmod(os.path.join(Root, Name), stat.S_IWRITE | stat.S_IREAD)
+        TestTools.BaseToolsTest.tearDown(self)
+
+    ## Save an entry of a module in the cache
+    #
+    #   @param  Name        The module name, also the name of its cache directory
+    #   @param  FileDict    {file name: content}
+    #
+    #   @retval str         The path of the manifest
+    #
+    def SaveEntry(self, Name, FileDict):
+        EntryDir = os.path.join(self.Store.Root, Name, 'hash')
+        os.makedirs(EntryDir)
+        EntryList = []
+        for FileName, Content in sorted(FileDict.items()):
+            self.WriteTmpFile(FileName, Content)
+            Digest, Size = self.Store.AddFile(self.GetTmpFilePath(FileName))
+            EntryList.append((CACHE_FILE_OUTPUT, FileName, Digest, Size))
+        ManifestFile = os.path.join(EntryDir, Name + MANIFEST_SUFFIX)
+        self.Store.SaveManifest(ManifestFile, EntryList)
+        return ManifestFile
+
+    def BlobCount(self):
+        return sum(len(Files) for Root, Dirs, Files in os.walk(self.Store.BlobDir))
+
+    def testSharedBlob(self):
+        self.SaveEntry('A', {'a.efi': b'same', 'a.map': b'map a'})
+        self.SaveEntry('B', {'b.efi': b'same'})
+        self.assertEqual(self.BlobCount(), 2)
+        Index = self.Store.LoadIndex()
+        self.assertEqual(sorted(Index), [os.path.join('A', 'hash', 'A' + MANIFEST_SUFFIX),
+                                         os.path.join('B', 'hash', 'B' + MANIFEST_SUFFIX)])
+
+    def testRestore(self):
+        ManifestFile = self.SaveEntry('A', {'a.efi': b'image'})
+        (Kind, RelPath, Digest, Size), = self.Store.LoadManifest(ManifestFile)
+        Copied = self.GetTmpFilePath('copied.efi')
+        Linked = self.GetTmpFilePath('linked.efi')
+        self.Store.RestoreFile(Digest, Size, Copied)
+        self.Store.RestoreFile(Digest, Size, Linked, True)
+        self.assertEqual(os.stat(Copied).st_nlink, 1)
+        self.assertEqual(os.stat(Linked).st_nlink, 2)
+        for File in (Copied, Linked):
+            with open(File, 'rb') as f:
+                self.assertEqual(f.read(), b'image')
+
+    def testBreakLink(self):
+        ManifestFile = self.SaveEntry('A', {'a.efi': b'image'})
+        (Kind, RelPath, Digest, Size), = self.Store.LoadManifest(ManifestFile)
+        Linked = self.GetTmpFilePath('linked.efi')
+        self.Store.RestoreFile(Digest, Size, Linked, True)
+        BreakLink(Linked)
+        self.assertEqual(os.stat(Linked).st_nlink, 1)
+        with open(Linked, 'r+b') as f:
+            f.write(b'IMAGE')
+        with open(self.Store.BlobPath(Digest), 'rb') as f:
+            self.assertEqual(f.read(), b'image')
+
+    def testRewriteRestoredLinks(self):
+        ManifestFile = self.SaveEntry('A', {'a.efi': b'image', 'a.map': b'map'})
+        OutputDir = self.GetTmpFilePath('OUTPUT')
+        EntryList = [(Digest, Size, os.path.join(OutputDir, 'X64', RelPath), True) for Kind, RelPath, Digest, Size in self.Store.LoadManifest(ManifestFile)]
+        SaveCacheLinks(OutputDir, [os.path.join('X64', 'a.efi')])
+        SaveCacheLinks(OutputDir, [os.path.join('X64', 'a.map')])
+        BinaryCache.CacheCopyEngine().RestoreFiles(self.Store, EntryList)
+        BreakCacheLinks(OutputDir)
+        self.assertFalse(os.path.exists(os.path.join(OutputDir, CACHE_LINK_FILE)))
+        # like make or GenFw, write the outputs in place
+        for Digest, Size, File, Link in EntryList:
+            self.assertEqual(os.stat(File).st_nlink, 1)
+            with open(File, 'wb') as f:
+                f.write(b'rebuilt')
+            with open(self.Store.BlobPath(Digest), 'rb') as f:
+                self.assertNotEqual(f.read(), b'rebuilt')
+
+    def testGcUnreferenced(self):
+        BinaryCache.BLOB_GRACE_PERIOD = -1
+        self.SaveEntry('A', {'a.efi': b'image a'})
+        self.Store.AddFile(self.GetTmpFilePath('a.efi'))
+        self.WriteTmpFile('orphan', b'orphan')
+        self.Store.AddFile(self.GetTmpFilePath('orphan'))
+        self.assertEqual(self.BlobCount(), 2)
+        RemovedEntry, RemovedBlob, Size = self.Store.Gc()
+        self.assertEqual((RemovedEntry, RemovedBlob), (0, 1))
+        self.assertEqual(self.BlobCount(), 1)
+
+    def testGcLeastRecentlyUsed(self):
+        Old = self.SaveEntry('Old', {'old.efi': b'o' * 4096, 'shared.efi': b'shared'})
+        New = self.SaveEntry('New', {'new.efi': b'n' * 4096, 'shared.efi': b'shared'})
+        os.utime(Old, (1, 1))
+        RemovedEntry, RemovedBlob, Size = self.Store.Gc(6000)
+        self.assertEqual((RemovedEntry, RemovedBlob), (1, 1))
+        self.assertFalse(os.path.exists(os.path.dirname(Old)))
+        self.assertTrue(os.path.exists(New))
+        self.assertEqual(self.BlobCount(), 2)
+        self.assertEqual(list(self.Store.LoadIndex()), [os.path.relpath(New, self.Store.Root)])
+        self.assertTrue(Size <= 6000)
+
+    def testGcWithoutIndex(self):
+        BinaryCache.BLOB_GRACE_PERIOD = -1
+        ManifestFile = self.SaveEntry('A', {'a.efi': b'image a'})
+        os.remove(os.path.join(self.Store.Root, INDEX_FILE))
+        self.assertEqual(self.Store.Gc(), (0, 0, self.Store.GetEntrySize(os.path.dirname(ManifestFile)) + len(b'image a')))
+        self.assertEqual(list(self.Store.LoadIndex()), [os.path.relpath(ManifestFile, self.Store.Root)])
+
+    def testGcDropsMissingEntry(self):
+        BinaryCache.BLOB_GRACE_PERIOD = -1
+        ManifestFile = self.SaveEntry('A', {'a.efi': b'image a'})
+        os.remove(ManifestFile)
+        self.assertEqual(self.Store.Gc()[:2], (0, 1))
+        self.assertEqual(self.Store.LoadIndex(), {})
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
@@ -0,0 +1,88 @@
+## @file
+# Unit tests for the process local view of the build cache state
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import threading
+import unittest
+
+import TestTools
+from AutoGen.CacheIR import LocalCacheIR, ModuleBuildCacheIR, MergeCacheIR
+
+## A dict counting the reads, like the round trips to a Manager dict
+class CountingDict(dict):
+    def __init__(self, *Args):
+        dict.__init__(self, *Args)
+        self.ReadCount = 0
+    def get(self, Key, Default=None):
+        self.ReadCount += 1
+        return dict.get(self, Key, Default)
+    def __getitem__(self, Key):
+        self.ReadCount += 1
+        return dict.__getitem__(self, Key)
+    def __contains__(self, Key):
+        self.ReadCount += 1
+        return dict.__contains__(self, Key)
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.Key = ('Module.inf', 'X64')
+        self.Shared = CountingDict({self.Key: ModuleBuildCacheIR(*self.Key)})
+        self.Local = LocalCacheIR(self.Shared, threading.Lock())
+
+    def testOneRoundTrip(self):
+        self.assertTrue(self.Key in self.Local)
+        IR = self.Local[self.Key]
+        self.assertTrue(self.Local.get(self.Key) is IR)
+        self.assertEqual(self.Shared.ReadCount, 1)
+
+    def testMissingKey(self):
+        self.assertFalse('PlatformHash' in self.Local)
+        self.assertRaises(KeyError, self.Local.__getitem__, 'PlatformHash')
+        dict.__setitem__(self.Shared, 'PlatformHash', 'abc')
+        self.assertEqual(self.Local['PlatformHash'], 'abc')
+
+    def testFlushShowsOtherUpdates(self):
+        self.Local[self.Key]
+        OtherIR = ModuleBuildCacheIR(*self.Key)
+        OtherIR.PreMakeCacheHit = True
+        dict.__setitem__(self.Shared, self.Key, OtherIR)
+        self.assertFalse(self.Local[self.Key].PreMakeCacheHit)
+        self.Local.Flush()
+        self.assertTrue(self.Local[self.Key].PreMakeCacheHit)
+
+    def testMergeFieldByField(self):
+        IR = self.Local[self.Key]
+        IR.MakeCacheHit = True
+        IR.MakeHashHexDigest = 'local'
+        self.Local[self.Key] = IR
+        OtherIR = ModuleBuildCacheIR(*self.Key)
+        OtherIR.MakeHashHexDigest = 'other'
+        OtherIR.CreateMakeFileDone = True
+        dict.__setitem__(self.Shared, self.Key, OtherIR)
+        self.Local.Flush()
+        IR = dict.__getitem__(self.Shared, self.Key)
+        self.assertTrue(IR.MakeCacheHit)
+        self.assertEqual(IR.MakeHashHexDigest, 'local')
+        self.assertTrue(IR.CreateMakeFileDone)
+
+    def testMergeClearedField(self):
+        SharedIR = dict.__getitem__(self.Shared, self.Key)
+        SharedIR.MakeCacheHit = True
+        IR = ModuleBuildCacheIR(*self.Key)
+        IR.MakeCacheHit = True
+        BaseFields = dict(vars(IR))
+        IR.MakeCacheHit = False
+        MergeCacheIR(IR, BaseFields, SharedIR)
+        self.assertFalse(IR.MakeCacheHit)
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
@@ -0,0 +1,93 @@
+## @file
+# Unit tests for the data pipe file of AutoGen
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import os
+import mmap
+import unittest
+
+import TestTools
+from Common import EdkLogger
+from Common.BuildToolError import FatalError
+from AutoGen import DataPipe
+from AutoGen.DataPipe import MemoryDataPipe, DATA_PIPE_HEADER, DATA_PIPE_MAGIC, DATA_PIPE_VERSION
+
+class Tests(TestTools.BaseToolsTest):
+
+    def setUp(self):
+        TestTools.BaseToolsTest.setUp(self)
+        EdkLogger.InitializeForUnitTest()
+        self.Data = {
+            "P_Info"        : {"WorkspaceDir": "/ws", "Target": "DEBUG", "ToolChain": "GCC5", "Arch": "X64"},
+            "PLA_PCD"       : [("PcdA", "gTokenSpaceGuid", 1), ("PcdB", "gTokenSpaceGuid", b"\x00\xff")],
+            "Empty"         : [],
+            ("Key", "Tuple"): None,
+        }
+
+    def DumpPipe(self, Name):
+        Pipe = MemoryDataPipe()
+        Pipe.DataContainer = self.Data
+        FilePath = self.GetTmpFilePath(Name)
+        Pipe.dump(FilePath)
+        return FilePath
+
+    def testHeader(self):
+        FilePath = self.DumpPipe('pipe')
+        with open(FilePath, 'rb') as File:
+            Magic, Version, DataSize = DATA_PIPE_HEADER.unpack(File.read(DATA_PIPE_HEADER.size))
+        self.assertEqual(Magic, DATA_PIPE_MAGIC)
+        self.assertEqual(Version, DATA_PIPE_VERSION)
+        self.assertEqual(DATA_PIPE_HEADER.size + DataSize, os.path.getsize(FilePath))
+
+    def testRoundTrip(self):
+        Pipe = MemoryDataPipe()
+        Pipe.load(self.DumpPipe('pipe'))
+        self.assertEqual(Pipe.DataContainer, self.Data)
+        self.assertEqual(Pipe.Get("Unknown"), None)
+
+    def testSharedObjects(self):
+        self.Data["MOL_PCDS"] = {("Module.inf", "/ws", "X64"): self.Data["PLA_PCD"]}
+        Pipe = MemoryDataPipe()
+        Pipe.load(self.DumpPipe('pipe'))
+        self.assertTrue(Pipe.Get("MOL_PCDS")[("Module.inf", "/ws", "X64")] is Pipe.Get("PLA_PCD"))
+
+    def testMmapClosed(self):
+        Mapped = []
+        class TrackedMmap(mmap.mmap):
+            def __init__(self, *Args, **Kwargs):
+                Mapped.append(self)
+        FilePath = self.DumpPipe('pipe')
+        DataPipe.mmap.mmap = TrackedMmap
+        try:
+            Pipe = MemoryDataPipe()
+            Pipe.load(FilePath)
+        finally:
+            DataPipe.mmap.mmap = TrackedMmap.__base__
+        self.assertEqual(len(Mapped), 1)
+        self.assertTrue(Mapped[0].closed)
+        self.assertEqual(Pipe.DataContainer, self.Data)
+
+    def testUnknownVersion(self):
+        FilePath = self.DumpPipe('pipe')
+        with open(FilePath, 'r+b') as File:
+            Magic, Version, DataSize = DATA_PIPE_HEADER.unpack(File.read(DATA_PIPE_HEADER.size))
+            File.seek(0)
+            File.write(DATA_PIPE_HEADER.pack(Magic, Version + 1, DataSize))
+        self.assertRaises(FatalError, MemoryDataPipe().load, FilePath)
+
+    def testUnknownMagic(self):
+        FilePath = self.GetTmpFilePath('old')
+        with open(FilePath, 'wb') as File:
+            File.write(b'\x80\x04' + b'\x00' * 64)
+        self.assertRaises(FatalError, MemoryDataPipe().load, FilePath)
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
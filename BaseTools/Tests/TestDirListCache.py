@@ -0,0 +1,52 @@
+## @file
+# Unit tests for the index of directory entries
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import os
+import unittest
+
+import TestTools
+from Common.Misc import DirListCache
+
+class Tests(TestTools.BaseToolsTest):
+
+    def setUp(self):
+        TestTools.BaseToolsTest.setUp(self)
+        self.Cache = DirListCache()
+        self.SourceDir = self.GetTmpFilePath('Pkg')
+        self.BuildDir = self.GetTmpFilePath('Build')
+        os.makedirs(os.path.join(self.SourceDir, 'Include'))
+        self.WriteTmpFile(os.path.join('Pkg', 'Include', 'Source.h'), '')
+
+    def testSourceDir(self):
+        self.assertEqual(self.Cache.FindFile('Source.h', [self.BuildDir, os.path.join(self.SourceDir, 'Include')]),
+                         os.path.join(self.SourceDir, 'Include'))
+        self.assertTrue(self.Cache.IsFile(os.path.join(self.SourceDir, 'Include', 'Source.h')))
+        self.assertFalse(self.Cache.IsFile(os.path.join(self.SourceDir, 'Include', 'Missing.h')))
+
+    def testFileCreatedAfterListing(self):
+        self.Cache.AddUncachedRoot(self.BuildDir)
+        OutputDir = os.path.join(self.BuildDir, 'X64', 'OUTPUT')
+        os.makedirs(OutputDir)
+        self.assertFalse(self.Cache.IsFile(os.path.join(OutputDir, 'Generated.h')))
+        self.WriteTmpFile(os.path.join('Build', 'X64', 'OUTPUT', 'Generated.h'), '')
+        self.assertEqual(self.Cache.FindFile('Generated.h', [OutputDir]), OutputDir)
+
+    def testDirCreatedAfterListing(self):
+        # the parent has been listed before the build directory is created
+        self.assertFalse(self.Cache.IsFile(os.path.join(self.BuildDir, 'Generated.h')))
+        self.Cache.AddUncachedRoot(self.BuildDir)
+        os.mkdir(self.BuildDir)
+        self.WriteTmpFile(os.path.join('Build', 'Generated.h'), '')
+        self.assertTrue(self.Cache.IsFile(os.path.join(self.BuildDir, 'Generated.h')))
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
@@ -0,0 +1,98 @@
+## @file
+# Unit tests for the cache of the values of ValueExpression and ValueExpressionEx
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import unittest
+
+import TestTools
+import Common.Expression as Expression
+from Common.Expression import ValueExpression, ValueExpressionEx, GetExpressionSymbols
+from CommonDataClass.Exceptions import BadExpression, WrnExpression
+
+## The expressions evaluated: (Expression, PCD type or None, symbol table, RealValue)
+ExpressionList = (
+    ('gA.PcdA == 1', None, {'gA.PcdA': '1'}, False),
+    ('gA.PcdA + 1', None, {'gA.PcdA': '1'}, True),
+    ('gA.PcdA + 1', None, {'gA.PcdA': 'gA.PcdB', 'gA.PcdB': '7'}, True),
+    ('"abc" == "abc" AND TRUE', None, {}, False),
+    ('(1 << 4) | 0x3', 'UINT32', {}, True),
+    ('{0x1, 0x2}', 'VOID*', {}, True),
+    ('L"ab"', 'VOID*', {}, True),
+    ('{UINT16(0x1234), gA.PcdA}', 'VOID*', {'gA.PcdA': '0x5'}, True),
+)
+
+## Create the expression object of an item of ExpressionList
+def NewExpression(Expr, PcdType, SymbolTable):
+    if PcdType is None:
+        return ValueExpression(Expr, SymbolTable)
+    return ValueExpressionEx(Expr, PcdType, SymbolTable)
+
+## Get the expressions whose values are cached, besides the values of the symbols used by them
+def CachedExpressions():
+    return [Key[2] for Key in Expression._ExpressionValueCache if Key[4]]
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        Expression._ExpressionValueCache.clear()
+
+    def tearDown(self):
+        Expression._ExpressionValueCache.clear()
+
+    def testSameValue(self):
+        for Expr, PcdType, SymbolTable, RealValue in ExpressionList:
+            Expected = NewExpression(Expr, PcdType, SymbolTable)._Evaluate(RealValue, 0)
+            self.assertEqual(NewExpression(Expr, PcdType, SymbolTable)(RealValue), Expected)
+            self.assertEqual(NewExpression(Expr, PcdType, dict(SymbolTable))(RealValue), Expected)
+        for Expr, PcdType, SymbolTable, RealValue in ExpressionList:
+            self.assertEqual(CachedExpressions().count(Expr), [Item[0] for Item in ExpressionList].count(Expr))
+
+    def testCachedValue(self):
+        ValueExpression('gA.PcdA + 1', {'gA.PcdA': '1'})(True)
+        Cached = ValueExpression('gA.PcdA + 1', {'gA.PcdA': '1'})
+        Cached._Evaluate = None
+        self.assertEqual(Cached(True), '2')
+        self.assertEqual(Cached._SymbolCopy, None)
+
+    def testSymbolChanged(self):
+        self.assertEqual(ValueExpression('gA.PcdA + 1', {'gA.PcdA': '1'})(True), '2')
+        self.assertEqual(ValueExpression('gA.PcdA + 1', {'gA.PcdA': '2'})(True), '3')
+        self.assertEqual(ValueExpression('gA.PcdA + 1', {'gA.PcdA': 'gA.PcdB', 'gA.PcdB': '7'})(True), '8')
+        self.assertEqual(ValueExpression('gA.PcdA + 1', {'gA.PcdA': 'gA.PcdB', 'gA.PcdB': '8'})(True), '9')
+        self.assertEqual(CachedExpressions(), ['gA.PcdA + 1'] * 4)
+
+    def testUnusedSymbol(self):
+        ValueExpression('gA.PcdA + 1', {'gA.PcdA': '1', 'gA.PcdB': '1'})(True)
+        ValueExpression('gA.PcdA + 1', {'gA.PcdA': '1', 'gA.PcdB': '2'})(True)
+        self.assertEqual(CachedExpressions(), ['gA.PcdA + 1'])
+
+    def testKind(self):
+        ValueExpression('gA.PcdA', {'gA.PcdA': '1'})()
+        ValueExpression('gA.PcdA', {'gA.PcdA': '1'})(True)
+        ValueExpressionEx('gA.PcdA', 'UINT8', {'gA.PcdA': '1'})(True)
+        ValueExpressionEx('gA.PcdA', 'UINT16', {'gA.PcdA': '1'})(True)
+        self.assertEqual(CachedExpressions(), ['gA.PcdA'] * 4)
+
+    def testErrorNotCached(self):
+        for Index in range(2):
+            self.assertRaises(BadExpression, ValueExpression('gA.PcdA + 1', {}), True)
+            self.assertRaises(WrnExpression, ValueExpression('gA.PcdA == 1', {'gA.PcdA': '"a"'}))
+        self.assertEqual(CachedExpressions(), [])
+
+    def testUnhashableSymbol(self):
+        SymbolTable = {'gA.PcdA': '1', 'gA.PcdB': ['1']}
+        self.assertEqual(GetExpressionSymbols('gA.PcdA + 1', SymbolTable), frozenset([('gA.PcdA', '1')]))
+        self.assertEqual(ValueExpression('gA.PcdA + 1', SymbolTable)(True), '2')
+        self.assertEqual(ValueExpression('gA.PcdA + 1 + gA.PcdB', SymbolTable)._GetCacheKey(True, 0), None)
+        self.assertEqual(CachedExpressions(), ['gA.PcdA + 1'])
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
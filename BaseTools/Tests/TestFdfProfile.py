@@ -0,0 +1,124 @@
+## @file
+# Unit tests for the FDF profiles saved in the meta file cache
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import unittest
+
+import TestTools
+from Common import EdkLogger
+import Common.GlobalData as GlobalData
+from Common.FileHashCache import MetaFileRecordCache
+from GenFds import FdfParser as FdfParserModule
+from GenFds.FdfParser import FdfParser
+
+TestFdf = '''[Defines]
+DEFINE BLOCK_SIZE = 0x1000
+
+[FD.TESTFD]
+BaseAddress   = 0xFF000000
+Size          = $(FD_SIZE)
+ErasePolarity = 1
+BlockSize     = $(BLOCK_SIZE)
+NumBlocks     = 0x10
+
+0x00000000|0x00008000
+FV = TESTFV
+!ifdef EXTRA_REGION
+0x00008000|0x00008000
+FV = TESTFV
+!endif
+
+!include Include.fdf.inc
+'''
+
+TestInclude = '''[FV.TESTFV]
+FvAlignment = $(FV_ALIGNMENT)
+ERASE_POLARITY = 1
+'''
+
+class Tests(TestTools.BaseToolsTest):
+
+    def setUp(self):
+        TestTools.BaseToolsTest.setUp(self)
+        EdkLogger.InitializeForUnitTest()
+        self.Saved = (dict(GlobalData.gGlobalDefines), dict(GlobalData.gCommandLineDefines), dict(GlobalData.gPlatformDefines),
+                      dict(GlobalData.gPlatformPcds), GlobalData.gMetaFileCache, GlobalData.gWorkspace)
+        self.WriteTmpFile('Test.fdf', TestFdf)
+        self.WriteTmpFile('Include.fdf.inc', TestInclude)
+        self.FdfFile = self.GetTmpFilePath('Test.fdf')
+        self.DbPath = self.GetTmpFilePath('metafile.db')
+        GlobalData.gWorkspace = self.testDir
+        GlobalData.gPlatformDefines = {'OUTPUT_DIRECTORY': 'Build/Test'}
+        GlobalData.gPlatformPcds = {}
+
+    def tearDown(self):
+        GlobalData.gGlobalDefines, GlobalData.gCommandLineDefines, GlobalData.gPlatformDefines, \
+            GlobalData.gPlatformPcds, GlobalData.gMetaFileCache, GlobalData.gWorkspace = self.Saved
+        del FdfParserModule.AllIncludeFileList[:]
+        TestTools.BaseToolsTest.tearDown(self)
+
+    ## Parse the FDF file like build does, and save its profile
+    def BuildParse(self, **CommandLineDefines):
+        GlobalData.gGlobalDefines = {'WORKSPACE': self.testDir, 'EDK_TOOLS_PATH': TestTools.BaseToolsDir, 'TARGET': 'DEBUG',
+                                     'ARCH': 'X64', 'TOOLCHAIN': 'GCC5', 'TOOL_CHAIN_TAG': 'GCC5', 'FAMILY': 'GCC'}
+        GlobalData.gCommandLineDefines = dict(CommandLineDefines, ARCH='X64')
+        GlobalData.gMetaFileCache = MetaFileRecordCache(self.DbPath)
+        del FdfParserModule.AllIncludeFileList[:]
+        Parser = FdfParser(self.FdfFile)
+        Parser.ParseFile()
+        Parser.SaveProfile()
+        GlobalData.gMetaFileCache.Flush()
+        return Parser
+
+    ## Load the profile like GenFds run alone does, with the macros got from its command line
+    def GenFdsLoad(self, **CommandLineDefines):
+        GlobalData.gGlobalDefines = {'WORKSPACE': self.testDir, 'TARGET': 'DEBUG', 'TOOLCHAIN': 'GCC5', 'TOOL_CHAIN_TAG': 'GCC5'}
+        GlobalData.gCommandLineDefines = dict(CommandLineDefines)
+        GlobalData.gMetaFileCache = MetaFileRecordCache(self.DbPath)
+        Parser = FdfParser(self.FdfFile)
+        return Parser, Parser.LoadProfile()
+
+    def testLoadAfterBuild(self):
+        Built = self.BuildParse(FD_SIZE='0x10000', FV_ALIGNMENT='16')
+        Parser, Loaded = self.GenFdsLoad(FD_SIZE='0x10000', FV_ALIGNMENT='16')
+        self.assertTrue(Loaded)
+        self.assertEqual(sorted(Parser.Profile.FdDict), sorted(Built.Profile.FdDict))
+        self.assertEqual(Parser.Profile.FdDict['TESTFD'].Size, 0x10000)
+        self.assertEqual(len(Parser.Profile.FdDict['TESTFD'].RegionList), 1)
+        self.assertEqual(Parser.Profile.FvDict['TESTFV'].FvAlignment, '16')
+
+    def testUnreferencedMacro(self):
+        self.BuildParse(FD_SIZE='0x10000', FV_ALIGNMENT='16')
+        self.assertTrue(self.GenFdsLoad(FD_SIZE='0x10000', FV_ALIGNMENT='16', UNUSED='TRUE')[1])
+
+    def testReferencedMacroChanged(self):
+        self.BuildParse(FD_SIZE='0x10000', FV_ALIGNMENT='16')
+        self.assertFalse(self.GenFdsLoad(FD_SIZE='0x20000', FV_ALIGNMENT='16')[1])
+        self.assertFalse(self.GenFdsLoad(FD_SIZE='0x10000', FV_ALIGNMENT='16', EXTRA_REGION='TRUE')[1])
+
+    def testIncludeFile(self):
+        self.BuildParse(FD_SIZE='0x10000', FV_ALIGNMENT='16')
+        self.assertFalse(self.GenFdsLoad(FD_SIZE='0x10000', FV_ALIGNMENT='8')[1])
+        self.WriteTmpFile('Include.fdf.inc', TestInclude + '\n')
+        self.assertFalse(self.GenFdsLoad(FD_SIZE='0x10000', FV_ALIGNMENT='16')[1])
+
+    def testIncludeFileLine(self):
+        Built = self.BuildParse(FD_SIZE='0x10000', FV_ALIGNMENT='16')
+        Line = [Text.startswith('FvAlignment') for Text in Built.Profile.FileLinesList].index(True) + 1
+        FileLine = FdfParserModule.GetRealFileLine(self.FdfFile, Line)
+        self.assertEqual(FileLine, (self.GetTmpFilePath('Include.fdf.inc'), 2))
+        del FdfParserModule.AllIncludeFileList[:]
+        Parser, Loaded = self.GenFdsLoad(FD_SIZE='0x10000', FV_ALIGNMENT='16')
+        self.assertTrue(Loaded)
+        self.assertEqual(FdfParserModule.GetRealFileLine(self.FdfFile, Line), FileLine)
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
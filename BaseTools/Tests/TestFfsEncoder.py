@@ -0,0 +1,180 @@
+## @file
+# Unit tests for the sections and FFS files generated in process, compared with
+# the GenSec and GenFfs tools
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import os
+import random
+import subprocess
+import unittest
+from struct import pack
+
+import TestTools
+from GenFds.FfsEncoder import EncodeSection, EncodeFfs, SectionTypeValue
+
+FileGuid = '0CB3D5E1-1F4A-4D8F-9A6B-3E2C1D0F5A7B'
+VendorGuid = 'A31280AD-481E-41B6-95E8-127F4C984779'
+LargeSize = 0x1000000
+
+## Find a C tool, skipping the wrappers that run it from the BaseTools binary directories
+#
+#   @param  ToolName        The name of the tool
+#
+#   @retval str             The path of the tool
+#   @retval None            The tool is not built
+#
+def FindCTool(ToolName):
+    WrapperDir = os.path.join(TestTools.BaseToolsDir, 'BinWrappers')
+    PathList = [os.path.join(TestTools.CSourceDir, 'bin')] + TestTools.BaseToolsBinPaths + \
+               os.environ.get('PATH', '').split(os.pathsep)
+    for Dir in PathList:
+        Tool = os.path.join(Dir, ToolName)
+        if os.path.realpath(Tool).startswith(WrapperDir + os.sep):
+            continue
+        if os.path.isfile(Tool) and os.access(Tool, os.X_OK):
+            return Tool
+    return None
+
+GenSecTool = FindCTool('GenSec')
+GenFfsTool = FindCTool('GenFfs')
+
+@unittest.skipUnless(GenSecTool and GenFfsTool, 'GenSec and GenFfs are not built')
+class Tests(TestTools.BaseToolsTest):
+
+    def setUp(self):
+        TestTools.BaseToolsTest.setUp(self)
+        self.Random = random.Random(0)
+
+    ## Get random data, or zeros for the large files
+    def GetData(self, Size):
+        if Size >= LargeSize // 2:
+            return bytes(Size)
+        return bytes(self.Random.getrandbits(8) for Index in range(Size))
+
+    ## Write a file with the data of a section
+    def WriteData(self, FileName, Size):
+        self.WriteTmpFile(FileName, self.GetData(Size))
+        return self.GetTmpFilePath(FileName)
+
+    ## Write a section file, with the large section header when the section is too large
+    def WriteSection(self, FileName, Type, Size):
+        if Size + 4 < LargeSize:
+            Header = pack('<4B', (Size + 4) & 0xFF, ((Size + 4) >> 8) & 0xFF, (Size + 4) >> 16, SectionTypeValue[Type])
+        else:
+            Header = pack('<4BI', 0xFF, 0xFF, 0xFF, SectionTypeValue[Type], Size + 8)
+        self.WriteTmpFile(FileName, Header + self.GetData(Size))
+        return self.GetTmpFilePath(FileName)
+
+    ## Run a C tool and return the content of its output file
+    def RunCTool(self, Cmd):
+        Output = self.GetTmpFilePath('Tool.out')
+        if os.path.exists(Output):
+            os.remove(Output)
+        Proc = subprocess.Popen(Cmd + ['-o', Output], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        Log = Proc.communicate()[0]
+        self.assertEqual(Proc.returncode, 0, Log)
+        with open(Output, 'rb') as File:
+            return File.read()
+
+    ## Compare EncodeSection with GenSec
+    def CheckSection(self, Input, Type=None, CompressionType=None, Guid=None, GuidHdrLen=None,
+                     GuidAttr=[], Ver=None, InputAlign=[], BuildNumber=None):
+        Cmd = [GenSecTool]
+        if Type:
+            Cmd += ['-s', Type]
+        if CompressionType:
+            Cmd += ['-c', CompressionType]
+        if Guid:
+            Cmd += ['-g', Guid]
+        if GuidHdrLen:
+            Cmd += ['-l', GuidHdrLen]
+        for Attr in GuidAttr:
+            Cmd += ['-r', Attr]
+        for SecAlign in InputAlign:
+            Cmd += ['--sectionalign', SecAlign]
+        if Ver:
+            Cmd += ['-n', Ver]
+            if BuildNumber:
+                Cmd += ['-j', BuildNumber]
+        Data = EncodeSection(Input, Type, CompressionType, Guid, GuidHdrLen, GuidAttr, Ver, InputAlign, BuildNumber)
+        self.assertNotEqual(Data, None)
+        self.assertEqual(Data, self.RunCTool(Cmd + Input))
+        return Data
+
+    ## Compare EncodeFfs with GenFfs
+    def CheckFfs(self, Input, Type, Fixed=False, CheckSum=False, Align=None, SectionAlign=None):
+        Cmd = [GenFfsTool, '-t', Type, '-g', FileGuid]
+        if Fixed:
+            Cmd.append('-x')
+        if CheckSum:
+            Cmd.append('-s')
+        if Align:
+            Cmd += ['-a', Align]
+        for Index, FileName in enumerate(Input):
+            Cmd += ['-i', FileName]
+            if SectionAlign and SectionAlign[Index]:
+                Cmd += ['-n', SectionAlign[Index]]
+        Data = EncodeFfs(Input, Type, FileGuid, Fixed, CheckSum, Align, SectionAlign)
+        self.assertNotEqual(Data, None)
+        self.assertEqual(Data, self.RunCTool(Cmd))
+        return Data
+
+    def testLeafSection(self):
+        self.CheckSection([self.WriteData('Raw.bin', 37)], 'EFI_SECTION_RAW')
+        self.CheckSection([self.WriteData('Pe.bin', 0x200)], 'EFI_SECTION_PE32')
+        self.CheckSection([], 'EFI_SECTION_VERSION', Ver='1.0', BuildNumber='12')
+        Data = self.CheckSection([self.WriteData('Large.bin', LargeSize)], 'EFI_SECTION_RAW')
+        self.assertEqual(Data[:8], pack('<4BI', 0xFF, 0xFF, 0xFF, 0x19, LargeSize + 8))
+
+    def testEncapsulationSection(self):
+        Input = [self.WriteSection('Pe.sec', 'EFI_SECTION_PE32', 0x123), self.WriteSection('Raw.sec', 'EFI_SECTION_RAW', 9)]
+        self.CheckSection(Input, 'EFI_SECTION_COMPRESSION', CompressionType='PI_NONE')
+        self.CheckSection(Input, 'EFI_SECTION_GUID_DEFINED')
+        self.CheckSection(Input, 'EFI_SECTION_GUID_DEFINED', InputAlign=['16', '512'])
+        self.CheckSection(Input, 'EFI_SECTION_GUID_DEFINED', Guid=VendorGuid, GuidHdrLen='4',
+                          GuidAttr=['PROCESSING_REQUIRED'])
+        Data = self.CheckSection([self.WriteSection('Large.sec', 'EFI_SECTION_RAW', LargeSize)], 'EFI_SECTION_GUID_DEFINED')
+        self.assertEqual(Data[:4], pack('<4B', 0xFF, 0xFF, 0xFF, 0x02))
+
+    def testAlignedSection(self):
+        Input = [self.WriteSection('Raw.sec', 'EFI_SECTION_RAW', 5), self.WriteSection('Pe.sec', 'EFI_SECTION_PE32', 0x80),
+                 self.WriteSection('Raw2.sec', 'EFI_SECTION_RAW', 3)]
+        self.CheckSection(Input, InputAlign=['1', '32', '4K'])
+        self.CheckSection(Input, InputAlign=['8', '16', '8'])
+
+    def testFfs(self):
+        Input = [self.WriteSection('Pe.sec', 'EFI_SECTION_PE32', 0x155), self.WriteSection('Raw.sec', 'EFI_SECTION_RAW', 7)]
+        self.CheckFfs(Input, 'EFI_FV_FILETYPE_DRIVER')
+        self.CheckFfs(Input, 'EFI_FV_FILETYPE_DRIVER', CheckSum=True, Align='4K')
+        self.CheckFfs(Input, 'EFI_FV_FILETYPE_FREEFORM', SectionAlign=['16', '512'])
+        self.CheckFfs(Input, 'EFI_FV_FILETYPE_FREEFORM', Align='16', SectionAlign=['64K', None])
+
+    def testFixedPadding(self):
+        Input = [self.WriteSection('Raw.sec', 'EFI_SECTION_RAW', 5), self.WriteSection('Pe.sec', 'EFI_SECTION_PE32', 0x40)]
+        #
+        # The first pad section of a fixed file is an EFI_FFS_SECTION_ALIGNMENT_PADDING_GUID
+        # section when it is large enough, the other ones are raw sections
+        #
+        Data = self.CheckFfs(Input, 'EFI_FV_FILETYPE_FREEFORM', Fixed=True, SectionAlign=['64', '128'])
+        self.assertEqual(Data[24 + 3], SectionTypeValue['EFI_SECTION_FREEFORM_SUBTYPE_GUID'])
+        self.CheckFfs(Input, 'EFI_FV_FILETYPE_FREEFORM', Fixed=True, SectionAlign=['16', '128'])
+        self.CheckFfs(Input, 'EFI_FV_FILETYPE_FREEFORM', SectionAlign=['64', '128'])
+
+    def testLargeFfs(self):
+        Input = [self.WriteSection('Large.sec', 'EFI_SECTION_RAW', LargeSize - 24)]
+        Data = self.CheckFfs(Input, 'EFI_FV_FILETYPE_FREEFORM')
+        self.assertEqual(len(Data), LargeSize + 12)
+        Data = self.CheckFfs(Input + [self.WriteSection('Raw.sec', 'EFI_SECTION_RAW', 3)], 'EFI_FV_FILETYPE_FREEFORM',
+                             SectionAlign=[None, '16'])
+        self.assertEqual(Data[19] & 0x01, 0x01)
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
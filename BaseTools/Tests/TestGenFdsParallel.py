@@ -0,0 +1,139 @@
+## @file
+# Unit tests for the FV images generated in parallel by GenFds, compared with
+# the images generated serially
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import os
+import random
+import shutil
+import subprocess
+import sys
+import unittest
+
+import TestTools
+from TestFfsEncoder import FindCTool
+
+TestDsc = '''[Defines]
+  PLATFORM_NAME                  = FvTest
+  PLATFORM_GUID                  = 5d4b8a0e-0c43-4f49-9d1d-8d3b9c6c0a11
+  PLATFORM_VERSION               = 1.0
+  DSC_SPECIFICATION              = 0x0001001C
+  OUTPUT_DIRECTORY               = Build/FvTest
+  SUPPORTED_ARCHITECTURES        = X64
+  BUILD_TARGETS                  = DEBUG
+  SKUID_IDENTIFIER               = DEFAULT
+  FLASH_DEFINITION               = FvTestPkg/FvTest.fdf
+'''
+
+TestFd = '''[FD.TESTFD]
+BaseAddress   = 0xFF000000
+Size          = 0x00400000
+ErasePolarity = 1
+BlockSize     = 0x1000
+NumBlocks     = 0x400
+
+0x00000000|0x00200000
+FV = FVMAIN
+
+0x00200000|0x00100000
+FV = SECFV
+'''
+
+FvHeader = '''[FV.%s]
+FvAlignment = 16
+ERASE_POLARITY = 1
+MEMORY_MAPPED = TRUE
+'''
+
+RawFile = '''FILE FREEFORM = %08X-1111-2222-3333-444455556666 {
+  SECTION RAW = FvTestPkg/raw%d.bin
+}
+'''
+
+FvImageFile = '''FILE FV_IMAGE = %08X-1111-2222-3333-444455556666 {
+  SECTION COMPRESS PI_NONE {
+%s  }
+}
+'''
+
+GenFvTool = FindCTool('GenFv')
+
+@unittest.skipUnless(GenFvTool and sys.platform != 'win32', 'GenFv is not built')
+class Tests(TestTools.BaseToolsTest):
+
+    def setUp(self):
+        TestTools.BaseToolsTest.setUp(self)
+        self.Random = random.Random(0)
+        self.FileNumber = 0
+        ConfDir = os.path.join(self.testDir, 'Conf')
+        os.mkdir(ConfDir)
+        for Template, Conf in (('target.template', 'target.txt'), ('tools_def.template', 'tools_def.txt'),
+                               ('build_rule.template', 'build_rule.txt')):
+            shutil.copy(os.path.join(TestTools.BaseToolsDir, 'Conf', Template), os.path.join(ConfDir, Conf))
+        os.mkdir(os.path.join(self.testDir, 'FvTestPkg'))
+
+    ## Get the text of an FV with the given raw files and nested FVs
+    def GetFv(self, FvName, RawNumber, NestedFvList=()):
+        FvText = FvHeader % FvName
+        for Index in range(RawNumber):
+            self.FileNumber += 1
+            Data = bytes(self.Random.getrandbits(8) for Index in range(self.Random.randint(0x1000, 0x8000)))
+            self.WriteTmpFile(os.path.join('FvTestPkg', 'raw%d.bin' % self.FileNumber), Data)
+            FvText += RawFile % (self.FileNumber, self.FileNumber)
+        if NestedFvList:
+            self.FileNumber += 1
+            FvText += FvImageFile % (self.FileNumber, ''.join('    SECTION FV_IMAGE = %s\n' % Name for Name in NestedFvList))
+        return FvText + '\n'
+
+    ## Run GenFds with the given number of threads, and read the images it generates
+    def RunGenFds(self, ThreadNumber):
+        BuildDir = os.path.join(self.testDir, 'Build')
+        if os.path.exists(BuildDir):
+            shutil.rmtree(BuildDir)
+        os.makedirs(os.path.join(BuildDir, 'FvTest', 'DEBUG_GCC5', 'X64'))
+        Env = dict(os.environ, WORKSPACE=self.testDir, PACKAGES_PATH=self.testDir, EDK_TOOLS_PATH=TestTools.BaseToolsDir,
+                   PYTHONPATH=TestTools.PythonSourceDir, PATH=os.pathsep.join((os.path.dirname(GenFvTool), os.environ['PATH'])))
+        Env.pop('CONF_PATH', None)
+        Proc = subprocess.Popen([sys.executable, '-m', 'GenFds.GenFds', '-f', 'FvTestPkg/FvTest.fdf', '-p', 'FvTestPkg/FvTest.dsc',
+                                 '-a', 'X64', '-b', 'DEBUG', '-t', 'GCC5', '-n', str(ThreadNumber)],
+                                cwd=self.testDir, env=Env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        Log = Proc.communicate()[0]
+        self.assertEqual(Proc.returncode, 0, Log)
+        FvDir = os.path.join(BuildDir, 'FvTest', 'DEBUG_GCC5', 'FV')
+        ImageDict = {}
+        for FileName in os.listdir(FvDir):
+            if FileName.endswith(('.fd', '.Fv')):
+                with open(os.path.join(FvDir, FileName), 'rb') as File:
+                    ImageDict[FileName] = File.read()
+        return ImageDict
+
+    def testParallelFv(self):
+        Fdf = TestFd + '\n'
+        Fdf += self.GetFv('FVMAIN', 1, ['PEIFV', 'DXEFV'])
+        Fdf += self.GetFv('SECFV', 1)
+        Fdf += self.GetFv('PEIFV', 2)
+        Fdf += self.GetFv('DXEFV', 3)
+        Fdf += self.GetFv('OTHERFV', 1, ['NESTFV'])
+        Fdf += self.GetFv('NESTFV', 1)
+        Fdf += self.GetFv('LONEFV', 2)
+        self.WriteTmpFile(os.path.join('FvTestPkg', 'FvTest.dsc'), TestDsc)
+        self.WriteTmpFile(os.path.join('FvTestPkg', 'FvTest.fdf'), Fdf)
+
+        SerialImageDict = self.RunGenFds(1)
+        self.assertEqual(sorted(SerialImageDict), ['DXEFV.Fv', 'FVMAIN.Fv', 'LONEFV.Fv', 'NESTFV.Fv', 'OTHERFV.Fv',
+                                                   'PEIFV.Fv', 'SECFV.Fv', 'TESTFD.fd'])
+        ParallelImageDict = self.RunGenFds(4)
+        self.assertEqual(sorted(ParallelImageDict), sorted(SerialImageDict))
+        for FileName in SerialImageDict:
+            self.assertEqual(ParallelImageDict[FileName], SerialImageDict[FileName], FileName)
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
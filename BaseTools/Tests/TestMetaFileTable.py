@@ -0,0 +1,141 @@
+## @file
+# Unit tests for the queries of the meta file tables
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import random
+import unittest
+
+import TestTools
+from Common.DataType import TAB_ARCH_COMMON, TAB_COMMON
+from Workspace.MetaFileTable import ModuleTable, PackageTable, PlatformTable
+
+ModelList = (1001, 1002, 1003)
+ArchList = ('COMMON', 'IA32', 'X64')
+Scope2List = ('COMMON', 'DEFAULT', 'PEIM', 'DXE_DRIVER', 'COMMON.STANDARD', 'DXE_DRIVER.STANDARD')
+
+class FakeDb(object):
+    def __init__(self):
+        self.TblFile = []
+
+class FakeMetaFile(object):
+    Name = 'Test'
+    Ext = '.dsc'
+    Dir = '/ws'
+    Path = '/ws/Test.dsc'
+    TimeStamp = 0
+
+## Select the records the way Query() did before the tables were indexed
+def ModuleQuery(Table, Model, Arch=None, Platform=None, BelongsToItem=None):
+    Result = [Item for Item in Table.CurrentContent if Item[1] == Model and Item[-1] >= 0]
+    if Arch is not None and Arch != TAB_ARCH_COMMON:
+        Result = [Item for Item in Result if Item[5] in ('COMMON', Arch)]
+    if Platform is not None and Platform != TAB_COMMON:
+        Result = [Item for Item in Result if Item[6] in ('COMMON', 'DEFAULT', Platform)]
+    if BelongsToItem is not None:
+        Result = [Item for Item in Result if Item[7] == BelongsToItem]
+    return [[R[2], R[3], R[4], R[5], R[6], R[0], R[9]] for R in Result]
+
+def PackageQuery(Table, Model, Arch=None):
+    Result = [Item for Item in Table.CurrentContent if Item[1] == Model and Item[-1] >= 0]
+    if Arch is not None and Arch != TAB_ARCH_COMMON:
+        Result = [Item for Item in Result if Item[5] in ('COMMON', Arch)]
+    return [[R[2], R[3], R[4], R[5], R[6], R[0], R[8]] for R in Result]
+
+def PlatformQuery(Table, Model, Scope1=None, Scope2=None, BelongsToItem=None, FromItem=None):
+    Result = [Item for Item in Table.CurrentContent if Item[1] == Model and Item[-1] > 0]
+    if Scope1 is not None and Scope1 != TAB_ARCH_COMMON:
+        Result = [Item for Item in Result if Item[5] in ('COMMON', Scope1)]
+    if Scope2 and Scope2 != TAB_COMMON:
+        Sc2 = set(['COMMON', 'DEFAULT', Scope2])
+        if '.' in Scope2:
+            Sc2.add(TAB_COMMON + Scope2[Scope2.index('.'):])
+        Result = [Item for Item in Result if Item[6] in Sc2]
+    if BelongsToItem is not None:
+        Result = [Item for Item in Result if Item[8] == BelongsToItem]
+    else:
+        Result = [Item for Item in Result if Item[8] < 0]
+    if FromItem is not None:
+        Result = [Item for Item in Result if Item[9] == FromItem]
+    return [[R[2], R[3], R[4], R[5], R[6], R[7], R[0], R[10]] for R in Result]
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.Random = random.Random(0)
+
+    ## Fill a table with records of random models and scopes
+    #
+    #   Some of the records belong to the records inserted before them.
+    #
+    def FillTable(self, Table, Number, **Extra):
+        IdList = []
+        for Line in range(Number):
+            BelongsToItem = -1
+            if IdList and self.Random.random() < 0.3:
+                BelongsToItem = self.Random.choice(IdList)
+            IdList.append(Table.Insert(self.Random.choice(ModelList), 'Value%d' % Line, '', '',
+                                       self.Random.choice(ArchList), self.Random.choice(Scope2List),
+                                       BelongsToItem=BelongsToItem, StartLine=Line, **Extra))
+        return IdList
+
+    def testModuleTable(self):
+        Table = ModuleTable(FakeDb(), FakeMetaFile(), True)
+        IdList = self.FillTable(Table, 300)
+        Table.SetEndFlag()
+        for Model in ModelList + (9999,):
+            for Arch in (None,) + ArchList:
+                for Platform in (None,) + Scope2List:
+                    self.assertEqual(Table.Query(Model, Arch, Platform), ModuleQuery(Table, Model, Arch, Platform))
+            for Item in IdList[:50]:
+                self.assertEqual(Table.Query(Model, 'X64', BelongsToItem=Item), ModuleQuery(Table, Model, 'X64', BelongsToItem=Item))
+
+    def testPackageTable(self):
+        Table = PackageTable(FakeDb(), FakeMetaFile(), True)
+        self.FillTable(Table, 300)
+        Table.SetEndFlag()
+        for Model in ModelList:
+            for Arch in (None,) + ArchList:
+                self.assertEqual(Table.Query(Model, Arch), PackageQuery(Table, Model, Arch))
+
+    def testPlatformTable(self):
+        Table = PlatformTable(FakeDb(), FakeMetaFile(), True)
+        IdList = self.FillTable(Table, 300, FromItem=1)
+        Table.SetEndFlag()
+        for Model in ModelList:
+            for Scope1 in (None,) + ArchList:
+                for Scope2 in (None,) + Scope2List:
+                    self.assertEqual(Table.Query(Model, Scope1, Scope2), PlatformQuery(Table, Model, Scope1, Scope2))
+            for Item in IdList[:50]:
+                self.assertEqual(Table.Query(Model, 'IA32', BelongsToItem=Item, FromItem=1),
+                                 PlatformQuery(Table, Model, 'IA32', BelongsToItem=Item, FromItem=1))
+
+    def testInsertAfterQuery(self):
+        Table = PlatformTable(FakeDb(), FakeMetaFile(), True)
+        self.FillTable(Table, 50)
+        Table.SetEndFlag()
+        Before = Table.Query(1001)
+        self.FillTable(Table, 50)
+        self.assertNotEqual(Table.Query(1001), Before)
+        self.assertEqual(Table.Query(1001), PlatformQuery(Table, 1001))
+
+    def testDisableComponent(self):
+        Table = PlatformTable(FakeDb(), FakeMetaFile(), True)
+        IdList = self.FillTable(Table, 200)
+        Table.SetEndFlag()
+        for Item in IdList[:100:7]:
+            Table.DisableComponent(Item)
+        for Model in ModelList:
+            self.assertEqual(Table.Query(Model), PlatformQuery(Table, Model))
+            for Item in IdList[:20]:
+                self.assertEqual(Table.Query(Model, BelongsToItem=Item), PlatformQuery(Table, Model, BelongsToItem=Item))
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
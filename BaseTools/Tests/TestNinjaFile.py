@@ -0,0 +1,168 @@
+## @file
+# Unit tests for the ninja files generated by the ninja build backend
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+from collections import OrderedDict
+
+import TestTools
+from Common import EdkLogger
+from Common.DataType import TAB_C_CODE_FILE
+from Common.Misc import SaveFileOnChange
+from AutoGen.GenMake import ModuleNinjaFile, PlatformNinjaFile
+
+## The compiler used in the tests, which copies the source file and saves a gcc style dependency file
+FakeCompiler = '''import sys
+Args = sys.argv[1:]
+DepsFile = Args[Args.index('-MF') + 1]
+Output = Args[Args.index('-o') + 1]
+Source = Args[-1]
+with open(Source) as File:
+    Data = File.read()
+with open(Output, 'w') as File:
+    File.write(Data)
+with open(DepsFile, 'w') as File:
+    File.write('%s: %s Include/Test.h\\n' % (Output, Source))
+'''
+
+class FakePath(object):
+    def __init__(self, Path):
+        self.Path = Path
+
+    def __str__(self):
+        return self.Path
+
+class FakeTarget(object):
+    def __init__(self, Target, Inputs, Commands, Dependencies=[]):
+        self.Target = FakePath(Target)
+        self.Inputs = Inputs
+        self.Commands = Commands
+        self.Dependencies = Dependencies
+
+class FakeModuleAutoGen(object):
+    Name = 'TestModule'
+    Arch = 'X64'
+    ToolChainFamily = 'GCC'
+    PlatformInfo = None
+    GenFfsList = []
+
+    def __init__(self, BuildDir):
+        self.MakeFileDir = BuildDir
+        self.Macros = dict.fromkeys(('OUTPUT_DIR', 'DEBUG_DIR', 'MODULE_BUILD_DIR', 'BIN_DIR', 'BUILD_DIR', 'WORKSPACE',
+                                     'FFS_OUTPUT_DIR'), BuildDir)
+        self.Targets = OrderedDict()
+
+class FakeWorkspaceAutoGen(object):
+    def __init__(self, BuildDir):
+        self.MakeFileDir = BuildDir
+
+class Tests(TestTools.BaseToolsTest):
+
+    def setUp(self):
+        TestTools.BaseToolsTest.setUp(self)
+        EdkLogger.InitializeForUnitTest()
+        self.BuildDir = self.GetTmpFilePath('Build')
+        os.makedirs(self.BuildDir)
+
+    ## Create the ninja file of a module compiling one C file and "linking" it
+    def CreateModuleNinjaFile(self):
+        Ago = FakeModuleAutoGen(self.BuildDir)
+        Source = self.GetTmpFilePath('Test.c')
+        Object = os.path.join(self.BuildDir, 'Test.obj')
+        Library = os.path.join(self.BuildDir, 'Test.lib')
+        Ago.Targets[TAB_C_CODE_FILE] = [FakeTarget(Object, [Source], ['"$(CC)" $(CC_FLAGS) $(DEPS_FLAGS) -o $@ $<'])]
+        Ago.Targets['STATIC-LIBRARY-FILE'] = [FakeTarget(Library, [Object], ['"$(CC)" -c "$(SLINK_CMD)" $@ $<', '-$(RM) missing.txt'])]
+        NinjaFile = ModuleNinjaFile(Ago)
+        NinjaFile._FileType = 'gmake'
+        NinjaFile.MakefileMacros = NinjaFile.GetMakefileMacros('\n'.join([
+            'OUTPUT_DIR = %s' % self.BuildDir,
+            'CC = %s' % sys.executable,
+            'CC_FLAGS = %s \\' % self.GetTmpFilePath('cc.py'),
+            '    -DTEST',
+            'SLINK_CMD = import shutil, sys; shutil.copy(sys.argv[2], sys.argv[1])',
+            'RM = rm -f',
+            ]))
+        NinjaFile.MakefileMacros['DEPS_FLAGS'] = ModuleNinjaFile._NINJA_DEPS_RULE_['GCC'][1]
+        NinjaFile.FileDependencyDict = {Source: [self.GetTmpFilePath('Test.h')]}
+        NinjaFile.ResultFileList = ['$(OUTPUT_DIR)/Test.lib']
+        SaveFileOnChange(ModuleNinjaFile.GetNinjaFilePath(Ago), NinjaFile.GetNinjaContent(), False)
+        return Ago, Source, Object, Library
+
+    def testExpandMacro(self):
+        NinjaFile = ModuleNinjaFile(FakeModuleAutoGen(self.BuildDir))
+        NinjaFile._FileType = 'gmake'
+        NinjaFile.MakefileMacros = NinjaFile.GetMakefileMacros('A = $(B) x\nB = b \\\n  c\n')
+        self.assertEqual(NinjaFile.MakefileMacros, {'A': '$(B) x', 'B': 'b    c'})
+        os.environ['TEST_NINJA_MACRO'] = 'env'
+        try:
+            self.assertEqual(NinjaFile.ExpandMacro('$(A) $$(TEST_NINJA_MACRO) $(TEST_NINJA_MACRO) $(UNDEFINED)'),
+                             'b    c x $(TEST_NINJA_MACRO) env ')
+        finally:
+            del os.environ['TEST_NINJA_MACRO']
+        self.assertEqual(NinjaFile.ExpandPathList(['$(A)', '$(FORCE_REBUILD)']), ['b', 'c', 'x', ModuleNinjaFile.FORCE_REBUILD_TARGET])
+        self.assertEqual(NinjaFile.GetShellCommand(['@echo $(A)', '-rm -f $@']),
+                         'cd %s && echo b    c x && (rm -f %s || true)' % (self.BuildDir, ModuleNinjaFile._OUTPUT_PLACEHOLDER_))
+
+    def testModuleNinjaFile(self):
+        Ago, Source, Object, Library = self.CreateModuleNinjaFile()
+        with open(ModuleNinjaFile.GetNinjaFilePath(Ago)) as File:
+            Content = File.read()
+        Escape = ModuleNinjaFile.EscapePath
+        # the headers found by searching #include only order the compilation, the compiler reports the real ones
+        self.assertIn('build %s: cc_gcc %s || %s\n' % (Escape(Object), Escape(Source), Escape(self.GetTmpFilePath('Test.h'))), Content)
+        self.assertIn('-MMD -MF %s.deps -o %s %s\n' % (Escape(Object), Escape(Object), Escape(Source)), Content)
+        self.assertIn('build %s: run %s\n' % (Escape(Library), Escape(Object)), Content)
+        self.assertIn('(rm -f missing.txt || true)', Content)
+        self.assertIn('build %s: phony %s\n' % (Escape(ModuleNinjaFile.GetModuleTarget(Ago)), Escape(Library)), Content)
+
+    def testPlatformNinjaFile(self):
+        Ago = self.CreateModuleNinjaFile()[0]
+        NinjaFile = PlatformNinjaFile(FakeWorkspaceAutoGen(self.GetTmpFilePath('.')), [Ago])
+        self.assertTrue(NinjaFile.Generate())
+        self.assertFalse(NinjaFile.Generate())
+        with open(NinjaFile.FilePath) as File:
+            Content = File.read()
+        self.assertIn('\nsubninja %s\n' % ModuleNinjaFile.EscapePath(ModuleNinjaFile.GetNinjaFilePath(Ago)), Content)
+        self.assertIn('\nbuild all: phony %s\n' % ModuleNinjaFile.EscapePath(ModuleNinjaFile.GetModuleTarget(Ago)), Content)
+        self.assertIn('\ndefault all\n', Content)
+
+    ## Run ninja with the generated files, and check it rebuilds the library when the header reported by compiler changes
+    @unittest.skipUnless(shutil.which('ninja') and sys.platform != 'win32', 'ninja is not found')
+    def testNinjaBuild(self):
+        self.WriteTmpFile('cc.py', FakeCompiler)
+        self.WriteTmpFile('Test.c', '#include "Test.h"\n')
+        self.WriteTmpFile('Test.h', '')
+        os.makedirs(self.GetTmpFilePath('Include'))
+        self.WriteTmpFile(os.path.join('Include', 'Test.h'), '#define A 1\n')
+        Ago, Source, Object, Library = self.CreateModuleNinjaFile()
+        NinjaFile = PlatformNinjaFile(FakeWorkspaceAutoGen(self.testDir), [Ago])
+        NinjaFile.Generate()
+
+        def RunNinja(*Options):
+            return subprocess.check_output(['ninja', '-f', NinjaFile.FilePath] + list(Options), cwd=self.testDir,
+                                           stderr=subprocess.STDOUT).decode()
+        RunNinja()
+        with open(Library) as File:
+            self.assertEqual(File.read(), '#include "Test.h"\n')
+        self.assertIn('no work to do', RunNinja())
+        # the header is only known from the dependency file of compiler
+        Header = self.GetTmpFilePath(os.path.join('Include', 'Test.h'))
+        os.utime(Header, (os.path.getmtime(Library) + 2,) * 2)
+        Output = RunNinja('-n', '-d', 'explain')
+        self.assertIn('%s is dirty' % Object, Output)
+        self.assertIn('[2/2]', Output)
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
@@ -0,0 +1,133 @@
+## @file
+# Unit tests for parsing the INF and DEC files in a process pool before AutoGen
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import os
+import unittest
+
+import TestTools
+from Common import EdkLogger
+import Common.GlobalData as GlobalData
+from CommonDataClass.DataClass import MODEL_FILE_INF, MODEL_FILE_DEC
+from Common.Misc import PathClass
+from AutoGen.WorkspaceAutoGen import WorkspaceAutoGen
+import Workspace.WorkspaceDatabase as WorkspaceDatabase
+from Workspace.MetaFileTable import MetaFileStorage
+
+## The INF files pre-parsed in the tests, from the packages of this tree
+ModuleFileList = (
+    'MdePkg/Library/BaseLib/BaseLib.inf',
+    'MdePkg/Library/BasePrintLib/BasePrintLib.inf',
+    'MdePkg/Library/BaseMemoryLib/BaseMemoryLib.inf',
+    'MdePkg/Library/UefiLib/UefiLib.inf',
+    )
+
+class FakePlatform(object):
+    def __init__(self, Modules, LibraryInstances):
+        self.Modules = Modules
+        self.LibraryInstances = LibraryInstances
+
+class FakeFdfProfile(object):
+    def __init__(self, InfList):
+        self.InfList = InfList
+
+class FakeWorkspaceDb(object):
+    def PreParse(self, ModuleList, ProcessNumber):
+        self.ModuleList = ModuleList
+
+## A WorkspaceAutoGen having only what PreParseMetaFiles() uses
+#
+#   The platform objects have no _RawData, so that the records of DSC file
+#   can't be queried directly.
+#
+class FakeWorkspaceAutoGen(object):
+    def __init__(self, PlatformDict, FdfInfList):
+        self.MetaFile = 'Platform.dsc'
+        self.ArchList = list(PlatformDict)
+        self.BuildTarget = 'DEBUG'
+        self.ToolChain = 'GCC5'
+        self.FdfProfile = FakeFdfProfile(FdfInfList) if FdfInfList else None
+        self.PlatformDict = PlatformDict
+        self.WorkspaceDb = FakeWorkspaceDb()
+        self.BuildDatabase = self
+
+    def __getitem__(self, Key):
+        return self.PlatformDict[Key[1]]
+
+class Tests(TestTools.BaseToolsTest):
+
+    def setUp(self):
+        TestTools.BaseToolsTest.setUp(self)
+        EdkLogger.InitializeForUnitTest()
+        self.Workspace = os.path.normpath(os.path.join(TestTools.BaseToolsDir, '..'))
+        self.SavedGlobals = (GlobalData.gWorkspace, GlobalData.gGlobalDefines, GlobalData.gParserProcessNumber)
+        self.SavedCpuCount = WorkspaceDatabase.multiprocessing.cpu_count
+        self.SavedFileNumber = WorkspaceDatabase.GetPreParseFileNumber
+        GlobalData.gWorkspace = self.Workspace
+        GlobalData.gGlobalDefines = {}
+
+    def tearDown(self):
+        GlobalData.gWorkspace, GlobalData.gGlobalDefines, GlobalData.gParserProcessNumber = self.SavedGlobals
+        WorkspaceDatabase.multiprocessing.cpu_count = self.SavedCpuCount
+        WorkspaceDatabase.GetPreParseFileNumber = self.SavedFileNumber
+        TestTools.BaseToolsTest.tearDown(self)
+
+    def GetPath(self, File):
+        return PathClass(os.path.normpath(File), self.Workspace)
+
+    def testPreParseFileNumber(self):
+        WorkspaceDatabase.multiprocessing.cpu_count = lambda: 4
+        self.assertEqual(WorkspaceDatabase.GetPreParseFileNumber(1), None)
+        self.assertEqual(WorkspaceDatabase.GetPreParseFileNumber(2), 567)
+        self.assertEqual(WorkspaceDatabase.GetPreParseFileNumber(4), 373)
+        # no more processes run in parallel than processors
+        self.assertEqual(WorkspaceDatabase.GetPreParseFileNumber(16), 373)
+        WorkspaceDatabase.multiprocessing.cpu_count = lambda: 1
+        self.assertEqual(WorkspaceDatabase.GetPreParseFileNumber(16), None)
+
+    def testModuleList(self):
+        GlobalData.gParserProcessNumber = 4
+        Driver, Lib, PrivateLib, FdfDriver = [self.GetPath(File) for File in ModuleFileList]
+        Wa = FakeWorkspaceAutoGen({
+            'IA32': FakePlatform({Driver: None}, [Lib, PrivateLib]),
+            'X64' : FakePlatform({Driver: None, Lib: None}, [Lib]),
+            }, [ModuleFileList[3], ModuleFileList[0]])
+        WorkspaceAutoGen.PreParseMetaFiles(Wa)
+        self.assertEqual([Module.Path for Module in Wa.WorkspaceDb.ModuleList],
+                         [Driver.Path, Lib.Path, PrivateLib.Path, FdfDriver.Path])
+
+    def testNoProcess(self):
+        GlobalData.gParserProcessNumber = 1
+        Wa = FakeWorkspaceAutoGen({'X64': None}, [])
+        WorkspaceAutoGen.PreParseMetaFiles(Wa)
+        self.assertFalse(hasattr(Wa.WorkspaceDb, 'ModuleList'))
+
+    def testPreParse(self):
+        # always use the pool, and compare the tables with the ones parsed in build process
+        WorkspaceDatabase.GetPreParseFileNumber = lambda ProcessNumber: 1
+        PreParsedDb = WorkspaceDatabase.WorkspaceDatabase()
+        PreParsedDb.PreParse([self.GetPath(File) for File in ModuleFileList], 2)
+        Db = WorkspaceDatabase.WorkspaceDatabase()
+        for File in ModuleFileList:
+            Module = Db.BuildObject[self.GetPath(File), 'X64', 'DEBUG', 'GCC5']
+            self.assertTrue(Module.Sources)
+            PreParsedTable = MetaFileStorage(PreParsedDb, self.GetPath(File), MODEL_FILE_INF)
+            self.assertTrue(PreParsedTable.IsIntegrity())
+            PreParsedModule = PreParsedDb.BuildObject[self.GetPath(File), 'X64', 'DEBUG', 'GCC5']
+            self.assertEqual(PreParsedModule.Sources, Module.Sources)
+            self.assertEqual(PreParsedModule.LibraryClasses, Module.LibraryClasses)
+            self.assertEqual(PreParsedModule.Packages, Module.Packages)
+        # the packages of the modules are pre-parsed too
+        Package = self.GetPath('MdePkg/MdePkg.dec')
+        self.assertTrue(MetaFileStorage(PreParsedDb, Package, MODEL_FILE_DEC).IsIntegrity())
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
@@ -0,0 +1,59 @@
+## @file
+# Unit tests for collecting the included files printed by MSFT compiler
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import os
+import sys
+import unittest
+
+import TestTools
+from Common import EdkLogger
+from AutoGen.GenMake import GetCompilerDependencyList, gDepsFileExt
+
+## Print like cl with /showIncludes: the source names on stdout, the notes on
+#  stderr in the language given by VSLANG, Bar.c has no notes
+FakeCompiler = '''import os, sys
+Prefix = "Note: including file:" if os.environ.get("VSLANG") == "1033" else "Remarque : inclusion du fichier :"
+for Source, IncludeList in (("Foo.c", ("C:\\\\Build\\\\DEBUG\\\\AutoGen.h", "C:\\\\Pkg\\\\Include\\\\Foo.h")), ("Bar.c", ())):
+    sys.stdout.write(Source + "\\n")
+    sys.stdout.flush()
+    for Include in IncludeList:
+        sys.stderr.write("%s %s\\n" % (Prefix, Include))
+        sys.stderr.flush()
+sys.stderr.write("Foo.c(3): warning C4100: unreferenced formal parameter\\n")
+'''
+
+class Tests(TestTools.BaseToolsTest):
+
+    def setUp(self):
+        TestTools.BaseToolsTest.setUp(self)
+        EdkLogger.InitializeForUnitTest()
+        sys.path.append(os.path.join(TestTools.PythonSourceDir, 'build'))
+        from build.build import LaunchCommand
+        self.LaunchCommand = LaunchCommand
+        self.WriteTmpFile('cl.py', FakeCompiler)
+        self.Command = [sys.executable, self.GetTmpFilePath('cl.py')]
+        self.DepsDir = self.GetTmpFilePath('OUTPUT')
+        os.mkdir(self.DepsDir)
+
+    def testShowIncludes(self):
+        self.LaunchCommand(self.Command, self.testDir, DepsDir=self.DepsDir)
+        DependencyList = GetCompilerDependencyList(os.path.join(self.DepsDir, 'Foo.c' + gDepsFileExt), self.DepsDir)
+        self.assertEqual([os.path.basename(File.replace('\\', '/')) for File in DependencyList], ['AutoGen.h', 'Foo.h'])
+        # no empty dependency file, so that the source is still scanned
+        self.assertFalse(os.path.exists(os.path.join(self.DepsDir, 'Bar.c' + gDepsFileExt)))
+
+    def testWithoutShowIncludes(self):
+        self.LaunchCommand(self.Command, self.testDir)
+        self.assertEqual(os.listdir(self.DepsDir), [])
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)
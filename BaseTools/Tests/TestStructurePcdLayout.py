@@ -0,0 +1,332 @@
+## @file
+# Unit tests for the evaluation of structure PCDs in Python, compared with the
+# C compiler and with the PcdValueInit application
+#
+# SPDX-License-Identifier: BSD-2-Clause-Patent
+#
+
+##
+# Import Modules
+#
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+
+import TestTools
+from Common import EdkLogger
+import Common.GlobalData as GlobalData
+from Common.MultipleWorkspace import MultipleWorkspace as mws
+from Common.Misc import PathClass
+from Workspace.StructurePcdLayout import StructureLayout, StructureLayoutError
+from Workspace.DscBuildData import DscBuildData
+from Workspace.WorkspaceDatabase import WorkspaceDatabase
+
+LayoutHeader = '''
+typedef struct {
+  UINT8     A;
+  UINT64    B;
+  UINT16    C[3];
+} LAYOUT_NATURAL;
+
+#pragma pack(1)
+typedef struct {
+  UINT8     A;
+  UINT32    B;
+  UINT16    Data[0];
+} LAYOUT_PACKED;
+#pragma pack()
+
+#pragma pack(push, 2)
+typedef struct {
+  UINT8     A;
+  UINT64    B;
+} LAYOUT_PACKED2;
+#pragma pack(pop)
+
+typedef union {
+  UINT32    U32;
+  UINT8     U8[6];
+  UINT16    U16;
+} LAYOUT_UNION;
+
+typedef struct {
+  UINT8           A;
+  union {
+    UINT32    U32;
+    UINT8     U8[4];
+  };
+  LAYOUT_UNION    Named;
+  UINT16          Count;
+  UINT32          Flex[];
+} LAYOUT_FLEXIBLE;
+
+typedef struct {
+  UINT8     A;
+  UINT8     (*P)[4];
+} LAYOUT_POINTER_TO_ARRAY;
+'''
+
+LayoutTypes = ('LAYOUT_NATURAL', 'LAYOUT_PACKED', 'LAYOUT_PACKED2', 'LAYOUT_UNION', 'LAYOUT_FLEXIBLE')
+LayoutFields = (
+    ('LAYOUT_NATURAL', 'B'), ('LAYOUT_NATURAL', 'C[2]'),
+    ('LAYOUT_PACKED', 'B'), ('LAYOUT_PACKED', 'Data[1]'),
+    ('LAYOUT_PACKED2', 'B'),
+    ('LAYOUT_UNION', 'U8[5]'), ('LAYOUT_UNION', 'U16'),
+    ('LAYOUT_FLEXIBLE', 'U32'), ('LAYOUT_FLEXIBLE', 'U8[3]'), ('LAYOUT_FLEXIBLE', 'Named.U8[4]'),
+    ('LAYOUT_FLEXIBLE', 'Count'), ('LAYOUT_FLEXIBLE', 'Flex[2]'),
+)
+
+LayoutProgram = '''#include <stdio.h>
+#include <stddef.h>
+#include <stdint.h>
+typedef uint8_t UINT8;
+typedef uint16_t UINT16;
+typedef uint32_t UINT32;
+typedef uint64_t UINT64;
+#include "Layout.h"
+int main (void)
+{
+%s  return 0;
+}
+'''
+
+TestDec = '''[Defines]
+  DEC_SPECIFICATION              = 0x00010017
+  PACKAGE_NAME                   = TestPkg
+  PACKAGE_GUID                   = 5e0e9358-46b6-4ae2-8218-4ab8b9bbdcec
+  PACKAGE_VERSION                = 1.0
+
+[Includes]
+  Include
+
+[Guids]
+  gTestTokenSpaceGuid = { 0x914aebe7, 0x4635, 0x459b, { 0xaa, 0x1c, 0x11, 0xe2, 0x19, 0xb0, 0x3a, 0x10 }}
+
+[PcdsFixedAtBuild, PcdsPatchableInModule, PcdsDynamic, PcdsDynamicEx]
+  gTestTokenSpaceGuid.PcdFixed|{0x0}|TEST_STRUCT|0x00000001 {
+    <HeaderFiles>
+      TestStruct.h
+    <Packages>
+      MdePkg/MdePkg.dec
+      TestPkg/TestPkg.dec
+  }
+  gTestTokenSpaceGuid.PcdFixed.A|0x12
+  gTestTokenSpaceGuid.PcdFixed.Name|L"abc"
+  gTestTokenSpaceGuid.PcdFixed.Sub.Y|0x1122334455667788
+
+  gTestTokenSpaceGuid.PcdDyn|{0x1, 0x2, 0x3}|TEST_STRUCT|0x00000002 {
+    <HeaderFiles>
+      TestStruct.h
+    <Packages>
+      MdePkg/MdePkg.dec
+      TestPkg/TestPkg.dec
+  }
+  gTestTokenSpaceGuid.PcdDyn.B|0x10
+  gTestTokenSpaceGuid.PcdDyn.Flex[3]|0x7
+
+  gTestTokenSpaceGuid.PcdPacked|{0x0}|TEST_PACKED|0x00000003 {
+    <HeaderFiles>
+      TestStruct.h
+    <Packages>
+      MdePkg/MdePkg.dec
+      TestPkg/TestPkg.dec
+  }
+  gTestTokenSpaceGuid.PcdPacked.B|0xdeadbeef
+'''
+
+TestDsc = '''[Defines]
+  PLATFORM_NAME                  = TestPkg
+  PLATFORM_GUID                  = 0d4b8a0e-0c43-4f49-9d1d-8d3b9c6c0a11
+  PLATFORM_VERSION               = 1.0
+  DSC_SPECIFICATION              = 0x0001001C
+  OUTPUT_DIRECTORY               = Build/TestPkg
+  SUPPORTED_ARCHITECTURES        = X64
+  BUILD_TARGETS                  = DEBUG
+  SKUID_IDENTIFIER               = ALL
+
+[SkuIds]
+  0|DEFAULT
+  1|SkuA
+  2|SkuB|SkuA
+
+[PcdsFixedAtBuild]
+  gTestTokenSpaceGuid.PcdFixed.B|0x55aa
+  gTestTokenSpaceGuid.PcdFixed.Guid|{GUID("11223344-5566-7788-99aa-bbccddeeff00")}
+  gTestTokenSpaceGuid.PcdFixed.Arr[2]|0xffffffff
+  gTestTokenSpaceGuid.PcdFixed.U8[1]|0x3
+  gTestTokenSpaceGuid.PcdFixed.Flag|TRUE
+  gTestTokenSpaceGuid.PcdFixed.Sub.X|-1
+  gTestTokenSpaceGuid.PcdFixed.Count|0x1234
+  gTestTokenSpaceGuid.PcdPacked|{0x9, 0x8}
+  gTestTokenSpaceGuid.PcdPacked.Data[4]|0x1234
+
+[PcdsDynamicDefault.common.DEFAULT]
+  gTestTokenSpaceGuid.PcdDyn|{0x5}
+  gTestTokenSpaceGuid.PcdDyn.A|0x1
+  gTestTokenSpaceGuid.PcdDyn.Name|L"def"
+
+[PcdsDynamicDefault.common.SkuA]
+  gTestTokenSpaceGuid.PcdDyn.A|0x2
+  gTestTokenSpaceGuid.PcdDyn.Flex|{0x1, 0x2, 0x3, 0x4, 0x5, 0x6, 0x7, 0x8, 0x9, 0xa}
+
+[PcdsDynamicDefault.common.SkuB]
+  gTestTokenSpaceGuid.PcdDyn.Sub.Y|0x42
+  gTestTokenSpaceGuid.PcdDyn.Arr|{0x1, 0x0, 0x0, 0x0, 0x2}
+
+[Components]
+  TestPkg/TestLib.inf
+'''
+
+TestInf = '''[Defines]
+  INF_VERSION                    = 0x00010005
+  BASE_NAME                      = TestLib
+  FILE_GUID                      = 2e4c4c3b-0a6b-4b0e-9f3e-3f3a36a1f001
+  MODULE_TYPE                    = BASE
+  VERSION_STRING                 = 1.0
+  LIBRARY_CLASS                  = TestLib
+
+[Sources]
+  TestLib.c
+
+[Packages]
+  MdePkg/MdePkg.dec
+  TestPkg/TestPkg.dec
+
+[Pcd]
+  gTestTokenSpaceGuid.PcdFixed
+  gTestTokenSpaceGuid.PcdDyn
+  gTestTokenSpaceGuid.PcdPacked
+'''
+
+TestHeader = '''#include <Uefi/UefiBaseType.h>
+
+#define TEST_NAME_LENGTH  8
+
+typedef struct {
+  UINT8     X;
+  UINT64    Y;
+} TEST_SUB;
+
+typedef struct {
+  UINT8       A;
+  UINT32      B;
+  CHAR16      Name[TEST_NAME_LENGTH];
+  EFI_GUID    Guid;
+  TEST_SUB    Sub;
+  union {
+    UINT32    U32;
+    UINT8     U8[4];
+  };
+  UINT32      Arr[4];
+  BOOLEAN     Flag;
+  UINT16      Count;
+  UINT8       Flex[0];
+} TEST_STRUCT;
+
+#pragma pack(1)
+typedef struct {
+  UINT8     A;
+  UINT32    B;
+  UINT16    Data[0];
+} TEST_PACKED;
+#pragma pack()
+'''
+
+## Get the C compiler of the host, None if it's not found
+def GetHostCompiler():
+    if sys.platform == "win32":
+        return None
+    return shutil.which(os.environ.get('BUILD_CC', 'gcc'))
+
+class Tests(TestTools.BaseToolsTest):
+
+    def setUp(self):
+        TestTools.BaseToolsTest.setUp(self)
+        EdkLogger.InitializeForUnitTest()
+
+    def testLayout(self):
+        Compiler = GetHostCompiler()
+        if not Compiler:
+            self.skipTest("The host C compiler is not found")
+        self.WriteTmpFile('Layout.h', LayoutHeader)
+        Statements = ''
+        for TypeName in LayoutTypes:
+            Statements += '  printf ("%%u\\n", (unsigned) sizeof (%s));\n' % TypeName
+        for TypeName, FieldName in LayoutFields:
+            Statements += '  printf ("%%u\\n", (unsigned) offsetof (%s, %s));\n' % (TypeName, FieldName)
+        self.WriteTmpFile('Layout.c', LayoutProgram % Statements)
+        subprocess.check_call([Compiler, '-o', self.GetTmpFilePath('Layout'), self.GetTmpFilePath('Layout.c')])
+        Expected = [int(Line) for Line in subprocess.check_output([self.GetTmpFilePath('Layout')]).split()]
+
+        Layout = StructureLayout(['Layout.h'], [self.testDir])
+        Result = [Layout.SizeOf(TypeName) for TypeName in LayoutTypes]
+        Result += [Layout.GetField(TypeName, FieldName)[0] for TypeName, FieldName in LayoutFields]
+        self.assertEqual(Result, Expected)
+
+    def testPointerToArray(self):
+        self.WriteTmpFile('Layout.h', LayoutHeader)
+        Layout = StructureLayout(['Layout.h'], [self.testDir])
+        self.assertRaises(StructureLayoutError, Layout.SizeOf, 'LAYOUT_POINTER_TO_ARRAY')
+
+    ## Get the values of the PCDs of the test platform
+    #
+    #   @retval dict    The default value and the values of the SKUs by the PCD names
+    #
+    def GetPcdValues(self):
+        Db = WorkspaceDatabase()
+        Db.BuildObject.GetCache().clear()
+        Platform = Db.BuildObject[PathClass(self.GetTmpFilePath(os.path.join('TestPkg', 'TestPkg.dsc')), self.testDir), 'X64', 'DEBUG', 'GCC5']
+        return {(Pcd.TokenSpaceGuidCName, Pcd.TokenCName): (Pcd.DefaultValue, {SkuName: Sku.DefaultValue for SkuName, Sku in Pcd.SkuInfoList.items()})
+                for Pcd in Platform.Pcds.values()}
+
+    def testOutput(self):
+        EdkToolsPath = os.environ.get('EDK_TOOLS_PATH', TestTools.BaseToolsDir)
+        if not GetHostCompiler() or not os.path.exists(os.path.join(EdkToolsPath, 'Source', 'C', 'libs', 'libCommon.a')):
+            self.skipTest("The PcdValueInit application can't be built")
+        for Directory in ('TestPkg', os.path.join('TestPkg', 'Include')):
+            os.mkdir(self.GetTmpFilePath(Directory))
+        self.WriteTmpFile(os.path.join('TestPkg', 'TestPkg.dec'), TestDec)
+        self.WriteTmpFile(os.path.join('TestPkg', 'TestPkg.dsc'), TestDsc)
+        self.WriteTmpFile(os.path.join('TestPkg', 'TestLib.inf'), TestInf)
+        self.WriteTmpFile(os.path.join('TestPkg', 'Include', 'TestStruct.h'), TestHeader)
+
+        SavedWorkspace = (os.environ.get('WORKSPACE'), GlobalData.gWorkspace, dict(GlobalData.gGlobalDefines), mws.WORKSPACE, mws.PACKAGES_PATH)
+        EvaluateStructurePcds = DscBuildData.EvaluateStructurePcds
+        Evaluated = []
+        def Evaluate(Self, *Args):
+            Evaluated.append(Self)
+            return EvaluateStructurePcds(Self, *Args)
+        def Fallback(Self, *Args):
+            raise StructureLayoutError("Evaluated by the application")
+        try:
+            os.environ['WORKSPACE'] = self.testDir
+            mws.setWs(self.testDir, os.path.realpath(os.path.join(TestTools.BaseToolsDir, '..')))
+            GlobalData.gWorkspace = self.testDir
+            GlobalData.gGlobalDefines['WORKSPACE'] = self.testDir
+            GlobalData.gGlobalDefines['EDK_TOOLS_PATH'] = EdkToolsPath
+            DscBuildData.EvaluateStructurePcds = Evaluate
+            Values = self.GetPcdValues()
+            self.assertTrue(Evaluated)
+            DscBuildData.EvaluateStructurePcds = Fallback
+            Expected = self.GetPcdValues()
+            OutputFile = os.path.join(Evaluated[0].OutputPath, 'Output.txt')
+        finally:
+            DscBuildData.EvaluateStructurePcds = EvaluateStructurePcds
+            WorkspaceDatabase().BuildObject.GetCache().clear()
+            SavedEnvWorkspace, GlobalData.gWorkspace, GlobalData.gGlobalDefines, mws.WORKSPACE, mws.PACKAGES_PATH = SavedWorkspace
+            if SavedEnvWorkspace is None:
+                del os.environ['WORKSPACE']
+            else:
+                os.environ['WORKSPACE'] = SavedEnvWorkspace
+
+        self.assertTrue(os.path.exists(OutputFile))
+        self.assertEqual(sorted(Values[('gTestTokenSpaceGuid', 'PcdDyn')][1]), ['DEFAULT', 'SKUA', 'SKUB'])
+        self.assertEqual(Values, Expected)
+
+TheTestSuite = TestTools.MakeTheTestSuite(locals())
+
+if __name__ == '__main__':
+    allTests = TheTestSuite()
+    unittest.TextTestRunner().run(allTests)